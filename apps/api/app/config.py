@@ -25,11 +25,47 @@ class Settings(BaseModel):
     access_ttl: int = int(os.getenv("JWT_ACCESS_TTL_SECONDS", "3600"))
     refresh_ttl: int = int(os.getenv("JWT_REFRESH_TTL_SECONDS", "2592000"))
     upload_dir: str = os.getenv("UPLOAD_DIR", os.path.join(os.getcwd(), "uploads"))
+    storage_backend: str = os.getenv("STORAGE_BACKEND", "local")
+    max_upload_size_mb: int = int(os.getenv("MAX_UPLOAD_SIZE_MB", "25"))
+    # Ex.: "/protected-uploads" para o nginx servir anexos (X-Accel-Redirect)
+    x_accel_redirect_prefix: str | None = os.getenv("X_ACCEL_REDIRECT_PREFIX") or None
+    # Respostas a partir deste tamanho (bytes) saem comprimidas (br/gzip); 0 desativa
+    compression_min_size: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
     
     # Environment and deployment settings
     env: str = os.getenv("ENV", "development")
     cookie_domain: str | None = os.getenv("COOKIE_DOMAIN", None)
     frontend_url: str = os.getenv("FRONTEND_URL", "http://localhost:3000")
+    # Token do scrape de GET /metrics (Authorization: Bearer); obrigatório em produção
+    metrics_token: str | None = os.getenv("METRICS_TOKEN") or None
+    # Monitor de queries (services/query_monitor)
+    slow_query_ms: int = int(os.getenv("SLOW_QUERY_MS", "500"))
+    n_plus_one_threshold: int = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+    query_budget_enforce: bool = os.getenv("QUERY_BUDGET_ENFORCE", "false").lower() in ("1", "true", "yes")
+    # Logging (app/logging_config): LOG_LEVELS="app.routers.imports=WARNING,..."
+    log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    log_levels: str = os.getenv("LOG_LEVELS", "")
+    log_format: str = os.getenv("LOG_FORMAT") or ("json" if os.getenv("ENV") == "production" else "text")
+    # Loggers de linha a linha: só 1 a cada LOG_SAMPLE_EVERY registros (abaixo de WARNING)
+    log_sampled: str = os.getenv("LOG_SAMPLED", "app.routers.imports.rows")
+    log_sample_every: int = int(os.getenv("LOG_SAMPLE_EVERY", "100"))
+    # Threads para código síncrono: handlers def (THREADPOOL_SIZE) e run_db (DB_THREADS)
+    threadpool_size: int = int(os.getenv("THREADPOOL_SIZE", "40"))
+    db_threads: int = int(os.getenv("DB_THREADS", "15"))
+    # Log de bloqueios do event loop acima deste tempo (0 desativa)
+    loop_lag_threshold_ms: int = int(os.getenv("LOOP_LAG_THRESHOLD_MS", "100"))
+    # Relay do outbox de eventos (services/outbox)
+    outbox_poll_ms: int = int(os.getenv("OUTBOX_POLL_MS", "1000"))
+    outbox_retention_hours: int = int(os.getenv("OUTBOX_RETENTION_HOURS", "24"))
+    # Referências de folha mais antigas que isso (meses) vão para o arquivo
+    # Parquet em <upload_dir>/payroll_archive (services/payroll_archive); 0 desativa
+    payroll_archive_months: int = int(os.getenv("PAYROLL_ARCHIVE_MONTHS", "0"))
+    # Profiler por amostragem (services/profiler); desligado não tem custo algum
+    profiling_enabled: bool = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+    profiling_interval_ms: float = float(os.getenv("PROFILING_INTERVAL_MS", "5"))
+
+    # UF cujos feriados estaduais entram no cálculo de horas úteis (SLA)
+    business_calendar_state: str = os.getenv("BUSINESS_CALENDAR_STATE", "PI")
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
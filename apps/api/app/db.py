@@ -1,8 +1,12 @@
+from functools import partial
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base, Session
-from typing import Generator
+from typing import Any, Callable, Generator, Optional, TypeVar
+import anyio
 from .config import settings
 
+T = TypeVar("T")
+
 engine = create_engine(
     settings.db_uri, 
     pool_pre_ping=True,
@@ -16,3 +20,21 @@ def get_db() -> Generator[Session, None, None]:
         yield db
     finally:
         db.close()
+
+
+_db_limiter: Optional[anyio.CapacityLimiter] = None
+
+
+async def run_db(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Executa código síncrono de banco (psycopg2) fora do event loop.
+
+    Usar em handlers/tarefas async que precisam do banco: o loop segue
+    atendendo outras requisições e WebSockets enquanto a query roda. As
+    threads são limitadas a DB_THREADS (padrão: tamanho do pool de conexões),
+    para não enfileirar mais trabalho do que há conexões.
+    """
+    global _db_limiter
+    if _db_limiter is None:
+        _db_limiter = anyio.CapacityLimiter(settings.db_threads)
+    return await anyio.to_thread.run_sync(partial(fn, *args, **kwargs), limiter=_db_limiter)
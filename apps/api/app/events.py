@@ -1,15 +1,20 @@
-from typing import Set
+from typing import Dict, List, Optional, Set, Tuple
 from fastapi import WebSocket
 import asyncio
+import logging
 import json
 from datetime import datetime, timedelta
 
+logger = logging.getLogger(__name__)
+
 class EventBus:
     def __init__(self):
         self.clients: Set[WebSocket] = set()
         self.lock = asyncio.Lock()
         self.last_broadcast: dict[str, datetime] = {}
         self.debounce_ms = 100  # 100ms debounce
+        # Clientes em resume: eventos ao vivo ficam na fila até o replay acabar
+        self.held: Dict[WebSocket, List[Tuple[Optional[int], str]]] = {}
 
     async def connect(self, ws: WebSocket):
         async with self.lock:
@@ -18,39 +23,51 @@ class EventBus:
     async def disconnect(self, ws: WebSocket):
         async with self.lock:
             self.clients.discard(ws)
+        self.held.pop(ws, None)
 
-    async def broadcast(self, event: str, payload: dict):
+    async def broadcast(self, event: str, payload: dict, seq: Optional[int] = None):
         """
         Broadcast otimizado com debounce para evitar múltiplos broadcasts desnecessários.
         Se o mesmo evento foi enviado há menos de 100ms, ignora.
+
+        Eventos do outbox chegam com seq (único por evento) e não passam pelo
+        debounce: pular um deles abriria um buraco no resume do cliente.
         """
-        # Criar chave única para o evento
-        event_key = f"{event}:{json.dumps(payload, sort_keys=True)}"
         now = datetime.utcnow()
+        if seq is None:
+            # Criar chave única para o evento
+            event_key = f"{event}:{json.dumps(payload, sort_keys=True)}"
 
-        # Verificar se precisa debounce
-        if event_key in self.last_broadcast:
-            time_since_last = (now - self.last_broadcast[event_key]).total_seconds() * 1000
-            if time_since_last < self.debounce_ms:
-                return  # Ignora broadcast duplicado
+            # Verificar se precisa debounce
+            if event_key in self.last_broadcast:
+                time_since_last = (now - self.last_broadcast[event_key]).total_seconds() * 1000
+                if time_since_last < self.debounce_ms:
+                    return  # Ignora broadcast duplicado
 
-        # Atualizar timestamp
-        self.last_broadcast[event_key] = now
+            # Atualizar timestamp
+            self.last_broadcast[event_key] = now
 
-        # Limpar timestamps antigos (> 5 segundos)
-        cutoff = now - timedelta(seconds=5)
-        self.last_broadcast = {k: v for k, v in self.last_broadcast.items() if v > cutoff}
+            # Limpar timestamps antigos (> 5 segundos)
+            cutoff = now - timedelta(seconds=5)
+            self.last_broadcast = {k: v for k, v in self.last_broadcast.items() if v > cutoff}
 
         # Broadcast sem lock de leitura (apenas lock de escrita)
-        data = json.dumps({"event": event, "payload": payload})
+        message = {"event": event, "payload": payload}
+        if seq is not None:
+            message["seq"] = seq
+        data = json.dumps(message)
         clients_copy = self.clients.copy()
 
         dead = []
         for ws in clients_copy:
+            queue = self.held.get(ws)
+            if queue is not None:
+                queue.append((seq, data))
+                continue
             try:
                 await ws.send_text(data)
             except Exception as e:
-                print(f"[EventBus] Erro ao enviar para cliente: {e}")
+                logger.warning(f"Erro ao enviar evento para cliente WebSocket: {e}")
                 dead.append(ws)
 
         # Remover clientes mortos (com lock)
@@ -58,5 +75,26 @@ class EventBus:
             async with self.lock:
                 for ws in dead:
                     self.clients.discard(ws)
+                    self.held.pop(ws, None)
+
+    def hold(self, ws: WebSocket):
+        """Segura os eventos ao vivo do cliente (enquanto o replay é enviado)."""
+        self.held.setdefault(ws, [])
+
+    async def release(self, ws: WebSocket, replayed_upto: Optional[int] = None):
+        """
+        Envia a fila segurada, em ordem, e volta o cliente ao fluxo ao vivo.
+        Eventos com seq <= replayed_upto já foram no replay e são descartados.
+        """
+        while True:
+            queue = self.held.get(ws)
+            if not queue:
+                # Fila vazia: sai do hold no mesmo passo do loop, sem reordenar
+                self.held.pop(ws, None)
+                return
+            seq, data = queue.pop(0)
+            if seq is not None and replayed_upto is not None and seq <= replayed_upto:
+                continue
+            await ws.send_text(data)
 
 eventbus = EventBus()
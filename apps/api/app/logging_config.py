@@ -0,0 +1,240 @@
+"""
+Configuração de logging da API.
+
+- Assíncrono: os loggers só enfileiram o registro (QueueHandler); uma
+  thread (QueueListener) formata e escreve no stdout. A thread da
+  requisição nunca bloqueia em I/O de log.
+- Estruturado: com LOG_FORMAT=json (padrão em produção) cada registro é
+  uma linha JSON (ts, level, logger, msg, request_id, exc...). Campos
+  extras passados em extra={...} entram no objeto.
+- Níveis por módulo: LOG_LEVEL para o root e LOG_LEVELS para exceções,
+  ex. "app.routers.imports=WARNING,sqlalchemy.engine=INFO".
+- Correlação: RequestIdMiddleware usa o X-Request-ID recebido (ou gera
+  um) e o devolve na resposta; todo log da requisição leva o mesmo id.
+- Amostragem: loggers listados em LOG_SAMPLED (padrão: os de linha a
+  linha da importação) só emitem 1 a cada LOG_SAMPLE_EVERY registros
+  abaixo de WARNING.
+- CPFs nas mensagens saem mascarados (***.456.789-**).
+"""
+import atexit
+import itertools
+import json
+import logging
+import queue
+import re
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+
+REQUEST_ID_HEADER = "x-request-id"
+
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+_listener: Optional[QueueListener] = None
+
+# Atributos padrão de LogRecord: o resto veio de extra={...}
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+_CPF_RE = re.compile(r"(?<!\d)(\d{3})\.?(\d{3})\.?(\d{3})-?(\d{2})(?!\d)")
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+def mask_cpf(text: str) -> str:
+    """Mascara CPFs (com ou sem pontuação) mantendo os dígitos do meio."""
+    return _CPF_RE.sub(r"***.\2.\3-**", text)
+
+
+# -----------------------------
+# Filtros e formatadores
+# -----------------------------
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        return True
+
+
+class PiiMaskingFilter(logging.Filter):
+    """
+    Aplica mask_cpf antes de o registro ir para a fila: na mensagem já
+    interpolada, no traceback (exc_info é formatado aqui, como em
+    _PreparedQueueHandler.prepare), no stack e nos extras string.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        message = record.getMessage()
+        masked = mask_cpf(message)
+        if masked != message or record.args:
+            record.msg, record.args = masked, None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        if record.exc_text:
+            # Só o texto segue adiante: o formatter não refaz o traceback cru
+            record.exc_text = mask_cpf(record.exc_text)
+            record.exc_info = None
+        if record.stack_info:
+            record.stack_info = mask_cpf(record.stack_info)
+        for key, value in list(record.__dict__.items()):
+            if key not in _RESERVED and isinstance(value, str):
+                setattr(record, key, mask_cpf(value))
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Deixa passar 1 a cada `every` registros abaixo de WARNING."""
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, every)
+        self._counter = itertools.count()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        return next(self._counter) % self.every == 0
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            data["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc"] = record.exc_text
+        if record.stack_info:
+            data["stack"] = record.stack_info
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not getattr(record, "request_id", None):
+            record.request_id = "-"
+        return super().format(record)
+
+
+class _PreparedQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # O padrão já formata o registro inteiro aqui, na thread da
+        # requisição; só interpolamos a mensagem e o traceback (que não
+        # pode atravessar a fila) e o listener formata o resto.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+# -----------------------------
+# Setup
+# -----------------------------
+
+def _parse_levels(spec: str) -> Dict[str, str]:
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging() -> None:
+    """Configura o root logger (idempotente). Chamado no import de app.main."""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    if settings.log_format == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(TextFormatter())
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    handler = _PreparedQueueHandler(log_queue)
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(PiiMaskingFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(settings.log_level.upper())
+
+    # Logs do uvicorn passam pelo mesmo pipeline
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uv_logger = logging.getLogger(name)
+        uv_logger.handlers.clear()
+        uv_logger.propagate = True
+
+    for name, level in _parse_levels(settings.log_levels).items():
+        logging.getLogger(name).setLevel(level)
+
+    if settings.log_sample_every > 1:
+        for name in filter(None, (n.strip() for n in settings.log_sampled.split(","))):
+            logging.getLogger(name).addFilter(SamplingFilter(settings.log_sample_every))
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Esvazia a fila e para a thread de escrita."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+# -----------------------------
+# Middleware
+# -----------------------------
+
+class RequestIdMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        incoming = Headers(scope=scope).get(REQUEST_ID_HEADER, "")
+        request_id = incoming[:64] if incoming.isprintable() and incoming else uuid.uuid4().hex
+        token = _request_id.set(request_id)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Request-ID"] = request_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_id.reset(token)
@@ -1,26 +1,28 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import json
+from .logging_config import RequestIdMiddleware, setup_logging
+
+# Antes dos routers: logs emitidos no import já saem pelo pipeline
+setup_logging()
+
 from .routers import auth, cases, imports, ws as wsmod, clients, users, comments, admin, sla_audit
 
 from .routers import closing, finance, dashboard, contract_attachments, analytics, rankings, campanhas, campaigns
+from .routers import metrics, profiling
 from .db import Base, engine
 from .routers import simulations
 from .routers.simulations import calculation_router
 from .config import settings
+from .utils.json_response import FastJSONResponse
+from .utils.compression import CompressionMiddleware
+from .services.metrics import MetricsMiddleware, mark_process_dead
+from .services.profiler import ProfilingMiddleware
+from .services.loop_monitor import start_loop_monitor, stop_loop_monitor
+from .services.outbox import start_relay, stop_relay
+from .services import change_versions  # noqa: F401 - registra os listeners de versão
+import anyio
 import os
 
-class UTF8JSONResponse(JSONResponse):
-    def render(self, content) -> bytes:
-        return json.dumps(
-            content,
-            ensure_ascii=False,
-            allow_nan=False,
-            indent=None,
-            separators=(",", ":"),
-        ).encode("utf-8")
-
 # Configurar timezone para Brasil (America/Sao_Paulo)
 os.environ['TZ'] = 'America/Sao_Paulo'
 try:
@@ -32,7 +34,7 @@ except AttributeError:
 
 app = FastAPI(
     title="Lifecalling API",
-    default_response_class=UTF8JSONResponse
+    default_response_class=FastJSONResponse
 )
 
 # Parse FRONTEND_URL para suportar múltiplas URLs separadas por vírgula
@@ -43,22 +45,45 @@ app.add_middleware(
     allow_origins=frontend_urls,
     allow_credentials=True,  # CRÍTICO: necessário para cookies HttpOnly
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
-    allow_headers=["Content-Type", "Authorization", "Accept", "Origin", "X-Requested-With", "X-CSRF-Token", "x-csrf-token"],
-    expose_headers=["Set-Cookie"],  # Expõe cookies para o frontend
+    allow_headers=["Content-Type", "Authorization", "Accept", "Origin", "X-Requested-With", "X-CSRF-Token", "x-csrf-token", "If-None-Match", "X-Profile", "X-Request-ID"],
+    expose_headers=["Set-Cookie", "ETag", "X-Profile-Id", "X-Request-ID"],  # Expõe cookies para o frontend
 )
 
+# X-Profile: 1 (admin) perfila a requisição; desligado, nem é instalado
+if settings.profiling_enabled:
+    app.add_middleware(ProfilingMiddleware)
+
+# Brotli/GZip para as respostas JSON grandes (listas, detalhe do caso)
+if settings.compression_min_size > 0:
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.compression_min_size)
+
+# Latência/status por rota e queries por requisição (GET /metrics).
+# Adicionado por último: é o mais externo e mede também a compressão.
+app.add_middleware(MetricsMiddleware)
+
+# X-Request-ID em todos os logs da requisição (o mais externo de todos)
+app.add_middleware(RequestIdMiddleware)
+
 # Configuração do Scheduler de SLA
 from .scheduler_config import init_scheduler, shutdown_scheduler
 
 @app.on_event("startup")
 async def startup_event():
     """Inicializa o scheduler de SLA no startup da aplicação"""
+    # Handlers síncronos (def) rodam neste pool; limita as threads do worker
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.threadpool_size
+    start_loop_monitor()
+    # Fan-out dos eventos do outbox para os WebSockets deste worker
+    await start_relay()
     init_scheduler()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Desliga o scheduler gracefully no shutdown da aplicação"""
     shutdown_scheduler()
+    await stop_relay()
+    stop_loop_monitor()
+    mark_process_dead()
 
 # Routers
 app.include_router(auth.r)
@@ -80,6 +105,8 @@ app.include_router(imports.r)
 app.include_router(clients.r)
 app.include_router(comments.r)
 app.include_router(sla_audit.r)
+app.include_router(metrics.r)
+app.include_router(profiling.r)
 app.include_router(wsmod.ws_router)
 
 # Health check endpoint
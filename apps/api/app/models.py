@@ -1,5 +1,5 @@
 from sqlalchemy import Numeric
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, UniqueConstraint, JSON, Text, Index
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, Boolean, ForeignKey, UniqueConstraint, JSON, Text, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone, timedelta
@@ -114,6 +114,7 @@ class Case(Base):
     ref_year = Column(Integer, nullable=True)  # Ano de referência
     import_batch_id_new = Column(Integer, ForeignKey("import_batches.id", ondelete="SET NULL"), nullable=True)  # Nova referência
     payroll_status_summary = Column(JSON, nullable=True)  # Resumo dos status da folha
+    payroll_summary_hash = Column(String(32), nullable=True)  # Hash do resumo (importação delta)
 
     # Campos de lock temporal (sistema de 72 horas)
     assigned_at = Column(DateTime, nullable=True)  # Quando foi atribuído
@@ -128,6 +129,28 @@ class Case(Base):
     last_simulation = relationship("Simulation", foreign_keys=[last_simulation_id])
     import_batch = relationship("ImportBatch", foreign_keys=[import_batch_id_new])
 
+    # Índices das consultas quentes (migração d0e1f2a3b4c5)
+    __table_args__ = (
+        Index('ix_cases_status_id', 'status', 'id'),
+        Index('ix_cases_client_id', 'client_id', 'id'),
+        Index('ix_cases_assignment_expires_at', 'assignment_expires_at'),
+        Index(
+            'ix_cases_sla_open', 'assignment_expires_at',
+            postgresql_where=text(
+                "assigned_user_id IS NOT NULL "
+                "AND status IN ('em_atendimento', 'calculista_pendente')"
+            ),
+        ),
+        Index('ix_cases_last_update_at_id', 'last_update_at', 'id'),
+        # POST /cases/claim-next (migração a7b8c9d0e1f2, services/case_dispatch)
+        Index(
+            'ix_cases_claimable',
+            text("((payroll_status_summary ->> 'priority_score')::int) DESC NULLS LAST"),
+            'created_at', 'id',
+            postgresql_where=text("status IN ('novo', 'em_atendimento')"),
+        ).ddl_if(dialect='postgresql'),
+    )
+
 class CaseEvent(Base):
     __tablename__ = "case_events"
     id = Column(Integer, primary_key=True)
@@ -137,10 +160,15 @@ class CaseEvent(Base):
     created_by = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=now_brt)
 
+    __table_args__ = (
+        Index('ix_case_events_case_id_created_at', 'case_id', 'created_at'),
+        Index('ix_case_events_type_created_at', 'type', 'created_at'),
+    )
+
 class Attachment(Base):
     __tablename__ = "attachments"
     id = Column(Integer, primary_key=True)
-    case_id = Column(Integer, ForeignKey("cases.id"))
+    case_id = Column(Integer, ForeignKey("cases.id"), index=True)
     path = Column(String(255), nullable=False)
     filename = Column(String(255), nullable=False)  # Nome original do arquivo
     mime = Column(String(100))
@@ -149,10 +177,57 @@ class Attachment(Base):
     created_at = Column(DateTime, default=now_brt)
 
 
+class AttachmentBlob(Base):
+    """
+    Conteúdo de anexo endereçado por SHA-256 (ver services/attachment_store).
+    ref_count = quantos registros de anexo apontam para o blob.
+    """
+    __tablename__ = "attachment_blobs"
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=now_brt)
+
+
+class ChangeVersion(Base):
+    """
+    Contador de alterações por tabela (ver services/change_versions).
+    Incrementado no commit de toda transação que escreve na tabela.
+    """
+    __tablename__ = "change_versions"
+    table_name = Column(String(64), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=now_brt)
+
+
+class OutboxEvent(Base):
+    """
+    Evento de domínio gravado na mesma transação da alteração (ver
+    services/outbox). seq é atribuído pelo relay, na ordem de publicação.
+    """
+    __tablename__ = "outbox_events"
+    id = Column(BigInteger, primary_key=True)
+    event = Column(String(80), nullable=False)
+    payload = Column(JSON, nullable=False, default=dict)
+    created_at = Column(DateTime, default=now_brt)
+    seq = Column(BigInteger, nullable=True, unique=True)
+    delivered_at = Column(DateTime, nullable=True)
+
+
+class CaseTombstone(Base):
+    """
+    Registro de caso excluído, para o delta de GET /cases/changes
+    (ver services/case_changes). Gravado automaticamente no flush.
+    """
+    __tablename__ = "case_tombstones"
+    case_id = Column(Integer, primary_key=True)
+    deleted_at = Column(DateTime, nullable=False, default=now_brt, index=True)
+
+
 class Simulation(Base):
     __tablename__ = "simulations"
     id = Column(Integer, primary_key=True)
-    case_id = Column(Integer, ForeignKey("cases.id"), nullable=False)
+    case_id = Column(Integer, ForeignKey("cases.id"), nullable=False, index=True)
     status = Column(String(20), default="draft")  # draft|approved|rejected
     created_by = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=now_brt)
@@ -182,6 +257,10 @@ class Simulation(Base):
     manual_input = Column(JSON, default={})
     results = Column(JSON, default={})
 
+    __table_args__ = (
+        Index('ix_simulations_status_updated_at', 'status', 'updated_at'),
+    )
+
 class Contract(Base):
     __tablename__ = "contracts"
     id = Column(Integer, primary_key=True)
@@ -292,7 +371,10 @@ class FinanceExpense(Base):
     updated_at = Column(DateTime, default=datetime.utcnow)
 
     # Sem constraint único - permite múltiplas despesas por mês
-    __table_args__ = tuple()
+    __table_args__ = (
+        Index('ix_finance_expenses_agent_date_type', 'agent_user_id', 'date', 'expense_type'),
+        Index('ix_finance_expenses_date', 'date'),
+    )
 
     # Relacionamentos
     creator = relationship("User", foreign_keys=[created_by])
@@ -316,6 +398,11 @@ class FinanceIncome(Base):
     created_at = Column(DateTime, default=now_brt)
     updated_at = Column(DateTime, default=now_brt, onupdate=now_brt)
 
+    __table_args__ = (
+        Index('ix_finance_incomes_agent_date_type', 'agent_user_id', 'date', 'income_type'),
+        Index('ix_finance_incomes_date', 'date'),
+    )
+
     # Relacionamentos
     creator = relationship("User", foreign_keys=[created_by])
     agent = relationship("User", foreign_keys=[agent_user_id])
@@ -343,6 +430,31 @@ class Campaign(Base):
     # Relacionamentos
     creator = relationship("User", foreign_keys=[created_by])
 
+class CampaignLeaderboardEntry(Base):
+    """
+    Leaderboard materializado de campanhas ativas.
+    Mantido incrementalmente quando contratos de um atendente mudam,
+    para que a leitura do ranking seja O(top-N).
+    """
+    __tablename__ = "campaign_leaderboard"
+    id = Column(Integer, primary_key=True)
+    campaign_id = Column(Integer, ForeignKey("campaigns.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    volume_contratos = Column(Integer, nullable=False, default=0)
+    valor_total_contratos = Column(Numeric(14,2), nullable=False, default=0)
+    valor_consultoria = Column(Numeric(14,2), nullable=False, default=0)
+    ticket_medio = Column(Numeric(14,2), nullable=False, default=0)
+    pontuacao = Column(Numeric(16,2), nullable=False, default=0)
+    posicao = Column(Integer, nullable=True)
+    updated_at = Column(DateTime, default=now_brt, onupdate=now_brt)
+
+    user = relationship("User")
+
+    __table_args__ = (
+        UniqueConstraint('campaign_id', 'user_id', name='uq_campaign_leaderboard_user'),
+        Index('ix_campaign_leaderboard_position', 'campaign_id', 'posicao'),
+    )
+
 # Payroll Import Models
 
 class PayrollClient(Base):
@@ -439,6 +551,25 @@ class Import(Base):
 
 # Novos modelos para importação iNETConsig
 
+class Entity(Base):
+    """
+    Dimensão de entidades (bancos/consignatárias) dos arquivos iNETConsig.
+    Uma linha por par (código, nome bruto), com o nome normalizado usado
+    para agrupar variações nos filtros de clientes.
+    """
+    __tablename__ = "entities"
+
+    id = Column(Integer, primary_key=True)
+    code = Column(String(16), nullable=False, index=True)
+    name = Column(String(255), nullable=False)  # Nome como veio no arquivo
+    normalized_name = Column(String(255), nullable=False, index=True)
+    created_at = Column(DateTime, default=now_brt)
+
+    __table_args__ = (
+        UniqueConstraint('code', 'name', name='uq_entities_code_name'),
+    )
+
+
 class ImportBatch(Base):
     """
     Lote de importação de arquivos iNETConsig.
@@ -459,6 +590,8 @@ class ImportBatch(Base):
     total_lines = Column(Integer, default=0)
     processed_lines = Column(Integer, default=0)
     error_lines = Column(Integer, default=0)
+    # Modo delta: {"mode", "unchanged", "changed", "new", "disappeared"}
+    delta_stats = Column(JSON, nullable=True)
 
     # Relacionamentos
     lines = relationship("PayrollLine", back_populates="batch", cascade="all, delete-orphan")
@@ -471,7 +604,9 @@ class PayrollLine(Base):
     """
     __tablename__ = "payroll_lines"
 
-    id = Column(Integer, primary_key=True)
+    # Particionada por referência (services/payroll_partitions); a PK inclui
+    # a chave de partição
+    id = Column(Integer, primary_key=True, autoincrement=True)
     batch_id = Column(Integer, ForeignKey("import_batches.id", ondelete="CASCADE"), nullable=False)
 
     # Dados básicos do funcionário
@@ -497,19 +632,67 @@ class PayrollLine(Base):
     # Metadados da entidade
     entity_code = Column(String(16), nullable=False)
     entity_name = Column(String(255), nullable=False)
-    ref_month = Column(Integer, nullable=False)
-    ref_year = Column(Integer, nullable=False)
+    entity_id = Column(Integer, ForeignKey("entities.id"), nullable=True, index=True)
+    ref_month = Column(Integer, primary_key=True)
+    ref_year = Column(Integer, primary_key=True)
 
     # Controle
     created_at = Column(DateTime, default=now_brt)
     line_number = Column(Integer, nullable=True)
+    content_hash = Column(String(32), nullable=True)  # services/payroll_hashes.line_hash
 
     # Relacionamentos
     batch = relationship("ImportBatch", back_populates="lines")
+    entity = relationship("Entity")
 
     __table_args__ = (
         UniqueConstraint('cpf', 'matricula', 'financiamento_code', 'ref_month', 'ref_year',
                         name='uix_payroll_unique_ref'),
+        {"postgresql_partition_by": "RANGE (ref_year, ref_month)"},
+    )
+
+class PayrollDiff(Base):
+    """
+    Resumo da comparação de um lote com o lote anterior da mesma entidade
+    (ver services/payroll_diff). Um por lote; recalcular substitui.
+    """
+    __tablename__ = "payroll_diffs"
+
+    id = Column(Integer, primary_key=True)
+    batch_id = Column(Integer, ForeignKey("import_batches.id", ondelete="CASCADE"), nullable=False, unique=True)
+    previous_batch_id = Column(Integer, ForeignKey("import_batches.id", ondelete="SET NULL"), nullable=True)
+    entity_code = Column(String(16), nullable=False)
+    ref_month = Column(Integer, nullable=False)
+    ref_year = Column(Integer, nullable=False)
+    previous_ref_month = Column(Integer, nullable=True)
+    previous_ref_year = Column(Integer, nullable=True)
+    # {"unchanged", "status_changed", "value_changed", "new", "disappeared"}
+    counts = Column(JSON, nullable=False, default=dict)
+    # {"1->2": 15, ...}
+    status_transitions = Column(JSON, nullable=False, default=dict)
+    prioritized_cases = Column(Integer, default=0)
+    created_at = Column(DateTime, default=now_brt)
+
+
+class PayrollDiffItem(Base):
+    """Financiamento que mudou entre as duas referências de um PayrollDiff."""
+    __tablename__ = "payroll_diff_items"
+
+    id = Column(BigInteger, primary_key=True)
+    diff_id = Column(Integer, ForeignKey("payroll_diffs.id", ondelete="CASCADE"), nullable=False)
+    kind = Column(String(16), nullable=False)  # status_changed | value_changed | new | disappeared
+    cpf = Column(String(14), nullable=False)
+    matricula = Column(String(32), nullable=False)
+    financiamento_code = Column(String(16), nullable=False)
+    old_status = Column(String(1), nullable=True)
+    new_status = Column(String(1), nullable=True)
+    old_value = Column(Numeric(12, 2), nullable=True)
+    new_value = Column(Numeric(12, 2), nullable=True)
+    # Status passou de efetivado para problema: caso vai para o topo da fila
+    priority = Column(Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        Index("ix_payroll_diff_items_diff_kind", "diff_id", "kind", "id"),
     )
 
 class Comment(Base):
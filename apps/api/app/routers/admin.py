@@ -12,7 +12,7 @@ r = APIRouter(prefix="/admin", tags=["admin"])
 
 
 @r.post("/clear-all-data")
-async def clear_all_data(
+def clear_all_data(
     db: Session = Depends(get_db),
     user=Depends(require_roles("admin"))
 ):
@@ -8,7 +8,7 @@ from decimal import Decimal
 from time import time
 from typing import Any, Dict, Literal, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from fastapi.responses import StreamingResponse
 from sqlalchemy import case, func
 from sqlalchemy.orm import Session
@@ -28,6 +28,10 @@ from ..models import (
     User,
 )
 from ..rbac import require_roles
+from ..services.metrics import http_summary
+from ..services.conditional_get import (
+    resource_etag, etag_matches, etag_headers, not_modified
+)
 
 ALLOWED_ROLES = ("admin", "supervisor", "financeiro", "calculista")
 
@@ -47,6 +51,9 @@ COMPLETED_STATUSES = {"fechamento_aprovado", "contrato_efetivado"}
 # Status que indicam casos em processamento ativo
 PROCESSING_STATUSES = {"em_atendimento", "calculista_pendente", "calculo_aprovado"}
 DEFAULT_LOOKBACK_DAYS = 30
+KPIS_CACHE_TTL = 60
+# Tabelas lidas pelos KPIs (versões usadas no ETag)
+KPIS_TABLES = ("cases", "contracts", "finance_expenses", "finance_incomes", "simulations")
 
 def ttl_cache(ttl_seconds: int):
     def decorator(func):
@@ -61,6 +68,10 @@ def ttl_cache(ttl_seconds: int):
                 if now - cached_at < ttl_seconds:
                     return cached_value
             value = func(*args, **kwargs)
+            if len(cache) > 256:
+                # Chaves com versão/período mudam com frequência: descarta as vencidas
+                for stale in [k for k, (at, _) in cache.items() if now - at >= ttl_seconds]:
+                    del cache[stale]
             cache[key] = (now, value)
             return value
 
@@ -182,12 +193,13 @@ def _format_money(value: Any) -> str:
     return f"{_to_float(value):.2f}"
 
 @ttl_cache(60)
-def _get_kpis_with_trends_cached(start_key: str, end_key: str, prev_start_key: str, prev_end_key: str) -> Dict[str, Any]:
+def _get_kpis_with_trends_cached(start_key: str, end_key: str, prev_start_key: str, prev_end_key: str, version: str = "") -> Dict[str, Any]:
     """
     Calcula KPIs para período atual e anterior, incluindo trends.
+    version (ETag da requisição) invalida o cache quando os dados mudam.
     """
-    current_kpis = _get_kpis_cached(start_key, end_key)
-    previous_kpis = _get_kpis_cached(prev_start_key, prev_end_key)
+    current_kpis = _get_kpis_cached(start_key, end_key, version)
+    previous_kpis = _get_kpis_cached(prev_start_key, prev_end_key, version)
     
     # Calcular trends para os principais KPIs
     trends = {
@@ -233,8 +245,8 @@ def _get_kpis_with_trends_cached(start_key: str, end_key: str, prev_start_key: s
     return result
 
 
-@ttl_cache(60)
-def _get_kpis_cached(start_key: str, end_key: str) -> Dict[str, Any]:
+@ttl_cache(KPIS_CACHE_TTL)
+def _get_kpis_cached(start_key: str, end_key: str, version: str = "") -> Dict[str, Any]:
     start = datetime.fromisoformat(start_key)
     end = datetime.fromisoformat(end_key)
     with SessionLocal() as db:
@@ -1040,11 +1052,6 @@ def _get_health_cached() -> Dict[str, Any]:
             "processed_last_24h": int(scheduler_processed),
             "last_run_at": _serialize_dt(scheduler_last_run),
         },
-        "errors": {
-            "http_4xx": 0,
-            "http_5xx": 0,
-            "note": "TODO: instrument HTTP error aggregation/log ingestion.",
-        },
     }
 
 def _build_cases_export(
@@ -1233,18 +1240,29 @@ def _build_funnel_export(
 
 @r.get("/kpis")
 def get_kpis(
+    request: Request,
+    response: Response,
     from_: Optional[str] = Query(None, alias="from"),
     to_: Optional[str] = Query(None, alias="to"),
     include_trends: bool = Query(True, description="Include trend calculations"),
     user=Depends(require_roles(*ALLOWED_ROLES)),
 ):
+    # GET condicional: além das versões das tabelas, o ETag vira a cada
+    # janela do cache (casos em atraso dependem do relógio)
+    with SessionLocal() as db:
+        etag = resource_etag(db, request, KPIS_TABLES, int(time() // KPIS_CACHE_TTL))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers.update(etag_headers(etag))
+
     if include_trends:
         start, end, prev_start, prev_end = _resolve_period_with_previous(from_, to_)
         data = _get_kpis_with_trends_cached(
             _cache_key(start), 
             _cache_key(end),
             _cache_key(prev_start),
-            _cache_key(prev_end)
+            _cache_key(prev_end),
+            etag
         )
         data["range"] = {
             "from": _serialize_dt(start), 
@@ -1254,7 +1272,7 @@ def get_kpis(
         }
     else:
         start, end = _resolve_period(from_, to_)
-        data = _get_kpis_cached(_cache_key(start), _cache_key(end))
+        data = _get_kpis_cached(_cache_key(start), _cache_key(end), etag)
         data["range"] = {"from": _serialize_dt(start), "to": _serialize_dt(end)}
     
     return data
@@ -1300,7 +1318,12 @@ def get_by_module(
 
 @r.get("/health")
 def get_health(user=Depends(require_roles(*ALLOWED_ROLES))):
-    return _get_health_cached()
+    data = dict(_get_health_cached())
+    # Métricas HTTP ao vivo (fora do cache): ver services/metrics
+    http = http_summary()
+    data["errors"] = {"http_4xx": http["http_4xx"], "http_5xx": http["http_5xx"]}
+    data["http"] = http
+    return data
 
 
 @r.get("/kpis/individual")
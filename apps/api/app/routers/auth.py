@@ -1,3 +1,5 @@
+import logging
+
 from fastapi import APIRouter, Response, HTTPException, Depends, Cookie, Request
 from pydantic import BaseModel
 from ..security import (
@@ -11,6 +13,7 @@ from ..db import SessionLocal
 from ..models import User
 
 r = APIRouter(prefix="/auth", tags=["auth"])
+logger = logging.getLogger(__name__)
 
 class LoginIn(BaseModel):
     email: str
@@ -18,41 +21,24 @@ class LoginIn(BaseModel):
 
 @r.post("/login")
 def login(payload: LoginIn, resp: Response):
-    print(f"\n{'='*60}")
-    print(f"[LOGIN] Tentativa de login: {payload.email}")
-    print(f"{'='*60}")
-
     with SessionLocal() as db:
         user = db.query(User).filter(User.email==payload.email).first()
 
         if not user:
-            print(f"[LOGIN] ❌ Usuario nao encontrado: {payload.email}")
+            logger.info("Login recusado: usuário não encontrado")
             raise HTTPException(401, "invalid credentials")
 
-        print(f"[LOGIN] ✓ Usuario encontrado: {user.name} (ID: {user.id})")
-        print(f"[LOGIN]   - Email: {user.email}")
-        print(f"[LOGIN]   - Role: {user.role}")
-        print(f"[LOGIN]   - Active: {user.active}")
-
-        print(f"[LOGIN] Verificando senha...")
         if not verify_password(payload.password, user.password_hash):
-            print(f"[LOGIN] ❌ Senha incorreta")
+            logger.info(f"Login recusado: senha incorreta (usuário {user.id})")
             raise HTTPException(401, "invalid credentials")
 
-        print(f"[LOGIN] ✓ Senha correta")
-
         # Verificar se usuário está ativo
         if not user.active:
-            print(f"[LOGIN] ❌ Usuario inativo")
+            logger.info(f"Login recusado: usuário {user.id} inativo")
             raise HTTPException(403, "user is inactive")
 
-        print(f"[LOGIN] ✓ Usuario ativo")
-        print(f"[LOGIN] Setando cookies...")
-
         set_auth_cookies(resp, user.id, user.role)
-
-        print(f"[LOGIN] ✅ Login bem-sucedido!")
-        print(f"{'='*60}\n")
+        logger.info(f"Login: usuário {user.id} ({user.role})")
 
         return {"id": user.id, "name": user.name, "role": user.role, "email": user.email}
 
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 from datetime import datetime, date
 from sqlalchemy.orm import Session
@@ -6,6 +6,8 @@ from typing import List, Optional
 from ..db import get_db
 from ..models import Campaign
 from ..rbac import require_roles
+from ..services.ranking_engine import compute_campaign_ranking
+from ..services import campaign_leaderboard
 
 r = APIRouter(prefix="/campaigns", tags=["campaigns"])
 
@@ -152,6 +154,39 @@ def get_campaign(
         "updated_at": campaign.updated_at.isoformat() if campaign.updated_at else None
     }
 
+@r.get("/{campaign_id}/ranking")
+def get_campaign_ranking(
+    campaign_id: int,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    db: Session = Depends(get_db),
+    user=Depends(require_roles("admin", "supervisor", "financeiro", "calculista", "atendente"))
+):
+    """Ranking da campanha pelo seu critério de pontuação (uma query agrupada)"""
+    campaign = db.get(Campaign, campaign_id)
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campanha não encontrada")
+
+    rows = compute_campaign_ranking(db, campaign, limit=limit)
+
+    return {
+        "campaign_id": campaign.id,
+        "criterio_pontuacao": campaign.criterio_pontuacao,
+        "items": [
+            {
+                "posicao": row.posicao,
+                "user_id": row.user_id,
+                "name": row.name,
+                "pontuacao": round(row.pontuacao, 2),
+                "volume_contratos": row.contratos,
+                "valor_total_contratos": round(row.valor_total_contratos, 2),
+                "valor_consultoria": round(row.consultoria_contratos, 2),
+                "ticket_medio": round(row.ticket_medio, 2)
+            }
+            for row in rows
+        ],
+        "total_participantes": rows[0].total if rows else 0
+    }
+
 @r.post("")
 def create_campaign(
     payload: CampaignCreate,
@@ -176,6 +211,8 @@ def create_campaign(
     )
 
     db.add(campaign)
+    db.flush()
+    campaign_leaderboard.rebuild_leaderboard(db, campaign)
     db.commit()
     db.refresh(campaign)
 
@@ -217,6 +254,10 @@ def update_campaign(
         campaign.meta_consultoria = payload.meta_consultoria
 
     campaign.updated_at = datetime.utcnow()
+
+    # Período ou status mudaram: reconstruir leaderboard materializado
+    campaign_leaderboard.rebuild_leaderboard(db, campaign)
+
     db.commit()
     db.refresh(campaign)
 
@@ -2,10 +2,11 @@ from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from datetime import datetime, date
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import case as sa_case
 from ..db import get_db
 from ..rbac import require_roles
-from ..models import Campaign, User, Contract, Case
+from ..models import Campaign
+from ..services.ranking_engine import compute_campaign_ranking, CRITERIOS_PONTUACAO
+from ..services import campaign_leaderboard
 from typing import List, Optional
 import json
 
@@ -102,7 +103,7 @@ def criar_campanha(
     if data.status not in ["ativa", "proxima", "encerrada"]:
         raise HTTPException(400, "Status deve ser: ativa, proxima ou encerrada")
 
-    criterios_validos = ["volume_contratos", "percentual_renda_liquida", "consultoria_liquida", "ticket_medio"]
+    criterios_validos = CRITERIOS_PONTUACAO
     if data.criterio_pontuacao not in criterios_validos:
         raise HTTPException(400, f"Critério de pontuação deve ser um de: {', '.join(criterios_validos)}")
 
@@ -124,6 +125,8 @@ def criar_campanha(
     )
 
     db.add(nova_campanha)
+    db.flush()
+    campaign_leaderboard.rebuild_leaderboard(db, nova_campanha)
     db.commit()
     db.refresh(nova_campanha)
 
@@ -202,7 +205,7 @@ def atualizar_campanha(
             raise HTTPException(400, "Status deve ser: ativa, proxima ou encerrada")
         campanha.status = data.status
     if data.criterio_pontuacao is not None:
-        criterios_validos = ["volume_contratos", "percentual_renda_liquida", "consultoria_liquida", "ticket_medio"]
+        criterios_validos = CRITERIOS_PONTUACAO
         if data.criterio_pontuacao not in criterios_validos:
             raise HTTPException(400, f"Critério de pontuação deve ser um de: {', '.join(criterios_validos)}")
         campanha.criterio_pontuacao = data.criterio_pontuacao
@@ -227,6 +230,10 @@ def atualizar_campanha(
         campanha.data_fim = data_fim
 
     campanha.updated_at = datetime.utcnow()
+
+    # Critério, período ou status mudaram: reconstruir leaderboard materializado
+    campaign_leaderboard.rebuild_leaderboard(db, campanha)
+
     db.commit()
     db.refresh(campanha)
 
@@ -286,65 +293,30 @@ def obter_ranking_campanha(
             "total_participantes": 0
         }
 
-    usuarios = db.query(User).filter(User.active == True).all()
-
-    # coalesce: se Contract.agent_user_id for nulo, usa Case.assigned_user_id
-    agente_expr = sa_case(
-        (Contract.agent_user_id.isnot(None), Contract.agent_user_id),
-        else_=Case.assigned_user_id
-    )
+    # Ranking set-based: uma query agrupada para todos os usuários ativos
+    linhas = compute_campaign_ranking(db, campanha)
 
     ranking = []
-    for usuario in usuarios:
-        contratos = db.query(Contract)\
-            .join(Case, Case.id == Contract.case_id, isouter=True)\
-            .filter(
-                agente_expr == usuario.id,
-                Contract.signed_at >= campanha.data_inicio,
-                Contract.signed_at <= campanha.data_fim,
-                Contract.status == "ativo"
-            ).all()
-
-        volume_contratos = len(contratos)
-        valor_total_contratos = sum(float(c.total_amount or 0) for c in contratos)
-        valor_consultoria = sum(float(c.consultoria_valor_liquido or 0) for c in contratos)
-        renda_liquida = valor_total_contratos * 0.8
-        percentual_renda_liquida = (renda_liquida / valor_total_contratos * 100) if valor_total_contratos > 0 else 0
-        ticket_medio = (valor_total_contratos / volume_contratos) if volume_contratos > 0 else 0
-
-        if campanha.criterio_pontuacao == "volume_contratos":
-            pontuacao = volume_contratos
-        elif campanha.criterio_pontuacao == "percentual_renda_liquida":
-            pontuacao = percentual_renda_liquida
-        elif campanha.criterio_pontuacao == "consultoria_liquida":
-            pontuacao = valor_consultoria
-        elif campanha.criterio_pontuacao == "ticket_medio":
-            pontuacao = ticket_medio
-        else:
-            pontuacao = 0
-
-        atende_meta_contratos = volume_contratos >= (campanha.meta_contratos or 0)
-        atende_meta_consultoria = valor_consultoria >= float(campanha.meta_consultoria or 0)
+    for linha in linhas:
+        atende_meta_contratos = linha.contratos >= (campanha.meta_contratos or 0)
+        atende_meta_consultoria = linha.consultoria_contratos >= float(campanha.meta_consultoria or 0)
 
         # Importante: NÃO bloquear por metas — exibir o progresso desde o início
         ranking.append({
-            "usuario": {"id": usuario.id, "nome": usuario.name, "email": usuario.email},
+            "usuario": {"id": linha.user_id, "nome": linha.name, "email": linha.email},
             "metricas": {
-                "volume_contratos": volume_contratos,
-                "valor_total_contratos": round(valor_total_contratos, 2),
-                "renda_liquida": round(renda_liquida, 2),
-                "percentual_renda_liquida": round(percentual_renda_liquida, 2),
-                "valor_consultoria": round(valor_consultoria, 2),
-                "ticket_medio": round(ticket_medio, 2)
+                "volume_contratos": linha.contratos,
+                "valor_total_contratos": round(linha.valor_total_contratos, 2),
+                "renda_liquida": round(linha.renda_liquida, 2),
+                "percentual_renda_liquida": round(linha.percentual_renda_liquida, 2),
+                "valor_consultoria": round(linha.consultoria_contratos, 2),
+                "ticket_medio": round(linha.ticket_medio, 2)
             },
-            "pontuacao": round(pontuacao, 2),
-            "atende_metas": {"contratos": atende_meta_contratos, "consultoria": atende_meta_consultoria}
+            "pontuacao": round(linha.pontuacao, 2),
+            "atende_metas": {"contratos": atende_meta_contratos, "consultoria": atende_meta_consultoria},
+            "posicao": linha.posicao
         })
 
-    ranking.sort(key=lambda x: x["pontuacao"], reverse=True)
-    for i, participante in enumerate(ranking):
-        participante["posicao"] = i + 1
-
     return {
         "campanha": {
             "id": campanha.id,
@@ -375,54 +347,18 @@ def obter_campanhas_ativas_com_rankings(
 
     resultado = []
     for campanha in campanhas_ativas:
-        usuarios = db.query(User).filter(User.active == True).all()
-
-        agente_expr = sa_case(
-            (Contract.agent_user_id.isnot(None), Contract.agent_user_id),
-            else_=Case.assigned_user_id
-        )
-
-        ranking_resumido = []
-        for usuario in usuarios:
-            contratos = db.query(Contract)\
-                .join(Case, Case.id == Contract.case_id, isouter=True)\
-                .filter(
-                    agente_expr == usuario.id,
-                    Contract.signed_at >= campanha.data_inicio,
-                    Contract.signed_at <= campanha.data_fim,
-                    Contract.status == "ativo"
-                ).all()
-
-            volume_contratos = len(contratos)
-            valor_total_contratos = sum(float(c.total_amount or 0) for c in contratos)
-            valor_consultoria = sum(float(c.consultoria_valor_liquido or 0) for c in contratos)
-            renda_liquida = valor_total_contratos * 0.8
-            percentual_renda_liquida = (renda_liquida / valor_total_contratos * 100) if valor_total_contratos > 0 else 0
-            ticket_medio = (valor_total_contratos / volume_contratos) if volume_contratos > 0 else 0
-
-            if campanha.criterio_pontuacao == "volume_contratos":
-                pontuacao = volume_contratos
-            elif campanha.criterio_pontuacao == "percentual_renda_liquida":
-                pontuacao = percentual_renda_liquida
-            elif campanha.criterio_pontuacao == "consultoria_liquida":
-                pontuacao = valor_consultoria
-            elif campanha.criterio_pontuacao == "ticket_medio":
-                pontuacao = ticket_medio
-            else:
-                pontuacao = 0
-
-            if pontuacao > 0:
-                ranking_resumido.append({
-                    "usuario": {"id": usuario.id, "nome": usuario.name},
-                    "pontuacao": round(pontuacao, 2),
-                    "volume_contratos": volume_contratos,
-                    "valor_consultoria": round(valor_consultoria, 2)
-                })
-
-        ranking_resumido.sort(key=lambda x: x["pontuacao"], reverse=True)
-        top_5 = ranking_resumido[:5]
-        for i, participante in enumerate(top_5):
-            participante["posicao"] = i + 1
+        # Leitura O(top-N) do leaderboard materializado (mantido incrementalmente)
+        entradas, total_participantes = campaign_leaderboard.read_top(db, campanha.id, limit=5)
+        top_5 = [
+            {
+                "usuario": {"id": entrada.user_id, "nome": entrada.user.name if entrada.user else None},
+                "pontuacao": float(entrada.pontuacao or 0),
+                "volume_contratos": entrada.volume_contratos,
+                "valor_consultoria": float(entrada.valor_consultoria or 0),
+                "posicao": entrada.posicao
+            }
+            for entrada in entradas
+        ]
 
         resultado.append({
             "id": campanha.id,
@@ -435,7 +371,7 @@ def obter_campanhas_ativas_com_rankings(
             "data_fim": campanha.data_fim.isoformat(),
             "dias_restantes": max(0, (campanha.data_fim - hoje).days),
             "top_5_ranking": top_5,
-            "total_participantes": len(ranking_resumido),
+            "total_participantes": total_participantes,
             "premiacoes": json.loads(campanha.premiacoes) if campanha.premiacoes else []
         })
 
@@ -4,9 +4,9 @@ from fastapi import (  # pyright: ignore[reportMissingImports]
 from pydantic import BaseModel  # pyright: ignore[reportMissingImports]
 from typing import List
 from datetime import datetime, timedelta
+import logging
 from ..utils.business_days import add_business_hours
 import os
-import shutil
 from decimal import Decimal
 
 from sqlalchemy import or_, func  # pyright: ignore[reportMissingImports]
@@ -19,11 +19,28 @@ from ..models import (
     ClientPhone, Comment, now_brt
 )
 from ..services.case_scheduler import CaseScheduler
+from ..services.case_dispatch import (
+    assign_case_to_user, claim_next_case, is_assignment_active
+)
+from ..services.attachment_store import get_attachment_store, FileTooLargeError
+from ..services.attachment_download import (
+    file_download_response, zip_download_response, ZipEntry
+)
 from ..constants import enrich_banks_with_names
-from ..config import settings
-from ..events import eventbus  # uso consistente do eventbus
+from ..services import case_changes, outbox
+from ..utils.json_response import FastJSONResponse
+from ..utils.fieldsets import FieldSet
+from ..services.query_monitor import query_budget
+from ..services.payroll_counts import count_financiamentos_by_cpf
+from ..services.conditional_get import (
+    resource_etag, etag_matches, etag_headers, not_modified
+)
 
 r = APIRouter(prefix="/cases", tags=["cases"])
+logger = logging.getLogger(__name__)
+
+# Tabelas lidas pela listagem (versões usadas no ETag)
+LIST_CASES_TABLES = ("cases", "clients", "users", "payroll_lines")
 
 
 def _normalize_json(value):
@@ -38,6 +55,74 @@ def _normalize_json(value):
     return value
 
 
+def _visibility_filter(user, mine: bool, now: datetime):
+    """
+    Regra de visibilidade da listagem (list_cases e changes); None = sem
+    restrição.
+    """
+    if mine:
+        # Apenas casos atribuídos a mim
+        return Case.assigned_user_id == user.id
+    if user.role == "atendente":
+        # Atendente sempre vê apenas casos disponíveis
+        # (não atribuídos ou expirados) na visualização global,
+        # independente de filtros
+        return or_(
+            Case.assigned_user_id.is_(None),
+            Case.assignment_expires_at < now,
+        )
+    return None
+
+
+def _financiamentos(db: Session, rows: list, count_financiamentos: bool) -> dict | None:
+    """Contagem de financiamentos dos clientes da página (uma query) ou None."""
+    if not count_financiamentos:
+        return None
+    return count_financiamentos_by_cpf(db, (c.client.cpf for c in rows if c.client))
+
+
+def _list_item(c: Case, financiamentos: dict | None) -> dict:
+    """
+    Item de caso da listagem (list_cases e changes). financiamentos vem de
+    _financiamentos, com client e assigned_user já carregados (joinedload).
+    """
+    entidade_value = getattr(c, "entidade", None)
+    item = {
+        "id": c.id,
+        "status": c.status or "novo",
+        "client_id": c.client_id,
+        "assigned_user_id": c.assigned_user_id,
+        "assigned_to": (
+            c.assigned_user.name if c.assigned_user else None
+        ),
+        "last_update_at": c.last_update_at,
+        "created_at": c.created_at,
+        "banco": entidade_value,  # Usar entidade como banco
+        "entidade": entidade_value,
+        "referencia_competencia": getattr(
+            c, "referencia_competencia", None
+        ),
+        "importado_em": getattr(c, "importado_em", None),
+    }
+
+    if c.client:
+        item["client"] = {
+            "name": c.client.name or "Nome não informado",
+            "cpf": c.client.cpf or "",
+            "matricula": c.client.matricula or "",
+            "num_financiamentos": (financiamentos or {}).get(c.client.cpf, 0),
+        }
+    else:
+        item["client"] = {
+            "name": "Cliente não encontrado",
+            "cpf": "",
+            "matricula": "",
+            "num_financiamentos": 0,
+        }
+
+    return item
+
+
 class PageOut(BaseModel):
     items: list[dict]
     total: int
@@ -79,7 +164,7 @@ class CaseCreate(BaseModel):
 
 
 @r.post("")
-async def create_case(
+def create_case(
     data: CaseCreate,
     user=Depends(require_roles("admin", "supervisor", "atendente")),
     db: Session = Depends(get_db)
@@ -90,16 +175,13 @@ async def create_case(
     Disponível para: admin, supervisor, atendente
     """
     try:
-        print(f"[DEBUG] Criando caso para client_id: {data.client_id}")
+        logger.debug(f"Criando caso para client_id: {data.client_id}")
 
         # Verificar se o cliente existe
         client = db.query(Client).filter(Client.id == data.client_id).first()
         if not client:
-            print(f"[DEBUG] Cliente {data.client_id} não encontrado")
             raise HTTPException(status_code=404, detail="Cliente não encontrado")
 
-        print(f"[DEBUG] Cliente encontrado: {client.name}")
-
         # Verificar se já existe um caso ativo para este cliente
         existing_case = db.query(Case).filter(
             Case.client_id == data.client_id,
@@ -110,14 +192,11 @@ async def create_case(
         ).first()
 
         if existing_case:
-            print(f"[DEBUG] Caso ativo encontrado: ID {existing_case.id}, Status: {existing_case.status}")
             raise HTTPException(
                 status_code=400,
                 detail=f"Cliente já possui um caso ativo (ID: {existing_case.id}, Status: {existing_case.status})"
             )
 
-        print(f"[DEBUG] Nenhum caso ativo encontrado, criando novo caso...")
-
         # Criar novo caso
         new_case = Case(
             client_id=data.client_id,
@@ -132,8 +211,6 @@ async def create_case(
         db.add(new_case)
         db.flush()
 
-        print(f"[DEBUG] Caso criado com ID: {new_case.id}")
-
         # Criar evento de criação
         event = CaseEvent(
             case_id=new_case.id,
@@ -148,18 +225,16 @@ async def create_case(
         )
         db.add(event)
 
-        db.commit()
-        db.refresh(new_case)
-
-        print(f"[DEBUG] Caso {new_case.id} commitado com sucesso")
-
-        # Broadcast evento via eventbus
-        await eventbus.broadcast("case.created", {
+        outbox.publish(db, "case.created", {
             "case_id": new_case.id,
             "client_id": data.client_id,
             "status": "novo",
             "created_by": user.id
         })
+        db.commit()
+        db.refresh(new_case)
+
+        logger.info(f"Caso #{new_case.id} criado manualmente por usuário {user.id}")
 
         return {
             "id": new_case.id,
@@ -173,9 +248,7 @@ async def create_case(
         # Re-raise HTTP exceptions (404, 400)
         raise
     except Exception as e:
-        print(f"[ERROR] Erro ao criar caso: {type(e).__name__}: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Erro ao criar caso: {type(e).__name__}: {e}")
         db.rollback()
         raise HTTPException(
             status_code=500,
@@ -183,9 +256,90 @@ async def create_case(
         )
 
 
+# Antes de /{case_id}: senão "changes" seria lido como id
+@r.get("/changes", dependencies=[Depends(query_budget(10))])
+def list_case_changes(
+    since: str | None = Query(None, description="Token da resposta anterior"),
+    limit: int = Query(200, ge=1, le=500),
+    mine: str | bool = Query(False),
+    fields: str | None = Query(
+        None, description="Campos de cada item (ex.: id,status,client.name)"
+    ),
+    user=Depends(
+        require_roles(
+            "admin", "supervisor", "financeiro", "calculista",
+            "atendente", "fechamento"
+        )
+    ),
+):
+    """
+    Delta da listagem de casos desde o token (ver services/case_changes).
+
+    - items: casos alterados e visíveis para o usuário (mesmo formato e
+      mesmas regras de visibilidade de GET /cases);
+    - removed: casos excluídos ou que deixaram de ser visíveis;
+    - next: token para a próxima chamada; has_more indica outra página.
+
+    Sem since, devolve só o token atual: chamar antes de carregar a
+    listagem completa. Token antigo demais responde 410 (recarregar tudo).
+    """
+    mine_bool = mine if isinstance(mine, bool) else str(mine).lower() in ('true', '1', 'yes')
+    now = case_changes.cursor_now()
+    if not since:
+        return {"items": [], "removed": [], "next": case_changes.caught_up_token(now=now), "has_more": False}
+    try:
+        cursor = case_changes.decode_token(since)
+    except ValueError:
+        raise HTTPException(400, "Token inválido")
+    if cursor[0] < now - case_changes.TOMBSTONE_RETENTION:
+        raise HTTPException(410, "Token expirado; recarregue a listagem")
+
+    with SessionLocal() as db:
+        page, has_more = case_changes.changed_ids(db, cursor, limit)
+        changed = {case_id for case_id, _ in page}
+        if user.role == "atendente" and not mine_bool:
+            # Atribuições expiradas voltam à visão global sem escrita no banco
+            changed.update(case_changes.expired_since(db, cursor[0], now))
+
+        rows = []
+        if changed:
+            from sqlalchemy.orm import joinedload
+            qry = (
+                db.query(Case)
+                .options(joinedload(Case.client), joinedload(Case.assigned_user))
+                .filter(Case.id.in_(changed))
+            )
+            visibility = _visibility_filter(user, mine_bool, now)
+            if visibility is not None:
+                qry = qry.filter(visibility)
+            rows = qry.order_by(Case.last_update_at, Case.id).all()
+
+        fieldset = FieldSet.parse(fields)
+        financiamentos = _financiamentos(db, rows, fieldset.wants("client.num_financiamentos"))
+        items = [_list_item(c, financiamentos) for c in rows]
+        visible = {c.id for c in rows}
+        removed = sorted(
+            (changed - visible) | set(case_changes.deleted_since(db, cursor[0]))
+        )
+
+    if has_more:
+        next_token = case_changes.encode_token(page[-1][1], page[-1][0])
+    else:
+        next_token = case_changes.caught_up_token(cursor, now)
+    return FastJSONResponse({
+        "items": fieldset.apply(items),
+        "removed": removed,
+        "next": next_token,
+        "has_more": has_more,
+    })
+
+
 @r.get("/{case_id}")
 def get_case(
     case_id: int,
+    fields: str | None = Query(
+        None, description="Campos a retornar (ex.: id,status,client.name)"
+    ),
     user=Depends(
         require_roles(
             "admin", "supervisor", "atendente", "calculista",
@@ -207,18 +361,21 @@ def get_case(
         if not c:
             raise HTTPException(404, "Case not found")
 
+        # Partes caras só são buscadas se pedidas em ?fields=
+        fieldset = FieldSet.parse(fields)
+
         # Simulação mais recente
         simulation = (
             db.query(Simulation)
             .filter(Simulation.case_id == case_id)
             .order_by(Simulation.id.desc())
             .first()
-        )
+        ) if fieldset.wants("simulation") else None
 
         # Anexos
         attachments = (
             db.query(Attachment).filter(Attachment.case_id == case_id).all()
-        )
+        ) if fieldset.wants("attachments") else []
 
         # Buscar todas as matrículas do CPF
         from app.models import PayrollClient
@@ -227,7 +384,7 @@ def get_case(
             .filter(PayrollClient.cpf == c.client.cpf)
             .distinct()
             .all()
-        )
+        ) if fieldset.wants("client.matriculas") else []
 
         financiamentos = (
             db.query(PayrollLine)
@@ -240,17 +397,13 @@ def get_case(
                 PayrollLine.entity_code.asc(),
             )
             .all()
-        )
+        ) if fieldset.wants("client.financiamentos") else []
 
         result = {
             "id": c.id,
             "status": c.status,
-            "created_at": (
-                c.created_at.isoformat() if c.created_at else None
-            ),
-            "last_update_at": (
-                c.last_update_at.isoformat() if c.last_update_at else None
-            ),
+            "created_at": c.created_at,
+            "last_update_at": c.last_update_at,
             "assigned_to": c.assigned_user.name if c.assigned_user else None,
             "assigned_user": {
                 "id": c.assigned_user.id,
@@ -260,9 +413,7 @@ def get_case(
             "referencia_competencia": getattr(
                 c, "referencia_competencia", None
             ),
-            "importado_em": c.importado_em.isoformat()
-            if getattr(c, "importado_em", None)
-            else None,
+            "importado_em": getattr(c, "importado_em", None),
             "client": {
                 "id": c.client.id,
                 "name": c.client.name,
@@ -339,24 +490,18 @@ def get_case(
                 ),
                 "results": _normalize_json(simulation.results),
                 "manual_input": _normalize_json(simulation.manual_input),
-                "created_at": simulation.created_at.isoformat()
-                if simulation.created_at
-                else None,
-                "updated_at": simulation.updated_at.isoformat()
-                if simulation.updated_at
-                else None,
+                "created_at": simulation.created_at,
+                "updated_at": simulation.updated_at,
             }
 
         result["attachments"] = [
             {
                 "id": a.id,
-                "filename": os.path.basename(a.path),
+                "filename": a.filename or os.path.basename(a.path),
                 "size": a.size,
                 "mime": a.mime,
                 "mime_type": a.mime,
-                "uploaded_at": (
-                    a.created_at.isoformat() if a.created_at else None
-                ),
+                "uploaded_at": a.created_at,
                 "uploaded_by": a.uploaded_by,
             }
             for a in attachments
@@ -364,32 +509,20 @@ def get_case(
 
         contract = (
             db.query(Contract).filter(Contract.case_id == case_id).first()
-        )
+        ) if fieldset.wants("contract") else None
         if contract:
             contract_attachments = db.query(ContractAttachment).filter(
                 ContractAttachment.contract_id == contract.id
-            ).all()
+            ).all() if fieldset.wants("contract.attachments") else []
             result["contract"] = {
                 "id": contract.id,
                 "status": contract.status,
                 "total_amount": float(contract.total_amount or 0),
                 "installments": contract.installments,
                 "paid_installments": contract.paid_installments,
-                "disbursed_at": (
-                    contract.disbursed_at.isoformat()
-                    if contract.disbursed_at
-                    else None
-                ),
-                "created_at": (
-                    contract.created_at.isoformat()
-                    if contract.created_at
-                    else None
-                ),
-                "updated_at": (
-                    contract.updated_at.isoformat()
-                    if contract.updated_at
-                    else None
-                ),
+                "disbursed_at": contract.disbursed_at,
+                "created_at": contract.created_at,
+                "updated_at": contract.updated_at,
                 "attachments": [
                     {
                         "id": att.id,
@@ -397,17 +530,43 @@ def get_case(
                         "size": att.size,
                         "mime": att.mime,
                         "mime_type": att.mime,
-                        "created_at": (
-                            att.created_at.isoformat()
-                            if att.created_at
-                            else None
-                        ),
+                        "created_at": att.created_at,
                     }
                     for att in contract_attachments
                 ],
             }
 
-        return result
+        # Datetimes/Decimals crus: serializados direto pelo orjson
+        return FastJSONResponse(fieldset.apply(result))
+
+
+@r.post("/claim-next")
+def claim_next(
+    request: Request,
+    entidade: str | None = None,  # Só casos com folha desta entidade/banco
+    user=Depends(
+        require_roles(
+            "admin", "supervisor", "financeiro", "calculista",
+            "atendente", "fechamento"
+        )
+    ),
+):
+    """
+    Atribui ao usuário o próximo caso disponível (maior prioridade da
+    folha, depois o mais antigo). Atendentes concorrentes nunca recebem o
+    mesmo caso (FOR UPDATE SKIP LOCKED).
+    """
+    verify_csrf(request)
+    with SessionLocal() as db:
+        c = claim_next_case(db, user, entity=entidade)
+        if c is None:
+            raise HTTPException(404, "Nenhum caso disponível")
+        db.commit()
+        return {
+            "ok": True,
+            "case_id": c.id,
+            "expires_at": c.assignment_expires_at.isoformat()
+        }
 
 
 @r.post("/{case_id}/assign")
@@ -424,50 +583,17 @@ def assign_case(
     # Verificar CSRF token
     verify_csrf(request)
     with SessionLocal() as db:
-        c = db.get(Case, case_id)
+        # Trava a linha: dois pedidos simultâneos não atribuem o mesmo caso
+        c = db.get(Case, case_id, with_for_update=True)
         if not c:
             raise HTTPException(404)
 
-        if (
-            c.assigned_user_id
-            and c.assignment_expires_at
-            and c.assignment_expires_at > now_brt()
-        ):
+        if is_assignment_active(c):
             raise HTTPException(
                 400, "Caso já está atribuído a outro usuário"
             )
 
-        now = now_brt()
-        c.assigned_user_id = user.id
-        c.status = "em_atendimento"
-        c.last_update_at = now
-        c.assigned_at = now
-        c.assignment_expires_at = add_business_hours(now, 48)  # 48h úteis (exclui sáb/dom)
-
-        if not c.assignment_history:
-            c.assignment_history = []
-
-        c.assignment_history.append(
-            {
-                "user_id": user.id,
-                "user_name": user.name,
-                "assigned_at": now.isoformat(),
-                "expires_at": c.assignment_expires_at.isoformat(),
-                "action": "assigned",
-            }
-        )
-
-        db.add(
-            CaseEvent(
-                case_id=c.id,
-                type="case.assigned",
-                payload={
-                    "to": user.id,
-                    "expires_at": c.assignment_expires_at.isoformat()
-                },
-                created_by=user.id,
-            )
-        )
+        assign_case_to_user(db, c, user)
         db.commit()
         return {
             "ok": True,
@@ -637,85 +763,36 @@ def upload_attachment(
         )
     ),
 ):
-    print(f"[UPLOAD] Iniciando upload para caso {case_id} "
-          f"por usuário {user.id}", flush=True)
-
     # Verificar CSRF token
     try:
         verify_csrf(request)
-        msg = "[UPLOAD] CSRF verificado com sucesso"
-        print(msg, flush=True)
     except Exception as e:
-        print(f"[UPLOAD] Erro CSRF: {e}", flush=True)
+        logger.warning(f"Upload para caso {case_id} recusado (CSRF): {e}")
         raise
 
     from ..models import Attachment
 
-    try:
-        with SessionLocal() as db:
-            c = db.get(Case, case_id)
-            if not c:
-                msg = f"[UPLOAD] Caso {case_id} não encontrado"
-                print(msg, flush=True)
-                raise HTTPException(404, "Case not found")
-            msg = f"[UPLOAD] Caso {case_id} encontrado"
-            print(msg, flush=True)
-    except Exception as e:
-        msg = f"[UPLOAD] Erro ao buscar caso: {e}"
-        print(msg, flush=True)
-        raise
-
-    try:
-        print(f"[UPLOAD] settings.upload_dir = {settings.upload_dir}",
-              flush=True)
-        os.makedirs(settings.upload_dir, exist_ok=True)
-        print("[UPLOAD] Diretório de upload criado/verificado", flush=True)
-    except Exception as e:
-        msg = f"Erro ao criar diretório de upload: {str(e)}"
-        print(f"[ERROR] {msg}", flush=True)
-        raise HTTPException(500, msg)
-
-    import uuid
+    with SessionLocal() as db:
+        if not db.get(Case, case_id):
+            raise HTTPException(404, "Case not found")
 
-    # Normalizar nome do arquivo
     original_filename = file.filename or "arquivo_sem_nome"
-    # Remover caracteres especiais/perigosos do nome
-    safe_filename = "".join(
-        c for c in original_filename
-        if c.isalnum() or c in (' ', '.', '-', '_')
-    ).rstrip()
-    if not safe_filename:
-        safe_filename = "arquivo_sem_nome"
-
-    file_extension = (
-        os.path.splitext(original_filename)[1]
-        if original_filename else ""
-    )
-
-    unique_filename = (
-        f"case_{case_id}_{uuid.uuid4().hex[:8]}{file_extension}"
-    )
-    dest = os.path.join(settings.upload_dir, unique_filename)
-
-    try:
-        with open(dest, "wb") as f:
-            shutil.copyfileobj(file.file, f)
-        print(f"[UPLOAD] Arquivo salvo em {dest}", flush=True)
-    except Exception as e:
-        msg = f"Erro ao salvar arquivo: {str(e)}"
-        print(f"[ERROR] {msg}", flush=True)
-        raise HTTPException(500, msg)
+    store = get_attachment_store()
 
     try:
         with SessionLocal() as db:
-            file_size = os.path.getsize(dest)
+            # Gravação em blocos, endereçada por SHA-256 (deduplica)
+            try:
+                stored = store.save(db, file.file)
+            except FileTooLargeError as e:
+                raise HTTPException(413, str(e))
 
             a = Attachment(
                 case_id=case_id,
-                path=dest,
+                path=stored.path,
                 filename=original_filename[:255],
                 mime=file.content_type or "application/octet-stream",
-                size=file_size,
+                size=stored.size,
                 uploaded_by=user.id,
             )
             db.add(a)
@@ -725,15 +802,17 @@ def upload_attachment(
                     type="attachment.added",
                     payload={
                         "filename": original_filename,
-                        "size": file_size
+                        "size": stored.size
                     },
                     created_by=user.id,
                 )
             )
             db.commit()
             db.refresh(a)
-            msg = f"[UPLOAD] Attachment #{a.id} salvo no banco"
-            print(msg, flush=True)
+            logger.info(
+                f"Attachment #{a.id} salvo no caso {case_id} por usuário {user.id}",
+                extra={"size": stored.size, "deduplicated": stored.deduplicated},
+            )
 
             return {
                 "id": a.id,
@@ -743,19 +822,10 @@ def upload_attachment(
                     a.created_at.isoformat() if a.created_at else None
                 ),
             }
+    except HTTPException:
+        raise
     except Exception as e:
-        # Se falhar ao salvar no banco, tentar remover arquivo
-        try:
-            if os.path.exists(dest):
-                os.remove(dest)
-                msg = f"[UPLOAD] Arquivo removido após erro: {dest}"
-                print(msg, flush=True)
-        except Exception as cleanup_error:
-            msg = f"[ERROR] Erro ao remover arquivo: {cleanup_error}"
-            print(msg, flush=True)
-
-        msg = f"[ERROR] Erro ao salvar attachment: {e}"
-        print(msg, flush=True)
+        logger.exception(f"Erro ao salvar attachment do caso {case_id}: {e}")
         error_msg = f"Erro ao salvar attachment: {str(e)}"
         raise HTTPException(500, error_msg)
 
@@ -791,14 +861,10 @@ def delete_attachment(
                     403,
                     "Você só pode remover anexos que você mesmo enviou"
                 )
-        filename = os.path.basename(attachment.path)
-        file_path = attachment.path
+        filename = attachment.filename or os.path.basename(attachment.path)
 
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        except Exception as e:
-            print(f"Erro ao remover arquivo físico {file_path}: {e}")
+        # Arquivo físico só é apagado após o commit, se não houver outras referências
+        get_attachment_store().release(db, attachment.path)
         db.delete(attachment)
 
         db.add(
@@ -825,38 +891,72 @@ def delete_attachment(
 def download_attachment(
     case_id: int,
     attachment_id: int,
+    request: Request,
     user=Depends(get_current_user)
 ):
-    """Download de um anexo específico."""
-    from fastapi.responses import FileResponse  # pyright: ignore
+    """Download de um anexo específico (ETag, Range, X-Accel-Redirect)."""
     from ..models import Attachment
 
+    # Uma única consulta; a sessão é fechada antes de transmitir o arquivo
     with SessionLocal() as db:
-        case = db.get(Case, case_id)
-        if not case:
-            raise HTTPException(404, "Caso não encontrado")
-        attachment = db.query(Attachment).filter(
+        attachment = db.query(
+            Attachment.path, Attachment.filename, Attachment.mime
+        ).filter(
             Attachment.id == attachment_id,
             Attachment.case_id == case_id
         ).first()
 
-        if not attachment:
-            raise HTTPException(404, "Anexo não encontrado")
-        if not os.path.exists(attachment.path):
-            raise HTTPException(
-                404, "Arquivo não encontrado no servidor"
-            )
+    if not attachment:
+        raise HTTPException(404, "Anexo não encontrado")
 
-        filename = (
-            attachment.filename or os.path.basename(attachment.path)
-        )
-        return FileResponse(
-            path=attachment.path,
-            media_type=attachment.mime or "application/octet-stream",
-            headers={
-                "Content-Disposition": f'attachment; filename="{filename}"'
-            }
+    return file_download_response(
+        request,
+        attachment.path,
+        attachment.filename or os.path.basename(attachment.path),
+        attachment.mime,
+    )
+
+
+@r.get("/{case_id}/attachments.zip")
+def download_case_attachments_zip(
+    case_id: int,
+    user=Depends(get_current_user)
+):
+    """
+    Baixa todos os documentos do caso (anexos do caso e dos contratos)
+    em um único ZIP, gerado em streaming.
+    """
+    from ..models import Attachment, ContractAttachment
+
+    with SessionLocal() as db:
+        if not db.query(Case.id).filter(Case.id == case_id).first():
+            raise HTTPException(404, "Caso não encontrado")
+
+        case_files = db.query(
+            Attachment.path, Attachment.filename, Attachment.mime
+        ).filter(Attachment.case_id == case_id).order_by(Attachment.id).all()
+
+        contract_files = db.query(
+            ContractAttachment.path, ContractAttachment.filename,
+            ContractAttachment.mime, ContractAttachment.contract_id
+        ).filter(
+            ContractAttachment.case_id == case_id
+        ).order_by(ContractAttachment.contract_id, ContractAttachment.id).all()
+
+    entries = [
+        ZipEntry(path=a.path, filename=a.filename, mime=a.mime, folder="caso")
+        for a in case_files
+    ] + [
+        ZipEntry(
+            path=a.path, filename=a.filename, mime=a.mime,
+            folder=f"contrato_{a.contract_id}"
         )
+        for a in contract_files
+    ]
+    if not entries:
+        raise HTTPException(404, "Nenhum anexo encontrado para este caso")
+
+    return zip_download_response(entries, f"caso_{case_id}_documentos.zip")
 
 
 @r.get("/status-counts")
@@ -912,8 +1012,10 @@ def get_status_counts(
     return {"counts": counts}
 
 
-@r.get("", response_model=PageOut)
+# Orçamento fixo: a página inteira sai em poucas queries (sem N+1)
+@r.get("", response_model=PageOut, dependencies=[Depends(query_budget(10))])
 def list_cases(
+    request: Request,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=200),
     q: str | None = None,
@@ -925,6 +1027,9 @@ def list_cases(
     order: str = Query("id_desc"),
     created_after: str | None = None,
     created_before: str | None = None,
+    fields: str | None = Query(
+        None, description="Campos de cada item (ex.: id,status,client.name)"
+    ),
     user=Depends(
         require_roles(
             "admin", "supervisor", "financeiro", "calculista",
@@ -937,6 +1042,19 @@ def list_cases(
             # Normalizar mine para boolean
             mine_bool = mine if isinstance(mine, bool) else str(mine).lower() in ('true', '1', 'yes')
 
+            # GET condicional: 304 antes de montar a query, se nada mudou
+            etag_scope = [user.id, user.role]
+            if user.role == "atendente" and not mine_bool:
+                # A visão global do atendente muda quando atribuições
+                # expiram, sem nenhuma escrita no banco
+                etag_scope.append(db.query(func.count(Case.id)).filter(
+                    Case.assigned_user_id.isnot(None),
+                    Case.assignment_expires_at < now_brt()
+                ).scalar())
+            etag = resource_etag(db, request, LIST_CASES_TABLES, *etag_scope)
+            if etag_matches(request, etag):
+                return not_modified(etag)
+
             # Usar entidade ou entity (alias legado)
             entity_filter = entidade or entity
 
@@ -947,27 +1065,13 @@ def list_cases(
             payroll_joined = False
 
             # Apply RBAC/assignment visibility rules FIRST
-            if user.role == "atendente":
-                if mine_bool:
-                    # Apenas casos atribuídos a mim
-                    qry = qry.filter(Case.assigned_user_id == user.id)
-                else:
-                    # Atendente sempre vê apenas casos disponíveis
-                    # (não atribuídos ou expirados) na visualização global,
-                    # independente de filtros
-                    now = now_brt()
-                    qry = qry.filter(
-                        or_(
-                            Case.assigned_user_id.is_(None),
-                            Case.assignment_expires_at < now,
-                        )
-                    )
+            visibility = _visibility_filter(user, mine_bool, now_brt())
+            if visibility is not None:
+                qry = qry.filter(visibility)
             else:
                 # Admin/Supervisor/outros: aplicar filtro de assignment
                 # se especificado
-                if mine_bool:
-                    qry = qry.filter(Case.assigned_user_id == user.id)
-                elif assigned is not None:
+                if assigned is not None:
                     if assigned == "0":
                         # Mostrar apenas casos não atribuídos
                         qry = qry.filter(Case.assigned_user_id.is_(None))
@@ -1092,76 +1196,21 @@ def list_cases(
 
                 rows = qry.offset((page - 1) * page_size).limit(page_size).all()
 
+            fieldset = FieldSet.parse(fields)
+            # Contagem agrupada da página: só quando o card ou a ordenação usam
+            financiamentos = _financiamentos(
+                db, rows,
+                order == "financiamentos_desc"
+                or fieldset.wants("client.num_financiamentos")
+            )
+
             items = []
 
             for c in rows:
                 try:
-                    entidade_value = getattr(c, "entidade", None)
-                    item = {
-                        "id": c.id,
-                        "status": c.status or "novo",
-                        "client_id": c.client_id,
-                        "assigned_user_id": c.assigned_user_id,
-                        "assigned_to": (
-                            c.assigned_user.name if c.assigned_user else None
-                        ),
-                        "last_update_at": c.last_update_at.isoformat()
-                        if c.last_update_at
-                        else None,
-                        "created_at": (
-                            c.created_at.isoformat() if c.created_at else None
-                        ),
-                        "banco": entidade_value,  # Usar entidade como banco
-                        "entidade": entidade_value,
-                        "referencia_competencia": getattr(
-                            c, "referencia_competencia", None
-                        ),
-                        "importado_em": c.importado_em.isoformat()
-                        if getattr(c, "importado_em", None)
-                        else None,
-                    }
-
-                    if hasattr(c, "client") and c.client:
-                        from app.models import PayrollLine
-                        num_financiamentos = db.query(PayrollLine).filter(
-                            PayrollLine.cpf == c.client.cpf
-                        ).count()
-
-                        item["client"] = {
-                            "name": c.client.name or "Nome não informado",
-                            "cpf": c.client.cpf or "",
-                            "matricula": c.client.matricula or "",
-                            "num_financiamentos": num_financiamentos,
-                        }
-                    else:
-                        client = (
-                            db.get(Client, c.client_id)
-                            if c.client_id
-                            else None
-                        )
-                        if client:
-                            from app.models import PayrollLine
-                            num_financiamentos = db.query(PayrollLine).filter(
-                                PayrollLine.cpf == client.cpf
-                            ).count()
-
-                            item["client"] = {
-                                "name": client.name or "Nome não informado",
-                                "cpf": client.cpf or "",
-                                "matricula": client.matricula or "",
-                                "num_financiamentos": num_financiamentos,
-                            }
-                        else:
-                            item["client"] = {
-                                "name": "Cliente não encontrado",
-                                "cpf": "",
-                                "matricula": "",
-                                "num_financiamentos": 0,
-                            }
-
-                    items.append(item)
+                    items.append(_list_item(c, financiamentos))
                 except Exception as e:
-                    print(f"Erro ao processar caso {c.id}: {e}")
+                    logger.exception(f"Erro ao processar caso {c.id}: {e}")
                     items.append(
                         {
                             "id": c.id,
@@ -1188,15 +1237,16 @@ def list_cases(
                     reverse=True
                 )
 
-            return {
-                "items": items,
+            # Datetimes crus: serializados direto pelo orjson
+            return FastJSONResponse({
+                "items": fieldset.apply(items),
                 "total": total,
                 "page": page,
                 "page_size": page_size
-            }
+            }, headers=etag_headers(etag))
 
         except Exception as e:
-            print(f"Erro na query de casos: {e}")
+            logger.exception(f"Erro na query de casos: {e}")
             return {
                 "items": [],
                 "total": 0,
@@ -1391,7 +1441,7 @@ def update_case_expiry(
 
 
 @r.post("/{case_id}/to-calculista")
-async def to_calculista(
+def to_calculista(
     case_id: int,
     user=Depends(require_roles("admin", "supervisor", "atendente"))
 ):
@@ -1417,18 +1467,18 @@ async def to_calculista(
                 created_by=user.id,
             )
         )
+        outbox.publish(
+            db, "case.updated", {"case_id": case_id, "status": "calculista_pendente"}
+        )
         db.commit()
         db.refresh(sim)
         sim_id = sim.id
 
-    await eventbus.broadcast(
-        "case.updated", {"case_id": case_id, "status": "calculista_pendente"}
-    )
     return {"simulation_id": sim_id}
 
 
 @r.post("/{case_id}/mark-no-contact")
-async def mark_no_contact(
+def mark_no_contact(
     case_id: int,
     user=Depends(require_roles("admin", "supervisor", "atendente"))
 ):
@@ -1460,16 +1510,16 @@ async def mark_no_contact(
         c.client.observacoes = new_obs
 
         c.last_update_at = now_brt()
+        outbox.publish(
+            db, "case.updated", {"case_id": case_id, "status": "sem_contato"}
+        )
         db.commit()
 
-    await eventbus.broadcast(
-        "case.updated", {"case_id": case_id, "status": "sem_contato"}
-    )
     return {"success": True, "case_id": case_id, "status": "sem_contato"}
 
 
 @r.post("/{case_id}/return-to-pipeline")
-async def return_to_pipeline(
+def return_to_pipeline(
     case_id: int,
     user=Depends(require_roles("admin", "supervisor", "atendente"))
 ):
@@ -1555,18 +1605,17 @@ async def return_to_pipeline(
             )
         )
 
+        outbox.publish(
+            db, "case.updated",
+            {
+                "case_id": case_id,
+                "status": "novo",
+                "assigned_user_id": None,
+                "returned_by": user.name
+            }
+        )
         db.commit()
 
-    await eventbus.broadcast(
-        "case.updated",
-        {
-            "case_id": case_id,
-            "status": "novo",
-            "assigned_user_id": None,
-            "returned_by": user.name
-        }
-    )
-
     return {
         "success": True,
         "case_id": case_id,
@@ -1576,7 +1625,7 @@ async def return_to_pipeline(
 
 
 @r.post("/{case_id}/to-fechamento")
-async def to_fechamento(
+def to_fechamento(
     case_id: int,
     user=Depends(require_roles("admin", "supervisor", "atendente"))
 ):
@@ -1606,12 +1655,12 @@ async def to_fechamento(
                 created_by=user.id,
             )
         )
+        outbox.publish(
+            db, "case.updated",
+            {"case_id": case_id, "status": "fechamento_pendente"}
+        )
         db.commit()
 
-    await eventbus.broadcast(
-        "case.updated",
-        {"case_id": case_id, "status": "fechamento_pendente"}
-    )
     return {
         "success": True,
         "case_id": case_id,
@@ -1671,7 +1720,7 @@ def get_cases_near_expiry(
 
 
 @r.post("/bulk-delete")
-async def bulk_delete_cases(
+def bulk_delete_cases(
     payload: BulkDeleteRequest,
     request: Request,
     user=Depends(require_roles("admin"))
@@ -1719,11 +1768,7 @@ async def bulk_delete_cases(
                     .all()
                 )
                 for att in attachments:
-                    try:
-                        if os.path.exists(att.path):
-                            os.remove(att.path)
-                    except Exception as e:
-                        print(f"Erro ao excluir arquivo {att.path}: {e}")
+                    get_attachment_store().release(db, att.path)
                     db.delete(att)
 
                 # eventos
@@ -1744,19 +1789,18 @@ async def bulk_delete_cases(
                     "id": case_id,
                     "reason": str(e)
                 })
-                print(f"Erro ao excluir caso {case_id}: {e}")
+                logger.error(f"Erro ao excluir caso {case_id}: {e}")
 
+        outbox.publish(
+            db, "cases.bulk_deleted",
+            {
+                "deleted_ids": results["deleted"],
+                "count": len(results["deleted"]),
+                "deleted_by": user.id
+            },
+        )
         db.commit()
 
-    await eventbus.broadcast(
-        "cases.bulk_deleted",
-        {
-            "deleted_ids": results["deleted"],
-            "count": len(results["deleted"]),
-            "deleted_by": user.id
-        },
-    )
-
     return {
         **results,
         "success_count": len(results["deleted"]),
@@ -1826,7 +1870,7 @@ class CreateEventRequest(BaseModel):
 
 
 @r.post("/{case_id}/events")
-async def create_case_event(
+def create_case_event(
     case_id: int,
     data: CreateEventRequest,
     user=Depends(get_current_user)
@@ -1847,14 +1891,13 @@ async def create_case_event(
 
         case.last_update_at = now_brt()
 
-        db.commit()
-        db.refresh(event)
-
-        await eventbus.broadcast("case.updated", {
+        outbox.publish(db, "case.updated", {
             "case_id": case_id,
             "event_type": data.type,
             "user_id": user.id
         })
+        db.commit()
+        db.refresh(event)
 
         return {
             "id": event.id,
@@ -1872,7 +1915,7 @@ async def create_case_event(
 
 
 @r.post("/{case_id}/return-to-calculista")
-async def return_to_calculista(
+def return_to_calculista(
     case_id: int,
     user=Depends(require_roles("admin", "supervisor", "financeiro"))
 ):
@@ -1890,17 +1933,12 @@ async def return_to_calculista(
         contract = db.query(Contract).filter(Contract.case_id == case_id).first()
         contract_was_updated = False
         if contract:
-            print(f"[INFO] Contrato #{contract.id} encontrado com status '{contract.status}'")
             # Alterar status apenas se não estiver já encerrado
             if contract.status != "encerrado":
                 contract.status = "encerrado"
                 contract.updated_at = now_brt()
                 contract_was_updated = True
-                print(f"[INFO] Contrato #{contract.id} alterado para 'encerrado'")
-            else:
-                print(f"[INFO] Contrato #{contract.id} já estava encerrado")
-        else:
-            print(f"[INFO] Nenhum contrato encontrado para o caso #{case_id}")
+                logger.info(f"Contrato #{contract.id} alterado para 'encerrado'")
 
         db.add(
             CaseEvent(
@@ -1918,12 +1956,12 @@ async def return_to_calculista(
                 created_by=user.id,
             )
         )
+        outbox.publish(
+            db, "case.updated", {"case_id": case_id, "status": "devolvido_financeiro"}
+        )
         db.commit()
-        print(f"[INFO] Caso #{case_id} devolvido ao calculista com sucesso")
+        logger.info(f"Caso #{case_id} devolvido ao calculista")
 
-    await eventbus.broadcast(
-        "case.updated", {"case_id": case_id, "status": "devolvido_financeiro"}
-    )
     return {
         "success": True,
         "message": "Caso retornado ao calculista com sucesso"
@@ -1936,7 +1974,7 @@ class StatusChangeRequest(BaseModel):
 
 
 @r.patch("/{case_id}/status")
-async def change_case_status(
+def change_case_status(
     case_id: int,
     data: StatusChangeRequest,
     user=Depends(require_roles("admin"))
@@ -2093,19 +2131,17 @@ async def change_case_status(
             }
         )
 
+        outbox.publish(
+            db, "case.updated",
+            {
+                "case_id": case_id,
+                "status": data.new_status,
+                "previous_status": previous_status,
+                "changed_by": user.name
+            }
+        )
         db.commit()
 
-    # Broadcast via WebSocket
-    await eventbus.broadcast(
-        "case.updated",
-        {
-            "case_id": case_id,
-            "status": data.new_status,
-            "previous_status": previous_status,
-            "changed_by": user.name
-        }
-    )
-
     return {
         "success": True,
         "message": (
@@ -2118,7 +2154,7 @@ async def change_case_status(
 
 
 @r.post("/{case_id}/cancel")
-async def cancel_case(
+def cancel_case(
     case_id: int,
     user=Depends(require_roles("admin", "supervisor", "financeiro"))
 ):
@@ -2136,17 +2172,12 @@ async def cancel_case(
         contract = db.query(Contract).filter(Contract.case_id == case_id).first()
         contract_was_updated = False
         if contract:
-            print(f"[INFO] Contrato #{contract.id} encontrado com status '{contract.status}'")
             # Alterar status apenas se não estiver já encerrado
             if contract.status != "encerrado":
                 contract.status = "encerrado"
                 contract.updated_at = now_brt()
                 contract_was_updated = True
-                print(f"[INFO] Contrato #{contract.id} alterado para 'encerrado'")
-            else:
-                print(f"[INFO] Contrato #{contract.id} já estava encerrado")
-        else:
-            print(f"[INFO] Nenhum contrato encontrado para o caso #{case_id}")
+                logger.info(f"Contrato #{contract.id} alterado para 'encerrado'")
 
         db.add(CaseEvent(
             case_id=case.id,
@@ -2161,13 +2192,12 @@ async def cancel_case(
             },
             created_by=user.id
         ))
+        outbox.publish(
+            db, "case.updated",
+            {"case_id": case_id, "status": "caso_cancelado"}
+        )
         db.commit()
-        print(f"[INFO] Caso #{case_id} cancelado com sucesso")
-
-    await eventbus.broadcast(
-        "case.updated",
-        {"case_id": case_id, "status": "caso_cancelado"}
-    )
+        logger.info(f"Caso #{case_id} cancelado")
 
     return {
         "success": True,
@@ -2275,12 +2305,8 @@ def delete_case_cascade(
             contract_id=contract.id
         ).all()
         for att in contract_attachments:
-            # Tentar deletar arquivo físico
-            try:
-                if os.path.exists(att.path):
-                    os.remove(att.path)
-            except Exception as e:
-                print(f"Erro ao remover arquivo {att.path}: {e}")
+            # Liberar arquivo físico (apagado após o commit, se sem referências)
+            get_attachment_store().release(db, att.path)
             db.delete(att)
 
         # PASSO 6: Deletar pagamentos
@@ -2306,12 +2332,8 @@ def delete_case_cascade(
     # PASSO 10: Deletar anexos do caso
     attachments = db.query(Attachment).filter_by(case_id=case_id).all()
     for att in attachments:
-        # Tentar deletar arquivo físico
-        try:
-            if os.path.exists(att.path):
-                os.remove(att.path)
-        except Exception as e:
-            print(f"Erro ao remover arquivo {att.path}: {e}")
+        # Liberar arquivo físico (apagado após o commit, se sem referências)
+        get_attachment_store().release(db, att.path)
         db.delete(att)
         stats["attachments"] += 1
 
@@ -3,11 +3,15 @@ from sqlalchemy.orm import Session  # pyright: ignore[reportMissingImports]
 from sqlalchemy import func, or_, distinct  # pyright: ignore[reportMissingImports]
 from typing import List
 import csv
+import logging
 import io
 from ..db import SessionLocal
 from ..rbac import require_roles
+from ..services.query_monitor import query_budget
+from ..services.payroll_counts import count_financiamentos_by_cpf
 from ..models import (
-    Client, Case, PayrollClient, PayrollContract, PayrollLine, ClientPhone, ClientAddress
+    Client, Case, PayrollClient, PayrollContract, PayrollLine, ClientPhone, ClientAddress,
+    Entity
 )
 from ..schemas import (
     ClientAddressCreate, ClientAddressUpdate, ClientAddressResponse,
@@ -18,44 +22,8 @@ from datetime import datetime
 import re
 
 
-
-
-def normalize_bank_name(name: str) -> str:
-    """Normaliza nome de banco para agrupar variações."""
-    if not name:
-        return name
-    normalized = name.upper().strip()
-
-    # BANCO DO BRASIL: tratar PRIMEIRO antes de remover BRASIL
-    if 'BANCO DO BRASIL' in normalized:
-        return 'BANCO DO BRASIL'
-
-    # Remover sufixos societários
-    normalized = normalized.replace(' S.A.', '').replace(' S/A', '').replace(' S.A', '')
-
-    # Padronizar bancos específicos
-    if 'SANTANDER' in normalized and not normalized.startswith('BANCO'):
-        normalized = 'BANCO SANTANDER'
-    elif 'SANATANDER' in normalized:
-        normalized = 'BANCO SANTANDER'
-    elif 'DAYCOVAL' in normalized and not normalized.startswith('BANCO'):
-        normalized = 'BANCO DAYCOVAL'
-    elif 'DIGIO' in normalized and 'PREVIDENCIA' not in normalized:
-        normalized = 'BANCO DIGIO'
-    elif 'FUTURO PREVID' in normalized:
-        return 'FUTURO PREVIDÊNCIA'
-    elif 'EQUATORIAL PREVID' in normalized:
-        return 'EQUATORIAL PREVIDÊNCIA'
-
-    # Remover CARTÃO e BRASIL do final (após tratar casos especiais)
-    normalized = normalized.replace(' CARTAO', '').replace(' CARTÃO', '')
-    if normalized.endswith(' BRASIL'):
-        normalized = normalized[:-7]
-
-    # Remover espaços duplos
-    return ' '.join(normalized.split())
-
 r = APIRouter(prefix="/clients", tags=["clients"])
+logger = logging.getLogger(__name__)
 
 
 class PageOut(BaseModel):
@@ -73,7 +41,24 @@ def get_db():
         db.close()
 
 
-@r.get("", response_model=PageOut)
+def _filter_by_banco(db: Session, clients_query, banco: str):
+    """
+    Filtra clientes com financiamentos de um banco (nome normalizado).
+    Usa a dimensão entities em vez de normalizar entity_name em Python.
+    """
+    return clients_query.filter(
+        db.query(PayrollLine.id)
+        .join(Entity, Entity.id == PayrollLine.entity_id)
+        .filter(
+            PayrollLine.cpf == Client.cpf,
+            Entity.normalized_name == banco
+        )
+        .exists()
+    )
+
+
+# Orçamento fixo: contagem de financiamentos agrupada (sem N+1)
+@r.get("", response_model=PageOut, dependencies=[Depends(query_budget(8))])
 def list_clients(
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=200),
@@ -124,17 +109,7 @@ def list_clients(
 
     # Filtrar por banco (entidade importada de PayrollLine)
     if banco:
-        # Buscar todas as entidades que correspondem ao nome normalizado
-        all_entities = db.query(PayrollLine.entity_name).filter(
-            PayrollLine.entity_name.isnot(None)
-        ).distinct().all()
-        matching_entities = [e[0] for e in all_entities if normalize_bank_name(e[0]) == banco]
-        
-        if matching_entities:
-            clients_query = clients_query.join(
-                PayrollLine,
-                PayrollLine.cpf == Client.cpf
-            ).filter(PayrollLine.entity_name.in_(matching_entities))
+        clients_query = _filter_by_banco(db, clients_query, banco)
 
     # Filtrar por status do caso
     if status:
@@ -164,12 +139,13 @@ def list_clients(
         (page-1)*page_size
     ).limit(page_size)
 
+    rows = clients_query.all()
+    # Financiamentos da página inteira em uma query agrupada por CPF
+    financiamentos = count_financiamentos_by_cpf(db, (row.cpf for row in rows))
+
     results = []
-    for client_data in clients_query.all():
-        # Contar financiamentos diretamente de PayrollLine pelo CPF
-        contratos_count = db.query(func.count(PayrollLine.id)).filter(
-            PayrollLine.cpf == client_data.cpf
-        ).scalar() or 0
+    for client_data in rows:
+        contratos_count = financiamentos.get(client_data.cpf, 0)
 
         results.append({
             "id": client_data.id,
@@ -203,39 +179,27 @@ def get_available_filters(
     Bancos = Entidades importadas dos arquivos TXT (de PayrollLine)
     Órgãos = Órgãos pagadores dos clientes
     """
-    # Listar entidades únicas das linhas de folha importadas (entity_name)
-    entidades = db.query(PayrollLine.entity_name).filter(
-        PayrollLine.entity_name.isnot(None)
-    ).distinct().all()
-    entidades_list = sorted([e[0] for e in entidades if e[0]])
-
-    # Listar status de casos únicos do banco de dados
-    db_status_list = db.query(Case.status).distinct().all()
-    db_status_set = set(s[0] for s in db_status_list if s[0])
-
-    # Agrupar entidades por nome normalizado
-    bancos_agrupados = {}
-    for entidade in entidades_list:
-        normalized = normalize_bank_name(entidade)
-        if normalized not in bancos_agrupados:
-            bancos_agrupados[normalized] = []
-        bancos_agrupados[normalized].append(entidade)
-
-    # Contar clientes por banco agrupado
-    bancos_with_count = []
-    for normalized_name, entidades_grupo in sorted(bancos_agrupados.items()):
-        # Contar clientes únicos com financiamentos deste grupo de entidades
-        count = (
-            db.query(func.count(distinct(Client.id)))
-            .join(PayrollLine, PayrollLine.cpf == Client.cpf)
-            .filter(PayrollLine.entity_name.in_(entidades_grupo))
-            .scalar()
-        )
-        bancos_with_count.append({
-            "value": normalized_name,
-            "label": normalized_name,
-            "count": count
-        })
+    # Clientes por banco (nome normalizado) em um único GROUP BY
+    bancos_rows = (
+        db.query(Entity.normalized_name, func.count(distinct(Client.id)))
+        .join(PayrollLine, PayrollLine.entity_id == Entity.id)
+        .outerjoin(Client, Client.cpf == PayrollLine.cpf)
+        .group_by(Entity.normalized_name)
+        .order_by(Entity.normalized_name)
+        .all()
+    )
+    bancos_with_count = [
+        {"value": name, "label": name, "count": count}
+        for name, count in bancos_rows
+    ]
+
+    # Clientes por status de caso em um único GROUP BY
+    status_counts = dict(
+        db.query(Case.status, func.count(distinct(Case.client_id)))
+        .filter(Case.status.isnot(None))
+        .group_by(Case.status)
+        .all()
+    )
 
     # Status padrão que devem SEMPRE aparecer nos filtros
     # Ordem: Novo → Simulação → Calculista → Fechamento → Financeiro → Final
@@ -257,19 +221,16 @@ def get_available_filters(
     }
 
     # Mesclar status do banco com status padrão
-    all_statuses = set(default_statuses.keys()) | db_status_set
+    all_statuses = set(default_statuses.keys()) | set(status_counts.keys())
 
-    status_with_count = []
-    for status in sorted(all_statuses):
-        count = db.query(func.count(distinct(Case.client_id))).filter(
-            Case.status == status
-        ).scalar() or 0
-
-        status_with_count.append({
+    status_with_count = [
+        {
             "value": status,
             "label": default_statuses.get(status, status.replace("_", " ").title()),
-            "count": count
-        })
+            "count": status_counts.get(status, 0)
+        }
+        for status in sorted(all_statuses)
+    ]
 
 
     # Contar clientes sem contratos (sem financiamentos)
@@ -440,17 +401,7 @@ def export_clients_csv(
     
     # Filtrar por banco (entidade importada de PayrollLine)
     if banco:
-        # Buscar todas as entidades que correspondem ao nome normalizado
-        all_entities = db.query(PayrollLine.entity_name).filter(
-            PayrollLine.entity_name.isnot(None)
-        ).distinct().all()
-        matching_entities = [e[0] for e in all_entities if normalize_bank_name(e[0]) == banco]
-        
-        if matching_entities:
-            clients_query = clients_query.join(
-                PayrollLine,
-                PayrollLine.cpf == Client.cpf
-            ).filter(PayrollLine.entity_name.in_(matching_entities))
+        clients_query = _filter_by_banco(db, clients_query, banco)
     
     if status:
         clients_query = clients_query.filter(Case.status == status)
@@ -833,7 +784,7 @@ def get_client_cases(
                 ),
             })
         except Exception as e:
-            print(f"Error processing case {case.id}: {e}")
+            logger.exception(f"Erro ao processar caso {case.id}: {e}")
             continue
 
     return {
@@ -901,6 +852,76 @@ def get_client_financiamentos(
     ]
 
 
+def _parse_reference(value: str | None, param: str):
+    """'YYYY-MM' -> (ano, mês)."""
+    if not value:
+        return None
+    try:
+        ref = datetime.strptime(value, "%Y-%m")
+    except ValueError:
+        raise HTTPException(400, f"{param} deve estar no formato YYYY-MM")
+    return ref.year, ref.month
+
+
+@r.get("/{client_id}/financiamentos/historico")
+def get_client_financiamentos_historico(
+    client_id: int,
+    from_: str | None = Query(None, alias="from", description="Referência inicial (YYYY-MM)"),
+    to: str | None = Query(None, description="Referência final (YYYY-MM)"),
+    entity_code: str | None = Query(None),
+    limit: int = Query(1000, ge=1, le=5000),
+    db: Session = Depends(get_db),
+    user=Depends(require_roles(
+        "admin", "supervisor", "financeiro", "calculista", "atendente",
+        "fechamento"
+    ))
+):
+    """
+    Financiamentos de referências antigas, já fora do banco (arquivo Parquet,
+    services/payroll_archive). Complementa /financiamentos, que só tem as
+    referências recentes.
+    """
+    from ..services import payroll_archive
+
+    client = db.query(Client).get(client_id)
+    if not client:
+        raise HTTPException(404, "Cliente não encontrado")
+    start = _parse_reference(from_, "from")
+    end = _parse_reference(to, "to")
+
+    try:
+        lines = payroll_archive.read_archive(
+            cpf=client.cpf, entity_code=entity_code, start=start, end=end, limit=limit
+        )
+    except payroll_archive.ArchiveUnavailable as e:
+        raise HTTPException(503, str(e))
+
+    return [
+        {
+            "id": line["id"],
+            "matricula": line["matricula"],
+            "financiamento_code": line["financiamento_code"],
+            "total_parcelas": line["total_parcelas"],
+            "parcelas_pagas": line["parcelas_pagas"],
+            "valor_parcela_ref": str(line["valor_parcela_ref"] or "0.00"),
+            "orgao_pagamento": line["orgao_pagamento"],
+            "orgao_pagamento_nome": line["orgao_pagamento_nome"],
+            "ref_month": line["ref_month"],
+            "ref_year": line["ref_year"],
+            "referencia": f"{line['ref_month']:02d}/{line['ref_year']}",
+            "entity_code": line["entity_code"],
+            "entity_name": line["entity_name"],
+            "status_code": line["status_code"],
+            "status_description": line["status_description"],
+            "cargo": line["cargo"],
+            "orgao": line["orgao"],
+            "lanc": line["lanc"],
+            "created_at": line["created_at"].isoformat() if line["created_at"] else None,
+            "arquivado": True,
+        } for line in lines
+    ]
+
+
 @r.get("/{client_id}/contratos-efetivados")
 def get_client_contratos_efetivados(
     client_id: int,
@@ -1512,7 +1533,7 @@ def bulk_delete_clients(
                 "id": client_id,
                 "reason": str(e)
             })
-            print(f"Erro ao excluir cliente {client_id}: {e}")
+            logger.error(f"Erro ao excluir cliente {client_id}: {e}")
 
     db.commit()
 
@@ -1662,7 +1683,7 @@ def delete_client_address(
 # ========== ENDPOINT DE IMPORTAÇÃO EM MASSA ==========
 
 @r.post("/bulk-update-cadastro", response_model=BulkCadastroImportResponse)
-async def bulk_update_cadastro(
+def bulk_update_cadastro(
     rows: List[BulkCadastroRow],
     db: Session = Depends(get_db),
     user=Depends(require_roles("admin", "supervisor"))
@@ -1,25 +1,47 @@
+import logging
+
 from fastapi import (  # pyright: ignore[reportMissingImports]
-    APIRouter, Depends, HTTPException
+    APIRouter, Depends, HTTPException, Query, Request, Response
 )
 from pydantic import BaseModel  # pyright: ignore[reportMissingImports]
 from sqlalchemy.orm import joinedload  # pyright: ignore[reportMissingImports]
 from ..db import SessionLocal
 from ..models import Case, CaseEvent, now_brt
 from ..rbac import require_roles
-from ..events import eventbus
+from ..services import outbox
+from ..utils.fieldsets import FieldSet
+from ..services.query_monitor import query_budget
+from ..services.conditional_get import (
+    resource_etag, etag_matches, etag_headers, not_modified
+)
 
 r = APIRouter(prefix="/closing", tags=["closing"])
+logger = logging.getLogger(__name__)
 
+# Tabelas lidas pela fila (versões usadas no ETag)
+QUEUE_TABLES = ("cases", "clients", "simulations")
 
-@r.get("/queue")
+
+@r.get("/queue", dependencies=[Depends(query_budget(10))])
 def queue(
+    request: Request,
+    response: Response,
     search: str | None = None,
     page: int = 1,
     page_size: int = 20,
+    fields: str | None = Query(
+        None, description="Campos de cada item (ex.: id,status,client.name)"
+    ),
     user=Depends(require_roles("admin", "supervisor", "atendente"))
 ):
     from ..models import Simulation
     with SessionLocal() as db:
+        # GET condicional: 304 antes de montar a query, se nada mudou
+        etag = resource_etag(db, request, QUEUE_TABLES)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        response.headers.update(etag_headers(etag))
+
         # Query base com JOIN para carregar dados completos
         # Status enviados para fechamento pelo atendente
         query = db.query(Case).options(
@@ -52,12 +74,15 @@ def queue(
             page_size
         ).all()
 
+        fieldset = FieldSet.parse(fields)
+        want_simulation = fieldset.wants("simulation")
+
         items = []
         for c in rows:
             try:
                 # Buscar simulação aprovada
                 simulation_data = None
-                if c.last_simulation_id:
+                if want_simulation and c.last_simulation_id:
                     sim = db.get(Simulation, c.last_simulation_id)
                     if sim and sim.status == "approved":
                         simulation_data = {
@@ -127,7 +152,7 @@ def queue(
                 items.append(item)
             except Exception as e:
                 # Log do erro mas continua processando outros casos
-                print(
+                logger.exception(
                     f"Erro ao processar caso {c.id} para fechamento: {e}"
                 )
                 # Adicionar item mínimo para não perder o caso
@@ -148,7 +173,7 @@ def queue(
                 })
 
         return {
-            "items": items,
+            "items": fieldset.apply(items),
             "total_count": total_count,
             "page": page,
             "page_size": page_size,
@@ -162,7 +187,7 @@ class CloseIn(BaseModel):
 
 
 @r.post("/approve")
-async def approve(
+def approve(
     data: CloseIn,
     user=Depends(require_roles("admin", "supervisor", "atendente"))
 ):
@@ -183,17 +208,17 @@ async def approve(
             payload={"notes": data.notes},
             created_by=user.id
         ))
+        outbox.publish(
+            db, "case.updated",
+            {"case_id": data.case_id, "status": "fechamento_aprovado"}
+        )
         db.commit()
 
-    await eventbus.broadcast(
-        "case.updated",
-        {"case_id": data.case_id, "status": "fechamento_aprovado"}
-    )
     return {"ok": True}
 
 
 @r.post("/reject")
-async def reject(
+def reject(
     data: CloseIn,
     user=Depends(require_roles("admin", "supervisor", "atendente"))
 ):
@@ -212,12 +237,12 @@ async def reject(
             payload={"notes": data.notes},
             created_by=user.id
         ))
+        outbox.publish(
+            db, "case.updated",
+            {"case_id": data.case_id, "status": "fechamento_reprovado"}
+        )
         db.commit()
 
-    await eventbus.broadcast(
-        "case.updated",
-        {"case_id": data.case_id, "status": "fechamento_reprovado"}
-    )
     return {"ok": True}
 
 
@@ -350,7 +375,7 @@ def get_case_details(
                 "id": a.id,
                 "path": a.path,
                 "filename": (
-                    os.path.basename(a.path) if a.path else None
+                    a.filename or (os.path.basename(a.path) if a.path else None)
                 ),
                 "mime": a.mime,
                 "size": a.size,
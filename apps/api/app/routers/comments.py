@@ -13,13 +13,13 @@ from ..db import SessionLocal
 from ..models import Comment, Case, User, now_brt
 from ..schemas.comments import CommentCreate, CommentOut, Channel
 from ..services.events import create_comment_events
-from ..events import eventbus
+from ..services import outbox
 
 r = APIRouter(prefix="/comments", tags=["comments"])
 
 
 @r.post("", response_model=CommentOut)
-async def create_comment(
+def create_comment(
     data: CommentCreate,
     user=Depends(require_roles(
         "admin", "supervisor", "calculista", "atendente", "financeiro", "fechamento"
@@ -62,19 +62,17 @@ async def create_comment(
             content=data.content
         )
 
+        outbox.publish(
+            db, "comment.added",
+            {
+                "case_id": data.case_id,
+                "channel": data.channel,
+                "author": user.name
+            }
+        )
         db.commit()
         db.refresh(comment)
 
-    # Broadcast via WebSocket
-    await eventbus.broadcast(
-        "comment.added",
-        {
-            "case_id": data.case_id,
-            "channel": data.channel,
-            "author": user.name
-        }
-    )
-
     return comment
 
 
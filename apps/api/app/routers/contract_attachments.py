@@ -1,13 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request
 from ..rbac import require_roles
 from ..security import get_current_user
 from ..db import SessionLocal
 from ..models import Contract, ContractAttachment, Case
-from ..config import settings
+from ..services.attachment_store import get_attachment_store, FileTooLargeError
+from ..services.attachment_download import (
+    file_download_response, zip_download_response, ZipEntry
+)
 from datetime import datetime
 import os
-import shutil
-import uuid
 
 r = APIRouter(prefix="/contracts", tags=["contract_attachments"])
 
@@ -25,18 +26,11 @@ def upload_contract_attachment(
         if not contract:
             raise HTTPException(404, "Contract not found")
 
-        # Criar diretório se não existir
-        os.makedirs(settings.upload_dir, exist_ok=True)
-
-        # Gerar nome único para o arquivo
-        file_extension = os.path.splitext(file.filename)[1] if file.filename else ""
-        unique_filename = f"contract_{contract_id}_{uuid.uuid4().hex[:8]}{file_extension}"
-        dest = os.path.join(settings.upload_dir, unique_filename)
-
-        # Salvar arquivo
+        # Gravação em blocos, endereçada por SHA-256 (deduplica)
         try:
-            with open(dest, "wb") as f:
-                shutil.copyfileobj(file.file, f)
+            stored = get_attachment_store().save(db, file.file)
+        except FileTooLargeError as e:
+            raise HTTPException(413, str(e))
         except Exception as e:
             raise HTTPException(500, f"Erro ao salvar arquivo: {str(e)}")
 
@@ -44,10 +38,10 @@ def upload_contract_attachment(
         attachment = ContractAttachment(
             contract_id=contract_id,
             case_id=contract.case_id,
-            path=dest,
-            filename=file.filename or unique_filename,
+            path=stored.path,
+            filename=file.filename or stored.sha256,
             mime=file.content_type,
-            size=os.path.getsize(dest),
+            size=stored.size,
             type="comprovante",
             uploaded_by=user.id
         )
@@ -92,33 +86,51 @@ def list_contract_attachments(contract_id: int, user=Depends(get_current_user)):
 def download_contract_attachment(
     contract_id: int,
     attachment_id: int,
+    request: Request,
     user=Depends(get_current_user)
 ):
-    """Download de anexo de contrato"""
+    """Download de anexo de contrato (ETag, Range, X-Accel-Redirect)"""
 
     with SessionLocal() as db:
-        attachment = db.query(ContractAttachment).filter(
+        attachment = db.query(
+            ContractAttachment.path, ContractAttachment.filename, ContractAttachment.mime
+        ).filter(
             ContractAttachment.id == attachment_id,
             ContractAttachment.contract_id == contract_id
         ).first()
 
-        if not attachment:
-            raise HTTPException(404, "Attachment not found")
+    if not attachment:
+        raise HTTPException(404, "Attachment not found")
 
-        if not os.path.exists(attachment.path):
-            raise HTTPException(404, "File not found on disk")
+    # Usar o nome original do arquivo ou fallback para o nome salvo
+    filename = attachment.filename or os.path.basename(attachment.path)
+    return file_download_response(request, attachment.path, filename, attachment.mime)
 
-        # Usar o nome original do arquivo ou fallback para o nome salvo
-        filename = attachment.filename or os.path.basename(attachment.path)
+@r.get("/{contract_id}/attachments.zip")
+def download_contract_attachments_zip(
+    contract_id: int,
+    user=Depends(get_current_user)
+):
+    """Baixa todos os anexos do contrato em um único ZIP (streaming)"""
 
-        from fastapi.responses import FileResponse
-        return FileResponse(
-            path=attachment.path,
-            media_type=attachment.mime or "application/octet-stream",
-            headers={
-                "Content-Disposition": f'attachment; filename="{filename}"'
-            }
-        )
+    with SessionLocal() as db:
+        if not db.query(Contract.id).filter(Contract.id == contract_id).first():
+            raise HTTPException(404, "Contract not found")
+
+        attachments = db.query(
+            ContractAttachment.path, ContractAttachment.filename, ContractAttachment.mime
+        ).filter(
+            ContractAttachment.contract_id == contract_id
+        ).order_by(ContractAttachment.id).all()
+
+    if not attachments:
+        raise HTTPException(404, "Attachment not found")
+
+    entries = [
+        ZipEntry(path=a.path, filename=a.filename, mime=a.mime)
+        for a in attachments
+    ]
+    return zip_download_response(entries, f"contrato_{contract_id}_anexos.zip")
 
 @r.delete("/{contract_id}/attachments/{attachment_id}")
 def delete_contract_attachment(
@@ -137,12 +149,8 @@ def delete_contract_attachment(
         if not attachment:
             raise HTTPException(404, "Attachment not found")
 
-        # Remover arquivo do disco
-        if os.path.exists(attachment.path):
-            try:
-                os.remove(attachment.path)
-            except Exception as e:
-                print(f"Erro ao remover arquivo: {e}")
+        # Remover arquivo do disco (após o commit, se sem outras referências)
+        get_attachment_store().release(db, attachment.path)
 
         # Remover do banco
         db.delete(attachment)
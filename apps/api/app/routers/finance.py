@@ -4,6 +4,8 @@ from fastapi import (  # pyright: ignore[reportMissingImports]
     HTTPException,
     UploadFile,
     File,
+    Query,
+    Request,
 )
 from fastapi.responses import Response  # pyright: ignore[reportMissingImports]
 from pydantic import BaseModel  # pyright: ignore[reportMissingImports]
@@ -12,23 +14,47 @@ from sqlalchemy.orm import joinedload  # pyright: ignore[reportMissingImports]
 from ..db import SessionLocal
 from ..models import Case, CaseEvent, Contract, now_brt
 from ..rbac import require_roles
-from ..events import eventbus
-from ..config import settings
+from ..services import campaign_leaderboard, outbox
+from ..services.attachment_store import get_attachment_store, FileTooLargeError
+from ..services.attachment_download import file_download_response
+from ..services.conditional_get import (
+    resource_etag, etag_matches, etag_headers, not_modified
+)
+from ..utils.json_response import FastJSONResponse
+from ..utils.fieldsets import FieldSet
 import io
+import logging
 import csv
 import os
-import shutil
 
 r = APIRouter(prefix="/finance", tags=["finance"])
+logger = logging.getLogger(__name__)
+
+# Tabelas lidas pela fila (versões usadas no ETag)
+QUEUE_TABLES = (
+    "cases", "clients", "simulations", "contracts",
+    "contract_attachments", "attachments",
+)
 
 
 @r.get("/queue")
-def queue(user=Depends(require_roles("admin", "supervisor", "financeiro"))):
+def queue(
+    request: Request,
+    fields: str | None = Query(
+        None, description="Campos de cada item (ex.: id,status,client.name)"
+    ),
+    user=Depends(require_roles("admin", "supervisor", "financeiro"))
+):
     from sqlalchemy.orm import (  # pyright: ignore[reportMissingImports]
         joinedload
     )
     from ..models import Simulation, Attachment, ContractAttachment
     with SessionLocal() as db:
+        # GET condicional: 304 antes de montar a fila, se nada mudou
+        etag = resource_etag(db, request, QUEUE_TABLES)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
         # Buscar todos os casos relevantes para o módulo financeiro
         # Inclui: pendentes (enviados pelo calculista), efetivados e cancelados
         # 'fechamento_aprovado' removido - casos chegam após calculista
@@ -45,11 +71,18 @@ def queue(user=Depends(require_roles("admin", "supervisor", "financeiro"))):
             Case.last_update_at.desc()
         ).all()
 
+        # Contrato e anexos custam queries por caso: só se pedidos em ?fields=
+        fieldset = FieldSet.parse(fields)
+        want_simulation = fieldset.wants("simulation")
+        want_contract = fieldset.wants("contract")
+        want_contract_attachments = fieldset.wants("contract.attachments")
+        want_attachments = fieldset.wants("attachments")
+
         items = []
         for c in rows:
             # Buscar simulação aprovada
             simulation_data = None
-            if c.last_simulation_id:
+            if want_simulation and c.last_simulation_id:
                 sim = db.get(Simulation, c.last_simulation_id)
                 if sim and sim.status == "approved":
                     simulation_data = {
@@ -106,11 +139,11 @@ def queue(user=Depends(require_roles("admin", "supervisor", "financeiro"))):
             # Buscar contrato se existir para incluir anexos
             contract = db.query(Contract).filter(
                 Contract.case_id == c.id
-            ).first()
+            ).first() if want_contract else None
             if contract:
                 contract_attachments = db.query(ContractAttachment).filter(
                     ContractAttachment.contract_id == contract.id
-                ).all()
+                ).all() if want_contract_attachments else []
                 item["contract"] = {
                     "id": contract.id,
                     "total_amount": (
@@ -119,11 +152,7 @@ def queue(user=Depends(require_roles("admin", "supervisor", "financeiro"))):
                         else 0
                     ),
                     "installments": contract.installments,
-                    "disbursed_at": (
-                        contract.disbursed_at.isoformat()
-                        if contract.disbursed_at
-                        else None
-                    ),
+                    "disbursed_at": contract.disbursed_at,
                     "status": contract.status,
                     "consultoria_liquida": (
                         float(contract.consultoria_valor_liquido)
@@ -147,11 +176,7 @@ def queue(user=Depends(require_roles("admin", "supervisor", "financeiro"))):
                             "size": a.size,
                             "mime": a.mime,
                             "mime_type": a.mime,
-                            "uploaded_at": (
-                                a.created_at.isoformat()
-                                if a.created_at
-                                else None
-                            )
+                            "uploaded_at": a.created_at
                         } for a in contract_attachments
                     ]
                 }
@@ -160,26 +185,25 @@ def queue(user=Depends(require_roles("admin", "supervisor", "financeiro"))):
 
             case_attachments = db.query(Attachment).filter(
                 Attachment.case_id == c.id
-            ).order_by(Attachment.created_at.desc()).all()
+            ).order_by(Attachment.created_at.desc()).all() if want_attachments else []
             item["attachments"] = [
                 {
                     "id": att.id,
-                    "filename": os.path.basename(att.path),
+                    "filename": att.filename or os.path.basename(att.path),
                     "size": att.size,
                     "mime": att.mime,
                     "mime_type": att.mime,
-                    "uploaded_at": (
-                        att.created_at.isoformat()
-                        if att.created_at
-                        else None
-                    )
+                    "uploaded_at": att.created_at
                 }
                 for att in case_attachments
             ]
 
             items.append(item)
 
-        return {"items": items}
+        # Datetimes/Decimals crus: serializados direto pelo orjson
+        return FastJSONResponse(
+            {"items": fieldset.apply(items)}, headers=etag_headers(etag)
+        )
 
 
 @r.get("/case/{case_id}")
@@ -509,7 +533,7 @@ class DisburseIn(BaseModel):
 
 
 @r.post("/disburse")
-async def disburse(
+def disburse(
     data: DisburseIn,
     user=Depends(require_roles("admin", "supervisor", "financeiro"))
 ):
@@ -521,6 +545,7 @@ async def disburse(
         ct = db.query(Contract).filter(Contract.case_id == c.id).first()
         if not ct:
             ct = Contract(case_id=c.id)
+        previous_owner_ids = [ct.agent_user_id, c.assigned_user_id]
 
         # Buscar simulação para pegar consultoria líquida
         from ..models import Simulation
@@ -571,13 +596,15 @@ async def disburse(
             },
             created_by=user.id
         ))
+        outbox.publish(
+            db, "case.updated",
+            {"case_id": data.case_id, "status": "contrato_efetivado"}
+        )
         db.commit()
         db.refresh(ct)
 
-    await eventbus.broadcast(
-        "case.updated",
-        {"case_id": data.case_id, "status": "contrato_efetivado"}
-    )
+        campaign_leaderboard.refresh_users(db, [ct.agent_user_id, *previous_owner_ids])
+
     return {"contract_id": ct.id}
 
 
@@ -607,7 +634,7 @@ class DisburseSimpleIn(BaseModel):
 
 
 @r.post("/disburse-simple")
-async def disburse_simple(
+def disburse_simple(
     data: DisburseSimpleIn,
     user=Depends(require_roles("admin", "supervisor", "financeiro"))
 ):
@@ -663,13 +690,15 @@ async def disburse_simple(
             # Calcular consultoria líquida (apenas para compatibilidade/registro)
             consultoria_liquida = consultoria_bruta - imposto_valor
 
-            print(f"[INFO] Consultoria Bruta: R$ {consultoria_bruta:.2f}")
-            print(f"[INFO] Imposto ({imposto_percentual}%): R$ {imposto_valor:.2f}")
-            print(f"[INFO] Consultoria Líquida (referência): R$ {consultoria_liquida:.2f}")
+            logger.debug(
+                f"Caso {c.id}: consultoria bruta R$ {consultoria_bruta:.2f}, "
+                f"imposto ({imposto_percentual}%) R$ {imposto_valor:.2f}, "
+                f"líquida R$ {consultoria_liquida:.2f}"
+            )
 
             if consultoria_bruta <= 0:
-                print(
-                    f"[AVISO] Consultoria bruta é zero para caso {c.id}, "
+                logger.warning(
+                    f"Consultoria bruta é zero para caso {c.id}, "
                     f"não será criada receita automática"
                 )
 
@@ -690,6 +719,9 @@ async def disburse_simple(
             if not ct:
                 ct = Contract(case_id=c.id)
 
+            # Donos anteriores também saem/mudam no leaderboard
+            previous_owner_ids = [ct.agent_user_id, c.assigned_user_id]
+
             ct.total_amount = total_amount
             ct.installments = simulation.prazo or 0
             ct.disbursed_at = data.disbursed_at or now_brt()
@@ -771,15 +803,13 @@ async def disburse_simple(
                 ct.imposto_expense_id = tax_expense.id
 
             # 5. Criar Receitas (Múltiplos Atendentes + Balcão)
-            print(f"[DEBUG] === VERIFICAÇÃO DE RECEITAS PARA CASO {c.id} ===")
-            print(f"[DEBUG] Consultoria Bruta: R$ {consultoria_bruta:.2f}")
-            print(f"[DEBUG] Imposto: R$ {imposto_valor:.2f}")
-            print(f"[DEBUG] Consultoria Líquida: R$ {consultoria_liquida:.2f}")
-            print(f"[DEBUG] Tem Corretor: {data.tem_corretor}")
-            print(f"[DEBUG] Comissão Corretor: R$ {data.corretor_comissao_valor or 0:.2f}")
-            print(f"[DEBUG] Atendente1: {atendente1_id} ({percentual_atendente1}%)")
-            print(f"[DEBUG] Atendente2: {atendente2_id} ({percentual_atendente2}%)")
-            print(f"[DEBUG] Balcão: ({percentual_balcao}%)")
+            logger.debug(
+                f"Receitas do caso {c.id}: corretor={data.tem_corretor} "
+                f"(R$ {data.corretor_comissao_valor or 0:.2f}), "
+                f"atendente1={atendente1_id} ({percentual_atendente1}%), "
+                f"atendente2={atendente2_id} ({percentual_atendente2}%), "
+                f"balcão {percentual_balcao}%"
+            )
 
             if consultoria_liquida and consultoria_liquida > 0.01:
                 from ..models import FinanceIncome, User, ContractAgent
@@ -795,10 +825,8 @@ async def disburse_simple(
                 ).first()
                 balcao_user_id = balcao_user.id if balcao_user else None
 
-                if balcao_user:
-                    print(f"[INFO] Usuário balcão encontrado: {balcao_user.name} (ID: {balcao_user.id})")
-                else:
-                    print("[AVISO] Usuário 'balcao@lifecalling.com' não encontrado")
+                if not balcao_user:
+                    logger.warning("Usuário 'balcao@lifecalling.com' não encontrado")
 
                 # ✅ Deduzir comissão ANTES de distribuir
                 consultoria_para_distribuir = consultoria_liquida
@@ -807,8 +835,8 @@ async def disburse_simple(
                     consultoria_para_distribuir = (
                         consultoria_liquida - data.corretor_comissao_valor
                     )
-                    print(
-                        f"[INFO] Deduzindo comissão: "
+                    logger.debug(
+                        f"Deduzindo comissão: "
                         f"R$ {consultoria_liquida:.2f} - "
                         f"R$ {data.corretor_comissao_valor:.2f} = "
                         f"R$ {consultoria_para_distribuir:.2f}"
@@ -817,7 +845,7 @@ async def disburse_simple(
                 # Garantir não negativo
                 if consultoria_para_distribuir < 0:
                     consultoria_para_distribuir = 0
-                    print("[AVISO] Consultoria para distribuir ajustada para 0")
+                    logger.warning(f"Caso {c.id}: consultoria para distribuir ajustada para 0")
 
                 # ✅ Distribuir entre atendentes e balcão
                 valor_atendente1 = (
@@ -830,8 +858,8 @@ async def disburse_simple(
                     consultoria_para_distribuir * (percentual_balcao / 100)
                 )
 
-                print(
-                    f"[INFO] Distribuição: "
+                logger.debug(
+                    f"Distribuição: "
                     f"Atendente1 ({percentual_atendente1}%): R$ {valor_atendente1:.2f} | "
                     f"Atendente2 ({percentual_atendente2}%): R$ {valor_atendente2:.2f} | "
                     f"Balcão ({percentual_balcao}%): R$ {valor_balcao:.2f}"
@@ -945,13 +973,19 @@ async def disburse_simple(
                 },
                 created_by=user.id
             ))
+            outbox.publish(
+                db, "case.updated",
+                {"case_id": data.case_id, "status": "contrato_efetivado"}
+            )
             db.commit()
             db.refresh(ct)
 
-        await eventbus.broadcast(
-            "case.updated",
-            {"case_id": data.case_id, "status": "contrato_efetivado"}
-        )
+            # Atualizar leaderboard das campanhas ativas (incremental)
+            campaign_leaderboard.refresh_users(
+                db, [ct.agent_user_id, c.assigned_user_id, atendente1_id, atendente2_id,
+                     *previous_owner_ids]
+            )
+
         return {"contract_id": ct.id}
 
     except HTTPException:
@@ -959,12 +993,7 @@ async def disburse_simple(
         raise
     except Exception as e:
         # Log detalhado do erro
-        import traceback
-        print(
-            f"[ERRO] Falha ao efetivar liberação do caso {data.case_id}: "
-            f"{str(e)}"
-        )
-        print(traceback.format_exc())
+        logger.exception(f"Falha ao efetivar liberação do caso {data.case_id}: {e}")
         raise HTTPException(
             500,
             f"Erro ao efetivar liberação: {str(e)}"
@@ -973,7 +1002,7 @@ async def disburse_simple(
 
 
 @r.post("/cases/{case_id}/reopen")
-async def reopen_case(
+def reopen_case(
     case_id: int,
     user=Depends(require_roles("admin", "financeiro"))
 ):
@@ -1049,14 +1078,13 @@ async def reopen_case(
                 created_by=user.id
             ))
 
+            outbox.publish(
+                db, "case.updated",
+                {"case_id": case_id, "status": "financeiro_pendente"}
+            )
             db.commit()
             db.refresh(case)
 
-        await eventbus.broadcast(
-            "case.updated",
-            {"case_id": case_id, "status": "financeiro_pendente"}
-        )
-
         return {
             "success": True,
             "case_id": case_id,
@@ -1069,9 +1097,7 @@ async def reopen_case(
     except HTTPException:
         raise
     except Exception as e:
-        import traceback
-        print(f"[ERRO] Falha ao reabrir caso {case_id}: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception(f"Falha ao reabrir caso {case_id}: {e}")
         raise HTTPException(500, f"Erro ao reabrir caso: {str(e)}")
 
 @r.get("/commissions")
@@ -1169,7 +1195,7 @@ def get_commissions(
 
 
 @r.post("/cancel/{contract_id}")
-async def cancel_contract(
+def cancel_contract(
     contract_id: int,
     user=Depends(require_roles("admin", "supervisor", "financeiro"))
 ):
@@ -1209,17 +1235,21 @@ async def cancel_contract(
             created_by=user.id
         ))
 
+        outbox.publish(
+            db, "case.updated",
+            {"case_id": case.id, "status": "contrato_cancelado"}
+        )
         db.commit()
 
-    await eventbus.broadcast(
-        "case.updated",
-        {"case_id": case.id, "status": "contrato_cancelado"}
-    )
+        campaign_leaderboard.refresh_users(
+            db, [contract.agent_user_id, case.assigned_user_id]
+        )
+
     return {"success": True, "message": "Contract cancelled successfully"}
 
 
 @r.delete("/delete/{contract_id}")
-async def delete_contract(
+def delete_contract(
     contract_id: int,
     user=Depends(require_roles("admin", "supervisor"))
 ):
@@ -1248,7 +1278,7 @@ async def delete_contract(
         ).all()
 
         for attachment in attachments:
-            # TODO: Remover arquivo físico do storage
+            get_attachment_store().release(db, attachment.path)
             db.delete(attachment)
 
         # Remove eventos relacionados ao contrato
@@ -1262,6 +1292,9 @@ async def delete_contract(
         for event in events:
             db.delete(event)
 
+        # Usuários cujo ranking muda com a deleção
+        affected_user_ids = [contract.agent_user_id, case.assigned_user_id]
+
         # Remove o contrato
         db.delete(contract)
 
@@ -1280,12 +1313,14 @@ async def delete_contract(
             created_by=user.id
         ))
 
+        outbox.publish(
+            db, "case.updated",
+            {"case_id": case.id, "status": "financeiro_pendente"}
+        )
         db.commit()
 
-    await eventbus.broadcast(
-        "case.updated",
-        {"case_id": case.id, "status": "financeiro_pendente"}
-    )
+        campaign_leaderboard.refresh_users(db, affected_user_ids)
+
     return {"success": True, "message": "Contract deleted successfully"}
 
 
@@ -1528,6 +1563,9 @@ def delete_expense(
                 commission.expense_id = None
                 db.add(commission)
 
+            # Remover anexo se existir
+            get_attachment_store().release(db, expense.attachment_path)
+
             # Deletar a despesa
             db.delete(expense)
             db.commit()
@@ -1537,9 +1575,7 @@ def delete_expense(
     except HTTPException:
         raise
     except Exception as e:
-        import traceback
-        print(f"[ERRO] Falha ao deletar despesa {expense_id}: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception(f"Falha ao deletar despesa {expense_id}: {e}")
         raise HTTPException(500, f"Erro ao remover despesa: {str(e)}")
 
 
@@ -1551,38 +1587,27 @@ def upload_expense_attachment(
 ):
     """Upload de anexo para uma despesa (compatibilidade - arquivo único)"""
     from ..models import FinanceExpense
-    import uuid
 
     with SessionLocal() as db:
         expense = db.get(FinanceExpense, expense_id)
         if not expense:
             raise HTTPException(404, "Despesa não encontrada")
 
-    # Criar diretório se não existir
-    os.makedirs(settings.upload_dir, exist_ok=True)
-
-    # Gerar nome único para o arquivo
-    file_extension = (
-        os.path.splitext(file.filename)[1] if file.filename else ""
-    )
-    unique_filename = (
-        f"expense_{expense_id}_{uuid.uuid4().hex[:8]}{file_extension}"
-    )
-    dest = os.path.join(settings.upload_dir, unique_filename)
+        store = get_attachment_store()
 
-    # Salvar arquivo
-    try:
-        with open(dest, "wb") as f:
-            shutil.copyfileobj(file.file, f)
-    except Exception as e:
-        raise HTTPException(500, f"Erro ao salvar arquivo: {str(e)}")
+        # Salvar arquivo (em blocos, endereçado por SHA-256)
+        try:
+            stored = store.save(db, file.file)
+        except FileTooLargeError as e:
+            raise HTTPException(413, str(e))
+        except Exception as e:
+            raise HTTPException(500, f"Erro ao salvar arquivo: {str(e)}")
 
-    # Atualizar registro da despesa
-    with SessionLocal() as db:
-        expense = db.get(FinanceExpense, expense_id)
-        expense.attachment_path = dest
-        expense.attachment_filename = file.filename or unique_filename
-        expense.attachment_size = os.path.getsize(dest)
+        # Atualizar registro (libera a referência ao anexo anterior)
+        store.release(db, expense.attachment_path)
+        expense.attachment_path = stored.path
+        expense.attachment_filename = file.filename or stored.sha256
+        expense.attachment_size = stored.size
         expense.attachment_mime = file.content_type
         expense.updated_at = now_brt()
 
@@ -1605,114 +1630,89 @@ def upload_expense_attachments(
 ):
     """Upload de múltiplos anexos para uma despesa"""
     from ..models import FinanceExpense
-    import uuid
 
     with SessionLocal() as db:
         expense = db.get(FinanceExpense, expense_id)
         if not expense:
             raise HTTPException(404, "Despesa não encontrada")
 
-    if not files:
-        raise HTTPException(400, "Nenhum arquivo enviado")
-
-    # Criar diretório se não existir
-    os.makedirs(settings.upload_dir, exist_ok=True)
+        if not files:
+            raise HTTPException(400, "Nenhum arquivo enviado")
 
-    uploaded_files = []
+        store = get_attachment_store()
+        uploaded_files = []
 
-    for file in files:
-        # Gerar nome único para cada arquivo
-        file_extension = (
-            os.path.splitext(file.filename)[1] if file.filename else ""
-        )
-        unique_filename = (
-            f"expense_{expense_id}_{uuid.uuid4().hex[:8]}{file_extension}"
-        )
-        dest = os.path.join(settings.upload_dir, unique_filename)
-
-        # Salvar arquivo
-        try:
-            with open(dest, "wb") as f:
-                shutil.copyfileobj(file.file, f)
+        for file in files:
+            # Salvar arquivo (em blocos, endereçado por SHA-256).
+            # Em caso de erro a transação é descartada e nenhuma referência fica.
+            try:
+                stored = store.save(db, file.file)
+            except FileTooLargeError as e:
+                raise HTTPException(413, f"{file.filename}: {str(e)}")
+            except Exception as e:
+                raise HTTPException(
+                    500,
+                    f"Erro ao salvar arquivo {file.filename}: {str(e)}"
+                )
 
             uploaded_files.append({
-                "filename": file.filename or unique_filename,
-                "path": dest,
-                "size": os.path.getsize(dest),
+                "filename": file.filename or stored.sha256,
+                "path": stored.path,
+                "size": stored.size,
                 "mime": file.content_type
             })
-        except Exception as e:
-            # Limpar arquivos já salvos em caso de erro
-            for uploaded in uploaded_files:
-                if os.path.exists(uploaded["path"]):
-                    os.remove(uploaded["path"])
-            raise HTTPException(
-                500,
-                f"Erro ao salvar arquivo {file.filename}: {str(e)}"
-            )
 
-    # Atualizar registro da despesa com o último arquivo (compatibilidade)
-    # Futuro: tabela separada para múltiplos anexos
-    if uploaded_files:
+        # Atualizar registro com o último arquivo (compatibilidade)
+        # Futuro: tabela separada para múltiplos anexos
         last_file = uploaded_files[-1]
-        with SessionLocal() as db:
-            expense = db.get(FinanceExpense, expense_id)
-            expense.attachment_path = last_file["path"]
-            expense.attachment_filename = last_file["filename"]
-            expense.attachment_size = last_file["size"]
-            expense.attachment_mime = last_file["mime"]
-            expense.updated_at = now_brt()
+        for uploaded in uploaded_files[:-1]:
+            store.release(db, uploaded["path"])
+        store.release(db, expense.attachment_path)
+
+        expense.attachment_path = last_file["path"]
+        expense.attachment_filename = last_file["filename"]
+        expense.attachment_size = last_file["size"]
+        expense.attachment_mime = last_file["mime"]
+        expense.updated_at = now_brt()
 
-            db.commit()
-            db.refresh(expense)
-
-    return {
-        "id": expense.id,
-        "uploaded_files": len(uploaded_files),
-        "files": [
-            {"filename": f["filename"], "size": f["size"]}
-            for f in uploaded_files
-        ],
-        "message": f"{len(uploaded_files)} arquivo(s) enviado(s) com sucesso"
+        db.commit()
+        db.refresh(expense)
+
+        return {
+            "id": expense.id,
+            "uploaded_files": len(uploaded_files),
+            "files": [
+                {"filename": f["filename"], "size": f["size"]}
+                for f in uploaded_files
+            ],
+            "message": f"{len(uploaded_files)} arquivo(s) enviado(s) com sucesso"
         }
 
 
 @r.get("/expenses/{expense_id}/attachment")
 def download_expense_attachment(
     expense_id: int,
+    request: Request,
     user=Depends(require_roles("admin", "supervisor", "financeiro"))
 ):
-    """Download do anexo de uma despesa"""
-    from fastapi.responses import (  # pyright: ignore[reportMissingImports]
-        FileResponse
-    )
+    """Download do anexo de uma despesa (ETag, Range, X-Accel-Redirect)"""
+    from ..models import FinanceExpense
 
     with SessionLocal() as db:
-        from ..models import FinanceExpense
         expense = db.get(FinanceExpense, expense_id)
 
         if not expense:
             raise HTTPException(404, "Despesa não encontrada")
 
-        if (
-            not expense.attachment_path
-            or not os.path.exists(expense.attachment_path)
-        ):
+        if not expense.attachment_path:
             raise HTTPException(404, "Anexo não encontrado")
 
+        path = expense.attachment_path
+        mime = expense.attachment_mime
         # Usar o nome original do arquivo ou fallback para o nome salvo
-        filename = (
-            expense.attachment_filename
-            or os.path.basename(expense.attachment_path)
-        )
+        filename = expense.attachment_filename or os.path.basename(path)
 
-        return FileResponse(
-            path=expense.attachment_path,
-            media_type=expense.attachment_mime or "application/octet-stream",
-            headers={
-                "Content-Disposition": f'attachment; filename="{filename}"'
-            }
-        )
+    return file_download_response(request, path, filename, mime)
 
 
 @r.delete("/expenses/{expense_id}/attachment")
@@ -1728,8 +1728,7 @@ def delete_expense_attachment(
         if not expense:
             raise HTTPException(404, "Despesa não encontrada")
 
-        if expense.attachment_path and os.path.exists(expense.attachment_path):
-            os.remove(expense.attachment_path)
+        get_attachment_store().release(db, expense.attachment_path)
 
         expense.attachment_path = None
         expense.attachment_filename = None
@@ -1966,6 +1965,9 @@ def delete_income(
         if not income:
             raise HTTPException(404, "Receita não encontrada")
 
+        # Remover anexo se existir
+        get_attachment_store().release(db, income.attachment_path)
+
         db.delete(income)
         db.commit()
 
@@ -1980,38 +1982,27 @@ def upload_income_attachment(
 ):
     """Upload de anexo para uma receita (compatibilidade - arquivo único)"""
     from ..models import FinanceIncome
-    import uuid
 
     with SessionLocal() as db:
         income = db.get(FinanceIncome, income_id)
         if not income:
             raise HTTPException(404, "Receita não encontrada")
 
-    # Criar diretório se não existir
-    os.makedirs(settings.upload_dir, exist_ok=True)
-
-    # Gerar nome único para o arquivo
-    file_extension = (
-        os.path.splitext(file.filename)[1] if file.filename else ""
-    )
-    unique_filename = (
-        f"income_{income_id}_{uuid.uuid4().hex[:8]}{file_extension}"
-    )
-    dest = os.path.join(settings.upload_dir, unique_filename)
+        store = get_attachment_store()
 
-    # Salvar arquivo
-    try:
-        with open(dest, "wb") as f:
-            shutil.copyfileobj(file.file, f)
-    except Exception as e:
-        raise HTTPException(500, f"Erro ao salvar arquivo: {str(e)}")
+        # Salvar arquivo (em blocos, endereçado por SHA-256)
+        try:
+            stored = store.save(db, file.file)
+        except FileTooLargeError as e:
+            raise HTTPException(413, str(e))
+        except Exception as e:
+            raise HTTPException(500, f"Erro ao salvar arquivo: {str(e)}")
 
-    # Atualizar registro da receita
-    with SessionLocal() as db:
-        income = db.get(FinanceIncome, income_id)
-        income.attachment_path = dest
-        income.attachment_filename = file.filename or unique_filename
-        income.attachment_size = os.path.getsize(dest)
+        # Atualizar registro (libera a referência ao anexo anterior)
+        store.release(db, income.attachment_path)
+        income.attachment_path = stored.path
+        income.attachment_filename = file.filename or stored.sha256
+        income.attachment_size = stored.size
         income.attachment_mime = file.content_type
         income.updated_at = now_brt()
 
@@ -2034,114 +2025,89 @@ def upload_income_attachments(
 ):
     """Upload de múltiplos anexos para uma receita"""
     from ..models import FinanceIncome
-    import uuid
 
     with SessionLocal() as db:
         income = db.get(FinanceIncome, income_id)
         if not income:
             raise HTTPException(404, "Receita não encontrada")
 
-    if not files:
-        raise HTTPException(400, "Nenhum arquivo enviado")
-
-    # Criar diretório se não existir
-    os.makedirs(settings.upload_dir, exist_ok=True)
+        if not files:
+            raise HTTPException(400, "Nenhum arquivo enviado")
 
-    uploaded_files = []
+        store = get_attachment_store()
+        uploaded_files = []
 
-    for file in files:
-        # Gerar nome único para cada arquivo
-        file_extension = (
-            os.path.splitext(file.filename)[1] if file.filename else ""
-        )
-        unique_filename = (
-            f"income_{income_id}_{uuid.uuid4().hex[:8]}{file_extension}"
-        )
-        dest = os.path.join(settings.upload_dir, unique_filename)
-
-        # Salvar arquivo
-        try:
-            with open(dest, "wb") as f:
-                shutil.copyfileobj(file.file, f)
+        for file in files:
+            # Salvar arquivo (em blocos, endereçado por SHA-256).
+            # Em caso de erro a transação é descartada e nenhuma referência fica.
+            try:
+                stored = store.save(db, file.file)
+            except FileTooLargeError as e:
+                raise HTTPException(413, f"{file.filename}: {str(e)}")
+            except Exception as e:
+                raise HTTPException(
+                    500,
+                    f"Erro ao salvar arquivo {file.filename}: {str(e)}"
+                )
 
             uploaded_files.append({
-                "filename": file.filename or unique_filename,
-                "path": dest,
-                "size": os.path.getsize(dest),
+                "filename": file.filename or stored.sha256,
+                "path": stored.path,
+                "size": stored.size,
                 "mime": file.content_type
             })
-        except Exception as e:
-            # Limpar arquivos já salvos em caso de erro
-            for uploaded in uploaded_files:
-                if os.path.exists(uploaded["path"]):
-                    os.remove(uploaded["path"])
-            raise HTTPException(
-                500,
-                f"Erro ao salvar arquivo {file.filename}: {str(e)}"
-            )
 
-    # Atualizar registro da receita com o último arquivo (compatibilidade)
-    # Futuro: tabela separada para múltiplos anexos
-    if uploaded_files:
+        # Atualizar registro com o último arquivo (compatibilidade)
+        # Futuro: tabela separada para múltiplos anexos
         last_file = uploaded_files[-1]
-        with SessionLocal() as db:
-            income = db.get(FinanceIncome, income_id)
-            income.attachment_path = last_file["path"]
-            income.attachment_filename = last_file["filename"]
-            income.attachment_size = last_file["size"]
-            income.attachment_mime = last_file["mime"]
-            income.updated_at = now_brt()
+        for uploaded in uploaded_files[:-1]:
+            store.release(db, uploaded["path"])
+        store.release(db, income.attachment_path)
+
+        income.attachment_path = last_file["path"]
+        income.attachment_filename = last_file["filename"]
+        income.attachment_size = last_file["size"]
+        income.attachment_mime = last_file["mime"]
+        income.updated_at = now_brt()
 
-            db.commit()
-            db.refresh(income)
-
-    return {
-        "id": income.id,
-        "uploaded_files": len(uploaded_files),
-        "files": [
-            {"filename": f["filename"], "size": f["size"]}
-            for f in uploaded_files
-        ],
-        "message": f"{len(uploaded_files)} arquivo(s) enviado(s) com sucesso"
+        db.commit()
+        db.refresh(income)
+
+        return {
+            "id": income.id,
+            "uploaded_files": len(uploaded_files),
+            "files": [
+                {"filename": f["filename"], "size": f["size"]}
+                for f in uploaded_files
+            ],
+            "message": f"{len(uploaded_files)} arquivo(s) enviado(s) com sucesso"
         }
 
 
 @r.get("/incomes/{income_id}/attachment")
 def download_income_attachment(
     income_id: int,
+    request: Request,
     user=Depends(require_roles("admin", "supervisor", "financeiro"))
 ):
-    """Download do anexo de uma receita"""
-    from fastapi.responses import (  # pyright: ignore[reportMissingImports]
-        FileResponse
-    )
+    """Download do anexo de uma receita (ETag, Range, X-Accel-Redirect)"""
+    from ..models import FinanceIncome
 
     with SessionLocal() as db:
-        from ..models import FinanceIncome
         income = db.get(FinanceIncome, income_id)
 
         if not income:
             raise HTTPException(404, "Receita não encontrada")
 
-        if (
-            not income.attachment_path
-            or not os.path.exists(income.attachment_path)
-        ):
+        if not income.attachment_path:
             raise HTTPException(404, "Anexo não encontrado")
 
+        path = income.attachment_path
+        mime = income.attachment_mime
         # Usar o nome original do arquivo ou fallback para o nome salvo
-        filename = (
-            income.attachment_filename
-            or os.path.basename(income.attachment_path)
-        )
+        filename = income.attachment_filename or os.path.basename(path)
 
-        return FileResponse(
-            path=income.attachment_path,
-            media_type=income.attachment_mime or "application/octet-stream",
-            headers={
-                "Content-Disposition": f'attachment; filename="{filename}"'
-            }
-        )
+    return file_download_response(request, path, filename, mime)
 
 
 @r.delete("/incomes/{income_id}/attachment")
@@ -2157,8 +2123,7 @@ def delete_income_attachment(
         if not income:
             raise HTTPException(404, "Receita não encontrada")
 
-        if income.attachment_path and os.path.exists(income.attachment_path):
-            os.remove(income.attachment_path)
+        get_attachment_store().release(db, income.attachment_path)
 
         income.attachment_path = None
         income.attachment_filename = None
@@ -2653,15 +2618,10 @@ def get_transactions(
 
     except Exception as e:
         # Log detalhado do erro
-        import traceback
-        print(
-            f"[ERRO] Falha ao buscar transações: {str(e)}"
-        )
-        print(
-            f"  Parâmetros: start_date={start_date}, end_date={end_date}, "
-            f"type={transaction_type}, category={category}"
+        logger.exception(
+            f"Falha ao buscar transações ({e}): start_date={start_date}, "
+            f"end_date={end_date}, type={transaction_type}, category={category}"
         )
-        print(traceback.format_exc())
         raise HTTPException(500, f"Erro ao buscar transações: {str(e)}")
 
 # Exportação de Relatórios
@@ -3193,8 +3153,7 @@ def delete_external_income(
             raise HTTPException(404, "Receita de cliente externo não encontrada")
 
         # Remover anexo se existir
-        if income.attachment_path and os.path.exists(income.attachment_path):
-            os.remove(income.attachment_path)
+        get_attachment_store().release(db, income.attachment_path)
 
         db.delete(income)
         db.commit()
@@ -3210,34 +3169,27 @@ def upload_external_income_attachment(
 ):
     """Upload de anexo para uma receita de cliente externo"""
     from ..models import ExternalClientIncome
-    import uuid
 
     with SessionLocal() as db:
         income = db.get(ExternalClientIncome, income_id)
         if not income:
             raise HTTPException(404, "Receita de cliente externo não encontrada")
 
-    # Criar diretório se não existir
-    os.makedirs(settings.upload_dir, exist_ok=True)
-
-    # Gerar nome único para o arquivo
-    file_extension = os.path.splitext(file.filename)[1] if file.filename else ""
-    unique_filename = f"external_income_{income_id}_{uuid.uuid4().hex[:8]}{file_extension}"
-    dest = os.path.join(settings.upload_dir, unique_filename)
+        store = get_attachment_store()
 
-    # Salvar arquivo
-    try:
-        with open(dest, "wb") as f:
-            shutil.copyfileobj(file.file, f)
-    except Exception as e:
-        raise HTTPException(500, f"Erro ao salvar arquivo: {str(e)}")
+        # Salvar arquivo (em blocos, endereçado por SHA-256)
+        try:
+            stored = store.save(db, file.file)
+        except FileTooLargeError as e:
+            raise HTTPException(413, str(e))
+        except Exception as e:
+            raise HTTPException(500, f"Erro ao salvar arquivo: {str(e)}")
 
-    # Atualizar registro
-    with SessionLocal() as db:
-        income = db.get(ExternalClientIncome, income_id)
-        income.attachment_path = dest
-        income.attachment_filename = file.filename or unique_filename
-        income.attachment_size = os.path.getsize(dest)
+        # Atualizar registro (libera a referência ao anexo anterior)
+        store.release(db, income.attachment_path)
+        income.attachment_path = stored.path
+        income.attachment_filename = file.filename or stored.sha256
+        income.attachment_size = stored.size
         income.attachment_mime = file.content_type
         income.updated_at = now_brt()
 
@@ -3255,10 +3207,10 @@ def upload_external_income_attachment(
 @r.get("/external-incomes/{income_id}/attachment")
 def download_external_income_attachment(
     income_id: int,
+    request: Request,
     user=Depends(require_roles("admin", "supervisor", "financeiro"))
 ):
-    """Download do anexo de uma receita de cliente externo"""
-    from fastapi.responses import FileResponse  # pyright: ignore[reportMissingImports]
+    """Download do anexo de uma receita de cliente externo (ETag, Range, X-Accel-Redirect)"""
     from ..models import ExternalClientIncome
 
     with SessionLocal() as db:
@@ -3267,16 +3219,15 @@ def download_external_income_attachment(
         if not income:
             raise HTTPException(404, "Receita de cliente externo não encontrada")
 
-        if not income.attachment_path or not os.path.exists(income.attachment_path):
+        if not income.attachment_path:
             raise HTTPException(404, "Anexo não encontrado")
 
-        filename = income.attachment_filename or os.path.basename(income.attachment_path)
+        path = income.attachment_path
+        mime = income.attachment_mime
+        # Usar o nome original do arquivo ou fallback para o nome salvo
+        filename = income.attachment_filename or os.path.basename(path)
 
-        return FileResponse(
-            path=income.attachment_path,
-            media_type=income.attachment_mime or "application/octet-stream",
-            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
-        )
+    return file_download_response(request, path, filename, mime)
 
 
 @r.delete("/external-incomes/{income_id}/attachment")
@@ -3293,8 +3244,7 @@ def delete_external_income_attachment(
         if not income:
             raise HTTPException(404, "Receita de cliente externo não encontrada")
 
-        if income.attachment_path and os.path.exists(income.attachment_path):
-            os.remove(income.attachment_path)
+        get_attachment_store().release(db, income.attachment_path)
 
         income.attachment_path = None
         income.attachment_filename = None
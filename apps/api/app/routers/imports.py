@@ -6,12 +6,18 @@ de folha de pagamento no formato iNETConsig, criando clientes,
 registrando financiamentos e gerando atendimentos automaticamente.
 """
 
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, text
+from sqlalchemy import JSON, bindparam, func, text
 from ..rbac import require_roles
 from ..db import SessionLocal
-from ..models import ImportBatch, PayrollLine, Client, Case, User
+from ..models import ImportBatch, PayrollLine, PayrollDiff, PayrollDiffItem, Client, Case, User, now_brt
+from ..services.entity_service import get_or_create_entity
+from ..services.change_versions import mark_changed
+from ..services.payroll_partitions import ensure_partition
+from ..services.payroll_hashes import line_hash, summary_hash
+from ..services.payroll_diff import build_diff
+from ..services.attachment_download import content_disposition
 from ..services.payroll_inetconsig_parser import (
     parse_inetconsig_file,
     validate_inetconsig_content,
@@ -19,12 +25,17 @@ from ..services.payroll_inetconsig_parser import (
 )
 from datetime import datetime
 from collections import defaultdict
+from typing import Literal, Optional
+import csv
+import io
 import logging
 import os
 import shutil
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
+# Eventos linha a linha: amostrados (LOG_SAMPLE_EVERY) em logging_config
+row_logger = logging.getLogger(f"{__name__}.rows")
 
 r = APIRouter(prefix="/imports", tags=["imports"])
 
@@ -132,6 +143,21 @@ def calculate_status_summary(lines: list) -> dict:
     return summary
 
 
+def count_disappeared_lines(db: Session, batch: ImportBatch, seen: set) -> int:
+    """
+    Linhas da mesma entidade e referência já gravadas que não vieram no
+    arquivo. Percorre só a partição do mês, em blocos.
+    """
+    rows = db.query(
+        PayrollLine.cpf, PayrollLine.matricula, PayrollLine.financiamento_code
+    ).filter(
+        PayrollLine.ref_year == batch.ref_year,
+        PayrollLine.ref_month == batch.ref_month,
+        PayrollLine.entity_code == batch.entity_code
+    ).yield_per(10000)
+    return sum(1 for key in rows if tuple(key) not in seen)
+
+
 def upsert_client(db: Session, cpf: str, matricula: str, nome: str, orgao: str = None,
                   orgao_pgto_code: str = None, orgao_pgto_name: str = None,
                   status_desconto: str = None, status_legenda: str = None) -> Client:
@@ -182,7 +208,7 @@ def upsert_client(db: Session, cpf: str, matricula: str, nome: str, orgao: str =
         if status_legenda:
             client.status_legenda = status_legenda
         client.cpf_matricula = cpf_matricula
-        logger.debug(f"Cliente atualizado: CPF {cpf}")
+        row_logger.debug(f"Cliente atualizado: CPF {cpf}")
     else:
         # Criar novo cliente
         client = Client(
@@ -198,7 +224,7 @@ def upsert_client(db: Session, cpf: str, matricula: str, nome: str, orgao: str =
         )
         db.add(client)
         db.flush()
-        logger.info(f"Cliente criado: {cpf} - {matricula}")
+        row_logger.info(f"Cliente criado: {cpf} - {matricula}")
 
     return client
 
@@ -237,8 +263,8 @@ def create_case_for_client(db: Session, client: Client, batch: ImportBatch,
         # Atualizar caso existente com novos dados
         existing_case.payroll_status_summary = status_summary
         existing_case.import_batch_id_new = batch.id
-        existing_case.last_update_at = datetime.utcnow()
-        logger.info(f"Caso #{existing_case.id} atualizado (CPF {client.cpf} já tinha caso ativo)")
+        existing_case.last_update_at = now_brt()
+        row_logger.info(f"Caso #{existing_case.id} atualizado (CPF {client.cpf} já tinha caso ativo)")
         return existing_case
 
     # Verificação adicional: garantir que NÃO exista NENHUM caso ativo do CPF
@@ -252,7 +278,7 @@ def create_case_for_client(db: Session, client: Client, batch: ImportBatch,
         logger.warning(f"⚠️ CPF {client.cpf} já tem caso #{any_active_case.id} ativo - não será criado novo caso")
         any_active_case.payroll_status_summary = status_summary
         any_active_case.import_batch_id_new = batch.id
-        any_active_case.last_update_at = datetime.utcnow()
+        any_active_case.last_update_at = now_brt()
         return any_active_case
 
     # Criar novo caso apenas se NÃO existir nenhum caso ativo do CPF
@@ -265,7 +291,7 @@ def create_case_for_client(db: Session, client: Client, batch: ImportBatch,
         ref_year=batch.ref_year,
         import_batch_id_new=batch.id,
         payroll_status_summary=status_summary,
-        last_update_at=datetime.utcnow(),
+        last_update_at=now_brt(),
 
         # Campos legados para compatibilidade
         entidade=batch.entity_name,
@@ -273,13 +299,16 @@ def create_case_for_client(db: Session, client: Client, batch: ImportBatch,
     )
     db.add(new_case)
     db.flush()  # Garantir que o ID seja gerado
-    logger.info(f"Novo caso criado: {new_case.id} para cliente {client.id}")
+    row_logger.info(f"Novo caso criado: {new_case.id} para cliente {client.id}")
     return new_case
 
 
 @r.post("")
-async def import_payroll_file(
+def import_payroll_file(
     file: UploadFile = File(...),
+    mode: Literal["delta", "full"] = Query(
+        "delta", description="delta: só grava linhas/casos que mudaram; full: regrava tudo"
+    ),
     db: Session = Depends(get_db),
     user=Depends(require_roles("admin", "supervisor", "financeiro", "calculista"))
 ):
@@ -293,6 +322,11 @@ async def import_payroll_file(
     4. Registra linhas de financiamento
     5. Gera casos na esteira para cada cliente
 
+    No modo delta (padrão) linhas e resumos de caso são comparados pelo hash
+    de conteúdo (services/payroll_hashes) e só o que mudou é gravado; o lote
+    registra quantas linhas ficaram iguais, mudaram, são novas ou sumiram
+    do arquivo (delta_stats).
+
     Returns:
         Estatísticas da importação e IDs criados
     """
@@ -303,7 +337,7 @@ async def import_payroll_file(
 
     try:
         # Ler conteúdo do arquivo com encoding correto para arquivos iNETConsig
-        raw_content = await file.read()
+        raw_content = file.file.read()
 
         # Tentar múltiplos encodings comuns em sistemas Windows/governamentais
         for encoding in ["latin-1", "cp1252", "iso-8859-1", "utf-8"]:
@@ -335,6 +369,14 @@ async def import_payroll_file(
 
         logger.info(f"Parse concluído: {len(lines)} linhas, {parse_stats['unique_clients']} clientes únicos")
 
+        # Partição da referência antes de qualquer escrita desta transação:
+        # o ATTACH precisa de lock em import_batches (FK)
+        try:
+            ensure_partition(meta["ref_year"], meta["ref_month"])
+        except Exception as e:
+            logger.error(f"Erro ao criar partição de {meta['ref_month']:02d}/{meta['ref_year']}: {e}")
+            # As linhas caem em payroll_lines_default; a próxima importação da referência as move
+
         # Criar lote de importação
         batch = ImportBatch(
             entity_code=meta["entity_code"],
@@ -351,6 +393,9 @@ async def import_payroll_file(
         db.add(batch)
         db.flush()
 
+        # Registrar entidade na dimensão (nome normalizado calculado uma vez)
+        entity_id = get_or_create_entity(db, meta["entity_code"], meta["entity_name"]).id
+
         # Salvar arquivo físico no sistema
         try:
             # Gerar nome único para o arquivo: batch_id_timestamp_filename.txt
@@ -376,11 +421,15 @@ async def import_payroll_file(
             "clients_created": 0,
             "clients_updated": 0,
             "lines_created": 0,
+            "lines_changed": 0,
+            "lines_unchanged": 0,
             "cases_created": 0,
             "cases_updated": 0,
+            "cases_unchanged": 0,
             "cases_reopened": 0,
             "errors": 0
         }
+        delta = mode == "delta"
 
         # Agrupar linhas por cliente (CPF + Matrícula)
         client_lines = defaultdict(list)
@@ -426,10 +475,11 @@ async def import_payroll_file(
 
                 # Calcular resumo de status para este cliente
                 status_summary = calculate_status_summary(client_line_group)
+                status_hash = summary_hash(status_summary)
 
                 # Criar/atualizar caso na esteira (1 caso por CPF - REGRA ABSOLUTA)
                 try:
-                    from ..models import CaseEvent, now_brt
+                    from ..models import CaseEvent
 
                     # Status considerados "abertos" (não criar novos casos se já houver um aberto)
                     OPEN_STATUSES = ["novo", "disponivel", "em_atendimento", "calculista",
@@ -450,16 +500,21 @@ async def import_payroll_file(
                         Case.status.in_(OPEN_STATUSES)
                     ).order_by(Case.id.desc()).first()
 
-                    if existing_case:
+                    if existing_case and delta and existing_case.payroll_summary_hash == status_hash:
+                        # Resumo igual ao já gravado: não mexe no caso (nem em last_update_at)
+                        case = existing_case
+                        counters["cases_unchanged"] += 1
+                    elif existing_case:
                         # Reaproveitar caso existente: apenas atualizar
                         existing_case.payroll_status_summary = status_summary
+                        existing_case.payroll_summary_hash = status_hash
                         existing_case.import_batch_id_new = batch.id
                         existing_case.ref_month = batch.ref_month
                         existing_case.ref_year = batch.ref_year
-                        existing_case.last_update_at = datetime.utcnow()
+                        existing_case.last_update_at = now_brt()
                         case = existing_case
                         counters["cases_updated"] += 1
-                        logger.info(f"Caso {case.id} atualizado para cliente {client.id}")
+                        row_logger.info(f"Caso {case.id} atualizado para cliente {client.id}")
                     else:
                         # Verificar se existe caso encerrado/sem_contato para REABRIR
                         closed_case = db.query(Case).filter(
@@ -472,10 +527,11 @@ async def import_payroll_file(
                             old_status = closed_case.status
                             closed_case.status = "novo"
                             closed_case.payroll_status_summary = status_summary
+                            closed_case.payroll_summary_hash = status_hash
                             closed_case.import_batch_id_new = batch.id
                             closed_case.ref_month = batch.ref_month
                             closed_case.ref_year = batch.ref_year
-                            closed_case.last_update_at = datetime.utcnow()
+                            closed_case.last_update_at = now_brt()
                             # Limpar atribuição antiga
                             closed_case.assigned_user_id = None
                             closed_case.assigned_at = None
@@ -499,7 +555,7 @@ async def import_payroll_file(
 
                             case = closed_case
                             counters["cases_reopened"] += 1
-                            logger.info(f"Caso {case.id} REABERTO (era {old_status}) para cliente {client.id}")
+                            row_logger.info(f"Caso {case.id} REABERTO (era {old_status}) para cliente {client.id}")
                         else:
                             # ANTES de criar novo caso, verificar se existe caso CANCELADO
                             canceled_case = db.query(Case).filter(
@@ -507,14 +563,18 @@ async def import_payroll_file(
                                 Case.status.in_(CANCELED_STATUSES)
                             ).order_by(Case.id.desc()).first()
 
-                            if canceled_case:
+                            if canceled_case and delta and canceled_case.payroll_summary_hash == status_hash:
+                                case = canceled_case
+                                counters["cases_unchanged"] += 1
+                            elif canceled_case:
                                 # NÃO reabrir caso cancelado, apenas atualizar dados de folha
                                 # Manter status "caso_cancelado" ou "contrato_cancelado"
                                 canceled_case.payroll_status_summary = status_summary
+                                canceled_case.payroll_summary_hash = status_hash
                                 canceled_case.import_batch_id_new = batch.id
                                 canceled_case.ref_month = batch.ref_month
                                 canceled_case.ref_year = batch.ref_year
-                                canceled_case.last_update_at = datetime.utcnow()
+                                canceled_case.last_update_at = now_brt()
                                 # NÃO mudar status - manter cancelado!
 
                                 # Criar evento informativo (não reabertura)
@@ -533,32 +593,42 @@ async def import_payroll_file(
 
                                 case = canceled_case
                                 counters["cases_updated"] += 1
-                                logger.info(f"Caso cancelado {case.id} atualizado (mantém status {canceled_case.status})")
+                                row_logger.info(f"Caso cancelado {case.id} atualizado (mantém status {canceled_case.status})")
                             else:
                                 # Criar novo caso (nenhum caso existe para este cliente)
                                 case = create_case_for_client(db, client, batch, status_summary)
+                                case.payroll_summary_hash = status_hash
                                 counters["cases_created"] += 1
-                                logger.info(f"Novo caso {case.id} criado para cliente {client.id}")
+                                row_logger.info(f"Novo caso {case.id} criado para cliente {client.id}")
 
                 except Exception as case_error:
                     logger.error(f"Erro ao criar/atualizar caso para cliente {client.id}: {case_error}")
                     # Não falhar a importação por causa do caso, mas registrar erro
                     counters["errors"] += 1
 
+                # Linhas já gravadas do cliente nesta referência (uma consulta,
+                # só na partição do mês), por código FIN
+                existing_lines = {
+                    pl.financiamento_code: pl
+                    for pl in db.query(PayrollLine).filter(
+                        PayrollLine.cpf == cpf,
+                        PayrollLine.matricula == matricula,
+                        PayrollLine.ref_month == batch.ref_month,
+                        PayrollLine.ref_year == batch.ref_year
+                    )
+                }
+
                 # Registrar todas as linhas do cliente
                 for line in client_line_group:
                     try:
-                        # Verificar se linha já existe (evitar duplicatas)
-                        existing_line = db.query(PayrollLine).filter(
-                            PayrollLine.cpf == line["cpf"],
-                            PayrollLine.matricula == line["matricula"],
-                            PayrollLine.financiamento_code == line["financiamento_code"],
-                            PayrollLine.ref_month == line["ref_month"],
-                            PayrollLine.ref_year == line["ref_year"]
-                        ).first()
-
-                        if existing_line:
+                        existing_line = existing_lines.get(line["financiamento_code"])
+                        content_hash = line_hash(line, entity_id)
+
+                        if existing_line and delta and existing_line.content_hash == content_hash:
+                            counters["lines_unchanged"] += 1
+                        elif existing_line:
                             # Atualizar linha existente
+                            existing_line.content_hash = content_hash
                             existing_line.status_code = line["status_code"]
                             existing_line.status_description = line["status_description"]
                             existing_line.orgao = line["orgao"]
@@ -568,7 +638,9 @@ async def import_payroll_file(
                             existing_line.valor_parcela_ref = line["valor_parcela_ref"]
                             existing_line.orgao_pagamento = line["orgao_pagamento"]
                             existing_line.orgao_pagamento_nome = line.get("orgao_pagamento_nome", "")
-                            logger.info(f"Linha atualizada para CPF {cpf}, FIN {line['financiamento_code']}")
+                            existing_line.entity_id = entity_id
+                            counters["lines_changed"] += 1
+                            row_logger.info(f"Linha atualizada para CPF {cpf}, FIN {line['financiamento_code']}")
                         else:
                             # Criar nova linha com campos corretos
                             payroll_line = PayrollLine(
@@ -589,13 +661,15 @@ async def import_payroll_file(
                                 orgao_pagamento_nome=line.get("orgao_pagamento_nome", ""),
                                 entity_code=line["entity_code"],
                                 entity_name=line["entity_name"],
+                                entity_id=entity_id,
                                 ref_month=line["ref_month"],
                                 ref_year=line["ref_year"],
-                                line_number=line.get("line_number")
+                                line_number=line.get("line_number"),
+                                content_hash=content_hash
                             )
                             db.add(payroll_line)
                             counters["lines_created"] += 1
-                            logger.info(f"Nova linha criada para CPF {cpf}, FIN {line['financiamento_code']}")
+                            row_logger.info(f"Nova linha criada para CPF {cpf}, FIN {line['financiamento_code']}")
 
                     except Exception as line_error:
                         logger.error(f"Erro ao salvar linha CPF {cpf}, FIN {line.get('financiamento_code')}: {line_error}")
@@ -621,6 +695,23 @@ async def import_payroll_file(
             logger.error(f"Erro no commit final: {e}")
             db.rollback()
 
+        try:
+            disappeared = count_disappeared_lines(
+                db, batch,
+                {(line["cpf"], line["matricula"], line["financiamento_code"]) for line in lines}
+            )
+        except Exception as e:
+            logger.error(f"Erro ao contar linhas ausentes do arquivo: {e}")
+            db.rollback()
+            disappeared = None
+        delta_stats = {
+            "mode": mode,
+            "unchanged": counters["lines_unchanged"],
+            "changed": counters["lines_changed"],
+            "new": counters["lines_created"],
+            "disappeared": disappeared,
+        }
+
         # Atualizar estatísticas do batch
         try:
             # Salvar ID do batch antes de qualquer operação
@@ -628,19 +719,34 @@ async def import_payroll_file(
 
             # Usar query update direta para evitar problemas de sessão
             db.execute(
-                text("UPDATE import_batches SET processed_lines = :processed, error_lines = :errors WHERE id = :id"),
+                text(
+                    "UPDATE import_batches SET processed_lines = :processed, error_lines = :errors, "
+                    "delta_stats = :delta_stats WHERE id = :id"
+                ).bindparams(bindparam("delta_stats", type_=JSON)),
                 {
                     "processed": counters["lines_created"],
                     "errors": counters["errors"],
+                    "delta_stats": delta_stats,
                     "id": batch_id
                 }
             )
+            mark_changed(db, ImportBatch.__tablename__)
             db.commit()
             logger.info(f"Estatísticas do batch {batch_id} atualizadas")
         except Exception as batch_error:
             logger.error(f"Erro ao atualizar estatísticas do batch: {batch_error}")
             db.rollback()
 
+        # Diferença para o lote anterior da entidade (não falha a importação)
+        diff_summary = None
+        batch_id = batch.id
+        try:
+            diff = build_diff(db, batch)
+            diff_summary = _diff_out(diff)
+        except Exception as e:
+            logger.error(f"Erro ao calcular diff do lote {batch_id}: {e}")
+            db.rollback()
+
         logger.info(f"Importação concluída: {counters}")
 
         # Calcular estatísticas adicionais
@@ -651,6 +757,8 @@ async def import_payroll_file(
             "success": True,
             "batch_id": batch.id,
             "counters": counters,
+            "delta_stats": delta_stats,
+            "diff": diff_summary,
             "parse_stats": parse_stats,
             "metadata": {
                 "entity_code": meta["entity_code"],
@@ -681,6 +789,12 @@ async def import_payroll_file(
         if counters["clients_updated"] > 0:
             messages.append(f"↻ {counters['clients_updated']} clientes foram atualizados")
 
+        if delta and counters["lines_unchanged"] > 0:
+            messages.append(f"= {counters['lines_unchanged']} linhas sem alteração (não regravadas)")
+
+        if disappeared:
+            messages.append(f"− {disappeared} financiamentos da referência não vieram neste arquivo")
+
         if counters["cases_created"] > 0:
             messages.append(f"✓ {counters['cases_created']} novos casos criados na esteira")
 
@@ -700,7 +814,7 @@ async def import_payroll_file(
 
 
 @r.get("/preview")
-async def preview_file(
+def preview_file(
     file: UploadFile = File(...),
     user=Depends(require_roles("admin", "supervisor", "financeiro", "calculista"))
 ):
@@ -709,7 +823,7 @@ async def preview_file(
     Útil para validação antes da importação completa.
     """
     try:
-        content = (await file.read()).decode("utf-8", errors="ignore")
+        content = file.file.read().decode("utf-8", errors="ignore")
 
         # Validar formato
         validation_errors = validate_inetconsig_content(content)
@@ -749,7 +863,12 @@ def list_import_batches(
         from sqlalchemy import func, distinct
         total_clients = (
             db.query(func.count(distinct(PayrollLine.cpf)))
-            .filter(PayrollLine.batch_id == batch.id)
+            .filter(
+                PayrollLine.batch_id == batch.id,
+                # Só a partição da referência do lote
+                PayrollLine.ref_year == batch.ref_year,
+                PayrollLine.ref_month == batch.ref_month,
+            )
             .scalar() or 0
         )
 
@@ -764,6 +883,7 @@ def list_import_batches(
             "total_lines": batch.total_lines,
             "processed_lines": batch.processed_lines,
             "error_lines": batch.error_lines,
+            "delta_stats": batch.delta_stats,
             "total_clients": total_clients,  # Total de clientes únicos
             "created_at": batch.created_at.isoformat(),
             "created_by": creator.name if creator else "Sistema",
@@ -788,7 +908,11 @@ def get_import_batch_details(
     lines_stats = db.query(
         PayrollLine.status_code,
         func.count(PayrollLine.id).label("count")
-    ).filter(PayrollLine.batch_id == batch_id).group_by(PayrollLine.status_code).all()
+    ).filter(
+        PayrollLine.batch_id == batch_id,
+        PayrollLine.ref_year == batch.ref_year,
+        PayrollLine.ref_month == batch.ref_month,
+    ).group_by(PayrollLine.status_code).all()
 
     # Contagem de casos criados
     cases_count = db.query(func.count(Case.id)).filter(
@@ -810,6 +934,7 @@ def get_import_batch_details(
             "total_lines": batch.total_lines,
             "processed_lines": batch.processed_lines,
             "error_lines": batch.error_lines,
+            "delta_stats": batch.delta_stats,
             "created_at": batch.created_at.isoformat(),
             "created_by": creator.name if creator else "Sistema",
             "generated_at": batch.generated_at.isoformat()
@@ -825,7 +950,7 @@ def get_import_batch_details(
 
 
 @r.get("/batches/{batch_id}/download")
-async def download_import_file(
+def download_import_file(
     batch_id: int,
     db: Session = Depends(get_db),
     user=Depends(require_roles("admin", "supervisor", "financeiro", "calculista"))
@@ -850,4 +975,141 @@ async def download_import_file(
         headers={
             "Content-Disposition": f'attachment; filename="{filename}"'
         }
-    )
\ No newline at end of file
+    )
+
+def _diff_out(diff: PayrollDiff) -> dict:
+    def ref(month, year):
+        return f"{month:02d}/{year}" if month else None
+
+    return {
+        "id": diff.id,
+        "batch_id": diff.batch_id,
+        "previous_batch_id": diff.previous_batch_id,
+        "entity_code": diff.entity_code,
+        "reference": ref(diff.ref_month, diff.ref_year),
+        "previous_reference": ref(diff.previous_ref_month, diff.previous_ref_year),
+        "counts": diff.counts,
+        "status_transitions": diff.status_transitions,
+        "prioritized_cases": diff.prioritized_cases,
+        "created_at": diff.created_at.isoformat() if diff.created_at else None,
+    }
+
+
+def _diff_item_out(item: PayrollDiffItem) -> dict:
+    return {
+        "kind": item.kind,
+        "cpf": item.cpf,
+        "matricula": item.matricula,
+        "financiamento_code": item.financiamento_code,
+        "old_status": item.old_status,
+        "new_status": item.new_status,
+        "old_value": str(item.old_value) if item.old_value is not None else None,
+        "new_value": str(item.new_value) if item.new_value is not None else None,
+        "priority": item.priority,
+    }
+
+
+def _get_diff(db: Session, batch_id: int) -> PayrollDiff:
+    diff = db.query(PayrollDiff).filter(PayrollDiff.batch_id == batch_id).first()
+    if not diff:
+        raise HTTPException(404, "Diff do lote não encontrado")
+    return diff
+
+
+def _diff_items_query(db: Session, diff_id: int, kind: Optional[str], priority: Optional[bool]):
+    query = db.query(PayrollDiffItem).filter(PayrollDiffItem.diff_id == diff_id)
+    if kind:
+        query = query.filter(PayrollDiffItem.kind == kind)
+    if priority is not None:
+        query = query.filter(PayrollDiffItem.priority.is_(priority))
+    return query
+
+
+DiffKind = Literal["status_changed", "value_changed", "new", "disappeared"]
+
+
+@r.get("/batches/{batch_id}/diff")
+def get_batch_diff(
+    batch_id: int,
+    db: Session = Depends(get_db),
+    user=Depends(require_roles("admin", "supervisor"))
+):
+    """Resumo da comparação do lote com o lote anterior da mesma entidade."""
+    return _diff_out(_get_diff(db, batch_id))
+
+
+@r.post("/batches/{batch_id}/diff")
+def rebuild_batch_diff(
+    batch_id: int,
+    db: Session = Depends(get_db),
+    user=Depends(require_roles("admin", "supervisor"))
+):
+    """Recalcula o diff do lote (ex.: lote anterior importado depois)."""
+    batch = db.query(ImportBatch).filter(ImportBatch.id == batch_id).first()
+    if not batch:
+        raise HTTPException(404, "Lote não encontrado")
+    return _diff_out(build_diff(db, batch))
+
+
+@r.get("/batches/{batch_id}/diff/items")
+def list_batch_diff_items(
+    batch_id: int,
+    kind: Optional[DiffKind] = None,
+    priority: Optional[bool] = None,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+    user=Depends(require_roles("admin", "supervisor"))
+):
+    """Financiamentos que mudaram no lote, paginados (filtro por tipo e prioridade)."""
+    diff = _get_diff(db, batch_id)
+    query = _diff_items_query(db, diff.id, kind, priority)
+    total = query.count()
+    items = query.order_by(PayrollDiffItem.id).offset((page - 1) * page_size).limit(page_size).all()
+    return {
+        "items": [_diff_item_out(item) for item in items],
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+    }
+
+
+@r.get("/batches/{batch_id}/diff/export")
+def export_batch_diff_csv(
+    batch_id: int,
+    kind: Optional[DiffKind] = None,
+    priority: Optional[bool] = None,
+    db: Session = Depends(get_db),
+    user=Depends(require_roles("admin", "supervisor"))
+):
+    """Exporta os itens do diff do lote para CSV (mesmos filtros da listagem)."""
+    from fastapi.responses import StreamingResponse
+
+    diff = _get_diff(db, batch_id)
+    fields = [
+        "kind", "cpf", "matricula", "financiamento_code", "old_status",
+        "new_status", "old_value", "new_value", "priority",
+    ]
+
+    def rows():
+        # Sessão própria: a de Depends já foi fechada quando o corpo é enviado
+        with SessionLocal() as stream_db:
+            output = io.StringIO()
+            writer = csv.DictWriter(output, fieldnames=fields)
+            output.write('\ufeff')
+            writer.writeheader()
+            query = _diff_items_query(stream_db, diff.id, kind, priority).order_by(PayrollDiffItem.id)
+            for n, item in enumerate(query.yield_per(2000), 1):
+                writer.writerow(_diff_item_out(item))
+                if n % 2000 == 0:
+                    yield output.getvalue().encode("utf-8")
+                    output.seek(0)
+                    output.truncate()
+            yield output.getvalue().encode("utf-8")
+
+    filename = f"diff_{diff.entity_code}_{diff.ref_year}{diff.ref_month:02d}.csv"
+    return StreamingResponse(
+        rows(),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": content_disposition(filename)}
+    )
@@ -0,0 +1,27 @@
+import hmac
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import Response
+
+from ..config import settings
+from ..services.metrics import render_metrics
+
+r = APIRouter(tags=["metrics"])
+
+
+@r.get("/metrics", include_in_schema=False)
+def metrics(authorization: str | None = Header(default=None)):
+    """
+    Métricas no formato Prometheus.
+    Com METRICS_TOKEN definido, exige Authorization: Bearer <token>;
+    sem ele, o endpoint só fica aberto fora de produção.
+    """
+    if settings.metrics_token:
+        expected = f"Bearer {settings.metrics_token}"
+        if not authorization or not hmac.compare_digest(authorization, expected):
+            raise HTTPException(401, "unauthorized")
+    elif settings.env == "production":
+        raise HTTPException(404, "Not Found")
+
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+
+from ..config import settings
+from ..rbac import require_roles
+from ..services import profiler
+from ..services.attachment_download import file_download_response
+
+r = APIRouter(prefix="/admin/profiles", tags=["admin"])
+
+
+def _require_enabled():
+    if not settings.profiling_enabled:
+        raise HTTPException(404, "Not Found")
+
+
+@r.post("", dependencies=[Depends(_require_enabled)])
+def profile_worker(
+    seconds: int = Query(10, ge=1, le=profiler.MAX_SECONDS),
+    user=Depends(require_roles("admin")),
+):
+    """
+    Amostra o worker que atendeu esta chamada por `seconds` segundos.
+    Com vários workers, cada chamada cai em um deles (o pid vai no nome).
+    """
+    path = profiler.profile_worker(seconds)
+    if path is None:
+        raise HTTPException(409, "Já existe um perfil em andamento neste worker")
+    return {"name": path.rsplit("/", 1)[-1]}
+
+
+@r.get("", dependencies=[Depends(_require_enabled)])
+def list_profiles(user=Depends(require_roles("admin"))):
+    return {"items": profiler.list_profiles()}
+
+
+@r.get("/{name}", dependencies=[Depends(_require_enabled)])
+def download_profile(name: str, request: Request, user=Depends(require_roles("admin"))):
+    """Arquivo .collapsed (flamegraph.pl, speedscope, inferno)."""
+    path = profiler.profile_path(name)
+    if path is None:
+        raise HTTPException(404, "Perfil não encontrado")
+    return file_download_response(request, path, name, media_type="text/plain")
@@ -1,16 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import Response
 from sqlalchemy.orm import Session
 from sqlalchemy import func, case, or_, select, distinct
 from ..db import get_db
 from ..rbac import require_roles
 from ..models import User, Case, Contract, Client
+from ..services.ranking_engine import compute_ranking, consultoria_liquida_por_usuario
+from ..services.conditional_get import (
+    resource_etag, etag_matches, etag_headers, not_modified
+)
 from datetime import datetime, timedelta, date
 import io
 import csv
 
 r = APIRouter(prefix="/rankings", tags=["rankings"])
 
+# Tabelas lidas pelo ranking de atendentes (versões usadas no ETag)
+AGENTS_TABLES = ("users", "cases", "contracts", "finance_incomes", "finance_expenses")
+
 
 # Util: parse datas
 # Retorna: (start_date, end_date_exclusive, prev_start, prev_end_exclusive)
@@ -51,126 +58,15 @@ def _calcular_consultoria_liquida_por_usuario(
 
     Retorna dict {user_id: valor_liquido}
     """
-    from ..models import FinanceIncome, FinanceExpense
-
-    # Query de receitas LÍQUIDAS (JÁ deduzidas - não deduzir novamente)
-    receitas_liquidas_q = (
-        db.query(
-            FinanceIncome.agent_user_id,
-            func.coalesce(
-                func.sum(FinanceIncome.amount), 0
-            ).label("receitas_liquidas")
-        )
-        .filter(FinanceIncome.agent_user_id.isnot(None))
-        .filter(FinanceIncome.income_type.in_([
-            "Consultoria Líquida - Atendente",
-            "Consultoria Líquida - Balcão",
-            "Consultoria Líquida"
-        ]))
-    )
-
-    if user_id:
-        receitas_liquidas_q = receitas_liquidas_q.filter(
-            FinanceIncome.agent_user_id == user_id
-        )
-
-    if start_date and end_date:
-        receitas_liquidas_q = receitas_liquidas_q.filter(
-            FinanceIncome.date.between(start_date, end_date)
-        )
-
-    receitas_liquidas_results = receitas_liquidas_q.group_by(
-        FinanceIncome.agent_user_id
-    ).all()
-
-    # Query de receitas BRUTAS (precisam dedução de despesas)
-    receitas_brutas_q = (
-        db.query(
-            FinanceIncome.agent_user_id,
-            func.coalesce(
-                func.sum(FinanceIncome.amount), 0
-            ).label("receitas_brutas")
-        )
-        .filter(FinanceIncome.agent_user_id.isnot(None))
-        .filter(FinanceIncome.income_type.in_([
-            "Consultoria Bruta - Atendente",
-            "Consultoria Bruta - Balcão",
-            "Consultoria - Atendente",
-            "Consultoria - Balcão"
-        ]))
+    return consultoria_liquida_por_usuario(
+        db, start_date, end_date, user_id=user_id
     )
 
-    if user_id:
-        receitas_brutas_q = receitas_brutas_q.filter(
-            FinanceIncome.agent_user_id == user_id
-        )
-
-    if start_date and end_date:
-        receitas_brutas_q = receitas_brutas_q.filter(
-            FinanceIncome.date.between(start_date, end_date)
-        )
-
-    receitas_brutas_results = receitas_brutas_q.group_by(
-        FinanceIncome.agent_user_id
-    ).all()
-
-    # Query de despesas (apenas para receitas brutas)
-    expense_q = (
-        db.query(
-            FinanceExpense.agent_user_id,
-            func.coalesce(
-                func.sum(FinanceExpense.amount), 0
-            ).label("despesas")
-        )
-        .filter(FinanceExpense.agent_user_id.isnot(None))
-        .filter(FinanceExpense.expense_type.in_(["Impostos", "Comissão"]))
-    )
-
-    if user_id:
-        expense_q = expense_q.filter(
-            FinanceExpense.agent_user_id == user_id
-        )
-
-    if start_date and end_date:
-        expense_q = expense_q.filter(
-            FinanceExpense.date.between(start_date, end_date)
-        )
-
-    expense_results = expense_q.group_by(
-        FinanceExpense.agent_user_id
-    ).all()
-
-    # Construir resultado
-    resultado = {}
-
-    # 1. Adicionar receitas LÍQUIDAS (sem dedução)
-    for r in receitas_liquidas_results:
-        resultado[r.agent_user_id] = float(r.receitas_liquidas or 0)
-
-    # 2. Adicionar receitas BRUTAS - deduzir despesas
-    receitas_brutas_map = {
-        r.agent_user_id: float(r.receitas_brutas or 0)
-        for r in receitas_brutas_results
-    }
-    despesas_map = {
-        r.agent_user_id: float(r.despesas or 0)
-        for r in expense_results
-    }
-
-    for user_id_bruta, receita_bruta in receitas_brutas_map.items():
-        despesa = despesas_map.get(user_id_bruta, 0)
-        liquida_bruta = receita_bruta - despesa
-
-        if user_id_bruta in resultado:
-            resultado[user_id_bruta] += liquida_bruta
-        else:
-            resultado[user_id_bruta] = liquida_bruta
-
-    return resultado
-
 
 @r.get("/agents")
 def ranking_agents(
+    request: Request,
+    response: Response,
     from_: str | None = Query(None, alias="from"),
     to: str | None = None,
     page: int = Query(1, ge=1),
@@ -194,104 +90,66 @@ def ranking_agents(
     """
 
     start, end, prev_start, prev_end = _parse_range(from_, to)
+    filtrar_periodo = bool(from_ and to)
 
-    # Buscar TODOS os usuários do sistema (não só atendentes)
-    all_users_q = db.query(User)
-    if agent_id:
-        all_users_q = all_users_q.filter(User.id == agent_id)
-
-    all_users = all_users_q.offset((page-1)*per_page).limit(per_page).all()
-    total_users = all_users_q.count()
-
-    # Estratégia para encontrar o atendente dono do contrato:
-    # 1) se Contract tiver agent_user_id, use;
-    # 2) senão, pegue Case.assigned_user_id (fallback).
-    owner_user_id = case(
-        (Contract.agent_user_id.isnot(None), Contract.agent_user_id),
-        else_=Case.assigned_user_id
-    )
-
-    # Buscar quantidade de contratos para o período atual
-    contracts_q = (
-        db.query(
-            owner_user_id.label("user_id"),
-            func.count(Contract.id).label("qtd")
-        )
-        .join(Case, Case.id == Contract.case_id, isouter=True)
-        .filter(Contract.status == "ativo")
-    )
+    # GET condicional: 304 antes de calcular o ranking, se nada mudou
+    etag = resource_etag(db, request, AGENTS_TABLES)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers.update(etag_headers(etag))
 
-    # Aplicar filtro de data usando signed_at como principal
-    if from_ and to:
-        contracts_q = contracts_q.filter(
-            func.coalesce(
-                Contract.signed_at, Contract.disbursed_at, Contract.created_at
-            ).between(start, end)
-        )
-
-    contracts_data = contracts_q.group_by(owner_user_id).all()
-    contracts_map = {r.user_id: {"qtd": r.qtd} for r in contracts_data}
-
-    # Buscar consultoria líquida por atendente (NOVO: com dedução de despesas)
-    consultoria_liquida_map = _calcular_consultoria_liquida_por_usuario(
+    # Ranking set-based: contratos + consultoria líquida de TODOS os usuários
+    # em uma única query agrupada, já ordenado e paginado no banco
+    current_rows = compute_ranking(
         db,
-        start_date=start if (from_ and to) else None,
-        end_date=end if (from_ and to) else None,
-        user_id=agent_id
+        start if filtrar_periodo else None,
+        end if filtrar_periodo else None,
+        "consultoria_liquida",
+        consultoria_so_com_contratos=True,
+        user_ids=[agent_id] if agent_id else None,
+        limit=per_page,
+        offset=(page - 1) * per_page,
     )
 
-    # Mesclar dados de contratos e consultoria líquida
-    for user_id in contracts_map:
-        contracts_map[user_id]["consult_sum"] = consultoria_liquida_map.get(user_id, 0)
+    if current_rows:
+        total_users = current_rows[0].total
+    else:
+        total_users_q = db.query(func.count(User.id))
+        if agent_id:
+            total_users_q = total_users_q.filter(User.id == agent_id)
+        total_users = total_users_q.scalar() or 0
 
-    # Período anterior para trend - quantidade de contratos
-    prev_q = (
-        db.query(
-            owner_user_id.label("user_id"),
-            func.count(Contract.id).label("qtd")
-        )
-        .join(Case, Case.id == Contract.case_id, isouter=True)
-        .filter(Contract.status == "ativo")
-        .group_by(owner_user_id)
-    )
-    if from_ and to:
-        prev_q = prev_q.filter(
-            func.coalesce(
-                Contract.signed_at, Contract.disbursed_at, Contract.created_at
-            ).between(prev_start, prev_end)
-        )
-    prev = prev_q.all()
-    prev_map = {r.user_id: {"qtd": r.qtd} for r in prev}
+    page_user_ids = [row.user_id for row in current_rows]
 
-    # Buscar consultoria líquida do período anterior (NOVO: com dedução de despesas)
-    prev_consultoria_map = _calcular_consultoria_liquida_por_usuario(
+    # Período anterior para trend - mesma query, apenas para a página atual
+    prev_rows = compute_ranking(
         db,
-        start_date=prev_start if (from_ and to) else None,
-        end_date=prev_end if (from_ and to) else None,
-        user_id=agent_id
-    )
-
-    # Mesclar dados de contratos e consultoria líquida do período anterior
-    for user_id in prev_map:
-        prev_map[user_id]["consult_sum"] = prev_consultoria_map.get(user_id, 0)
+        prev_start if filtrar_periodo else None,
+        prev_end if filtrar_periodo else None,
+        "consultoria_liquida",
+        consultoria_so_com_contratos=True,
+        user_ids=page_user_ids,
+    ) if page_user_ids else []
+    prev_map = {
+        row.user_id: {"qtd": row.contratos, "consult_sum": row.consultoria_liquida}
+        for row in prev_rows
+    }
 
     # buscar metas (se existir campo User.settings)
     targets_map = {}
-    for u in all_users:
-        if hasattr(u, "settings") and isinstance(u.settings, dict):
-            targets = u.settings.get("targets", {})
-            targets_map[u.id] = {
-                "contratos": int(targets.get("contracts", 0) or 0),
-                "consultoria": float(targets.get("consultoria", 15000.0) or 15000.0)
-            }
-        else:
-            targets_map[u.id] = {"contratos": 0, "consultoria": 15000.0}
+    if page_user_ids and hasattr(User, "settings"):
+        for u in db.query(User).filter(User.id.in_(page_user_ids)).all():
+            if isinstance(u.settings, dict):
+                targets = u.settings.get("targets", {})
+                targets_map[u.id] = {
+                    "contratos": int(targets.get("contracts", 0) or 0),
+                    "consultoria": float(targets.get("consultoria", 15000.0) or 15000.0)
+                }
 
     items = []
-    for user in all_users:
-        # Dados do período atual (pode ser 0 se não tiver contratos)
-        current_data = contracts_map.get(user.id, {"qtd": 0, "consult_sum": 0})
-        prev_data = prev_map.get(user.id, {"qtd": 0, "consult_sum": 0})
+    for row in current_rows:
+        current_data = {"qtd": row.contratos, "consult_sum": row.consultoria_liquida}
+        prev_data = prev_map.get(row.user_id, {"qtd": 0, "consult_sum": 0})
 
         # trend
         trend_contracts = 0
@@ -307,15 +165,11 @@ def ranking_agents(
             ) * 100
 
         # ticket médio
-        ticket_medio = (
-            current_data["consult_sum"] / current_data["qtd"]
-            if current_data["qtd"] > 0
-            else 0
-        )
+        ticket_medio = row.ticket_medio_consultoria
 
         # metas (buscar do settings ou usar padrão)
-        meta_contratos = targets_map.get(user.id, {}).get("contratos", 0)
-        meta_consultoria = targets_map.get(user.id, {}).get(
+        meta_contratos = targets_map.get(row.user_id, {}).get("contratos", 0)
+        meta_consultoria = targets_map.get(row.user_id, {}).get(
             "consultoria", 15000.0
         )
 
@@ -332,8 +186,8 @@ def ranking_agents(
         )
 
         items.append({
-            "user_id": user.id,
-            "name": user.name,
+            "user_id": row.user_id,
+            "name": row.name,
             "contracts": current_data["qtd"],
             "consultoria_liq": current_data["consult_sum"],
             "ticket_medio": ticket_medio,
@@ -345,9 +199,7 @@ def ranking_agents(
             "atingimento_consultoria": round(atingimento_consultoria, 2)
         })
 
-    # Ordenar por consultoria líquida (maior primeiro)
-    items.sort(key=lambda x: x["consultoria_liq"], reverse=True)
-
+    # Já ordenado por consultoria líquida (maior primeiro) via window function
     return {
         "items": items,
         "pagination": {
@@ -760,81 +612,29 @@ def get_podium(
     Apenas contratos com status="ativo" são considerados.
     """
     start, end, prev_start, prev_end = _parse_range(from_, to)
+    filtrar_periodo = bool(from_ and to)
 
-    # Estratégia para encontrar o atendente dono do contrato
-    owner_user_id = case(
-        (Contract.agent_user_id.isnot(None), Contract.agent_user_id),
-        else_=Case.assigned_user_id
-    )
-
-    # Query para contar contratos por atendente
-    contracts_query = (
-        db.query(
-            owner_user_id.label("user_id"),
-            func.count(Contract.id).label("contracts")
-        )
-        .join(Case, Case.id == Contract.case_id, isouter=True)
-        .join(User, User.id == owner_user_id)
-        .filter(Contract.status == "ativo")
-        .filter(User.role == "atendente")
-    )  # Filtrar apenas atendentes ANTES do limit
-
-    if from_ and to:
-        contracts_query = contracts_query.filter(
-            func.coalesce(
-                Contract.signed_at, Contract.disbursed_at, Contract.created_at
-            ).between(start, end)
-        )
-
-    contracts_data = contracts_query.group_by(owner_user_id).all()
-
-    # Buscar consultoria líquida por atendente (NOVO: com dedução de despesas)
-    consultoria_liquida_map = _calcular_consultoria_liquida_por_usuario(
+    # Top 3 atendentes com contratos ou receitas no período, direto do banco
+    top_rows = compute_ranking(
         db,
-        start_date=start if (from_ and to) else None,
-        end_date=end if (from_ and to) else None
+        start if filtrar_periodo else None,
+        end if filtrar_periodo else None,
+        "consultoria_liquida",
+        roles=["atendente"],
+        only_with_activity=True,
+        limit=3,
     )
 
-    # Criar mapa mesclando contratos e consultoria líquida
-    podium_map = {}
-    for r in contracts_data:
-        podium_map[r.user_id] = {"contracts": int(r.contracts or 0), "consultoria_liq": 0}
-
-    # Adicionar consultoria líquida para usuários com contratos
-    for user_id in podium_map:
-        podium_map[user_id]["consultoria_liq"] = consultoria_liquida_map.get(user_id, 0)
-
-    # Adicionar consultoria líquida para usuários SEM contratos (mas com receitas)
-    for user_id, consultoria_liq in consultoria_liquida_map.items():
-        if user_id not in podium_map:
-            # Verificar se é atendente
-            user_obj = db.get(User, user_id)
-            if user_obj and user_obj.role == "atendente":
-                podium_map[user_id] = {"contracts": 0, "consultoria_liq": consultoria_liq}
-
-    # Ordenar por consultoria líquida
-    sorted_users = sorted(
-        podium_map.items(),
-        key=lambda x: x[1]["consultoria_liq"],
-        reverse=True
-    )
-
-    # Formatar Top 3 - garantir que sempre tenha 3 posições quando houver dados suficientes
-    podium = []
-    position = 1
-    for user_id, data in sorted_users:
-        if position > 3:  # Limitar a 3 posições
-            break
-        user_obj = db.get(User, user_id)
-        if user_obj and user_obj.role == "atendente":  # Filtrar apenas atendentes
-            podium.append({
-                "position": position,
-                "user_id": user_id,
-                "name": user_obj.name,
-                "contracts": data["contracts"],
-                "consultoria_liq": data["consultoria_liq"]
-            })
-            position += 1
+    podium = [
+        {
+            "position": row.posicao,
+            "user_id": row.user_id,
+            "name": row.name,
+            "contracts": row.contratos,
+            "consultoria_liq": row.consultoria_liquida
+        }
+        for row in top_rows
+    ]
 
     return {
         "period": {"from": str(start), "to": str(end)},
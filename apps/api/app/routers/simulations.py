@@ -3,18 +3,25 @@ from pydantic import BaseModel
 from ..rbac import require_roles
 from ..db import SessionLocal
 from ..models import Case, Client, Simulation, CaseEvent, now_brt
-from ..events import eventbus
+from ..services import outbox
 from ..constants import enrich_banks_with_names
 from ..services.simulation_service import (
     SimulationInput,
     compute_simulation_totals,
     validate_simulation_input
 )
+from ..services.simulation_batch import (
+    SimulationBatchInput,
+    compute_simulation_batch,
+    validate_simulation_batch_input
+)
 from decimal import Decimal
 from sqlalchemy import func
 from datetime import datetime
+import logging
 
 r = APIRouter(prefix="/simulations", tags=["simulations"])
+logger = logging.getLogger(__name__)
 
 
 class SimCreate(BaseModel):
@@ -22,7 +29,7 @@ class SimCreate(BaseModel):
 
 
 @r.post("")
-async def create_sim(
+def create_sim(
     data: SimCreate,
     user=Depends(require_roles(
         "admin", "supervisor", "calculista", "atendente"
@@ -43,12 +50,12 @@ async def create_sim(
             payload={"case_id": c.id},
             created_by=user.id
         ))
+        outbox.publish(
+            db, "case.updated",
+            {"case_id": c.id, "status": "calculista_pendente"}
+        )
         db.commit()
         db.refresh(sim)
-    await eventbus.broadcast(
-        "case.updated",
-        {"case_id": c.id, "status": "calculista_pendente"}
-    )
     return {"id": sim.id, "status": sim.status}
 
 
@@ -175,8 +182,8 @@ def list_pending(
             })
 
         count = len(items)
-        print(
-            f"[DEBUG] Found {count} simulations with status={status}, "
+        logger.debug(
+            f"Found {count} simulations with status={status}, "
             f"include_completed_today={include_completed_today}, date={date}"
         )
         return {
@@ -270,13 +277,35 @@ def list_retorno_fechamento(
         return {"items": items, "count": len(items)}
 
 
+@r.post("/batch")
+def simulate_batch(
+    data: SimulationBatchInput,
+    user=Depends(require_roles("calculista", "supervisor", "admin"))
+):
+    """
+    Avalia uma grade de cenários (coeficientes × percentuais × seguros)
+    sobre o mesmo conjunto de bancos e retorna os melhores por liberadoCliente.
+    Não persiste nada: serve para comparação antes de salvar a simulação.
+    """
+    errors = validate_simulation_batch_input(data)
+    if errors:
+        raise HTTPException(
+            400, {"detail": "Dados inválidos", "errors": errors}
+        )
+
+    try:
+        return compute_simulation_batch(data)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
 class SimSave(BaseModel):
     manual_input: dict
     results: dict
 
 
 @r.post("/{case_id}")
-async def create_or_update_simulation(
+def create_or_update_simulation(
     case_id: int,
     data: SimulationInput,
     user=Depends(require_roles("calculista", "supervisor", "admin"))
@@ -406,7 +435,7 @@ async def create_or_update_simulation(
 
 
 @r.post("/{sim_id}/approve")
-async def approve(
+def approve(
     sim_id: int,
     user=Depends(require_roles("calculista", "admin", "supervisor"))
 ):
@@ -495,19 +524,15 @@ async def approve(
                 created_by=user.id
             ))
 
-        db.commit()
-
-    # Obter status final do caso após aprovação
-    with SessionLocal() as db:
-        case = db.get(Case, sim.case_id)
         final_status = case.status
+        outbox.publish(
+            db, "simulation.updated", {"simulation_id": sim_id, "status": "approved"}
+        )
+        outbox.publish(
+            db, "case.updated", {"case_id": sim.case_id, "status": final_status}
+        )
+        db.commit()
 
-    await eventbus.broadcast(
-        "simulation.updated", {"simulation_id": sim_id, "status": "approved"}
-    )
-    await eventbus.broadcast(
-        "case.updated", {"case_id": sim.case_id, "status": final_status}
-    )
     return {"ok": True, "case_status": final_status}
 
 
@@ -516,7 +541,7 @@ class RejectInput(BaseModel):
 
 
 @r.post("/{sim_id}/reject")
-async def reject(
+def reject(
     sim_id: int,
     data: RejectInput,
     user=Depends(require_roles("calculista", "admin", "supervisor"))
@@ -581,14 +606,14 @@ async def reject(
             created_by=user.id
         ))
 
+        outbox.publish(
+            db, "simulation.updated", {"simulation_id": sim_id, "status": "rejected"}
+        )
+        outbox.publish(
+            db, "case.updated", {"case_id": sim.case_id, "status": "calculo_rejeitado"}
+        )
         db.commit()
 
-    await eventbus.broadcast(
-        "simulation.updated", {"simulation_id": sim_id, "status": "rejected"}
-    )
-    await eventbus.broadcast(
-        "case.updated", {"case_id": sim.case_id, "status": "calculo_rejeitado"}
-    )
     return {"ok": True}
 
 
@@ -696,7 +721,7 @@ def get_simulation_history(
 
 
 @r.post("/{sim_id}/reopen")
-async def reopen_simulation(
+def reopen_simulation(
     sim_id: int,
     user=Depends(require_roles("calculista", "admin", "supervisor"))
 ):
@@ -737,22 +762,21 @@ async def reopen_simulation(
             created_by=user.id
         ))
 
+        outbox.publish(
+            db, "simulation.updated",
+            {"simulation_id": sim_id, "status": "draft"}
+        )
+        outbox.publish(
+            db, "case.updated",
+            {"case_id": sim.case_id, "status": "calculista_pendente"}
+        )
         db.commit()
 
-    await eventbus.broadcast(
-        "simulation.updated",
-        {"simulation_id": sim_id, "status": "draft"}
-    )
-    await eventbus.broadcast(
-        "case.updated",
-        {"case_id": sim.case_id, "status": "calculista_pendente"}
-    )
-
     return {"ok": True, "message": "Simulação reaberta para edição"}
 
 
 @r.post("/{sim_id}/set-as-final")
-async def set_simulation_as_final(
+def set_simulation_as_final(
     sim_id: int,
     user=Depends(require_roles("calculista", "admin", "supervisor"))
 ):
@@ -793,17 +817,16 @@ async def set_simulation_as_final(
             created_by=user.id
         ))
 
+        outbox.publish(
+            db, "simulation.updated",
+            {"simulation_id": sim_id, "is_final": True}
+        )
+        outbox.publish(
+            db, "case.updated",
+            {"case_id": sim.case_id, "last_simulation_id": sim_id}
+        )
         db.commit()
 
-    await eventbus.broadcast(
-        "simulation.updated",
-        {"simulation_id": sim_id, "is_final": True}
-    )
-    await eventbus.broadcast(
-        "case.updated",
-        {"case_id": sim.case_id, "last_simulation_id": sim_id}
-    )
-
     return {
         "ok": True,
         "message": "Simulação definida como final",
@@ -812,7 +835,7 @@ async def set_simulation_as_final(
 
 
 @r.post("/{case_id}/send-to-finance")
-async def send_to_finance(
+def send_to_finance(
     case_id: int,
     user=Depends(require_roles("calculista", "admin", "supervisor"))
 ):
@@ -852,12 +875,11 @@ async def send_to_finance(
             created_by=user.id
         ))
 
+        outbox.publish(
+            db, "case.updated", {"case_id": case_id, "status": "financeiro_pendente"}
+        )
         db.commit()
 
-    await eventbus.broadcast(
-        "case.updated", {"case_id": case_id, "status": "financeiro_pendente"}
-    )
-
     return {"ok": True, "message": "Caso enviado para financeiro"}
 
 
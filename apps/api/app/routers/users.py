@@ -269,55 +269,38 @@ def users_performance(
 ):
     """Dados de performance dos usuários (contratos efetivados e produção)"""
     with SessionLocal() as db:
-        from ..models import Case, Contract
+        from ..models import Case
+        from ..services.ranking_engine import compute_ranking
         from sqlalchemy import func  # pyright: ignore[reportMissingImports]
         from datetime import datetime, timedelta
 
         # Buscar dados dos últimos 30 dias
         thirty_days_ago = datetime.utcnow() - timedelta(days=30)
 
-        # Buscar todos os usuários ativos
-        users = db.query(User).filter(User.active).all()
-        performance_data = []
-
-        for user in users:
-            # Contratos efetivados pelo usuário
-            contratos_efetivados = db.query(func.count(Case.id)).filter(
-                Case.assigned_user_id == user.id,
+        # Contratos efetivados por usuário (uma query agrupada)
+        efetivados_map = dict(
+            db.query(Case.assigned_user_id, func.count(Case.id))
+            .filter(
+                Case.assigned_user_id.isnot(None),
                 Case.status == "contrato_efetivado",
                 Case.last_update_at >= thirty_days_ago
-            ).scalar() or 0
-
-            # Produção total (consultoria líquida) do usuário
-            # NOVO: Calcula receitas - despesas (Impostos + Comissão)
-            from ..models import FinanceIncome, FinanceExpense
-            from sqlalchemy import func
-
-            # Receitas do usuário
-            receitas = db.query(
-                func.coalesce(func.sum(FinanceIncome.amount), 0)
-            ).filter(
-                FinanceIncome.agent_user_id == user.id,
-                FinanceIncome.date >= thirty_days_ago
-            ).scalar() or 0
-
-            # Despesas do usuário (Impostos + Comissão)
-            despesas = db.query(
-                func.coalesce(func.sum(FinanceExpense.amount), 0)
-            ).filter(
-                FinanceExpense.agent_user_id == user.id,
-                FinanceExpense.expense_type.in_(["Impostos", "Comissão"]),
-                FinanceExpense.date >= thirty_days_ago
-            ).scalar() or 0
-
-            # Produção líquida = receitas - despesas
-            producao_total = float(receitas) - float(despesas)
-
-            performance_data.append({
-                "user_id": user.id,
-                "contratos_efetivados": int(contratos_efetivados),
-                "producao_total": float(producao_total)
-            })
+            )
+            .group_by(Case.assigned_user_id)
+            .all()
+        )
+
+        # Produção líquida = receitas - despesas (Impostos + Comissão),
+        # calculada pelo motor de ranking para todos os usuários ativos
+        rows = compute_ranking(db, thirty_days_ago, None, only_active=True)
+
+        performance_data = [
+            {
+                "user_id": row.user_id,
+                "contratos_efetivados": int(efetivados_map.get(row.user_id, 0)),
+                "producao_total": float(row.receitas_total - row.despesas)
+            }
+            for row in rows
+        ]
 
         return {"performance": performance_data}
 
@@ -3,9 +3,65 @@ from ..events import eventbus
 # (unused import removed)
 import jwt
 from ..config import settings
+from ..db import SessionLocal, run_db
+from ..services import outbox
+import asyncio
 import json
+import logging
 
 ws_router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Tempo máximo segurando os eventos ao vivo à espera do primeiro "resume"
+# (clientes antigos não mandam); depois disso o fluxo ao vivo é liberado
+RESUME_WAIT_SECONDS = 5.0
+
+def _load_user(user_id: int):
+    from ..models import User
+    with SessionLocal() as db:
+        return db.get(User, user_id)
+
+
+def _load_replay(after_seq: int, upto_seq: int):
+    with SessionLocal() as db:
+        events = outbox.load_replay(db, after_seq, upto_seq)
+        if events is None:
+            return None
+        return [
+            json.dumps({"event": e.event, "payload": e.payload, "seq": e.seq})
+            for e in events
+        ]
+
+
+async def resume_events(ws: WebSocket, after_seq) -> None:
+    """
+    Reenvia os eventos perdidos desde after_seq (mensagem "resume").
+
+    Os eventos ao vivo ficam segurados enquanto o replay sai, para o
+    cliente recebê-los em ordem de seq. Se o intervalo não está mais
+    retido no outbox, envia "resync": o cliente deve recarregar tudo.
+    """
+    upto = outbox.relay_cursor()
+    eventbus.hold(ws)
+    try:
+        replay = None
+        if upto is not None and isinstance(after_seq, int):
+            replay = await run_db(_load_replay, after_seq, upto)
+        if replay is None:
+            await ws.send_json({
+                "type": "resync",
+                "data": {"reason": "too_old", "seq": upto}
+            })
+            return
+        for data in replay:
+            await ws.send_text(data)
+        await ws.send_json({
+            "type": "resumed",
+            "data": {"after": after_seq, "seq": max(upto, after_seq), "count": len(replay)}
+        })
+    finally:
+        await eventbus.release(ws, replayed_upto=upto)
+
 
 async def authenticate_websocket(websocket: WebSocket):
     """Autentica usuário via cookie access no header"""
@@ -30,14 +86,11 @@ async def authenticate_websocket(websocket: WebSocket):
         data = jwt.decode(token, settings.jwt_secret, algorithms=["HS256"])
         user_id = int(data["sub"])
 
-        # Busca usuário no banco
-        from ..db import SessionLocal
-        from ..models import User
-        with SessionLocal() as db:
-            user = db.get(User, user_id)
-            if not user or not user.active:
-                await websocket.close(code=1008, reason="Invalid user")
-                return None
+        # Busca usuário no banco (fora do event loop)
+        user = await run_db(_load_user, user_id)
+        if not user or not user.active:
+            await websocket.close(code=1008, reason="Invalid user")
+            return None
         return user
     except Exception:
         await websocket.close(code=1008, reason="Invalid token")
@@ -52,21 +105,43 @@ async def ws_events(ws: WebSocket):
 
     await ws.accept()
 
+    # Segura os eventos ao vivo desde já: os que chegarem entre o hello e
+    # o "resume" do cliente são entregues depois do replay, e não antes
+    # (o cliente descartaria o replay por seq <= lastSeq)
+    awaiting_resume = outbox.relay_cursor() is not None
+    if awaiting_resume:
+        eventbus.hold(ws)
     await eventbus.connect(ws)
     try:
         await ws.send_json({
             "type": "hello",
-            "data": {"ok": True, "user": user.name}
+            "data": {"ok": True, "user": user.name, "seq": outbox.relay_cursor()}
         })
 
         while True:
             try:
-                message = await ws.receive_text()
+                if awaiting_resume:
+                    try:
+                        message = await asyncio.wait_for(ws.receive_text(), RESUME_WAIT_SECONDS)
+                    except asyncio.TimeoutError:
+                        awaiting_resume = False
+                        await eventbus.release(ws)
+                        continue
+                else:
+                    message = await ws.receive_text()
                 data = json.loads(message)
 
+                if awaiting_resume:
+                    awaiting_resume = False
+                    if data.get("type") != "resume":
+                        await eventbus.release(ws)
+
                 # Responde ao ping com pong
                 if data.get("type") == "ping":
                     await ws.send_json({"type": "pong"})
+                # Reconexão: {"type": "resume", "after": <último seq recebido>}
+                elif data.get("type") == "resume":
+                    await resume_events(ws, data.get("after"))
 
             except json.JSONDecodeError:
                 await ws.send_json({
@@ -76,6 +151,6 @@ async def ws_events(ws: WebSocket):
     except WebSocketDisconnect:
         pass
     except Exception as e:
-        print(f"WebSocket error: {e}")
+        logger.warning(f"WebSocket error: {e}")
     finally:
         await eventbus.disconnect(ws)
@@ -46,6 +46,44 @@ def process_expired_cases_job():
         db.close()
 
 
+def purge_case_tombstones_job():
+    """Remove tombstones de casos além da retenção do delta (/cases/changes)."""
+    from .services.case_changes import purge_tombstones
+    from .db import SessionLocal
+
+    try:
+        with SessionLocal() as db:
+            deleted = purge_tombstones(db)
+        logger.info(f"Tombstones de casos removidos: {deleted}")
+    except Exception as e:
+        logger.error(f"Erro ao limpar tombstones de casos: {str(e)}")
+
+
+def rebuild_campaign_leaderboards_job():
+    """Monta o leaderboard das campanhas ativas (inclui as que entraram no período hoje)."""
+    from .services.campaign_leaderboard import rebuild_active_leaderboards
+    from .db import SessionLocal
+
+    try:
+        with SessionLocal() as db:
+            total = rebuild_active_leaderboards(db)
+        logger.info(f"Leaderboards de campanhas reconstruídos: {total}")
+    except Exception as e:
+        logger.error(f"Erro ao reconstruir leaderboards de campanhas: {str(e)}")
+
+
+def archive_payroll_references_job():
+    """Exporta para Parquet e remove do banco as referências de folha além do horizonte."""
+    from .config import settings
+    from .services.payroll_archive import archive_old_references
+
+    try:
+        stats = archive_old_references(settings.payroll_archive_months)
+        logger.info(f"Arquivo de referências de folha: {stats}")
+    except Exception as e:
+        logger.error(f"Erro ao arquivar referências de folha: {str(e)}")
+
+
 def init_scheduler():
     """
     Inicializa o scheduler com a configuração de execução diária às 18h BRT.
@@ -72,6 +110,40 @@ def init_scheduler():
 
     logger.info("✅ Scheduler de SLA configurado: execução diária às 18h BRT")
 
+    scheduler.add_job(
+        purge_case_tombstones_job,
+        trigger=CronTrigger(hour=3, minute=0, timezone=brasilia_tz),
+        id='case_tombstones_purge',
+        name='Limpeza diária de tombstones de casos',
+        replace_existing=True,
+        misfire_grace_time=3600
+    )
+
+    scheduler.add_job(
+        rebuild_campaign_leaderboards_job,
+        trigger=CronTrigger(hour=0, minute=5, timezone=brasilia_tz),
+        id='campaign_leaderboards_rebuild',
+        name='Reconstrução diária dos leaderboards de campanhas ativas',
+        replace_existing=True,
+        misfire_grace_time=3600
+    )
+
+    from .config import settings
+    from .services.payroll_archive import available as archive_available
+
+    if settings.payroll_archive_months > 0:
+        if archive_available():
+            scheduler.add_job(
+                archive_payroll_references_job,
+                trigger=CronTrigger(day=1, hour=4, minute=0, timezone=brasilia_tz),
+                id='payroll_archive_monthly',
+                name='Arquivo mensal de referências de folha antigas',
+                replace_existing=True,
+                misfire_grace_time=3600
+            )
+        else:
+            logger.warning("PAYROLL_ARCHIVE_MONTHS definido, mas pyarrow não está instalado")
+
     # Iniciar o scheduler
     scheduler.start()
     logger.info("✅ Scheduler de SLA iniciado com sucesso")
@@ -0,0 +1,306 @@
+"""
+Download de anexos com cache HTTP, Range e offload para o nginx.
+
+Depois que a rota autoriza o acesso e localiza o arquivo, file_download_response:
+
+- responde 304 quando If-None-Match / If-Modified-Since batem (o ETag é
+  forte e igual ao SHA-256 do blob, então o mesmo comprovante aberto de
+  novo não trafega);
+- com X_ACCEL_REDIRECT_PREFIX configurado, devolve só os cabeçalhos e um
+  X-Accel-Redirect para o nginx servir o arquivo (sendfile, Range nativo);
+- sem nginx, transmite o arquivo em blocos com suporte a Range (206/416).
+
+zip_download_response monta um ZIP com vários anexos em streaming.
+"""
+import logging
+import os
+import re
+import time
+import unicodedata
+import zipfile
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+
+from ..config import settings
+from .attachment_store import get_attachment_store
+from .conditional_get import CACHE_CONTROL, etag_matches
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 256 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+# Fora do ASCII imprimível, aspas e barra invertida quebram filename="..."
+_UNSAFE_FILENAME_RE = re.compile(r'[^\x20-\x7e]|["\\]')
+
+
+def content_disposition(filename: str, disposition: str = "attachment") -> str:
+    """
+    Content-Disposition com o nome em ASCII (filename=) e, se o nome tiver
+    outros caracteres, o original em UTF-8 (filename*=, RFC 5987/6266).
+    """
+    ascii_name = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode("ascii")
+    ascii_name = _UNSAFE_FILENAME_RE.sub("_", ascii_name).strip() or "download"
+    header = f'{disposition}; filename="{ascii_name}"'
+    if ascii_name != filename:
+        header += f"; filename*=utf-8''{quote(filename, safe='')}"
+    return header
+
+
+def file_download_response(
+    request: Request,
+    path: str,
+    filename: str,
+    media_type: Optional[str] = None,
+) -> Response:
+    """Resposta de download para um arquivo já autorizado."""
+    try:
+        stat = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise HTTPException(404, "Arquivo não encontrado no servidor")
+
+    media_type = media_type or "application/octet-stream"
+    etag = _etag(path, stat)
+    cache_headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": CACHE_CONTROL,
+    }
+
+    if _not_modified(request, etag, stat.st_mtime):
+        return Response(status_code=304, headers=cache_headers)
+
+    headers = {
+        **cache_headers,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": content_disposition(filename),
+    }
+
+    accel_location = _x_accel_location(path)
+    if accel_location:
+        headers["X-Accel-Redirect"] = accel_location
+        return Response(headers=headers, media_type=media_type)
+
+    size = stat.st_size
+    range_header = request.headers.get("range")
+    if range_header and _if_range_matches(request, etag):
+        byte_range = _parse_range(range_header, size)
+        if byte_range is None:
+            return Response(
+                status_code=416,
+                headers={**cache_headers, "Content-Range": f"bytes */{size}"},
+            )
+        if byte_range != (0, size - 1):
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            return StreamingResponse(
+                _iter_file(path, start, end - start + 1),
+                status_code=206,
+                headers=headers,
+                media_type=media_type,
+            )
+
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(_iter_file(path, 0, size), headers=headers, media_type=media_type)
+
+
+def _etag(path: str, stat: os.stat_result) -> str:
+    """ETag forte = SHA-256 do blob; fraco (tamanho/mtime) para arquivos legados."""
+    sha256 = get_attachment_store().backend.sha256_from_path(path)
+    if sha256:
+        return f'"{sha256}"'
+    return f'W/"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if request.headers.get("if-none-match"):
+        return etag_matches(request, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= since.timestamp()
+    return False
+
+
+def _if_range_matches(request: Request, etag: str) -> bool:
+    """If-Range: só atende o Range se o ETag (forte) ainda for o mesmo."""
+    if_range = request.headers.get("if-range")
+    if not if_range:
+        return True
+    return not etag.startswith("W/") and if_range.strip() == etag
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpreta um único intervalo "bytes=a-b", "bytes=a-" ou "bytes=-n".
+    Retorna None se não for satisfazível. Múltiplos intervalos são
+    ignorados (arquivo inteiro), como permitido pela RFC 9110.
+    """
+    if "," in header:
+        return (0, size - 1)
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return (0, size - 1)
+
+    first, last = match.groups()
+    if not first and not last:
+        return (0, size - 1)
+    if not first:
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            return None
+        return (max(size - suffix, 0), size - 1)
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return None
+    return (start, min(end, size - 1))
+
+
+def _iter_file(path: str, start: int, length: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _x_accel_location(path: str) -> Optional[str]:
+    """URI interna do nginx para o arquivo, se o offload estiver ativo."""
+    prefix = settings.x_accel_redirect_prefix
+    if not prefix:
+        return None
+    root = os.path.abspath(settings.upload_dir)
+    real = os.path.abspath(path)
+    if not real.startswith(root + os.sep):
+        return None
+    relative = os.path.relpath(real, root).replace(os.sep, "/")
+    return prefix.rstrip("/") + "/" + quote(relative)
+
+
+# -----------------------------
+# ZIP com todos os anexos
+# -----------------------------
+
+# Conteúdos já comprimidos: gravados sem recompressão (ZIP_STORED)
+_COMPRESSED_MIMES = {
+    "application/pdf", "application/zip", "application/gzip",
+    "application/x-7z-compressed", "application/x-rar-compressed",
+    "image/jpeg", "image/png", "image/gif", "image/webp", "image/heic",
+}
+_COMPRESSED_EXTENSIONS = {
+    ".pdf", ".zip", ".gz", ".7z", ".rar", ".jpg", ".jpeg", ".png", ".gif",
+    ".webp", ".heic", ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".mp3", ".mp4",
+}
+
+
+@dataclass
+class ZipEntry:
+    path: str
+    filename: str
+    mime: Optional[str] = None
+    folder: str = ""
+
+
+class _ZipSink:
+    """Destino de escrita não posicionável: o zipfile usa data descriptors."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _is_compressed(entry: ZipEntry) -> bool:
+    mime = (entry.mime or "").lower()
+    if mime in _COMPRESSED_MIMES or mime.startswith(("video/", "audio/")):
+        return True
+    return os.path.splitext(entry.filename or entry.path)[1].lower() in _COMPRESSED_EXTENSIONS
+
+
+def _unique_name(name: str, used: set) -> str:
+    base, ext = os.path.splitext(name)
+    candidate = name
+    n = 2
+    while candidate.lower() in used:
+        candidate = f"{base} ({n}){ext}"
+        n += 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def _iter_zip(entries: List[ZipEntry]) -> Iterator[bytes]:
+    sink = _ZipSink()
+    used: set = set()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+        for entry in entries:
+            try:
+                stat = os.stat(entry.path)
+            except OSError:
+                logger.warning(f"Anexo ausente no disco, ignorado no ZIP: {entry.path}")
+                continue
+
+            name = entry.filename or os.path.basename(entry.path)
+            name = name.replace("\\", "_").replace("/", "_")
+            if entry.folder:
+                name = f"{entry.folder}/{name}"
+            zinfo = zipfile.ZipInfo(
+                _unique_name(name, used),
+                date_time=time.localtime(stat.st_mtime)[:6],
+            )
+            zinfo.compress_type = zipfile.ZIP_STORED if _is_compressed(entry) else zipfile.ZIP_DEFLATED
+            zinfo.file_size = stat.st_size
+
+            with open(entry.path, "rb") as src, zf.open(zinfo, mode="w", force_zip64=True) as dest:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
+
+
+def zip_download_response(entries: List[ZipEntry], zip_filename: str) -> StreamingResponse:
+    """
+    ZIP montado sob demanda e transmitido à medida que é gerado
+    (sem bufferizar o arquivo inteiro em memória).
+    """
+    return StreamingResponse(
+        _iter_zip(entries),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": content_disposition(zip_filename),
+            "Cache-Control": "private, no-store",
+        },
+    )
@@ -0,0 +1,301 @@
+"""
+Armazenamento de anexos endereçado por conteúdo (SHA-256).
+
+Todos os uploads (casos, contratos, despesas, receitas e receitas externas)
+passam por aqui:
+
+- o arquivo é lido em blocos, com limite de tamanho, e gravado em um
+  arquivo temporário enquanto o hash é calculado;
+- depois do commit da transação que registrou a referência, o temporário
+  é renomeado atomicamente para o caminho do blob (ou descartado, se o
+  mesmo conteúdo já estiver armazenado); se a transação termina sem
+  commit (rollback, ou sessão fechada por exceção) ele é apagado, sem
+  deixar blob órfão;
+- a tabela attachment_blobs mantém a contagem de referências, e o blob só
+  é removido quando nenhum registro aponta mais para ele.
+
+O backend é plugável (register_backend): disco local hoje, um store
+compatível com S3 depois, selecionado por settings.storage_backend.
+"""
+import hashlib
+import inspect
+import logging
+import os
+import re
+import tempfile
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..db import SessionLocal
+from ..models import AttachmentBlob
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024  # 1 MiB
+
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+_PENDING_KEY = "attachment_store_pending"
+_ROLLBACK_KEY = "attachment_store_rollback"
+
+
+class FileTooLargeError(Exception):
+    """Arquivo excede o tamanho máximo permitido para upload."""
+
+
+@dataclass
+class StoredFile:
+    path: str
+    sha256: str
+    size: int
+    deduplicated: bool
+
+
+class StorageBackend(ABC):
+    """Interface dos backends de blobs (chave = SHA-256 do conteúdo)."""
+
+    @abstractmethod
+    def temp_dir(self) -> str:
+        """Diretório local para o arquivo temporário do upload."""
+
+    @abstractmethod
+    def exists(self, sha256: str) -> bool:
+        """O blob já está armazenado."""
+
+    @abstractmethod
+    def path(self, sha256: str) -> str:
+        """Caminho armazenado do blob (conhecido antes de ele ser publicado)."""
+
+    @abstractmethod
+    def put(self, tmp_path: str, sha256: str) -> str:
+        """Move o temporário para o blob e retorna o caminho armazenado."""
+
+    @abstractmethod
+    def delete(self, sha256: str) -> None:
+        """Apaga o blob (sem erro se ele não existe)."""
+
+    @abstractmethod
+    def sha256_from_path(self, path: str) -> Optional[str]:
+        """SHA-256 de um caminho gerado por este backend (None se legado)."""
+
+
+class LocalDiskBackend(StorageBackend):
+    """Blobs em <upload_dir>/blobs/ab/cd/<sha256>."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.blob_root = os.path.join(self.root, "blobs")
+        self.tmp_root = os.path.join(self.root, "tmp")
+
+    def path(self, sha256: str) -> str:
+        return os.path.join(self.blob_root, sha256[:2], sha256[2:4], sha256)
+
+    def temp_dir(self) -> str:
+        # Mesmo sistema de arquivos dos blobs para o rename ser atômico
+        os.makedirs(self.tmp_root, exist_ok=True)
+        return self.tmp_root
+
+    def exists(self, sha256: str) -> bool:
+        return os.path.exists(self.path(sha256))
+
+    def put(self, tmp_path: str, sha256: str) -> str:
+        dest = self.path(sha256)
+        if os.path.exists(dest):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            os.replace(tmp_path, dest)
+        return dest
+
+    def delete(self, sha256: str) -> None:
+        dest = self.path(sha256)
+        if os.path.exists(dest):
+            os.remove(dest)
+
+    def sha256_from_path(self, path: str) -> Optional[str]:
+        if not path:
+            return None
+        path = os.path.abspath(path)
+        name = os.path.basename(path)
+        if path.startswith(self.blob_root + os.sep) and _SHA256_RE.match(name):
+            return name
+        return None
+
+
+_BACKENDS: Dict[str, Callable[[], StorageBackend]] = {
+    "local": lambda: LocalDiskBackend(settings.upload_dir),
+}
+
+
+def register_backend(name: str, factory: Callable[[], StorageBackend]) -> None:
+    """
+    Registra um backend (ex.: "s3") selecionável por STORAGE_BACKEND.
+    factory pode ser a própria classe; classe com método abstrato sem
+    implementação é recusada já aqui.
+    """
+    if inspect.isclass(factory):
+        if not issubclass(factory, StorageBackend):
+            raise TypeError(f"{factory.__name__} não é um StorageBackend")
+        if inspect.isabstract(factory):
+            missing = ", ".join(sorted(factory.__abstractmethods__))
+            raise TypeError(f"Backend {factory.__name__} incompleto: falta {missing}")
+    _BACKENDS[name] = factory
+
+
+class AttachmentStore:
+    def __init__(self, backend: StorageBackend, max_size: int):
+        self.backend = backend
+        self.max_size = max_size
+
+    def save(self, db: Session, fileobj: BinaryIO, max_size: Optional[int] = None) -> StoredFile:
+        """
+        Grava o conteúdo de fileobj e adiciona uma referência ao blob
+        na transação de db. O caminho retornado vai no registro do anexo;
+        o blob só é publicado nele depois do commit de db.
+        """
+        limit = max_size or self.max_size
+        fd, tmp_path = tempfile.mkstemp(dir=self.backend.temp_dir(), suffix=".part")
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while True:
+                    chunk = fileobj.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > limit:
+                        raise FileTooLargeError(
+                            f"Arquivo excede o limite de {limit // (1024 * 1024)} MB"
+                        )
+                    hasher.update(chunk)
+                    out.write(chunk)
+                out.flush()
+                os.fsync(out.fileno())
+
+            sha256 = hasher.hexdigest()
+
+            # A referência trava a linha até o commit, serializando com uma
+            # coleta concorrente do mesmo conteúdo; o blob só é publicado
+            # depois do commit (rollback descarta o temporário).
+            self._acquire(db, sha256, size)
+            deduplicated = self.backend.exists(sha256)
+            path = self.backend.path(sha256)
+        except BaseException:
+            _remove_file(tmp_path)
+            raise
+
+        _after_commit(db, lambda: self.backend.put(tmp_path, sha256))
+        _on_rollback(db, lambda: _remove_file(tmp_path))
+
+        if deduplicated:
+            logger.info(f"Anexo deduplicado: {sha256} ({size} bytes)")
+        return StoredFile(path=path, sha256=sha256, size=size, deduplicated=deduplicated)
+
+    def release(self, db: Session, path: Optional[str]) -> None:
+        """
+        Remove uma referência ao arquivo. O blob é apagado após o commit
+        de db, se não houver mais referências. Arquivos legados (gravados
+        antes do store) são apagados diretamente após o commit.
+        """
+        if not path:
+            return
+        sha256 = self.backend.sha256_from_path(path)
+        if sha256 is None:
+            _after_commit(db, lambda: _remove_file(path))
+            return
+
+        db.query(AttachmentBlob).filter(
+            AttachmentBlob.sha256 == sha256,
+            AttachmentBlob.ref_count > 0
+        ).update(
+            {AttachmentBlob.ref_count: AttachmentBlob.ref_count - 1},
+            synchronize_session=False
+        )
+        _after_commit(db, lambda: self._collect(sha256))
+
+    def _acquire(self, db: Session, sha256: str, size: int) -> None:
+        stmt = pg_insert(AttachmentBlob.__table__).values(
+            sha256=sha256, size=size, ref_count=1
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["sha256"],
+            set_={"ref_count": AttachmentBlob.__table__.c.ref_count + 1},
+        )
+        db.execute(stmt)
+
+    def _collect(self, sha256: str) -> None:
+        """Apaga o blob se a contagem chegou a zero (linha travada)."""
+        with SessionLocal() as db:
+            blob = db.query(AttachmentBlob).filter(
+                AttachmentBlob.sha256 == sha256
+            ).with_for_update().first()
+            if blob is None or blob.ref_count > 0:
+                return
+            self.backend.delete(sha256)
+            db.delete(blob)
+            db.commit()
+            logger.info(f"Blob sem referências removido: {sha256}")
+
+
+def _remove_file(path: str) -> None:
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    except Exception as e:
+        logger.error(f"Erro ao remover arquivo {path}: {e}")
+
+
+def _after_commit(db: Session, action: Callable[[], None]) -> None:
+    db.info.setdefault(_PENDING_KEY, []).append(action)
+
+
+def _on_rollback(db: Session, action: Callable[[], None]) -> None:
+    db.info.setdefault(_ROLLBACK_KEY, []).append(action)
+
+
+def _run_actions(actions) -> None:
+    for action in actions:
+        try:
+            action()
+        except Exception as e:
+            logger.error(f"Erro ao publicar/coletar anexo: {e}")
+
+
+@event.listens_for(Session, "after_commit")
+def _run_pending(session: Session) -> None:
+    session.info.pop(_ROLLBACK_KEY, None)
+    _run_actions(session.info.pop(_PENDING_KEY, []))
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_pending(session: Session, transaction) -> None:
+    # Fim da transação raiz sem commit (after_commit já esvaziou as listas):
+    # rollback explícito ou close() da sessão, inclusive no __exit__ do
+    # "with SessionLocal() as db" quando o bloco levanta exceção
+    if transaction.parent is not None:
+        return
+    session.info.pop(_PENDING_KEY, None)
+    _run_actions(session.info.pop(_ROLLBACK_KEY, []))
+
+
+_store: Optional[AttachmentStore] = None
+
+
+def get_attachment_store() -> AttachmentStore:
+    """Store padrão, com o backend de settings.storage_backend."""
+    global _store
+    if _store is None:
+        factory = _BACKENDS.get(settings.storage_backend)
+        if factory is None:
+            raise RuntimeError(f"Backend de armazenamento desconhecido: {settings.storage_backend}")
+        _store = AttachmentStore(
+            factory(),
+            max_size=settings.max_upload_size_mb * 1024 * 1024,
+        )
+    return _store
@@ -0,0 +1,194 @@
+"""
+Leaderboard materializado de campanhas ativas.
+
+Em vez de recalcular o ranking completo de cada campanha a cada poll,
+mantém a tabela campaign_leaderboard atualizada incrementalmente:
+quando um contrato é efetivado/cancelado/deletado, apenas as linhas dos
+usuários afetados são recalculadas e as posições são reordenadas por
+window function. Mudanças de posição são publicadas pelo outbox
+("campaign.leaderboard_updated"), no mesmo commit do recálculo.
+
+A pontuação das campanhas vem só dos contratos; receitas e despesas não
+mexem no leaderboard. A tabela é montada na criação/edição da campanha e
+pelo job diário (campanhas que entram no período); a leitura nunca grava.
+As linhas são gravadas com INSERT ... ON CONFLICT, então duas montagens
+simultâneas (um job por worker) não esbarram em uq_campaign_leaderboard_user.
+"""
+import logging
+from datetime import date
+from typing import Iterable, List, Dict, Any
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, joinedload
+
+from ..models import Campaign, CampaignLeaderboardEntry, now_brt
+from . import outbox
+from .ranking_engine import compute_campaign_ranking
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_EVENT = "campaign.leaderboard_updated"
+
+
+def active_campaigns(db: Session) -> List[Campaign]:
+    """Campanhas com status 'ativa' cujo período inclui hoje."""
+    hoje = date.today()
+    return db.query(Campaign).filter(
+        Campaign.status == "ativa",
+        Campaign.data_inicio <= hoje,
+        Campaign.data_fim >= hoje
+    ).all()
+
+
+def _row_values(row) -> Dict[str, Any]:
+    return {
+        "volume_contratos": row.contratos,
+        "valor_total_contratos": round(row.valor_total_contratos, 2),
+        "valor_consultoria": round(row.consultoria_contratos, 2),
+        "ticket_medio": round(row.ticket_medio, 2),
+        "pontuacao": round(row.pontuacao, 2),
+        "updated_at": now_brt(),
+    }
+
+
+def _upsert_rows(db: Session, campaign_id: int, rows: List[Any], with_position: bool) -> None:
+    """Grava as linhas da campanha (insere ou atualiza por campaign_id + user_id)."""
+    if not rows:
+        return
+    values = []
+    for row in rows:
+        item = {"campaign_id": campaign_id, "user_id": row.user_id, **_row_values(row)}
+        if with_position:
+            item["posicao"] = row.posicao
+        values.append(item)
+    table = CampaignLeaderboardEntry.__table__
+    stmt = pg_insert(table).values(values)
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_campaign_leaderboard_user",
+        set_={name: stmt.excluded[name] for name in values[0] if name not in ("campaign_id", "user_id")},
+    )
+    db.execute(stmt)
+
+
+def _reorder_positions(db: Session, campaign_id: int) -> List[Dict[str, Any]]:
+    """
+    Recalcula as posições da campanha com row_number() e retorna
+    apenas as linhas cuja posição mudou.
+    """
+    result = db.execute(
+        text("""
+            WITH ranked AS (
+                SELECT id,
+                       posicao AS old_posicao,
+                       row_number() OVER (ORDER BY pontuacao DESC, user_id) AS new_posicao
+                FROM campaign_leaderboard
+                WHERE campaign_id = :campaign_id
+            )
+            UPDATE campaign_leaderboard cl
+            SET posicao = ranked.new_posicao
+            FROM ranked
+            WHERE cl.id = ranked.id
+              AND cl.posicao IS DISTINCT FROM ranked.new_posicao
+            RETURNING cl.user_id, ranked.old_posicao, ranked.new_posicao
+        """),
+        {"campaign_id": campaign_id}
+    )
+    return [
+        {"user_id": row.user_id, "old_position": row.old_posicao, "new_position": row.new_posicao}
+        for row in result
+    ]
+
+
+def rebuild_leaderboard(db: Session, campanha: Campaign) -> None:
+    """Reconstrói o leaderboard completo de uma campanha (criação/edição/job diário)."""
+    db.query(CampaignLeaderboardEntry).filter(
+        CampaignLeaderboardEntry.campaign_id == campanha.id
+    ).delete(synchronize_session=False)
+    _upsert_rows(db, campanha.id, compute_campaign_ranking(db, campanha, min_score=0), with_position=True)
+    db.flush()
+
+
+def rebuild_active_leaderboards(db: Session) -> int:
+    """Reconstrói o leaderboard de todas as campanhas ativas; faz commit próprio."""
+    campanhas = active_campaigns(db)
+    for campanha in campanhas:
+        rebuild_leaderboard(db, campanha)
+    db.commit()
+    return len(campanhas)
+
+
+def refresh_users(db: Session, user_ids: Iterable[int | None]) -> List[Dict[str, Any]]:
+    """
+    Atualiza incrementalmente as linhas dos usuários informados em todas as
+    campanhas ativas e reordena as posições. Faz commit próprio, junto com
+    os eventos de leaderboard no outbox.
+
+    Returns:
+        Lista de mudanças por campanha: [{"campaign_id", "changes": [...]}, ...]
+    """
+    ids = {uid for uid in user_ids if uid}
+    if not ids:
+        return []
+
+    updates = []
+    try:
+        for campanha in active_campaigns(db):
+            rows = {
+                row.user_id: row
+                for row in compute_campaign_ranking(db, campanha, user_ids=ids)
+            }
+            entries = {
+                entry.user_id: entry
+                for entry in db.query(CampaignLeaderboardEntry).filter(
+                    CampaignLeaderboardEntry.campaign_id == campanha.id,
+                    CampaignLeaderboardEntry.user_id.in_(ids)
+                ).all()
+            }
+
+            pontuados = []
+            for user_id in ids:
+                row = rows.get(user_id)
+                entry = entries.get(user_id)
+                if row is None or row.pontuacao <= 0:
+                    # Sem pontuação: sai do leaderboard
+                    if entry is not None:
+                        db.delete(entry)
+                    continue
+                pontuados.append(row)
+
+            db.flush()
+            _upsert_rows(db, campanha.id, pontuados, with_position=False)
+            changes = _reorder_positions(db, campanha.id)
+            if changes:
+                update = {"campaign_id": campanha.id, "changes": changes}
+                outbox.publish(db, LEADERBOARD_EVENT, update)
+                updates.append(update)
+
+        db.commit()
+    except Exception as e:
+        # Leaderboard é derivado: nunca deve quebrar a operação principal
+        db.rollback()
+        logger.exception(f"Erro ao atualizar leaderboard: {e}")
+        return []
+
+    return updates
+
+
+def read_top(db: Session, campaign_id: int, limit: int = 5) -> tuple[List[CampaignLeaderboardEntry], int]:
+    """Lê o top-N materializado (via índice campaign_id, posicao) e o total de participantes."""
+    top = (
+        db.query(CampaignLeaderboardEntry)
+        .options(joinedload(CampaignLeaderboardEntry.user))
+        .filter(CampaignLeaderboardEntry.campaign_id == campaign_id)
+        .order_by(CampaignLeaderboardEntry.posicao)
+        .limit(limit)
+        .all()
+    )
+    total = 0
+    if top:
+        total = db.query(CampaignLeaderboardEntry.id).filter(
+            CampaignLeaderboardEntry.campaign_id == campaign_id
+        ).count()
+    return top, total
+
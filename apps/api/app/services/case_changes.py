@@ -0,0 +1,114 @@
+"""
+Delta da esteira de casos (GET /cases/changes).
+
+O cliente carrega a listagem uma vez e depois pede só o que mudou desde o
+último token recebido:
+
+- casos com (last_update_at, id) acima do cursor, em ordem, pelo índice
+  ix_cases_last_update_at_id;
+- casos excluídos, pela tabela case_tombstones (gravada no flush de
+  qualquer db.delete(case));
+- para o atendente, casos cuja atribuição expirou desde o cursor (voltam a
+  ser visíveis sem nenhuma escrita no banco).
+
+O token é opaco para o cliente: base64 de "<last_update_at ISO>|<id>",
+com horário de Brasília sem fuso (como as colunas DateTime).
+
+last_update_at é preenchido pela aplicação antes do commit; uma transação
+lenta pode ficar visível com um horário que o cursor já passou. Por isso,
+quando o cliente alcança o fim, o próximo token recua COMMIT_SLACK: esses
+casos vêm de novo e o cliente aplica o delta de forma idempotente.
+"""
+import base64
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event, tuple_
+from sqlalchemy.orm import Session
+
+from ..models import Case, CaseTombstone, now_brt
+
+COMMIT_SLACK = timedelta(seconds=5)
+# Tokens mais antigos que isso recebem 410: o cliente recarrega a listagem
+TOMBSTONE_RETENTION = timedelta(days=30)
+
+
+def cursor_now() -> datetime:
+    """Agora em horário de Brasília, sem fuso: comparável com last_update_at."""
+    return now_brt().replace(tzinfo=None)
+
+
+def encode_token(ts: datetime, case_id: int = 0) -> str:
+    raw = f"{ts.isoformat()}|{case_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_token(token: str) -> Tuple[datetime, int]:
+    """Levanta ValueError para token malformado."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        ts, case_id = raw.split("|", 1)
+        return datetime.fromisoformat(ts).replace(tzinfo=None), int(case_id)
+    except Exception as e:
+        raise ValueError(f"token inválido: {token!r}") from e
+
+
+def caught_up_token(since: Optional[Tuple[datetime, int]] = None, now: Optional[datetime] = None) -> str:
+    """Token para quem já recebeu tudo: recua COMMIT_SLACK, sem voltar atrás do cursor."""
+    cursor = ((now or cursor_now()) - COMMIT_SLACK, 0)
+    if since is not None and since > cursor:
+        cursor = since
+    return encode_token(*cursor)
+
+
+def changed_ids(db: Session, since: Tuple[datetime, int], limit: int) -> Tuple[List[Tuple[int, datetime]], bool]:
+    """Uma página de (id, last_update_at) alterados após o cursor, e se há mais."""
+    rows = (
+        db.query(Case.id, Case.last_update_at)
+        .filter(tuple_(Case.last_update_at, Case.id) > tuple_(*since))
+        .order_by(Case.last_update_at, Case.id)
+        .limit(limit + 1)
+        .all()
+    )
+    return [tuple(r) for r in rows[:limit]], len(rows) > limit
+
+
+def deleted_since(db: Session, since_ts: datetime) -> List[int]:
+    return [
+        case_id for (case_id,) in db.query(CaseTombstone.case_id).filter(
+            CaseTombstone.deleted_at > since_ts
+        )
+    ]
+
+
+def expired_since(db: Session, since_ts: datetime, now: datetime) -> List[int]:
+    """
+    Casos cuja atribuição expirou no intervalo (since_ts, now].
+
+    Sem limite: o próximo token não cobre expirações (o cursor anda por
+    last_update_at), então uma expiração cortada aqui nunca seria entregue.
+    O volume é limitado pelos casos atribuídos.
+    """
+    return [
+        case_id for (case_id,) in db.query(Case.id).filter(
+            Case.assigned_user_id.isnot(None),
+            Case.assignment_expires_at > since_ts,
+            Case.assignment_expires_at <= now,
+        )
+    ]
+
+
+def purge_tombstones(db: Session) -> int:
+    deleted = db.query(CaseTombstone).filter(
+        CaseTombstone.deleted_at < cursor_now() - TOMBSTONE_RETENTION
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+@event.listens_for(Session, "before_flush")
+def _record_tombstones(session: Session, flush_context, instances) -> None:
+    # Exclusões via query.delete() (reset do admin) não passam por aqui
+    for obj in list(session.deleted):
+        if isinstance(obj, Case) and obj.id is not None:
+            session.merge(CaseTombstone(case_id=obj.id, deleted_at=cursor_now()))
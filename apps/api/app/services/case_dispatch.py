@@ -0,0 +1,101 @@
+"""
+Distribuição de casos para atendentes ("pegar o próximo").
+
+Em vez de cada atendente escolher um caso na lista e disputar a mesma
+linha, POST /cases/claim-next seleciona o próximo caso disponível com
+
+    SELECT ... FOR UPDATE OF cases SKIP LOCKED LIMIT 1
+
+Linhas travadas por outra transação em andamento são puladas: cada
+atendente concorrente recebe um caso diferente, sem espera e sem erro de
+"já atribuído". A ordem é prioridade da folha
+(payroll_status_summary.priority_score, maior primeiro) e depois idade.
+O índice parcial ix_cases_claimable cobre exatamente esse filtro/ordem.
+"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import and_, exists, literal_column, or_, select
+from sqlalchemy.orm import Session
+
+from ..models import Case, CaseEvent, Client, PayrollLine, now_brt
+from ..utils.business_days import add_business_hours
+
+ASSIGNMENT_BUSINESS_HOURS = 48
+CLAIMABLE_STATUSES = ("novo", "em_atendimento")
+
+# Mesma expressão do índice ix_cases_claimable (chave literal, não parâmetro)
+PRIORITY_SCORE = literal_column("((cases.payroll_status_summary ->> 'priority_score')::int)")
+
+
+def assign_case_to_user(db: Session, case: Case, user, now: Optional[datetime] = None) -> None:
+    """Atribui o caso ao usuário por 48h úteis e registra o evento."""
+    now = now or now_brt()
+    case.assigned_user_id = user.id
+    case.status = "em_atendimento"
+    case.last_update_at = now
+    case.assigned_at = now
+    case.assignment_expires_at = add_business_hours(now, ASSIGNMENT_BUSINESS_HOURS)  # exclui sáb/dom/feriados
+
+    # Reatribui a lista: mutação in-place de JSON não é detectada
+    case.assignment_history = list(case.assignment_history or []) + [
+        {
+            "user_id": user.id,
+            "user_name": user.name,
+            "assigned_at": now.isoformat(),
+            "expires_at": case.assignment_expires_at.isoformat(),
+            "action": "assigned",
+        }
+    ]
+
+    db.add(
+        CaseEvent(
+            case_id=case.id,
+            type="case.assigned",
+            payload={
+                "to": user.id,
+                "expires_at": case.assignment_expires_at.isoformat()
+            },
+            created_by=user.id,
+        )
+    )
+
+
+def is_assignment_active(case: Case, now: Optional[datetime] = None) -> bool:
+    return bool(
+        case.assigned_user_id
+        and case.assignment_expires_at
+        and case.assignment_expires_at > (now or now_brt())
+    )
+
+
+def claim_next_case(db: Session, user, entity: Optional[str] = None) -> Optional[Case]:
+    """
+    Trava e atribui ao usuário o próximo caso disponível (None se não houver).
+    A atribuição só é visível após o commit do chamador.
+    """
+    now = now_brt()
+    stmt = (
+        select(Case)
+        .where(
+            Case.status.in_(CLAIMABLE_STATUSES),
+            or_(Case.assigned_user_id.is_(None), Case.assignment_expires_at < now),
+        )
+        .order_by(PRIORITY_SCORE.desc().nulls_last(), Case.created_at, Case.id)
+        .limit(1)
+        .with_for_update(skip_locked=True, of=Case)
+    )
+    if entity:
+        stmt = stmt.where(
+            exists().where(and_(
+                Client.id == Case.client_id,
+                PayrollLine.cpf == Client.cpf,
+                PayrollLine.entity_name == entity,
+            ))
+        )
+
+    case = db.execute(stmt).scalar_one_or_none()
+    if case is None:
+        return None
+    assign_case_to_user(db, case, user, now)
+    return case
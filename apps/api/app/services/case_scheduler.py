@@ -16,10 +16,15 @@ from ..models import (
     Case, CaseEvent, User, now_brt, Comment, Attachment, ClientPhone,
     SLAExecution
 )
+from ..utils.business_days import add_business_hours_bulk
+from .change_versions import mark_changed
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Status em que a atribuição tem prazo (expira e volta para a esteira)
+ASSIGNMENT_OPEN_STATUSES = ["em_atendimento", "calculista_pendente"]
+
 
 class CaseScheduler:
     """
@@ -103,7 +108,7 @@ class CaseScheduler:
                 Case.assigned_user_id.isnot(None),
                 Case.assignment_expires_at.isnot(None),
                 Case.assignment_expires_at <= now,
-                Case.status.in_(["em_atendimento", "calculista_pendente"])
+                Case.status.in_(ASSIGNMENT_OPEN_STATUSES)
             ).all()
 
             logger.info(f"Encontrados {len(expired_cases)} casos expirados")
@@ -210,6 +215,40 @@ class CaseScheduler:
             stats["errors"] += 1
             return stats
 
+    def recompute_assignment_expirations(self, hours: int = 48) -> int:
+        """
+        Recalcula assignment_expires_at dos casos atribuídos em aberto
+        (ASSIGNMENT_OPEN_STATUSES), ex.: após cadastrar um novo feriado no
+        calendário. Casos fechados mantêm o prazo que tinham.
+
+        Usa a variante vetorizada do calendário de dias úteis e
+        atualiza os casos em lote.
+
+        Args:
+            hours: Horas úteis do prazo de atribuição
+
+        Returns:
+            int: Quantidade de casos atualizados
+        """
+        rows = self.db.query(Case.id, Case.assigned_at).filter(
+            Case.assigned_user_id.isnot(None),
+            Case.assigned_at.isnot(None),
+            Case.status.in_(ASSIGNMENT_OPEN_STATUSES)
+        ).all()
+        if not rows:
+            return 0
+
+        expirations = add_business_hours_bulk([r.assigned_at for r in rows], hours)
+        self.db.bulk_update_mappings(Case, [
+            {"id": r.id, "assignment_expires_at": expires_at}
+            for r, expires_at in zip(rows, expirations)
+        ])
+        mark_changed(self.db, Case.__tablename__)
+        self.db.commit()
+
+        logger.info(f"Prazos de atribuição recalculados: {len(rows)} casos")
+        return len(rows)
+
     def get_cases_near_expiry(self, hours_before: int = 2) -> list:
         """
         Retorna casos que estão próximos de expirar (para notificações).
@@ -227,7 +266,7 @@ class CaseScheduler:
             Case.assignment_expires_at.isnot(None),
             Case.assignment_expires_at <= warning_time,
             Case.assignment_expires_at > now_brt(),
-            Case.status.in_(["em_atendimento", "calculista_pendente"])
+            Case.status.in_(ASSIGNMENT_OPEN_STATUSES)
         ).all()
 
         return [
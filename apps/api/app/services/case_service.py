@@ -4,6 +4,7 @@ from typing import List
 from datetime import datetime, timedelta
 from ..utils.business_days import add_business_hours
 import os
+import logging
 import shutil
 
 # imports do projeto
@@ -20,6 +21,7 @@ from sqlalchemy import or_
 from sqlalchemy.orm import joinedload
 
 r = APIRouter(prefix="/cases", tags=["cases"])
+logger = logging.getLogger(__name__)
 
 
 # -------------------------
@@ -587,7 +589,7 @@ def list_cases(
 
                     items.append(item)
                 except Exception as e:
-                    print(f"Erro ao processar caso {c.id}: {e}")
+                    logger.exception(f"Erro ao processar caso {c.id}: {e}")
                     items.append(
                         {
                             "id": c.id,
@@ -605,7 +607,7 @@ def list_cases(
             return {"items": items, "total": total, "page": page, "page_size": page_size}
 
         except Exception as e:
-            print(f"Erro na query de casos: {e}")
+            logger.exception(f"Erro na query de casos: {e}")
             return {"items": [], "total": 0, "page": page, "page_size": page_size, "error": str(e)}
 
 
@@ -765,7 +767,7 @@ async def bulk_delete_cases(payload: BulkDeleteRequest, user=Depends(require_rol
                         if os.path.exists(att.path):
                             os.remove(att.path)
                     except Exception as e:
-                        print(f"Erro ao excluir arquivo {att.path}: {e}")
+                        logger.warning(f"Erro ao excluir arquivo {att.path}: {e}")
                     db.delete(att)
 
                 # Excluir eventos associados
@@ -777,7 +779,7 @@ async def bulk_delete_cases(payload: BulkDeleteRequest, user=Depends(require_rol
                 results["deleted"].append(case_id)
             except Exception as e:
                 results["failed"].append({"id": case_id, "reason": str(e)})
-                print(f"Erro ao excluir caso {case_id}: {e}")
+                logger.error(f"Erro ao excluir caso {case_id}: {e}")
 
         db.commit()
 
@@ -0,0 +1,128 @@
+"""
+Versão por tabela para requisições condicionais (ETag / 304).
+
+Toda transação que escreve em uma tabela com ETag (ETAG_TABLES) incrementa
+change_versions.version daquela tabela no próprio commit. As versões são transacionais: só ficam
+visíveis junto com os dados que as alteraram, então um ETag calculado a
+partir delas nunca "congela" uma resposta antiga.
+
+As escritas são detectadas pelo ORM:
+
+- objetos novos/alterados/removidos em cada flush;
+- UPDATE/DELETE/INSERT emitidos por Session.execute (query.update(),
+  insert() do core etc.).
+
+SQL textual (text()) e bulk_*_mappings não passam por esses eventos: quem
+usar deve chamar mark_changed(db, "tabela") na mesma transação.
+
+Os contadores são atualizados por último, logo antes do commit e em ordem
+alfabética, para segurar o lock da linha pelo menor tempo possível e sem
+risco de deadlock entre transações que escrevem nas mesmas tabelas.
+
+Contenção: cada contador é uma linha quente. Duas transações que escrevem
+em "cases" se enfileiram no UPSERT do contador entre o before_commit e o
+commit (o lock dura só esse trecho, mas o commit da segunda espera o da
+primeira). Por isso só as tabelas que algum endpoint usa em ETag são
+contadas: escritas em outbox, lotes de importação, leaderboard, auditoria
+etc. não tocam change_versions. Um endpoint novo que use resource_etag
+com outra tabela precisa incluí-la em ETAG_TABLES (get_versions recusa
+tabela não rastreada, em vez de devolver um ETag que nunca muda).
+"""
+from typing import Dict, Iterable
+
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from ..models import ChangeVersion, now_brt
+
+_CHANGED_KEY = "change_versions_tables"
+
+# Tabelas lidas por endpoints com ETag (rankings, finance, closing,
+# analytics, cases); só elas têm contador
+ETAG_TABLES = frozenset({
+    "attachments",
+    "cases",
+    "clients",
+    "contract_attachments",
+    "contracts",
+    "finance_expenses",
+    "finance_incomes",
+    "payroll_lines",
+    "simulations",
+    "users",
+})
+
+
+def mark_changed(db: Session, *tables: str) -> None:
+    """Registra escrita em tabelas que o ORM não enxerga (SQL textual, bulk)."""
+    tracked = ETAG_TABLES.intersection(tables)
+    if tracked:
+        db.info.setdefault(_CHANGED_KEY, set()).update(tracked)
+
+
+def get_versions(db: Session, tables: Iterable[str]) -> Dict[str, int]:
+    """Versão atual de cada tabela (0 se nunca alterada desde a migração)."""
+    tables = sorted(set(tables))
+    untracked = set(tables) - ETAG_TABLES
+    if untracked:
+        raise ValueError(f"Tabelas sem contador de versão (incluir em ETAG_TABLES): {sorted(untracked)}")
+    rows = db.query(ChangeVersion.table_name, ChangeVersion.version).filter(
+        ChangeVersion.table_name.in_(tables)
+    ).all()
+    found = dict(rows)
+    return {t: found.get(t, 0) for t in tables}
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed(session: Session, flush_context) -> None:
+    tables = {
+        obj.__table__.name
+        for objs in (session.new, session.dirty, session.deleted)
+        for obj in objs
+        if hasattr(obj, "__table__")
+    }
+    if tables:
+        mark_changed(session, *tables)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_executed(orm_execute_state) -> None:
+    if not (
+        orm_execute_state.is_insert
+        or orm_execute_state.is_update
+        or orm_execute_state.is_delete
+    ):
+        return
+    table = getattr(orm_execute_state.statement, "table", None)
+    name = getattr(table, "name", None)
+    if name:
+        mark_changed(orm_execute_state.session, name)
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_versions(session: Session) -> None:
+    # O flush do commit acontece depois deste evento: antecipa para
+    # capturar as tabelas escritas por ele.
+    session.flush()
+    tables = session.info.pop(_CHANGED_KEY, None)
+    if not tables:
+        return
+
+    stmt = pg_insert(ChangeVersion.__table__).values([
+        {"table_name": name, "version": 1, "updated_at": now_brt()}
+        for name in sorted(tables)
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["table_name"],
+        set_={
+            "version": ChangeVersion.__table__.c.version + 1,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    session.execute(stmt)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed(session: Session) -> None:
+    session.info.pop(_CHANGED_KEY, None)
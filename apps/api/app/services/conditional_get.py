@@ -0,0 +1,65 @@
+"""
+GET condicional (ETag fraco / 304) para listagens e painéis consultados
+por polling.
+
+O ETag é um hash barato de:
+
+- rota + query string;
+- escopo da resposta (usuário, papel, período resolvido...);
+- versões das tabelas lidas pelo endpoint (services/change_versions).
+
+Ele é calculado ANTES da query principal; se bater com o If-None-Match,
+o handler devolve 304 sem consultar nem serializar nada.
+
+Uso:
+
+    etag = resource_etag(db, request, ("cases", "clients"), user.id)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    ...
+    return FastJSONResponse(conteudo, headers=etag_headers(etag))
+"""
+import hashlib
+from typing import Any, Dict, Iterable
+
+from fastapi import Request
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+
+from .change_versions import get_versions
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def resource_etag(db: Session, request: Request, tables: Iterable[str], *scope: Any) -> str:
+    """ETag fraco da resposta de request, dado o que ela lê e seu escopo."""
+    versions = get_versions(db, tables)
+    parts = [
+        request.url.path,
+        "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items())),
+        *(str(s) for s in scope),
+        *(f"{table}:{version}" for table, version in versions.items()),
+    ]
+    digest = hashlib.blake2b("|".join(parts).encode("utf-8"), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _strip_weak(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match com comparação fraca (RFC 9110, 13.1.2)."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or _strip_weak(etag) in {_strip_weak(t) for t in tags}
+
+
+def etag_headers(etag: str) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=etag_headers(etag))
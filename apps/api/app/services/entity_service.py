@@ -0,0 +1,62 @@
+"""
+Dimensão de entidades (bancos/consignatárias) das folhas importadas.
+
+O nome normalizado é calculado uma única vez, na importação, e gravado em
+entities.normalized_name. Os filtros de clientes agrupam por essa coluna
+em vez de varrer payroll_lines e normalizar em Python a cada requisição.
+"""
+from sqlalchemy.orm import Session
+
+from ..models import Entity
+
+
+def normalize_bank_name(name: str) -> str:
+    """Normaliza nome de banco para agrupar variações."""
+    if not name:
+        return name
+    normalized = name.upper().strip()
+
+    # BANCO DO BRASIL: tratar PRIMEIRO antes de remover BRASIL
+    if 'BANCO DO BRASIL' in normalized:
+        return 'BANCO DO BRASIL'
+
+    # Remover sufixos societários
+    normalized = normalized.replace(' S.A.', '').replace(' S/A', '').replace(' S.A', '')
+
+    # Padronizar bancos específicos
+    if 'SANTANDER' in normalized and not normalized.startswith('BANCO'):
+        normalized = 'BANCO SANTANDER'
+    elif 'SANATANDER' in normalized:
+        normalized = 'BANCO SANTANDER'
+    elif 'DAYCOVAL' in normalized and not normalized.startswith('BANCO'):
+        normalized = 'BANCO DAYCOVAL'
+    elif 'DIGIO' in normalized and 'PREVIDENCIA' not in normalized:
+        normalized = 'BANCO DIGIO'
+    elif 'FUTURO PREVID' in normalized:
+        return 'FUTURO PREVIDÊNCIA'
+    elif 'EQUATORIAL PREVID' in normalized:
+        return 'EQUATORIAL PREVIDÊNCIA'
+
+    # Remover CARTÃO e BRASIL do final (após tratar casos especiais)
+    normalized = normalized.replace(' CARTAO', '').replace(' CARTÃO', '')
+    if normalized.endswith(' BRASIL'):
+        normalized = normalized[:-7]
+
+    # Remover espaços duplos
+    return ' '.join(normalized.split())
+
+
+def get_or_create_entity(db: Session, code: str, name: str) -> Entity:
+    """
+    Retorna a entidade (código, nome bruto), criando-a se necessário.
+    Chamado uma vez por lote de importação.
+    """
+    entity = db.query(Entity).filter(
+        Entity.code == code,
+        Entity.name == name
+    ).one_or_none()
+    if not entity:
+        entity = Entity(code=code, name=name, normalized_name=normalize_bank_name(name))
+        db.add(entity)
+        db.flush()
+    return entity
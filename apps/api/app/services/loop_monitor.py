@@ -0,0 +1,97 @@
+"""
+Monitor de atraso (lag) do event loop.
+
+Um callback síncrono pesado no loop (query psycopg2 dentro de um handler
+async, parse de arquivo...) congela todas as requisições e WebSockets do
+worker. Duas peças detectam isso:
+
+- heartbeat: uma tarefa no loop acorda a cada INTERVAL e mede quanto
+  atrasou além do previsto (histograma event_loop_lag_seconds no /metrics);
+- watchdog: uma thread confere o último heartbeat; se o loop ficou mais
+  de LOOP_LAG_THRESHOLD_MS sem responder, registra um warning com a pilha
+  atual da thread do loop, ou seja, o código que está bloqueando.
+
+Com LOOP_LAG_THRESHOLD_MS=0 nada é iniciado.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from ..config import settings
+from .metrics import EVENT_LOOP_LAG
+
+logger = logging.getLogger(__name__)
+
+INTERVAL = 0.05
+
+
+class LoopLagMonitor:
+    def __init__(self, threshold_ms: int, interval: float = INTERVAL):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval
+        self._beat = time.perf_counter()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Chamar de dentro do event loop (startup da aplicação)."""
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.perf_counter()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _heartbeat(self) -> None:
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            lag = max(0.0, now - expected)
+            self._beat = now
+            EVENT_LOOP_LAG.observe(lag)
+            if lag >= self.threshold:
+                logger.warning(f"Event loop atrasou {lag * 1000:.0f} ms")
+
+    def _watch(self) -> None:
+        reported_beat = None
+        while not self._stop.wait(self.threshold / 2):
+            beat = self._beat
+            blocked = time.perf_counter() - beat
+            if blocked < self.threshold + self.interval or beat == reported_beat:
+                continue
+            # Uma pilha por bloqueio: o mesmo heartbeat não é reportado de novo
+            reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame, limit=20)) if frame is not None else "(indisponível)"
+            logger.warning(
+                f"Event loop bloqueado há {blocked * 1000:.0f} ms; pilha do loop:\n{stack}"
+            )
+
+
+_monitor: Optional[LoopLagMonitor] = None
+
+
+def start_loop_monitor() -> None:
+    global _monitor
+    if settings.loop_lag_threshold_ms <= 0 or _monitor is not None:
+        return
+    _monitor = LoopLagMonitor(settings.loop_lag_threshold_ms)
+    _monitor.start()
+
+
+def stop_loop_monitor() -> None:
+    global _monitor
+    if _monitor is not None:
+        _monitor.stop()
+        _monitor = None
@@ -0,0 +1,198 @@
+"""
+Instrumentação de requisições, exposta no formato Prometheus.
+
+- MetricsMiddleware (ASGI): latência por rota (template, ex.
+  /cases/{case_id}), contagem por método/rota/status e requisições em
+  andamento;
+- número de queries e tempo de banco por requisição (hooks do
+  SQLAlchemy em services/query_monitor). Um N+1 aparece como o histograma
+  http_request_db_queries da rota deslocado para a direita e em
+  http_request_n_plus_one_total;
+- render_metrics(): texto para GET /metrics;
+- http_summary(): erros 4xx/5xx e rotas mais lentas/com mais queries,
+  usados em GET /analytics/health.
+
+Com vários workers (uvicorn --workers N), defina PROMETHEUS_MULTIPROC_DIR
+apontando para um diretório limpo a cada start: cada processo grava ali
+suas métricas e /metrics agrega todos eles.
+"""
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+    Histogram, generate_latest, multiprocess,
+)
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..config import settings
+from .query_monitor import UNMATCHED_ROUTE, finish_request, start_request
+
+REQUESTS = Counter(
+    "http_requests_total", "Requisições HTTP atendidas",
+    ["method", "route", "status"],
+)
+LATENCY = Histogram(
+    "http_request_duration_seconds", "Latência das requisições HTTP",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requisições HTTP em andamento",
+    multiprocess_mode="livesum",
+)
+DB_QUERIES = Histogram(
+    "http_request_db_queries", "Queries SQL executadas por requisição",
+    ["route"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250, 500, 1000),
+)
+DB_TIME = Histogram(
+    "http_request_db_seconds", "Tempo de banco por requisição",
+    ["route"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "Atraso do event loop medido pelo heartbeat (services/loop_monitor)",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+N_PLUS_ONE = Counter(
+    "http_request_n_plus_one_total",
+    "Requisições com o mesmo statement repetido N_PLUS_ONE_THRESHOLD+ vezes",
+    ["route"],
+)
+
+
+# -----------------------------
+# Middleware
+# -----------------------------
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        token = start_request(scope)
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_FLIGHT.dec()
+            stats = finish_request(token)
+
+            method = scope["method"]
+            route = stats.route
+            REQUESTS.labels(method, route, str(status)).inc()
+            LATENCY.labels(method, route).observe(elapsed)
+            DB_QUERIES.labels(route).observe(stats.queries)
+            DB_TIME.labels(route).observe(stats.seconds)
+            if stats.repeated_statements(settings.n_plus_one_threshold):
+                N_PLUS_ONE.labels(route).inc()
+
+
+# -----------------------------
+# Exposição
+# -----------------------------
+
+def _is_multiprocess() -> bool:
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def _collector_registry() -> CollectorRegistry:
+    if _is_multiprocess():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Corpo e content-type de GET /metrics."""
+    return generate_latest(_collector_registry()), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead() -> None:
+    """Remove os gauges "live" deste worker (chamado no shutdown)."""
+    if _is_multiprocess():
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def _histogram_quantile(buckets: Dict[float, float], q: float) -> Optional[float]:
+    """Quantil estimado por interpolação linear nos buckets cumulativos."""
+    bounds = sorted(buckets)
+    if not bounds or buckets[bounds[-1]] == 0:
+        return None
+    rank = q * buckets[bounds[-1]]
+    prev_bound, prev_count = 0.0, 0.0
+    for bound in bounds:
+        count = buckets[bound]
+        if count >= rank:
+            if bound == float("inf"):
+                return prev_bound
+            if count == prev_count:
+                return bound
+            return prev_bound + (bound - prev_bound) * (rank - prev_count) / (count - prev_count)
+        prev_bound, prev_count = bound, count
+    return prev_bound
+
+
+def http_summary(top: int = 5) -> Dict[str, Any]:
+    """Resumo das métricas HTTP (desde o start dos workers) para analytics/health."""
+    by_class = {"2xx": 0.0, "3xx": 0.0, "4xx": 0.0, "5xx": 0.0}
+    latency_buckets: Dict[float, float] = {}
+    routes: Dict[str, Dict[str, float]] = {}
+
+    def route_entry(route: str) -> Dict[str, float]:
+        return routes.setdefault(route, {"count": 0.0, "seconds": 0.0, "queries": 0.0})
+
+    for family in _collector_registry().collect():
+        for sample in family.samples:
+            route = sample.labels.get("route")
+            if sample.name == "http_requests_total":
+                key = f"{sample.labels['status'][0]}xx"
+                if key in by_class:
+                    by_class[key] += sample.value
+            elif sample.name == "http_request_duration_seconds_bucket":
+                le = float(sample.labels["le"])
+                latency_buckets[le] = latency_buckets.get(le, 0.0) + sample.value
+            elif sample.name == "http_request_duration_seconds_count":
+                route_entry(route)["count"] += sample.value
+            elif sample.name == "http_request_duration_seconds_sum":
+                route_entry(route)["seconds"] += sample.value
+            elif sample.name == "http_request_db_queries_sum":
+                route_entry(route)["queries"] += sample.value
+
+    averages: List[Dict[str, Any]] = [
+        {
+            "route": route,
+            "requests": int(data["count"]),
+            "avg_ms": round(data["seconds"] / data["count"] * 1000, 2),
+            "avg_queries": round(data["queries"] / data["count"], 2),
+        }
+        for route, data in routes.items()
+        if data["count"] and route != UNMATCHED_ROUTE
+    ]
+    p95 = _histogram_quantile(latency_buckets, 0.95)
+
+    return {
+        "requests": int(sum(by_class.values())),
+        "http_4xx": int(by_class["4xx"]),
+        "http_5xx": int(by_class["5xx"]),
+        "latency_p95_ms": round(p95 * 1000, 2) if p95 is not None else None,
+        "slowest_routes": sorted(averages, key=lambda r: r["avg_ms"], reverse=True)[:top],
+        "most_queries_routes": sorted(averages, key=lambda r: r["avg_queries"], reverse=True)[:top],
+    }
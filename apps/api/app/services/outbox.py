@@ -0,0 +1,295 @@
+"""
+Outbox transacional dos eventos de domínio (WebSocket /ws/events).
+
+Os handlers não fazem mais broadcast depois do commit: chamam
+
+    outbox.publish(db, "case.updated", {...})
+
+antes do db.commit(), gravando o evento em outbox_events na mesma
+transação da alteração. Se a transação falha, o evento some junto; se o
+worker morre depois do commit, o evento continua na tabela. A resposta
+não espera o fan-out para os WebSockets.
+
+Cada worker roda um OutboxRelay (iniciado no startup):
+
+1. carimbo: o worker que obtém o advisory lock atribui seq (1, 2, 3...)
+   aos eventos pendentes, em ordem de id, e marca delivered_at. Como só
+   um worker carimba por vez, seq cresce na ordem de publicação, sem
+   buracos visíveis;
+2. fan-out: todos os workers leem os eventos com seq acima do último
+   que enviaram e fazem broadcast para os seus próprios WebSockets.
+
+O relay acorda com NOTIFY outbox_events (emitido no commit de quem
+publicou e de quem carimbou) e, como garantia, a cada OUTBOX_POLL_MS.
+Eventos publicados há mais de OUTBOX_RETENTION_HOURS são apagados.
+
+Os eventos saem no WebSocket com o seq ({"event", "payload", "seq"}). Um
+cliente que reconecta envia {"type": "resume", "after": <último seq>} e
+recebe só o que perdeu (load_replay); se o intervalo já saiu da janela
+retida, recebe {"type": "resync"} e recarrega tudo (routers/ws).
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event, func, text
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..db import SessionLocal, engine, run_db
+from ..events import eventbus
+from ..models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "outbox_events"
+BATCH_SIZE = 500
+# Chave do pg_try_advisory_xact_lock do carimbo
+STAMP_LOCK_KEY = 72_001
+PURGE_EVERY = 600.0
+# Acima disso, resume vira resync completo
+REPLAY_LIMIT = 1000
+
+_PENDING_KEY = "outbox_pending"
+
+
+def publish(db: Session, event_name: str, payload: Dict[str, Any]) -> None:
+    """Registra o evento na transação corrente; só é publicado após o commit."""
+    db.add(OutboxEvent(event=event_name, payload=payload))
+    db.info[_PENDING_KEY] = True
+
+
+@event.listens_for(Session, "before_commit")
+def _notify_relays(session: Session) -> None:
+    # NOTIFY é transacional: os relays só acordam se o commit acontecer
+    if session.info.pop(_PENDING_KEY, False):
+        session.execute(text("SELECT pg_notify(:channel, '')"), {"channel": CHANNEL})
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+# -----------------------------
+# Relay
+# -----------------------------
+
+def stamp_pending(db: Session, limit: int = BATCH_SIZE) -> int:
+    """
+    Atribui seq aos eventos pendentes (se este worker obtiver o lock).
+    Retorna quantos foram carimbados.
+    """
+    locked = db.execute(
+        text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": STAMP_LOCK_KEY}
+    ).scalar()
+    if not locked:
+        return 0
+    stamped = db.execute(
+        text(
+            """
+            UPDATE outbox_events o
+            SET seq = b.base + b.rn, delivered_at = now()
+            FROM (
+                SELECT id,
+                       row_number() OVER (ORDER BY id) AS rn,
+                       (SELECT COALESCE(MAX(seq), 0) FROM outbox_events) AS base
+                FROM outbox_events
+                WHERE seq IS NULL
+                ORDER BY id
+                LIMIT :limit
+            ) b
+            WHERE o.id = b.id
+            """
+        ),
+        {"limit": limit},
+    ).rowcount
+    if stamped:
+        db.execute(text("SELECT pg_notify(:channel, '')"), {"channel": CHANNEL})
+    db.commit()
+    return stamped
+
+
+def fetch_after(db: Session, after_seq: int, limit: int = BATCH_SIZE) -> List[OutboxEvent]:
+    return (
+        db.query(OutboxEvent)
+        .filter(OutboxEvent.seq > after_seq)
+        .order_by(OutboxEvent.seq)
+        .limit(limit)
+        .all()
+    )
+
+
+def last_seq(db: Session) -> int:
+    return db.execute(text("SELECT COALESCE(MAX(seq), 0) FROM outbox_events")).scalar()
+
+
+def load_replay(
+    db: Session, after_seq: int, upto_seq: int, limit: int = REPLAY_LIMIT
+) -> Optional[List[OutboxEvent]]:
+    """
+    Eventos com after_seq < seq <= upto_seq, para um cliente que reconectou.
+    None quando o intervalo não está mais (ou nunca esteve) na tabela:
+    o cliente precisa de resync completo.
+    """
+    if after_seq >= upto_seq:
+        # Cliente à frente deste worker: os eventos ainda vão chegar ao vivo.
+        # Bem à frente do banco (ex.: banco restaurado), não há como retomar.
+        return [] if after_seq <= last_seq(db) else None
+    if after_seq < 0 or upto_seq - after_seq > limit:
+        return None
+    oldest = db.query(func.min(OutboxEvent.seq)).scalar()
+    if oldest is None or oldest > after_seq + 1:
+        return None
+    return (
+        db.query(OutboxEvent)
+        .filter(OutboxEvent.seq > after_seq, OutboxEvent.seq <= upto_seq)
+        .order_by(OutboxEvent.seq)
+        .all()
+    )
+
+
+def purge_delivered(db: Session, retention_hours: int) -> int:
+    # Mantém sempre o último evento: MAX(seq) é a base do próximo carimbo
+    deleted = db.execute(
+        text(
+            "DELETE FROM outbox_events "
+            "WHERE delivered_at < now() - make_interval(hours => :hours) "
+            "AND seq < (SELECT MAX(seq) FROM outbox_events)"
+        ),
+        {"hours": retention_hours},
+    ).rowcount
+    db.commit()
+    return deleted
+
+
+def _stamp_and_fetch(after_seq: int) -> List[Dict[str, Any]]:
+    with SessionLocal() as db:
+        stamp_pending(db)
+        return [
+            {"seq": e.seq, "event": e.event, "payload": e.payload}
+            for e in fetch_after(db, after_seq)
+        ]
+
+
+def _last_seq() -> int:
+    with SessionLocal() as db:
+        return last_seq(db)
+
+
+def _purge() -> int:
+    with SessionLocal() as db:
+        return purge_delivered(db, settings.outbox_retention_hours)
+
+
+def _open_listen_connection():
+    # Conexão fora do pool: fica presa ao LISTEN enquanto o worker viver
+    raw = engine.raw_connection()
+    raw.detach()
+    conn = raw.dbapi_connection
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f"LISTEN {CHANNEL}")
+    return conn
+
+
+class OutboxRelay:
+    def __init__(self, poll_interval: float):
+        self.poll_interval = poll_interval
+        self.cursor = 0
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._listen_conn = None
+        self._last_purge = 0.0
+
+    async def start(self) -> None:
+        self.cursor = await run_db(_last_seq)
+        await self._listen()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._listen_conn is not None:
+            asyncio.get_running_loop().remove_reader(self._listen_conn.fileno())
+            self._listen_conn.close()
+            self._listen_conn = None
+
+    async def _listen(self) -> None:
+        """LISTEN em uma conexão dedicada, lida pelo próprio event loop."""
+        try:
+            conn = await run_db(_open_listen_connection)
+        except Exception as e:
+            logger.warning(f"Outbox sem LISTEN ({e}); usando apenas polling")
+            return
+        asyncio.get_running_loop().add_reader(conn.fileno(), self._on_notify)
+        self._listen_conn = conn
+
+    def _on_notify(self) -> None:
+        try:
+            self._listen_conn.poll()
+        except Exception as e:
+            logger.warning(f"Conexão LISTEN do outbox falhou: {e}")
+            asyncio.get_running_loop().remove_reader(self._listen_conn.fileno())
+            self._listen_conn = None
+            return
+        if self._listen_conn.notifies:
+            self._listen_conn.notifies.clear()
+            self._wake.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self._relay_once()
+                if time.monotonic() - self._last_purge > PURGE_EVERY:
+                    self._last_purge = time.monotonic()
+                    await run_db(_purge)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"Erro no relay do outbox: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _relay_once(self) -> None:
+        while True:
+            events = await run_db(_stamp_and_fetch, self.cursor)
+            for item in events:
+                # Cursor antes do envio: um resume concorrente inclui este
+                # evento no replay e descarta a cópia ao vivo (EventBus.release)
+                self.cursor = item["seq"]
+                await eventbus.broadcast(item["event"], item["payload"], seq=item["seq"])
+            if len(events) < BATCH_SIZE:
+                return
+
+
+_relay: Optional[OutboxRelay] = None
+
+
+async def start_relay() -> None:
+    global _relay
+    if _relay is not None:
+        return
+    _relay = OutboxRelay(settings.outbox_poll_ms / 1000)
+    await _relay.start()
+
+
+def relay_cursor() -> Optional[int]:
+    """Último seq enviado aos WebSockets deste worker (None sem relay)."""
+    return _relay.cursor if _relay is not None else None
+
+
+async def stop_relay() -> None:
+    global _relay
+    if _relay is not None:
+        await _relay.stop()
+        _relay = None
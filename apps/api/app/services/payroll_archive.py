@@ -0,0 +1,294 @@
+"""
+Arquivo frio das referências antigas de payroll_lines (Parquet).
+
+As telas usam quase sempre a última ou as duas últimas referências de cada
+CPF. Referências com mais de PAYROLL_ARCHIVE_MONTHS meses saem do banco:
+
+1. a partição do mês (services/payroll_partitions) é exportada, ordenada
+   por CPF, para <upload_dir>/payroll_archive/payroll_lines_yYYYYmMM.parquet
+   (zstd, grupos de ARCHIVE_ROW_GROUP linhas). O arquivo é escrito num
+   temporário próprio do processo e só é renomeado depois de completo;
+2. o Parquet é relido e conferido contra a partição (número de linhas e,
+   por CPF, linhas, soma dos ids e soma das parcelas); só então ela é
+   destacada e removida (DROP, sem DELETE em massa nem VACUUM depois).
+
+Uma execução por vez (pg_try_advisory_lock em ARCHIVE_LOCK_KEY): com
+vários workers com scheduler, os demais pulam a rodada.
+
+As consultas (read_archive) escolhem os arquivos pelo período no nome e
+leem com memory map; como cada arquivo está ordenado por CPF, as
+estatísticas dos grupos deixam o filtro por CPF ler só um ou dois grupos.
+
+Precisa do pyarrow; sem ele o job não roda e o histórico responde 503.
+"""
+import logging
+import os
+import re
+import tempfile
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from ..config import settings
+from ..db import engine
+from ..models import now_brt
+from .payroll_partitions import DDL_LOCK_TIMEOUT, PARENT, list_partitions, partition_name
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - job desativado sem a dependência
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_ROW_GROUP = 50_000
+# Chave do pg_try_advisory_lock do arquivamento (outbox 72_001, partições 72_002)
+ARCHIVE_LOCK_KEY = 72_003
+
+# Por CPF: (linhas, soma dos ids, soma de valor_parcela_ref)
+Checksums = Dict[str, Tuple[int, int, Decimal]]
+
+_FILE_RE = re.compile(r"^payroll_lines_y(\d{4})m(\d{2})\.parquet$")
+
+# Colunas exportadas: as mesmas de PayrollLine, na mesma ordem (conferido em
+# tests/test_payroll_archive.py)
+COLUMNS = [
+    ("id", "int64"),
+    ("batch_id", "int64"),
+    ("cpf", "string"),
+    ("matricula", "string"),
+    ("nome", "string"),
+    ("cargo", "string"),
+    ("status_code", "string"),
+    ("status_description", "string"),
+    ("financiamento_code", "string"),
+    ("orgao", "string"),
+    ("lanc", "string"),
+    ("total_parcelas", "int32"),
+    ("parcelas_pagas", "int32"),
+    ("valor_parcela_ref", "decimal"),
+    ("orgao_pagamento", "string"),
+    ("orgao_pagamento_nome", "string"),
+    ("entity_code", "string"),
+    ("entity_name", "string"),
+    ("entity_id", "int64"),
+    ("ref_month", "int32"),
+    ("ref_year", "int32"),
+    ("created_at", "timestamp"),
+    ("line_number", "int32"),
+    ("content_hash", "string"),
+]
+
+
+class ArchiveUnavailable(RuntimeError):
+    """pyarrow não instalado."""
+
+
+def available() -> bool:
+    return pq is not None
+
+
+def archive_dir() -> str:
+    path = os.path.join(settings.upload_dir, "payroll_archive")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def archive_path(year: int, month: int) -> str:
+    return os.path.join(archive_dir(), f"{partition_name(year, month)}.parquet")
+
+
+def _schema():
+    types = {
+        "int32": pa.int32(),
+        "int64": pa.int64(),
+        "string": pa.string(),
+        "decimal": pa.decimal128(12, 2),
+        "timestamp": pa.timestamp("us"),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in COLUMNS])
+
+
+def _require() -> None:
+    if not available():
+        raise ArchiveUnavailable("pyarrow não instalado: arquivo de folhas indisponível")
+
+
+def archived_references() -> List[Tuple[int, int]]:
+    refs = []
+    for filename in os.listdir(archive_dir()):
+        m = _FILE_RE.match(filename)
+        if m:
+            refs.append((int(m.group(1)), int(m.group(2))))
+    return sorted(refs)
+
+
+def horizon_reference(months: int, now=None) -> Tuple[int, int]:
+    """Primeira referência mantida no banco: o mês atual menos `months` meses."""
+    now = now or now_brt()
+    total = now.year * 12 + (now.month - 1) - months
+    return total // 12, total % 12 + 1
+
+
+def _export_partition(year: int, month: int) -> int:
+    """Escreve o Parquet da partição (ordenado por CPF); retorna o número de linhas."""
+    final_path = archive_path(year, month)
+    # Temporário único por processo: duas exportações nunca dividem o arquivo
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=f".{partition_name(year, month)}.", suffix=".tmp", dir=archive_dir()
+    )
+    os.close(fd)
+    schema = _schema()
+    columns = ", ".join(name for name, _ in COLUMNS)
+    rows = 0
+    try:
+        with engine.connect() as conn:
+            result = conn.execution_options(yield_per=ARCHIVE_ROW_GROUP).execute(text(
+                f"SELECT {columns} FROM {partition_name(year, month)} "
+                f"ORDER BY cpf, matricula, financiamento_code"
+            ))
+            with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+                for chunk in result.partitions():
+                    writer.write_table(
+                        pa.Table.from_pylist([dict(r._mapping) for r in chunk], schema=schema),
+                        row_group_size=ARCHIVE_ROW_GROUP,
+                    )
+                    rows += len(chunk)
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, final_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return rows
+
+
+def _parquet_checksums(path: str) -> Checksums:
+    """Checksums por CPF relidos do Parquet (em lotes, sem carregar o arquivo inteiro)."""
+    sums: Dict[str, List] = {}
+    parquet = pq.ParquetFile(path, memory_map=True)
+    for batch in parquet.iter_batches(batch_size=ARCHIVE_ROW_GROUP, columns=["cpf", "id", "valor_parcela_ref"]):
+        data = batch.to_pydict()
+        for cpf, line_id, valor in zip(data["cpf"], data["id"], data["valor_parcela_ref"]):
+            entry = sums.setdefault(cpf, [0, 0, Decimal(0)])
+            entry[0] += 1
+            entry[1] += line_id
+            entry[2] += valor or Decimal(0)
+    return {cpf: tuple(entry) for cpf, entry in sums.items()}
+
+
+def _partition_checksums(conn, name: str) -> Checksums:
+    rows = conn.execute(text(
+        f"SELECT cpf, count(*), sum(id), COALESCE(sum(valor_parcela_ref), 0) FROM {name} GROUP BY cpf"
+    ))
+    return {cpf: (int(count), int(id_sum), Decimal(valor_sum)) for cpf, count, id_sum, valor_sum in rows}
+
+
+def _drop_archived_partition(year: int, month: int, exported: Checksums) -> None:
+    """Destaca e remove a partição, se ela ainda bate com o que foi exportado."""
+    name = partition_name(year, month)
+    with engine.begin() as conn:
+        conn.execute(text(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT}'"))
+        # Bloqueia escritas na partição entre a conferência e o DROP
+        conn.execute(text(f"LOCK TABLE {name} IN SHARE MODE"))
+        current = _partition_checksums(conn, name)
+        if current != exported:
+            differing = (set(current) ^ set(exported)) | {
+                cpf for cpf in set(current) & set(exported) if current[cpf] != exported[cpf]
+            }
+            raise RuntimeError(
+                f"{name} não confere com o Parquet: "
+                f"{sum(c[0] for c in exported.values())} linhas exportadas, "
+                f"{sum(c[0] for c in current.values())} no banco, {len(differing)} CPFs divergentes"
+            )
+        conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+        conn.execute(text(f"DROP TABLE {name}"))
+
+
+def archive_reference(year: int, month: int) -> int:
+    _require()
+    rows = _export_partition(year, month)
+    path = archive_path(year, month)
+    written = pq.ParquetFile(path, memory_map=True).metadata.num_rows
+    if written != rows:
+        raise RuntimeError(f"Parquet de {month:02d}/{year} com {written} linhas, esperadas {rows}")
+    exported = _parquet_checksums(path)
+    if sum(c[0] for c in exported.values()) != rows:
+        raise RuntimeError(f"Parquet de {month:02d}/{year} ilegível: linhas relidas não conferem")
+    _drop_archived_partition(year, month, exported)
+    logger.info(f"Referência {month:02d}/{year} arquivada: {rows} linhas em {path}")
+    return rows
+
+
+def archive_old_references(months: int) -> Dict[str, int]:
+    """
+    Arquiva as referências anteriores ao horizonte; cada uma é independente.
+    Se outro processo já está arquivando, não faz nada (skipped=1).
+    """
+    _require()
+    horizon = horizon_reference(months)
+    stats = {"references": 0, "lines": 0, "errors": 0, "skipped": 0}
+    # Lock de sessão numa conexão própria: vale pela rodada inteira, que
+    # atravessa várias transações (exportação, conferência, DROP)
+    with engine.connect() as lock_conn:
+        locked = lock_conn.execute(
+            text("SELECT pg_try_advisory_lock(:key)"), {"key": ARCHIVE_LOCK_KEY}
+        ).scalar()
+        lock_conn.commit()
+        if not locked:
+            logger.info("Arquivo de referências já em andamento em outro processo; rodada pulada")
+            stats["skipped"] = 1
+            return stats
+        try:
+            refs = [ref for ref in list_partitions(lock_conn) if ref < horizon]
+            lock_conn.commit()
+            for year, month in refs:
+                try:
+                    stats["lines"] += archive_reference(year, month)
+                    stats["references"] += 1
+                except Exception as e:
+                    stats["errors"] += 1
+                    logger.error(f"Erro ao arquivar referência {month:02d}/{year}: {e}")
+        finally:
+            # O lock de sessão sobrevive à devolução da conexão ao pool
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ARCHIVE_LOCK_KEY})
+            lock_conn.commit()
+    return stats
+
+
+def _iter_files(start: Optional[Tuple[int, int]], end: Optional[Tuple[int, int]]) -> Iterator[str]:
+    # Mais recentes primeiro, como as telas de financiamentos
+    for ref in reversed(archived_references()):
+        if (start is None or ref >= start) and (end is None or ref <= end):
+            yield archive_path(*ref)
+
+
+def read_archive(
+    cpf: Optional[str] = None,
+    entity_code: Optional[str] = None,
+    start: Optional[Tuple[int, int]] = None,
+    end: Optional[Tuple[int, int]] = None,
+    limit: int = 1000,
+) -> List[Dict[str, Any]]:
+    """
+    Linhas arquivadas por CPF, entidade e/ou período (referências (ano, mês)
+    inclusivas), da referência mais recente para a mais antiga.
+    """
+    _require()
+    filters = []
+    if cpf:
+        filters.append(("cpf", "=", cpf))
+    if entity_code:
+        filters.append(("entity_code", "=", entity_code))
+
+    items: List[Dict[str, Any]] = []
+    for path in _iter_files(start, end):
+        table = pq.read_table(path, filters=filters or None, memory_map=True)
+        if table.num_rows:
+            items.extend(table.slice(0, limit - len(items)).to_pylist())
+        if len(items) >= limit:
+            break
+    return items
@@ -0,0 +1,26 @@
+"""
+Contagens de financiamentos (linhas de folha) por CPF.
+
+As listagens de casos e de clientes mostram quantos financiamentos cada
+cliente tem; a página inteira é contada numa única query agrupada, em vez
+de uma contagem por linha.
+"""
+from typing import Dict, Iterable
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..models import PayrollLine
+
+
+def count_financiamentos_by_cpf(db: Session, cpfs: Iterable[str]) -> Dict[str, int]:
+    """Linhas de folha por CPF; CPFs sem linha ficam de fora do dict."""
+    cpfs = {cpf for cpf in cpfs if cpf}
+    if not cpfs:
+        return {}
+    return dict(
+        db.query(PayrollLine.cpf, func.count(PayrollLine.id))
+        .filter(PayrollLine.cpf.in_(cpfs))
+        .group_by(PayrollLine.cpf)
+        .all()
+    )
@@ -0,0 +1,207 @@
+"""
+Diferença mês a mês da folha por entidade.
+
+Quando chega um arquivo iNETConsig, o lote é comparado com o lote anterior
+da mesma entity_code (referência imediatamente anterior que já foi
+importada). As linhas das duas referências são lidas em ordem de
+(cpf, matricula, financiamento_code), com cursor no servidor, e combinadas
+num merge ordenado: nenhuma das duas referências fica inteira em memória.
+
+Cada financiamento cai em um tipo:
+
+- status_changed: mudou o status do desconto (ex.: 1 -> 2, falta de margem);
+- value_changed: mesmo status, valor da parcela diferente;
+- new: só na referência nova;
+- disappeared: só na anterior.
+
+O resumo vai para payroll_diffs (contagens e transições de status) e os
+itens para payroll_diff_items. Itens em que o status passou de efetivado
+(1, 4) para problema são marcados como prioritários, e os casos abertos
+desses CPFs sobem na fila do atendimento (priority_score da esteira).
+
+A ordenação usa COLLATE "C" para bater com a comparação de strings do
+Python; o merge confere a ordem e falha se ela não for crescente.
+"""
+import logging
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import insert, text, tuple_
+from sqlalchemy.orm import Session
+
+from ..models import Case, Client, ImportBatch, PayrollDiff, PayrollDiffItem
+from .case_changes import cursor_now
+from .case_dispatch import CLAIMABLE_STATUSES
+
+logger = logging.getLogger(__name__)
+
+PROBLEM_STATUSES = {"2", "3", "5", "6", "S"}
+SUCCESS_STATUSES = {"1", "4"}
+# Acima do 10 de calculate_status_summary (qualquer problema)
+REGRESSION_PRIORITY = 20
+
+FETCH_SIZE = 5000
+INSERT_CHUNK = 1000
+KINDS = ("unchanged", "status_changed", "value_changed", "new", "disappeared")
+
+_LINES_SQL = text(
+    'SELECT cpf, matricula, financiamento_code, status_code, valor_parcela_ref '
+    'FROM payroll_lines '
+    'WHERE entity_code = :entity_code AND ref_year = :year AND ref_month = :month '
+    'ORDER BY cpf COLLATE "C", matricula COLLATE "C", financiamento_code COLLATE "C"'
+)
+
+
+def previous_batch(db: Session, batch: ImportBatch) -> Optional[ImportBatch]:
+    """Último lote da mesma entidade com referência anterior à do lote."""
+    return (
+        db.query(ImportBatch)
+        .filter(
+            ImportBatch.entity_code == batch.entity_code,
+            tuple_(ImportBatch.ref_year, ImportBatch.ref_month) < tuple_(batch.ref_year, batch.ref_month),
+        )
+        .order_by(ImportBatch.ref_year.desc(), ImportBatch.ref_month.desc(), ImportBatch.id.desc())
+        .first()
+    )
+
+
+def _key(row) -> Tuple[str, str, str]:
+    return row.cpf, row.matricula, row.financiamento_code
+
+
+def _ordered(rows: Iterable) -> Iterator:
+    last = None
+    for row in rows:
+        key = _key(row)
+        if last is not None and key <= last:
+            raise ValueError(f"Linhas fora de ordem no merge: {last} -> {key}")
+        last = key
+        yield row
+
+
+def _item(kind: str, old, new) -> Dict[str, Any]:
+    ref = new if new is not None else old
+    old_status = old.status_code if old is not None else None
+    new_status = new.status_code if new is not None else None
+    return {
+        "kind": kind,
+        "cpf": ref.cpf,
+        "matricula": ref.matricula,
+        "financiamento_code": ref.financiamento_code,
+        "old_status": old_status,
+        "new_status": new_status,
+        "old_value": old.valor_parcela_ref if old is not None else None,
+        "new_value": new.valor_parcela_ref if new is not None else None,
+        "priority": old_status in SUCCESS_STATUSES and new_status in PROBLEM_STATUSES,
+    }
+
+
+def diff_rows(previous: Iterable, current: Iterable) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+    """
+    Merge ordenado de duas sequências de linhas (ordenadas pela chave).
+    Gera (tipo, item); item é None para linha sem mudança.
+    """
+    prev_it, cur_it = _ordered(previous), _ordered(current)
+    prev, cur = next(prev_it, None), next(cur_it, None)
+    while prev is not None or cur is not None:
+        if cur is None or (prev is not None and _key(prev) < _key(cur)):
+            yield "disappeared", _item("disappeared", prev, None)
+            prev = next(prev_it, None)
+        elif prev is None or _key(cur) < _key(prev):
+            yield "new", _item("new", None, cur)
+            cur = next(cur_it, None)
+        else:
+            if prev.status_code != cur.status_code:
+                yield "status_changed", _item("status_changed", prev, cur)
+            elif prev.valor_parcela_ref != cur.valor_parcela_ref:
+                yield "value_changed", _item("value_changed", prev, cur)
+            else:
+                yield "unchanged", None
+            prev, cur = next(prev_it, None), next(cur_it, None)
+
+
+def build_diff(db: Session, batch: ImportBatch) -> PayrollDiff:
+    """Calcula (ou recalcula) o diff do lote e prioriza os casos afetados."""
+    prev = previous_batch(db, batch)
+
+    db.query(PayrollDiff).filter(PayrollDiff.batch_id == batch.id).delete(synchronize_session=False)
+    diff = PayrollDiff(
+        batch_id=batch.id,
+        previous_batch_id=prev.id if prev else None,
+        entity_code=batch.entity_code,
+        ref_month=batch.ref_month,
+        ref_year=batch.ref_year,
+        previous_ref_month=prev.ref_month if prev else None,
+        previous_ref_year=prev.ref_year if prev else None,
+    )
+    db.add(diff)
+    db.flush()
+
+    counts = Counter({kind: 0 for kind in KINDS})
+    transitions: Counter = Counter()
+    buffer: List[Dict[str, Any]] = []
+
+    # Conexão separada para os dois cursores de leitura; a sessão só grava
+    with db.get_bind().connect() as conn:
+        stream = conn.execution_options(yield_per=FETCH_SIZE)
+        current = stream.execute(
+            _LINES_SQL, {"entity_code": batch.entity_code, "year": batch.ref_year, "month": batch.ref_month}
+        )
+        previous = stream.execute(
+            _LINES_SQL, {"entity_code": prev.entity_code, "year": prev.ref_year, "month": prev.ref_month}
+        ) if prev else []
+
+        for kind, item in diff_rows(previous, current):
+            counts[kind] += 1
+            if item is None:
+                continue
+            if kind == "status_changed":
+                transitions[f"{item['old_status']}->{item['new_status']}"] += 1
+            item["diff_id"] = diff.id
+            buffer.append(item)
+            if len(buffer) >= INSERT_CHUNK:
+                db.execute(insert(PayrollDiffItem), buffer)
+                buffer = []
+    if buffer:
+        db.execute(insert(PayrollDiffItem), buffer)
+
+    diff.counts = dict(counts)
+    diff.status_transitions = dict(transitions)
+    diff.prioritized_cases = prioritize_cases(db, diff)
+    db.commit()
+    logger.info(
+        f"Diff do lote {batch.id} ({batch.entity_code} {batch.ref_month:02d}/{batch.ref_year}) "
+        f"contra {prev.id if prev else 'nenhum'}: {dict(counts)}, {diff.prioritized_cases} casos priorizados"
+    )
+    return diff
+
+
+def prioritize_cases(db: Session, diff: PayrollDiff) -> int:
+    """
+    Sobe para REGRESSION_PRIORITY os casos ainda na fila dos CPFs com
+    financiamento que passou de efetivado para problema.
+    """
+    cpfs = [
+        cpf for (cpf,) in db.query(PayrollDiffItem.cpf).filter(
+            PayrollDiffItem.diff_id == diff.id,
+            PayrollDiffItem.priority.is_(True),
+        ).distinct()
+    ]
+    now = cursor_now()
+    updated = 0
+    for start in range(0, len(cpfs), 500):
+        cases = (
+            db.query(Case)
+            .join(Client, Client.id == Case.client_id)
+            .filter(Client.cpf.in_(cpfs[start:start + 500]), Case.status.in_(CLAIMABLE_STATUSES))
+            .all()
+        )
+        for case in cases:
+            # Reatribui o dict: mutação in-place de JSON não é detectada
+            summary = dict(case.payroll_status_summary or {})
+            summary["priority_score"] = REGRESSION_PRIORITY
+            summary["payroll_diff_id"] = diff.id
+            case.payroll_status_summary = summary
+            case.last_update_at = now
+            updated += 1
+    return updated
@@ -0,0 +1,59 @@
+"""
+Hashes de conteúdo da importação de folha (modo delta).
+
+Uma reimportação da mesma referência traz quase sempre as mesmas linhas.
+Com o hash gravado em payroll_lines.content_hash e
+cases.payroll_summary_hash, a importação compara antes de escrever e só
+atualiza o que mudou: sem UPDATE (nem WAL, nem tupla morta) para linha
+igual e sem mexer em last_update_at de caso cujo resumo não mudou.
+
+Os campos entram normalizados (texto sem espaços nas pontas, valores com
+2 casas), para que diferenças de formatação do arquivo não contem como
+mudança.
+"""
+import hashlib
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Optional
+
+import orjson
+
+# Campos que a importação grava numa linha já existente; a chave
+# (cpf, matricula, financiamento_code, referência) fica de fora
+LINE_FIELDS = (
+    "status_code",
+    "status_description",
+    "orgao",
+    "lanc",
+    "total_parcelas",
+    "parcelas_pagas",
+    "valor_parcela_ref",
+    "orgao_pagamento",
+    "orgao_pagamento_nome",
+)
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _normalize(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (Decimal, float)):
+        try:
+            return str(Decimal(str(value)).quantize(Decimal("0.01")))
+        except InvalidOperation:
+            return str(value)
+    return str(value).strip()
+
+
+def line_hash(line: Dict[str, Any], entity_id: Optional[int]) -> str:
+    """Hash dos campos atualizáveis de uma linha do parser."""
+    parts = [_normalize(line.get(field)) for field in LINE_FIELDS]
+    parts.append(_normalize(entity_id))
+    return _digest("\x1f".join(parts).encode())
+
+
+def summary_hash(summary: Dict[str, Any]) -> str:
+    """Hash do resumo de status (calculate_status_summary) de um cliente."""
+    return _digest(orjson.dumps(summary, option=orjson.OPT_SORT_KEYS))
@@ -0,0 +1,97 @@
+"""
+Partições de payroll_lines por referência (RANGE em ref_year, ref_month).
+
+Cada mês importado vive em payroll_lines_yYYYYmMM; payroll_lines_default
+recebe referências que ainda não têm partição (não deveria acontecer, a
+importação chama ensure_partition antes de gravar as linhas).
+
+O ganho de leitura (partition pruning) se limita às consultas com
+ref_year/ref_month na condição: a busca de linha existente na importação
+e as estatísticas de um lote só leem a partição do mês. As buscas por CPF
+continuam varrendo todas, pelo índice de cpf de cada uma.
+
+Referências antigas saem da tabela pelo arquivo frio
+(services/payroll_archive), que exporta a partição e faz DETACH + DROP,
+sem DELETE em massa.
+"""
+import logging
+import re
+from typing import List, Set, Tuple
+
+from sqlalchemy import text
+
+from ..db import engine
+
+logger = logging.getLogger(__name__)
+
+PARENT = "payroll_lines"
+DEFAULT_PARTITION = "payroll_lines_default"
+# Chave do pg_advisory_xact_lock da criação de partições
+PARTITION_LOCK_KEY = 72_002
+# DDL no pai espera no máximo isso por queries longas, em vez de enfileirar
+# todas as leituras de payroll_lines atrás do lock
+DDL_LOCK_TIMEOUT = "5s"
+
+_NAME_RE = re.compile(r"^payroll_lines_y(\d{4})m(\d{2})$")
+# Partições já conferidas neste processo
+_known: Set[Tuple[int, int]] = set()
+
+
+def partition_name(year: int, month: int) -> str:
+    return f"{PARENT}_y{year:04d}m{month:02d}"
+
+
+def _bounds(year: int, month: int) -> str:
+    ny, nm = (year + 1, 1) if month == 12 else (year, month + 1)
+    return f"FROM ({year}, {month}) TO ({ny}, {nm})"
+
+
+def list_partitions(conn) -> List[Tuple[int, int]]:
+    """(ano, mês) das partições anexadas, da mais antiga para a mais nova."""
+    rows = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = CAST(:parent AS regclass)"
+    ), {"parent": PARENT}).scalars()
+    refs = []
+    for name in rows:
+        m = _NAME_RE.match(name)
+        if m:
+            refs.append((int(m.group(1)), int(m.group(2))))
+    return sorted(refs)
+
+
+def ensure_partition(year: int, month: int) -> bool:
+    """
+    Garante a partição da referência; retorna True se ela foi criada agora.
+
+    Roda numa conexão própria, com commit imediato: o DDL não pode ficar
+    preso na transação (longa) da importação. A partição é criada solta,
+    recebe as linhas que estejam na DEFAULT e só então é anexada
+    (ATTACH PARTITION não bloqueia leituras e escritas no pai, ao contrário
+    de CREATE TABLE ... PARTITION OF).
+    """
+    if (year, month) in _known:
+        return False
+    name = partition_name(year, month)
+    created = False
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY})
+        exists = conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar()
+        if exists is None:
+            conn.execute(text(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT}'"))
+            conn.execute(text(f"CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS)"))
+            if conn.execute(text("SELECT to_regclass(:name)"), {"name": DEFAULT_PARTITION}).scalar():
+                moved = conn.execute(text(
+                    f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+                    f"WHERE ref_year = :y AND ref_month = :m RETURNING *) "
+                    f"INSERT INTO {name} SELECT * FROM moved"
+                ), {"y": year, "m": month}).rowcount
+                if moved:
+                    logger.warning(f"{moved} linhas de {year}/{month:02d} movidas de {DEFAULT_PARTITION} para {name}")
+            conn.execute(text(f"ALTER TABLE {PARENT} ATTACH PARTITION {name} FOR VALUES {_bounds(year, month)}"))
+            created = True
+            logger.info(f"Partição {name} criada")
+    _known.add((year, month))
+    return created
+
@@ -0,0 +1,230 @@
+"""
+Profiler por amostragem, em processo, para investigar lentidão em produção.
+
+Uma thread lê sys._current_frames() a cada PROFILING_INTERVAL_MS e conta
+as pilhas das threads ocupadas (threads ociosas do threadpool e o event
+loop parado em select são descartados). O resultado sai no formato
+"collapsed stacks" (uma linha "f1;f2;f3 N" por pilha), aceito por
+flamegraph.pl, speedscope e inferno.
+
+Dois modos, só para admin:
+
+- uma requisição: cabeçalho X-Profile: 1 (ProfilingMiddleware); a
+  resposta traz X-Profile-Id com o nome do arquivo;
+- o worker inteiro por N segundos: POST /admin/profiles?seconds=N.
+
+Os perfis ficam em UPLOAD_DIR/profiles. Com PROFILING_ENABLED desligado
+o middleware nem é instalado e nenhuma thread de amostragem existe.
+Amostra o processo todo: com requisições concorrentes no mesmo worker,
+as pilhas delas também aparecem.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+MAX_SECONDS = 120
+PROFILE_HEADER = "x-profile"
+
+# (fim do caminho do arquivo, função) do frame mais interno de uma thread ociosa
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("asyncio/runners.py", "run"),
+    ("uvloop/__init__.py", "run"),
+    ("concurrent/futures/thread.py", "_worker"),
+}
+
+# Um perfil por vez em cada worker: limita o overhead
+_active = threading.Lock()
+
+
+def profiles_dir() -> str:
+    path = os.path.join(settings.upload_dir, "profiles")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _frame_label(code) -> str:
+    # Caminho curto: "app/routers/cases.py", "sqlalchemy/orm/query.py"
+    filename = code.co_filename.replace(os.sep, "/")
+    for marker in ("/site-packages/", "/apps/api/"):
+        idx = filename.rfind(marker)
+        if idx >= 0:
+            filename = filename[idx + len(marker):]
+            break
+    else:
+        filename = os.path.basename(filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _is_idle(frame) -> bool:
+    filename = frame.f_code.co_filename.replace(os.sep, "/")
+    name = frame.f_code.co_name
+    return any(filename.endswith(suffix) and name == func for suffix, func in _IDLE_FRAMES)
+
+
+class StackSampler:
+    """Amostra as pilhas de todas as threads (exceto a própria) em intervalos fixos."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._started_at = 0.0
+        self.duration = 0.0
+
+    def start(self) -> "StackSampler":
+        self._started_at = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self) -> "StackSampler":
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._started_at
+        return self
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or _is_idle(frame):
+                    continue
+                stack: List[str] = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _profile_name(label: str) -> str:
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    safe = "".join(c if c.isalnum() else "_" for c in label).strip("_")[:60]
+    return f"{stamp}-{os.getpid()}-{safe or 'worker'}.collapsed"
+
+
+def _write_profile(name: str, sampler: StackSampler, header: str) -> str:
+    path = os.path.join(profiles_dir(), name)
+    with open(path, "w", encoding="utf-8") as f:
+        # Comentários são ignorados pelo flamegraph.pl/speedscope
+        f.write(f"# {header}\n")
+        f.write(f"# samples={sampler.samples} interval_ms={sampler.interval * 1000:.1f} "
+                f"duration_s={sampler.duration:.3f}\n")
+        f.write(sampler.collapsed())
+    logger.info(f"Perfil gravado: {path} ({sampler.samples} amostras)")
+    return path
+
+
+def profile_worker(seconds: float) -> Optional[str]:
+    """Amostra este worker por seconds; None se já houver um perfil em andamento."""
+    if not _active.acquire(blocking=False):
+        return None
+    try:
+        sampler = StackSampler(settings.profiling_interval_ms / 1000).start()
+        time.sleep(min(seconds, MAX_SECONDS))
+        sampler.stop()
+        return _write_profile(_profile_name(f"worker-{int(seconds)}s"), sampler, f"worker pid={os.getpid()}")
+    finally:
+        _active.release()
+
+
+def list_profiles() -> List[Dict[str, object]]:
+    directory = profiles_dir()
+    items = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        path = os.path.join(directory, name)
+        if name.endswith(".collapsed") and os.path.isfile(path):
+            stat = os.stat(path)
+            items.append({
+                "name": name,
+                "size": stat.st_size,
+                "created_at": datetime.fromtimestamp(stat.st_mtime),
+            })
+    return items
+
+
+def profile_path(name: str) -> Optional[str]:
+    """Caminho de um perfil pelo nome (sem permitir sair do diretório)."""
+    if os.path.basename(name) != name or not name.endswith(".collapsed"):
+        return None
+    path = os.path.join(profiles_dir(), name)
+    return path if os.path.isfile(path) else None
+
+
+def _is_admin(headers: Headers) -> bool:
+    # Import tardio: security depende de models/db
+    from ..security import get_current_user
+
+    cookies = {}
+    for part in headers.get("cookie", "").split(";"):
+        key, _, value = part.strip().partition("=")
+        if key:
+            cookies[key] = value
+    try:
+        user = get_current_user(
+            access=cookies.get("access"),
+            refresh=cookies.get("refresh"),
+            authorization=headers.get("authorization"),
+        )
+    except Exception:
+        return False
+    return user.role == "admin"
+
+
+class ProfilingMiddleware:
+    """Perfila a requisição quando um admin envia X-Profile: 1."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if headers.get(PROFILE_HEADER) != "1":
+            await self.app(scope, receive, send)
+            return
+        if not await run_in_threadpool(_is_admin, headers) or not _active.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        name = _profile_name(f"{scope['method']}-{scope['path']}")
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Profile-Id"] = name
+            await send(message)
+
+        sampler = StackSampler(settings.profiling_interval_ms / 1000).start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            _active.release()
+            query = scope.get("query_string", b"").decode("latin-1")
+            target = scope["path"] + (f"?{query}" if query else "")
+            await run_in_threadpool(
+                _write_profile, name, sampler, f"{scope['method']} {target} pid={os.getpid()}"
+            )
@@ -0,0 +1,187 @@
+"""
+Monitor de queries por requisição: queries lentas, N+1 e orçamento.
+
+Os hooks before/after_cursor_execute do SQLAlchemy acumulam, no contexto
+da requisição (iniciado pelo MetricsMiddleware):
+
+- número de queries e tempo de banco (vão para o /metrics);
+- contagem por formato de statement. O SQL já chega parametrizado, então
+  a mesma query dentro de um loop tem sempre o mesmo texto; N repetições
+  (N_PLUS_ONE_THRESHOLD) na mesma requisição são registradas como
+  possível N+1, com a rota;
+- queries acima de SLOW_QUERY_MS são registradas na hora, com a rota.
+
+Rotas quentes declaram um orçamento com
+dependencies=[Depends(query_budget(10))]. O orçamento fixo não cresce com
+a página, então um N+1 estoura; per_item fica para rotas que realmente
+precisam de queries por item. Estourar o orçamento gera um warning; com
+QUERY_BUDGET_ENFORCE=true (testes, dev) a query que estoura levanta
+QueryBudgetExceeded e a requisição falha.
+
+record_requests() coleta as estatísticas das requisições concluídas,
+para asserts em testes (ver tests/test_query_budget.py):
+
+    with record_requests() as recorded:
+        client.get("/cases?page_size=50")
+    assert recorded[-1].queries <= 10
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional
+
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import Scope
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class QueryBudgetExceeded(Exception):
+    """A requisição executou mais queries do que o orçamento da rota."""
+
+
+@dataclass
+class DbStats:
+    scope: Optional[Scope] = None
+    queries: int = 0
+    seconds: float = 0.0
+    budget: Optional[int] = None
+    shapes: Counter = field(default_factory=Counter)
+
+    @property
+    def method(self) -> str:
+        return self.scope["method"] if self.scope else ""
+
+    @property
+    def route(self) -> str:
+        return route_label(self.scope) if self.scope else UNMATCHED_ROUTE
+
+    def repeated_statements(self, threshold: int) -> List[tuple]:
+        """Statements executados threshold+ vezes: [(statement, vezes)]."""
+        return [(s, n) for s, n in self.shapes.most_common() if n >= threshold]
+
+
+def route_label(scope: Scope) -> str:
+    """Template da rota (baixa cardinalidade); rotas inexistentes agrupadas."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+# Handlers síncronos rodam no threadpool com uma cópia do contexto:
+# o objeto é o mesmo, então o que eles somam aparece aqui.
+_db_stats: ContextVar[Optional[DbStats]] = ContextVar("db_stats", default=None)
+
+_recorders: List[List[DbStats]] = []
+_recorders_lock = threading.Lock()
+
+
+def current_db_stats() -> Optional[DbStats]:
+    """Queries/tempo de banco da requisição atual (None fora de requisições)."""
+    return _db_stats.get()
+
+
+def start_request(scope: Scope) -> Token:
+    return _db_stats.set(DbStats(scope=scope))
+
+
+def finish_request(token: Token) -> DbStats:
+    """Encerra o contexto da requisição e registra N+1 / orçamento estourado."""
+    stats = _db_stats.get()
+    _db_stats.reset(token)
+
+    for statement, count in stats.repeated_statements(settings.n_plus_one_threshold):
+        logger.warning(
+            f"Possível N+1 em {stats.method} {stats.route}: "
+            f"{count}x {_shorten(statement)}"
+        )
+    if stats.budget is not None and stats.queries > stats.budget:
+        logger.warning(
+            f"Orçamento de queries estourado em {stats.method} {stats.route}: "
+            f"{stats.queries} > {stats.budget}"
+        )
+
+    with _recorders_lock:
+        for recorded in _recorders:
+            recorded.append(stats)
+    return stats
+
+
+@contextmanager
+def record_requests() -> Iterator[List[DbStats]]:
+    """Coleta as DbStats das requisições concluídas dentro do bloco."""
+    recorded: List[DbStats] = []
+    with _recorders_lock:
+        _recorders.append(recorded)
+    try:
+        yield recorded
+    finally:
+        with _recorders_lock:
+            _recorders.remove(recorded)
+
+
+def query_budget(max_queries: int, per_item: int = 0, page_param: str = "page_size", default_page_size: int = 20):
+    """
+    Dependência que declara o orçamento de queries da rota:
+    max_queries fixas + per_item por item da página (?page_size=).
+    """
+    def dep(request: Request):
+        stats = _db_stats.get()
+        if stats is None:
+            return
+        budget = max_queries
+        if per_item:
+            try:
+                page_size = int(request.query_params.get(page_param, default_page_size))
+            except ValueError:
+                page_size = default_page_size
+            budget += per_item * page_size
+        stats.budget = budget
+    return dep
+
+
+def _shorten(statement: str, limit: int = 300) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + "..."
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    stats = _db_stats.get()
+
+    if elapsed * 1000 >= settings.slow_query_ms:
+        where = f"{stats.method} {stats.route}" if stats else "fora de requisição"
+        logger.warning(f"Query lenta ({elapsed * 1000:.0f} ms) em {where}: {_shorten(statement)}")
+
+    if stats is None:
+        return
+    stats.queries += 1
+    stats.seconds += elapsed
+    stats.shapes[statement] += 1
+
+    if settings.query_budget_enforce and stats.budget is not None and stats.queries > stats.budget:
+        raise QueryBudgetExceeded(
+            f"{stats.method} {stats.route} excedeu o orçamento de {stats.budget} queries"
+        )
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start_time"):
+        conn.info["query_start_time"].pop()
@@ -0,0 +1,373 @@
+"""
+Motor de ranking set-based.
+Calcula todas as métricas de pontuação (volume, consultoria líquida,
+ticket médio, renda líquida) para todos os usuários em UMA query agrupada
+por período, com a posição calculada por window function no banco.
+
+Compartilhado por rankings, campanhas, campaigns e users/performance.
+"""
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Iterable, List, Optional
+
+from sqlalchemy import func, case, literal, or_, union_all, select
+from sqlalchemy.orm import Session
+
+from ..models import User, Case, Contract, FinanceIncome, FinanceExpense
+
+
+# Critérios aceitos em Campaign.criterio_pontuacao
+CRITERIOS_PONTUACAO = [
+    "volume_contratos",
+    "percentual_renda_liquida",
+    "consultoria_liquida",
+    "ticket_medio",
+]
+
+# Receitas já deduzidas de imposto/comissão (somar direto)
+INCOME_TYPES_LIQUIDAS = [
+    "Consultoria Líquida - Atendente",
+    "Consultoria Líquida - Balcão",
+    "Consultoria Líquida",
+]
+
+# Receitas brutas (precisam dedução das despesas do atendente)
+INCOME_TYPES_BRUTAS = [
+    "Consultoria Bruta - Atendente",
+    "Consultoria Bruta - Balcão",
+    "Consultoria - Atendente",
+    "Consultoria - Balcão",
+]
+
+# Despesas deduzidas da produção do atendente
+EXPENSE_TYPES_DEDUCAO = ["Impostos", "Comissão"]
+
+# Renda líquida estimada sobre o valor total dos contratos
+RENDA_LIQUIDA_FATOR = 0.8
+
+
+@dataclass
+class RankingRow:
+    """Linha do ranking com todas as métricas de um usuário."""
+    user_id: int
+    name: str
+    email: str
+    role: str
+    contratos: int
+    valor_total_contratos: float
+    consultoria_contratos: float
+    consultoria_liquida: float
+    receitas_total: float
+    despesas: float
+    renda_liquida: float
+    percentual_renda_liquida: float
+    ticket_medio: float
+    ticket_medio_consultoria: float
+    pontuacao: float
+    posicao: int
+    total: int
+
+
+def owner_user_id_expr():
+    """
+    Dono do contrato para ranking:
+    1) Contract.agent_user_id, se preenchido;
+    2) senão, Case.assigned_user_id (fallback).
+    """
+    return case(
+        (Contract.agent_user_id.isnot(None), Contract.agent_user_id),
+        else_=Case.assigned_user_id
+    )
+
+
+def contract_date_expr():
+    """Data de referência do contrato usada nos rankings gerais."""
+    return func.coalesce(
+        Contract.signed_at, Contract.disbursed_at, Contract.created_at
+    )
+
+
+def _contracts_subquery(db: Session, start, end, date_column):
+    """Agregado de contratos ativos por dono, no período (limites inclusivos)."""
+    owner = owner_user_id_expr()
+    q = (
+        db.query(
+            owner.label("user_id"),
+            func.count(Contract.id).label("contratos"),
+            func.coalesce(func.sum(Contract.total_amount), 0).label("valor_total"),
+            func.coalesce(func.sum(Contract.consultoria_valor_liquido), 0).label("consultoria_contratos"),
+        )
+        .join(Case, Case.id == Contract.case_id, isouter=True)
+        .filter(Contract.status == "ativo")
+    )
+    if start is not None:
+        q = q.filter(date_column >= start)
+    if end is not None:
+        q = q.filter(date_column <= end)
+    return q.group_by(owner).subquery("contracts_agg")
+
+
+def _finance_subquery(db: Session, start, end):
+    """
+    Agregado financeiro por atendente em uma única passada:
+    receitas e despesas são unidas (UNION ALL) e somadas condicionalmente.
+    """
+    income_rows = select(
+        FinanceIncome.agent_user_id.label("user_id"),
+        case((FinanceIncome.income_type.in_(INCOME_TYPES_LIQUIDAS), FinanceIncome.amount), else_=0).label("liquida"),
+        case((FinanceIncome.income_type.in_(INCOME_TYPES_LIQUIDAS), 1), else_=0).label("liquida_qtd"),
+        case((FinanceIncome.income_type.in_(INCOME_TYPES_BRUTAS), FinanceIncome.amount), else_=0).label("bruta"),
+        case((FinanceIncome.income_type.in_(INCOME_TYPES_BRUTAS), 1), else_=0).label("bruta_qtd"),
+        FinanceIncome.amount.label("receita"),
+        literal(0).label("despesa"),
+    ).where(FinanceIncome.agent_user_id.isnot(None))
+
+    expense_rows = select(
+        FinanceExpense.agent_user_id.label("user_id"),
+        literal(0).label("liquida"),
+        literal(0).label("liquida_qtd"),
+        literal(0).label("bruta"),
+        literal(0).label("bruta_qtd"),
+        literal(0).label("receita"),
+        FinanceExpense.amount.label("despesa"),
+    ).where(
+        FinanceExpense.agent_user_id.isnot(None),
+        FinanceExpense.expense_type.in_(EXPENSE_TYPES_DEDUCAO),
+    )
+
+    if start is not None:
+        income_rows = income_rows.where(FinanceIncome.date >= start)
+        expense_rows = expense_rows.where(FinanceExpense.date >= start)
+    if end is not None:
+        income_rows = income_rows.where(FinanceIncome.date <= end)
+        expense_rows = expense_rows.where(FinanceExpense.date <= end)
+
+    movimentos = union_all(income_rows, expense_rows).subquery("movimentos")
+
+    return (
+        db.query(
+            movimentos.c.user_id.label("user_id"),
+            func.sum(movimentos.c.liquida).label("liquida"),
+            func.sum(movimentos.c.liquida_qtd).label("liquida_qtd"),
+            func.sum(movimentos.c.bruta).label("bruta"),
+            func.sum(movimentos.c.bruta_qtd).label("bruta_qtd"),
+            func.sum(movimentos.c.receita).label("receita"),
+            func.sum(movimentos.c.despesa).label("despesa"),
+        )
+        .group_by(movimentos.c.user_id)
+        .subquery("finance_agg")
+    )
+
+
+def _consultoria_liquida_expr(finance):
+    """Líquidas somam direto; brutas só deduzem despesas se existirem receitas brutas."""
+    return func.coalesce(finance.c.liquida, 0) + case(
+        (func.coalesce(finance.c.bruta_qtd, 0) > 0,
+         func.coalesce(finance.c.bruta, 0) - func.coalesce(finance.c.despesa, 0)),
+        else_=0
+    )
+
+
+def compute_ranking(
+    db: Session,
+    start: date | datetime | None = None,
+    end: date | datetime | None = None,
+    criterio: str = "consultoria_liquida",
+    *,
+    date_column=None,
+    consultoria_de_contratos: bool = False,
+    consultoria_so_com_contratos: bool = False,
+    user_ids: Optional[Iterable[int]] = None,
+    roles: Optional[Iterable[str]] = None,
+    only_active: bool = False,
+    only_with_activity: bool = False,
+    min_score: Optional[float] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+) -> List[RankingRow]:
+    """
+    Calcula o ranking de todos os usuários para um período.
+
+    Args:
+        db: Sessão do banco de dados
+        start, end: Período (None = sem limite naquele lado)
+        criterio: Critério de pontuação (ver CRITERIOS_PONTUACAO)
+        date_column: Coluna de data do contrato (padrão: contract_date_expr())
+        consultoria_de_contratos: Pontua "consultoria_liquida" pela soma de
+            Contract.consultoria_valor_liquido em vez das receitas/despesas;
+            o agregado financeiro nem entra na query (receitas/despesas = 0)
+        consultoria_so_com_contratos: Consultoria líquida (receitas/despesas)
+            só conta para quem tem contrato no período; sem contrato fica 0,
+            como no ranking de atendentes original
+        user_ids / roles / only_active: Filtros de usuários participantes
+        only_with_activity: Apenas usuários com contratos ou receitas no período
+        min_score: Pontuação mínima (aplicada antes do cálculo de posição)
+        limit / offset: Paginação sobre o ranking já ordenado
+
+    Returns:
+        Lista de RankingRow ordenada pela posição
+    """
+    if date_column is None:
+        date_column = contract_date_expr()
+
+    contracts = _contracts_subquery(db, start, end, date_column)
+    finance = None if consultoria_de_contratos else _finance_subquery(db, start, end)
+
+    contratos = func.coalesce(contracts.c.contratos, 0)
+    valor_total = func.coalesce(contracts.c.valor_total, 0)
+    consultoria_contratos = func.coalesce(contracts.c.consultoria_contratos, 0)
+
+    if finance is None:
+        consultoria_liquida = consultoria_contratos
+        receitas_total = despesas = literal(0)
+    else:
+        consultoria_liquida = _consultoria_liquida_expr(finance)
+        if consultoria_so_com_contratos:
+            consultoria_liquida = case((contratos > 0, consultoria_liquida), else_=0)
+        receitas_total = func.coalesce(finance.c.receita, 0)
+        despesas = func.coalesce(finance.c.despesa, 0)
+
+    renda_liquida = valor_total * RENDA_LIQUIDA_FATOR
+    percentual_renda_liquida = case(
+        (valor_total > 0, RENDA_LIQUIDA_FATOR * 100), else_=0
+    )
+    ticket_medio = case(
+        (contratos > 0, valor_total / func.nullif(contratos, 0)), else_=0
+    )
+    ticket_medio_consultoria = case(
+        (contratos > 0, consultoria_liquida / func.nullif(contratos, 0)), else_=0
+    )
+
+    scores = {
+        "volume_contratos": contratos,
+        "percentual_renda_liquida": percentual_renda_liquida,
+        "consultoria_liquida": consultoria_liquida,
+        "ticket_medio": ticket_medio,
+    }
+    pontuacao = scores.get(criterio, literal(0))
+
+    base = (
+        db.query(
+            User.id.label("user_id"),
+            User.name.label("name"),
+            User.email.label("email"),
+            User.role.label("role"),
+            contratos.label("contratos"),
+            valor_total.label("valor_total_contratos"),
+            consultoria_contratos.label("consultoria_contratos"),
+            consultoria_liquida.label("consultoria_liquida"),
+            receitas_total.label("receitas_total"),
+            despesas.label("despesas"),
+            renda_liquida.label("renda_liquida"),
+            percentual_renda_liquida.label("percentual_renda_liquida"),
+            ticket_medio.label("ticket_medio"),
+            ticket_medio_consultoria.label("ticket_medio_consultoria"),
+            pontuacao.label("pontuacao"),
+        )
+        .outerjoin(contracts, contracts.c.user_id == User.id)
+    )
+    if finance is not None:
+        base = base.outerjoin(finance, finance.c.user_id == User.id)
+
+    if user_ids is not None:
+        base = base.filter(User.id.in_(list(user_ids)))
+    if roles is not None:
+        base = base.filter(User.role.in_(list(roles)))
+    if only_active:
+        base = base.filter(User.active == True)
+    if only_with_activity:
+        ativos = [contracts.c.user_id.isnot(None)]
+        if finance is not None:
+            ativos += [finance.c.liquida_qtd > 0, finance.c.bruta_qtd > 0]
+        base = base.filter(or_(*ativos))
+    if min_score is not None:
+        base = base.filter(pontuacao > min_score)
+
+    base = base.subquery("ranking_base")
+
+    ranked = db.query(
+        base,
+        func.row_number().over(
+            order_by=(base.c.pontuacao.desc(), base.c.user_id)
+        ).label("posicao"),
+        func.count().over().label("total"),
+    ).subquery("ranking")
+
+    q = db.query(ranked).order_by(ranked.c.posicao)
+    if offset:
+        q = q.offset(offset)
+    if limit is not None:
+        q = q.limit(limit)
+
+    return [
+        RankingRow(
+            user_id=row.user_id,
+            name=row.name,
+            email=row.email,
+            role=row.role,
+            contratos=int(row.contratos or 0),
+            valor_total_contratos=float(row.valor_total_contratos or 0),
+            consultoria_contratos=float(row.consultoria_contratos or 0),
+            consultoria_liquida=float(row.consultoria_liquida or 0),
+            receitas_total=float(row.receitas_total or 0),
+            despesas=float(row.despesas or 0),
+            renda_liquida=float(row.renda_liquida or 0),
+            percentual_renda_liquida=float(row.percentual_renda_liquida or 0),
+            ticket_medio=float(row.ticket_medio or 0),
+            ticket_medio_consultoria=float(row.ticket_medio_consultoria or 0),
+            pontuacao=float(row.pontuacao or 0),
+            posicao=int(row.posicao),
+            total=int(row.total),
+        )
+        for row in q.all()
+    ]
+
+
+def compute_campaign_ranking(
+    db: Session,
+    campanha,
+    *,
+    user_ids: Optional[Iterable[int]] = None,
+    min_score: Optional[float] = None,
+    limit: Optional[int] = None,
+) -> List[RankingRow]:
+    """
+    Ranking de uma campanha: usuários ativos, contratos ativos assinados
+    dentro do período da campanha, pontuados pelo critério da campanha.
+    A pontuação vem só dos contratos (sem o agregado financeiro).
+    """
+    return compute_ranking(
+        db,
+        campanha.data_inicio,
+        campanha.data_fim,
+        campanha.criterio_pontuacao,
+        date_column=Contract.signed_at,
+        consultoria_de_contratos=True,
+        user_ids=user_ids,
+        only_active=True,
+        min_score=min_score,
+        limit=limit,
+    )
+
+
+
+def consultoria_liquida_por_usuario(
+    db: Session,
+    start: date | datetime | None = None,
+    end: date | datetime | None = None,
+    user_id: int | None = None,
+) -> dict[int, float]:
+    """
+    Consultoria líquida por usuário (receitas líquidas + brutas deduzidas
+    de impostos/comissão) em uma única query agrupada.
+
+    Retorna dict {user_id: valor_liquido}
+    """
+    finance = _finance_subquery(db, start, end)
+    consultoria_liquida = _consultoria_liquida_expr(finance)
+    q = db.query(finance.c.user_id, consultoria_liquida.label("valor")).filter(
+        or_(finance.c.liquida_qtd > 0, finance.c.bruta_qtd > 0)
+    )
+    if user_id:
+        q = q.filter(finance.c.user_id == user_id)
+    return {row.user_id: float(row.valor or 0) for row in q.all()}
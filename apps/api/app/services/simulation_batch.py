@@ -0,0 +1,238 @@
+"""
+Simulação em lote (vetorizada com NumPy).
+
+Avalia uma grade de cenários (coeficientes × percentuais de consultoria ×
+seguros) sobre o MESMO conjunto de bancos em uma única chamada.
+
+Os resultados são idênticos aos de compute_simulation_totals: as operações
+de ponto flutuante são executadas na mesma ordem (banco a banco), e o
+arredondamento half-up reproduz round_half_up, caindo para o cálculo com
+Decimal apenas nos valores que estão a um ulp de um empate (.xx5).
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from itertools import zip_longest
+from typing import List, Optional
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from .simulation_service import (
+    SimulationBankInput,
+    SimulationInput,
+    SimulationTotals,
+    is_margin_bank,
+    validate_simulation_input,
+)
+
+# Limite de cenários por chamada (grade completa)
+MAX_SCENARIOS = 20000
+
+# Tolerância relativa para detectar valores próximos de um empate .xx5
+_TIE_TOLERANCE = 1e-9
+
+
+class SimulationBatchInput(BaseModel):
+    banks: List[SimulationBankInput]          # 1 a 6 bancos (mesmo banks_json)
+    prazo: int = 96                           # meses (informativo, igual à simulação)
+    coeficientes: List[str]                   # texto livre, vírgula ou ponto
+    percentuaisConsultoria: List[float]       # 0-100%
+    seguros: List[float] = Field(default_factory=lambda: [0.0])  # R$
+    top: Optional[int] = 10                   # melhores cenários (None = todos)
+
+
+class SimulationScenario(BaseModel):
+    coeficiente: str
+    percentualConsultoria: float
+    seguro: float
+    totals: SimulationTotals
+
+
+class SimulationBatchResult(BaseModel):
+    prazo: int
+    totalCenarios: int
+    cenarios: List[SimulationScenario]
+
+
+def _parse_coeficiente(value: str) -> float:
+    """Normaliza coeficiente como em compute_simulation_totals."""
+    try:
+        coeficiente = float(str(value or "0").replace(",", "."))
+    except ValueError:
+        raise ValueError(f"Coeficiente inválido: {value}")
+    if coeficiente <= 0:
+        raise ValueError("Coeficiente deve ser maior que zero")
+    return coeficiente
+
+
+def validate_simulation_batch_input(input_data: SimulationBatchInput) -> List[str]:
+    """
+    Aplica validate_simulation_input à grade: os bancos e o prazo uma vez e
+    cada coeficiente, percentual e seguro em pelo menos uma simulação.
+    Retorna a lista de erros (sem repetição).
+    """
+    if not (input_data.coeficientes and input_data.percentuaisConsultoria and input_data.seguros):
+        return []
+
+    errors: List[str] = []
+    for coeficiente, percentual, seguro in zip_longest(
+        input_data.coeficientes,
+        input_data.percentuaisConsultoria,
+        input_data.seguros,
+    ):
+        simulation = SimulationInput(
+            banks=input_data.banks,
+            prazo=input_data.prazo,
+            coeficiente=coeficiente if coeficiente is not None else input_data.coeficientes[0],
+            seguro=seguro if seguro is not None else input_data.seguros[0],
+            percentualConsultoria=(
+                percentual if percentual is not None else input_data.percentuaisConsultoria[0]
+            ),
+        )
+        for error in validate_simulation_input(simulation):
+            if error not in errors:
+                errors.append(error)
+    return errors
+
+
+def round_half_up_array(values: np.ndarray) -> np.ndarray:
+    """
+    Versão vetorizada de round_half_up (2 casas, empates longe do zero,
+    sobre a representação decimal mais curta do float).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    scaled = np.abs(values) * 100.0
+    floor = np.floor(scaled)
+    frac = scaled - floor
+
+    result = np.sign(values) * np.floor(scaled + 0.5) / 100.0
+
+    # Perto de um empate, o float pode estar logo abaixo/acima de .xx5:
+    # resolver exatamente como a função escalar (Decimal(str(x))).
+    ambiguous = np.abs(frac - 0.5) <= _TIE_TOLERANCE * np.maximum(scaled, 1.0)
+    if ambiguous.any():
+        flat_values = values.reshape(-1)
+        flat_result = result.reshape(-1)
+        for idx in np.flatnonzero(ambiguous.reshape(-1)):
+            decimal_value = Decimal(str(float(flat_values[idx])))
+            flat_result[idx] = float(
+                decimal_value.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            )
+        result = flat_result.reshape(values.shape)
+
+    # Normalizar -0.0 para 0.0
+    return result + 0.0
+
+
+def compute_simulation_batch(input_data: SimulationBatchInput) -> SimulationBatchResult:
+    """
+    Calcula todos os cenários da grade e retorna os melhores,
+    ordenados por liberadoCliente (maior primeiro).
+    """
+    if not input_data.coeficientes:
+        raise ValueError("Informe pelo menos um coeficiente")
+    if not input_data.percentuaisConsultoria:
+        raise ValueError("Informe pelo menos um percentual de consultoria")
+    if not input_data.seguros:
+        raise ValueError("Informe pelo menos um valor de seguro")
+
+    total_cenarios = (
+        len(input_data.coeficientes)
+        * len(input_data.percentuaisConsultoria)
+        * len(input_data.seguros)
+    )
+    if total_cenarios > MAX_SCENARIOS:
+        raise ValueError(f"Máximo de {MAX_SCENARIOS} cenários por chamada")
+
+    coeficientes = np.array(
+        [_parse_coeficiente(c) for c in input_data.coeficientes], dtype=np.float64
+    )[:, None, None]
+    percentuais = np.array(
+        [p or 0.0 for p in input_data.percentuaisConsultoria], dtype=np.float64
+    )[None, :, None]
+    seguros = np.array(
+        [s or 0.0 for s in input_data.seguros], dtype=np.float64
+    )[None, None, :]
+
+    # Acumular banco a banco, na mesma ordem da função escalar
+    total_financiado = np.zeros_like(coeficientes)
+    liberado_total = np.zeros_like(coeficientes)
+    valor_a_subtrair = np.zeros_like(coeficientes)
+    saldo_total = 0.0
+
+    for bank in input_data.banks:
+        if is_margin_bank(bank.bank):
+            continue
+        parcela = bank.parcela or 0.0
+        saldo_devedor = bank.saldoDevedor or 0.0
+
+        financiado = parcela / coeficientes
+        liberado = financiado - saldo_devedor
+
+        total_financiado = total_financiado + financiado
+        saldo_total += saldo_devedor
+        liberado_total = liberado_total + liberado
+
+    for bank in input_data.banks:
+        if not is_margin_bank(bank.bank):
+            continue
+        parcela = abs(bank.parcela or 0.0)
+        valor_a_subtrair = valor_a_subtrair + parcela / coeficientes
+
+    valor_parcela_total = sum(bank.parcela or 0.0 for bank in input_data.banks)
+
+    # Cálculos finais (broadcast para a grade coeficiente × percentual × seguro)
+    shape = (coeficientes.shape[0], percentuais.shape[1], seguros.shape[2])
+    valor_liquido = np.broadcast_to(liberado_total - seguros, shape)
+    custo_consultoria = np.broadcast_to(total_financiado * (percentuais / 100.0), shape)
+    custo_consultoria_liquido = custo_consultoria * 0.86
+    liberado_cliente = valor_liquido - custo_consultoria - valor_a_subtrair
+
+    total_financiado = np.broadcast_to(total_financiado, shape)
+    liberado_total = np.broadcast_to(liberado_total, shape)
+    valor_a_subtrair = np.broadcast_to(valor_a_subtrair, shape)
+
+    rounded = {
+        "totalFinanciado": round_half_up_array(total_financiado),
+        "liberadoTotal": round_half_up_array(liberado_total),
+        "valorLiquido": round_half_up_array(valor_liquido),
+        "custoConsultoria": round_half_up_array(custo_consultoria),
+        "custoConsultoriaLiquido": round_half_up_array(custo_consultoria_liquido),
+        "valorASubtrair": round_half_up_array(valor_a_subtrair),
+        "liberadoCliente": round_half_up_array(liberado_cliente),
+    }
+    valor_parcela_total_r = float(round_half_up_array(np.array(valor_parcela_total)))
+    saldo_total_r = float(round_half_up_array(np.array(saldo_total)))
+    seguros_r = round_half_up_array(seguros.reshape(-1))
+
+    # Melhores cenários por liberadoCliente (estável: ordem da grade no empate)
+    flat_liberado = rounded["liberadoCliente"].reshape(-1)
+    order = np.argsort(-flat_liberado, kind="stable")
+    if input_data.top is not None:
+        order = order[:max(input_data.top, 0)]
+
+    cenarios = []
+    for flat_idx in order:
+        ci, pi, si = np.unravel_index(flat_idx, shape)
+        cenarios.append(SimulationScenario(
+            coeficiente=input_data.coeficientes[ci],
+            percentualConsultoria=float(input_data.percentuaisConsultoria[pi]),
+            seguro=float(input_data.seguros[si]),
+            totals=SimulationTotals(
+                valorParcelaTotal=valor_parcela_total_r,
+                saldoTotal=saldo_total_r,
+                liberadoTotal=float(rounded["liberadoTotal"][ci, pi, si]),
+                seguroObrigatorio=float(seguros_r[si]),
+                totalFinanciado=float(rounded["totalFinanciado"][ci, pi, si]),
+                valorLiquido=float(rounded["valorLiquido"][ci, pi, si]),
+                custoConsultoria=float(rounded["custoConsultoria"][ci, pi, si]),
+                custoConsultoriaLiquido=float(rounded["custoConsultoriaLiquido"][ci, pi, si]),
+                valorASubtrair=float(rounded["valorASubtrair"][ci, pi, si]),
+                liberadoCliente=float(flat_liberado[flat_idx]),
+            )
+        ))
+
+    return SimulationBatchResult(
+        prazo=input_data.prazo,
+        totalCenarios=total_cenarios,
+        cenarios=cenarios,
+    )
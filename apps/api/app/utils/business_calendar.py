@@ -0,0 +1,258 @@
+"""
+Calendário de dias úteis pré-calculado.
+
+Mantém um array ordenado com os ordinais (date.toordinal()) dos dias úteis
+de um intervalo de anos, excluindo fins de semana e uma lista plugável de
+feriados (nacionais, estaduais - ex.: PI - e municipais). Com isso:
+
+- "dias úteis entre A e B" vira duas buscas binárias (bisect);
+- "adicionar N horas úteis" vira aritmética sobre o índice do dia útil.
+
+Ambas as operações são O(log n) em vez de percorrer dia a dia.
+Uma variante vetorizada (NumPy) atende recálculos em massa
+(ex.: assignment_expires_at de milhares de casos).
+"""
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, time, timedelta
+from typing import Callable, Iterable, List, Sequence, Set
+
+import numpy as np
+
+DAY = timedelta(days=1)
+_DAY_US = 86_400_000_000  # microssegundos em um dia
+
+# Provedor de feriados: recebe um ano e retorna as datas de feriado daquele ano
+HolidayProvider = Callable[[int], Iterable[date]]
+
+
+def easter_sunday(year: int) -> date:
+    """Domingo de Páscoa (algoritmo anônimo gregoriano / Meeus)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def national_holidays(year: int) -> List[date]:
+    """Feriados nacionais (Lei 662/1949, Lei 6.802/1980, Lei 14.759/2023)."""
+    easter = easter_sunday(year)
+    holidays = [
+        date(year, 1, 1),    # Confraternização Universal
+        date(year, 4, 21),   # Tiradentes
+        date(year, 5, 1),    # Dia do Trabalho
+        date(year, 9, 7),    # Independência
+        date(year, 10, 12),  # Nossa Senhora Aparecida
+        date(year, 11, 2),   # Finados
+        date(year, 11, 15),  # Proclamação da República
+        date(year, 12, 25),  # Natal
+        easter - timedelta(days=2),  # Sexta-feira Santa
+    ]
+    if year >= 2024:
+        holidays.append(date(year, 11, 20))  # Consciência Negra
+    return holidays
+
+
+# Feriados estaduais fixos (mês, dia)
+STATE_HOLIDAYS = {
+    "PI": [
+        (3, 13),   # Batalha do Jenipapo
+        (10, 19),  # Dia do Piauí
+    ],
+}
+
+
+def state_holidays(uf: str) -> HolidayProvider:
+    """Provedor de feriados estaduais fixos para a UF informada."""
+    dates = STATE_HOLIDAYS.get((uf or "").upper(), [])
+
+    def provider(year: int) -> List[date]:
+        return [date(year, month, day) for month, day in dates]
+
+    return provider
+
+
+def combine_providers(*providers: HolidayProvider) -> HolidayProvider:
+    """Combina vários provedores de feriados em um só."""
+    def provider(year: int) -> Set[date]:
+        result: Set[date] = set()
+        for p in providers:
+            result.update(p(year))
+        return result
+
+    return provider
+
+
+class BusinessCalendar:
+    """
+    Calendário de dias úteis com índice pré-calculado.
+
+    Considera úteis os dias de segunda a sexta que não estão na lista de
+    feriados. Todas as horas de um dia útil contam (24h/dia), como no
+    cálculo original de add_business_hours.
+    """
+
+    def __init__(
+        self,
+        holidays: HolidayProvider = national_holidays,
+        start_year: int = 2020,
+        end_year: int = 2035,
+    ):
+        self.holidays = holidays
+        self._build(start_year, end_year)
+
+    def _build(self, start_year: int, end_year: int) -> None:
+        holiday_ordinals = set()
+        for year in range(start_year, end_year + 1):
+            holiday_ordinals.update(d.toordinal() for d in self.holidays(year))
+
+        first = date(start_year, 1, 1).toordinal()
+        last = date(end_year, 12, 31).toordinal()
+        self.start_year = start_year
+        self.end_year = end_year
+        self.ordinals = [
+            o for o in range(first, last + 1)
+            if (o - 1) % 7 < 5 and o not in holiday_ordinals  # ordinal 1 = segunda
+        ]
+        self._ordinals_np = np.array(self.ordinals, dtype=np.int64)
+
+    def _ensure_range(self, *years: int) -> None:
+        """Estende o intervalo pré-calculado se alguma data cair fora dele."""
+        low = min(years)
+        high = max(years)
+        if low < self.start_year or high >= self.end_year:
+            self._build(min(low, self.start_year), max(high + 1, self.end_year))
+
+    # -----------------------------
+    # Consultas escalares (bisect)
+    # -----------------------------
+    def is_business_day(self, d: date | datetime) -> bool:
+        if isinstance(d, datetime):
+            d = d.date()
+        self._ensure_range(d.year)
+        o = d.toordinal()
+        i = bisect_left(self.ordinals, o)
+        return i < len(self.ordinals) and self.ordinals[i] == o
+
+    def count_business_days_between(self, start_dt: date | datetime, end_dt: date | datetime) -> int:
+        """Quantidade de dias úteis entre duas datas (inclusive)."""
+        if start_dt > end_dt:
+            return 0
+        start = start_dt.date() if isinstance(start_dt, datetime) else start_dt
+        end = end_dt.date() if isinstance(end_dt, datetime) else end_dt
+        self._ensure_range(start.year, end.year)
+        return (
+            bisect_right(self.ordinals, end.toordinal())
+            - bisect_left(self.ordinals, start.toordinal())
+        )
+
+    def add_business_hours(self, start_dt: datetime, hours: float) -> datetime:
+        """
+        Adiciona horas úteis a uma data, pulando fins de semana e feriados.
+
+        Se a data inicial cair em dia não útil, a contagem começa às 00:00
+        do próximo dia útil. Terminar exatamente no fim de um dia útil
+        retorna 00:00 do dia seguinte (mesmo comportamento do loop original).
+        """
+        if hours <= 0:
+            return start_dt
+
+        self._ensure_range(start_dt.year, (start_dt + timedelta(hours=hours * 3)).year)
+
+        day_ordinal = start_dt.toordinal()
+        index = bisect_left(self.ordinals, day_ordinal)
+        if self.ordinals[index] == day_ordinal:
+            offset = start_dt - datetime.combine(start_dt.date(), time(0), tzinfo=start_dt.tzinfo)
+        else:
+            offset = timedelta(0)
+
+        # Posição em "tempo útil" desde o início do primeiro dia útil do índice
+        position = index * DAY + offset + timedelta(hours=hours)
+
+        # Dia útil que contém a posição final, com resto em (0, 24h]
+        days, remainder = divmod(position, DAY)
+        if remainder == timedelta(0):
+            days -= 1
+            remainder = DAY
+
+        self._ensure_index(days)
+        result_day = date.fromordinal(self.ordinals[days])
+        return datetime.combine(result_day, time(0), tzinfo=start_dt.tzinfo) + remainder
+
+    def _ensure_index(self, index: int) -> None:
+        while index >= len(self.ordinals):
+            self._build(self.start_year, self.end_year + 5)
+
+    # -----------------------------
+    # Variante vetorizada (NumPy)
+    # -----------------------------
+    def add_business_hours_bulk(self, starts: Sequence[datetime], hours: float) -> List[datetime]:
+        """
+        Versão vetorizada de add_business_hours para recálculos em massa.
+        Todas as datas devem compartilhar o mesmo tzinfo (ou nenhum).
+        """
+        if not starts:
+            return []
+        if hours <= 0:
+            return list(starts)
+
+        years = [s.year for s in starts]
+        self._ensure_range(min(years), max(years) + int(hours // (24 * 200)) + 1)
+
+        tzinfo = starts[0].tzinfo
+        day_ordinals = np.fromiter((s.toordinal() for s in starts), dtype=np.int64, count=len(starts))
+        offsets_us = np.fromiter(
+            ((s.hour * 3600 + s.minute * 60 + s.second) * 1_000_000 + s.microsecond for s in starts),
+            dtype=np.int64,
+            count=len(starts),
+        )
+
+        ordinals = self._ordinals_np
+        index = np.searchsorted(ordinals, day_ordinals, side="left")
+        is_business = ordinals[np.minimum(index, len(ordinals) - 1)] == day_ordinals
+        offsets_us = np.where(is_business, offsets_us, 0)
+
+        hours_us = int(round(hours * 3600 * 1_000_000))
+        position = index * _DAY_US + offsets_us + hours_us
+
+        days, remainder = np.divmod(position, _DAY_US)
+        at_boundary = remainder == 0
+        days = np.where(at_boundary, days - 1, days)
+        remainder = np.where(at_boundary, _DAY_US, remainder)
+
+        self._ensure_index(int(days.max()))
+        result_ordinals = self._ordinals_np[days]
+
+        return [
+            datetime.combine(date.fromordinal(int(o)), time(0), tzinfo=tzinfo) + timedelta(microseconds=int(r))
+            for o, r in zip(result_ordinals, remainder)
+        ]
+
+
+_default_calendar: BusinessCalendar | None = None
+
+
+def get_default_calendar() -> BusinessCalendar:
+    """Calendário padrão: feriados nacionais + estaduais da UF configurada."""
+    global _default_calendar
+    if _default_calendar is None:
+        from ..config import settings
+        _default_calendar = BusinessCalendar(
+            holidays=combine_providers(
+                national_holidays,
+                state_holidays(settings.business_calendar_state),
+            )
+        )
+    return _default_calendar
+
+
+def set_default_calendar(calendar: BusinessCalendar) -> None:
+    """Substitui o calendário padrão (ex.: lista de feriados customizada)."""
+    global _default_calendar
+    _default_calendar = calendar
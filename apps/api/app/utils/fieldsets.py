@@ -0,0 +1,74 @@
+"""
+Sparse fieldsets: ?fields=id,status,client.name
+
+Permite que a tela peça só os campos que o card renderiza. Caminhos com
+ponto descem em objetos aninhados; em listas, o filtro vale para cada
+item. Um prefixo sozinho ("client") mantém o objeto inteiro. Campos
+desconhecidos são ignorados.
+
+Além de podar a resposta (FieldSet.apply), os handlers consultam
+FieldSet.wants antes de buscar dados caros (financiamentos, anexos,
+contrato...), para não pagar queries cujo resultado seria descartado.
+"""
+from typing import Any, Dict, Optional, Union
+
+_Tree = Union[bool, Dict[str, "_Tree"]]
+
+
+class FieldSet:
+    def __init__(self, tree: Optional[Dict[str, _Tree]] = None):
+        # None = todos os campos
+        self.tree = tree
+
+    @classmethod
+    def parse(cls, fields: Optional[str]) -> "FieldSet":
+        if not fields or not fields.strip():
+            return cls()
+        tree: Dict[str, _Tree] = {}
+        for path in fields.split(","):
+            parts = [p.strip() for p in path.split(".") if p.strip()]
+            if not parts:
+                continue
+            node = tree
+            for part in parts[:-1]:
+                child = node.get(part)
+                if child is True:
+                    break
+                if child is None:
+                    child = node[part] = {}
+                node = child
+            else:
+                node[parts[-1]] = True
+        return cls(tree or None)
+
+    def wants(self, path: str) -> bool:
+        """True se algum campo em path (ou abaixo dele) foi pedido."""
+        node: _Tree = self.tree if self.tree is not None else True
+        for part in path.split("."):
+            if node is True:
+                return True
+            node = node.get(part)
+            if node is None:
+                return False
+        return True
+
+    def apply(self, data: Any) -> Any:
+        """Poda data (dict, lista de dicts ou escalar) para os campos pedidos."""
+        if self.tree is None:
+            return data
+        return _prune(data, self.tree)
+
+
+def _prune(data: Any, tree: _Tree) -> Any:
+    if tree is True:
+        return data
+    if isinstance(data, dict):
+        # Percorre a árvore pedida (poucos campos), não o item inteiro
+        return {
+            k: data[k] if sub is True else _prune(data[k], sub)
+            for k, sub in tree.items()
+            if k in data
+        }
+    if isinstance(data, list):
+        return [_prune(item, tree) for item in data]
+    return data
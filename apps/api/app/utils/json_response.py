@@ -0,0 +1,69 @@
+"""
+Resposta JSON rápida (orjson) usada como default_response_class da API.
+
+Serializa nativamente datetime/date/time (ISO 8601, igual a isoformat()),
+UUID, Enum, dataclasses e arrays NumPy. Decimal vira float, como os
+handlers já faziam manualmente, e linhas do SQLAlchemy viram dicts.
+
+Handlers com listas grandes podem retornar FastJSONResponse(conteudo)
+diretamente, com datetimes/Decimals crus: isso pula o jsonable_encoder do
+FastAPI (recursivo, em Python) e a formatação manual item a item.
+
+Sem orjson instalado, cai para json.dumps com o mesmo tratamento de tipos.
+"""
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any
+from uuid import UUID
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - fallback sem a dependência
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """Tipos que o serializador não conhece nativamente."""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if hasattr(obj, "_mapping"):  # Row do SQLAlchemy
+        return dict(obj._mapping)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if hasattr(obj, "model_dump"):  # modelos Pydantic
+        return obj.model_dump(mode="json")
+    if hasattr(obj, "tolist"):  # escalares/arrays NumPy (fallback)
+        return obj.tolist()
+    if orjson is None:
+        if isinstance(obj, (datetime, date, time)):
+            return obj.isoformat()
+        if isinstance(obj, UUID):
+            return str(obj)
+    raise TypeError(f"Tipo não serializável em JSON: {type(obj).__name__}")
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=_OPTIONS)
+else:
+    def dumps(content: Any) -> bytes:
+        return json.dumps(
+            content,
+            ensure_ascii=False,
+            allow_nan=False,
+            indent=None,
+            separators=(",", ":"),
+            default=_default,
+        ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,92 @@
+"""
+Benchmark do cálculo de horas/dias úteis.
+
+Compara o loop dia a dia original com o calendário pré-calculado
+(busca binária) e com a variante vetorizada (NumPy).
+
+Uso:
+    python bench_business_days.py [--n 5000]
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from app.utils.business_calendar import BusinessCalendar
+
+
+def _legacy_add_business_hours(start_dt: datetime, hours: int) -> datetime:
+    """Loop original (sem feriados), mantido aqui apenas como referência."""
+    current = start_dt
+    remaining_hours = hours
+    while remaining_hours > 0:
+        while current.weekday() >= 5:
+            days_to_add = (7 - current.weekday()) if current.weekday() == 6 else 2
+            current += timedelta(days=days_to_add)
+            current = current.replace(hour=0, minute=0, second=0, microsecond=0)
+        hours_until_end_of_day = 24 - (current.hour + current.minute / 60.0 + current.second / 3600.0)
+        if remaining_hours <= hours_until_end_of_day:
+            current += timedelta(hours=remaining_hours)
+            remaining_hours = 0
+        else:
+            current += timedelta(hours=hours_until_end_of_day)
+            remaining_hours -= hours_until_end_of_day
+            current = current.replace(hour=0, minute=0, second=0, microsecond=0)
+            current += timedelta(days=1)
+    return current
+
+
+def _legacy_count_business_days_between(start_dt: datetime, end_dt: datetime) -> int:
+    if start_dt > end_dt:
+        return 0
+    count = 0
+    current = start_dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    end = end_dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    while current <= end:
+        if current.weekday() < 5:
+            count += 1
+        current += timedelta(days=1)
+    return count
+
+
+def _timed(label: str, fn):
+    t0 = time.perf_counter()
+    result = fn()
+    print(f"{label:<40} {time.perf_counter() - t0:8.4f}s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=5000)
+    args = parser.parse_args()
+
+    random.seed(42)
+    base = datetime(2025, 1, 1)
+    starts = [
+        base + timedelta(minutes=random.randint(0, 365 * 24 * 60))
+        for _ in range(args.n)
+    ]
+    ends = [s + timedelta(days=random.randint(0, 120)) for s in starts]
+
+    # Sem feriados para comparar contagens com o loop original
+    calendar = BusinessCalendar(holidays=lambda year: [])
+
+    print(f"n = {args.n}")
+    _timed("add_business_hours (loop original)",
+           lambda: [_legacy_add_business_hours(s, 48) for s in starts])
+    _timed("add_business_hours (calendário)",
+           lambda: [calendar.add_business_hours(s, 48) for s in starts])
+    _timed("add_business_hours_bulk (NumPy)",
+           lambda: calendar.add_business_hours_bulk(starts, 48))
+
+    legacy = _timed("count_business_days (loop original)",
+                    lambda: [_legacy_count_business_days_between(s, e) for s, e in zip(starts, ends)])
+    new = _timed("count_business_days (calendário)",
+                 lambda: [calendar.count_business_days_between(s, e) for s, e in zip(starts, ends)])
+    print(f"divergências na contagem: {sum(a != b for a, b in zip(legacy, new))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Teste de carga do POST /cases/claim-next (services/case_dispatch).
+
+Cria um lote de casos "novo" de uma entidade exclusiva do teste, dispara
+N atendentes concorrentes pegando casos até a fila esvaziar e verifica
+que nenhum caso foi entregue duas vezes. Mostra vazão e latência por
+claim. Os dados criados são removidos no final.
+
+Precisa de PostgreSQL (SKIP LOCKED) em DATABASE_URL e de um usuário
+existente (--user-id, padrão: o primeiro usuário ativo).
+
+Uso:
+    python bench_claim.py [--claimers 100] [--cases 2000] [--user-id 1]
+"""
+
+import argparse
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.models import Case, CaseEvent, Client, ImportBatch, PayrollLine, User
+from app.services.case_dispatch import claim_next_case
+
+
+def _seed(Session, n_cases: int, entity: str) -> tuple:
+    now = datetime.now()
+    with Session() as db:
+        batch = ImportBatch(
+            entity_code="BENCH", entity_name=entity, ref_month=now.month,
+            ref_year=now.year, generated_at=now, filename="bench_claim",
+        )
+        db.add(batch)
+        db.flush()
+
+        clients = [
+            Client(name=f"Bench {i}", cpf=f"{90000000000 + i}", matricula=f"B{i:06d}")
+            for i in range(n_cases)
+        ]
+        db.add_all(clients)
+        db.flush()
+
+        db.add_all([
+            PayrollLine(
+                batch_id=batch.id, cpf=c.cpf, matricula=c.matricula,
+                status_code="1", status_description="Lançado e Efetivado",
+                financiamento_code="0001", entity_code="BENCH", entity_name=entity,
+                ref_month=now.month, ref_year=now.year,
+            )
+            for c in clients
+        ])
+        cases = [
+            Case(
+                client_id=c.id, status="novo", source="bench",
+                created_at=now - timedelta(minutes=random.randint(0, 10_000)),
+                payroll_status_summary={"priority_score": random.choice((1, 5, 10))},
+            )
+            for c in clients
+        ]
+        db.add_all(cases)
+        db.commit()
+        return batch.id, [c.id for c in clients], [c.id for c in cases]
+
+
+def _cleanup(Session, batch_id: int, client_ids: list, case_ids: list) -> None:
+    with Session() as db:
+        db.query(CaseEvent).filter(CaseEvent.case_id.in_(case_ids)).delete(synchronize_session=False)
+        db.query(Case).filter(Case.id.in_(case_ids)).delete(synchronize_session=False)
+        db.query(PayrollLine).filter(PayrollLine.batch_id == batch_id).delete(synchronize_session=False)
+        db.query(Client).filter(Client.id.in_(client_ids)).delete(synchronize_session=False)
+        db.query(ImportBatch).filter(ImportBatch.id == batch_id).delete(synchronize_session=False)
+        db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--claimers", type=int, default=100)
+    parser.add_argument("--cases", type=int, default=2000)
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args()
+
+    engine = create_engine(settings.db_uri, pool_size=args.claimers, max_overflow=0)
+    Session = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+    with Session() as db:
+        q = db.query(User).filter(User.active == True)  # noqa: E712
+        user = db.get(User, args.user_id) if args.user_id else q.order_by(User.id).first()
+        if user is None:
+            raise SystemExit("Nenhum usuário encontrado (--user-id)")
+
+    entity = f"BENCH CLAIM {uuid.uuid4().hex[:8]}"
+    batch_id, client_ids, case_ids = _seed(Session, args.cases, entity)
+    print(f"{args.cases} casos criados; {args.claimers} atendentes concorrentes (usuário {user.id})")
+
+    claimed = []
+    latencies = []
+    lock = threading.Lock()
+    start_gate = threading.Barrier(args.claimers)
+
+    def claimer():
+        mine, times = [], []
+        start_gate.wait()
+        while True:
+            t0 = time.perf_counter()
+            with Session() as db:
+                case = claim_next_case(db, user, entity=entity)
+                if case is None:
+                    break
+                db.commit()
+                mine.append(case.id)
+            times.append(time.perf_counter() - t0)
+        with lock:
+            claimed.extend(mine)
+            latencies.extend(times)
+
+    try:
+        threads = [threading.Thread(target=claimer) for _ in range(args.claimers)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        duplicates = [case_id for case_id, n in Counter(claimed).items() if n > 1]
+        latencies.sort()
+        p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000  # noqa: E731
+        print(f"claims: {len(claimed)} / {args.cases}  duplicados: {len(duplicates)}")
+        print(f"tempo: {elapsed:.2f} s  vazão: {len(claimed) / elapsed:.0f} claims/s")
+        print(f"latência: p50 {p(0.5):.1f} ms  p95 {p(0.95):.1f} ms  p99 {p(0.99):.1f} ms")
+        if duplicates or len(claimed) != args.cases:
+            raise SystemExit("FALHOU: casos duplicados ou não distribuídos")
+    finally:
+        _cleanup(Session, batch_id, client_ids, case_ids)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Benchmark de serialização JSON das respostas grandes.
+
+Compara o caminho antigo (formatação manual de datetime/Decimal +
+jsonable_encoder do FastAPI + json.dumps do UTF8JSONResponse) com o
+FastJSONResponse (orjson, tipos crus) para:
+
+- uma página de 200 itens de GET /cases (list_cases);
+- a fila completa de GET /finance/queue.
+
+Uso:
+    python bench_json.py [--queue 2000] [--repeat 50]
+"""
+
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+
+from app.utils.json_response import FastJSONResponse, orjson
+
+
+def _legacy_render(content) -> bytes:
+    """Caminho antigo: jsonable_encoder + UTF8JSONResponse (json.dumps)."""
+    return json.dumps(
+        jsonable_encoder(content),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def _preformat(value):
+    """Formatação manual que os handlers faziam (isoformat/float item a item)."""
+    if isinstance(value, dict):
+        return {k: _preformat(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_preformat(v) for v in value]
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _case_item(i: int) -> dict:
+    now = datetime(2025, 1, 1, 9, 0) + timedelta(minutes=i * 7, microseconds=i)
+    return {
+        "id": i,
+        "status": random.choice(["novo", "em_atendimento", "calculista_pendente"]),
+        "client_id": 1000 + i,
+        "assigned_user_id": random.choice([None, 3, 7]),
+        "assigned_to": random.choice([None, "Maria Souza", "João Lima"]),
+        "last_update_at": now,
+        "created_at": now - timedelta(days=3),
+        "banco": "BANCO SANTANDER",
+        "entidade": "BANCO SANTANDER",
+        "referencia_competencia": "01/2025",
+        "importado_em": now - timedelta(days=3),
+        "client": {
+            "name": f"Cliente {i} da Silva",
+            "cpf": f"{i:011d}",
+            "matricula": f"{i:06d}",
+            "num_financiamentos": random.randint(0, 9),
+        },
+    }
+
+
+def _queue_item(i: int) -> dict:
+    now = datetime(2025, 1, 1, 9, 0) + timedelta(minutes=i * 11, microseconds=i)
+    dec = lambda: Decimal(random.randint(10000, 9999999)) / 100  # noqa: E731
+    return {
+        "id": i,
+        "client_id": 1000 + i,
+        "status": "financeiro_pendente",
+        "assigned_user_id": 3,
+        "client": {
+            "id": 1000 + i, "name": f"Cliente {i}", "cpf": f"{i:011d}",
+            "matricula": f"{i:06d}", "banco": "001", "agencia": "1234",
+            "conta": "12345-6", "chave_pix": None, "tipo_chave_pix": None,
+        },
+        "simulation": {
+            "id": i, "status": "approved",
+            "totals": {k: dec() for k in (
+                "valorParcelaTotal", "saldoTotal", "liberadoTotal", "seguroObrigatorio",
+                "totalFinanciado", "valorLiquido", "custoConsultoria", "liberadoCliente",
+            )},
+            "banks": [{"bank": "SANTANDER", "parcela": 350.5, "saldoDevedor": 9000.0}],
+            "prazo": 96,
+            "percentualConsultoria": 12.0,
+        },
+        "contract": {
+            "id": i, "total_amount": dec(), "installments": 96,
+            "disbursed_at": now, "status": "ativo",
+            "consultoria_liquida": dec(), "consultoria_bruta": dec(),
+            "imposto_percentual": 14.0,
+            "attachments": [
+                {"id": j, "filename": "comprovante.pdf", "size": 123456,
+                 "mime": "application/pdf", "mime_type": "application/pdf",
+                 "uploaded_at": now}
+                for j in range(2)
+            ],
+        },
+        "attachments": [
+            {"id": j, "filename": "rg.jpg", "size": 234567, "mime": "image/jpeg",
+             "mime_type": "image/jpeg", "uploaded_at": now}
+            for j in range(3)
+        ],
+    }
+
+
+def _timed(label: str, fn, repeat: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = (time.perf_counter() - t0) / repeat * 1000
+    print(f"{label:<46} {elapsed:8.2f} ms")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queue", type=int, default=2000, help="itens na fila financeira")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    random.seed(7)
+    response = FastJSONResponse(content=None)
+    print(f"serializador: {'orjson' if orjson else 'json (fallback)'}")
+
+    for label, build, n in (
+        ("list_cases (200 itens)", _case_item, 200),
+        (f"finance/queue ({args.queue} itens)", _queue_item, args.queue),
+    ):
+        print(f"\n{label}")
+        rows = {"items": [build(i) for i in range(n)]}
+        assert json.loads(_legacy_render(_preformat(rows))) == json.loads(response.render(rows))
+        old = _timed(
+            "  antigo: formatação + jsonable_encoder + json",
+            lambda: _legacy_render(_preformat(rows)),
+            args.repeat,
+        )
+        new = _timed(
+            "  novo: tipos crus + FastJSONResponse",
+            lambda: response.render(rows),
+            args.repeat,
+        )
+        print(f"  speedup: {old / new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
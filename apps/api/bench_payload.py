@@ -0,0 +1,109 @@
+"""
+Benchmark de tamanho de payload e tempo de codificação das telas grandes.
+
+Para cada resposta (detalhe do caso, página de GET /cases e a fila de
+GET /finance/queue), compara a resposta completa com a pedida via
+?fields= (campos que o card renderiza), sem compressão, com GZip e com
+Brotli (se instalado), usando o mesmo CompressionMiddleware da API.
+O tempo "json ms" da variante com fields inclui a poda (FieldSet.apply).
+O ganho maior nos handlers, as queries por item que deixam de rodar
+(contrato, anexos, contagem de financiamentos), não aparece aqui.
+
+Uso:
+    python bench_payload.py [--queue 2000] [--financiamentos 120] [--repeat 20]
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from bench_json import _case_item, _queue_item
+from app.utils.compression import CompressionMiddleware, brotli
+from app.utils.fieldsets import FieldSet
+from app.utils.json_response import dumps
+
+# Campos usados pelos cards das listagens
+CASE_CARD_FIELDS = "id,status,assigned_to,last_update_at,entidade,client.name,client.cpf"
+QUEUE_CARD_FIELDS = "id,status,client.name,client.cpf,simulation.totals,contract.status,contract.total_amount"
+CASE_HEADER_FIELDS = "id,status,assigned_user,entidade,client.name,client.cpf,client.matricula,simulation"
+
+
+def _case_detail(financiamentos: int) -> dict:
+    now = datetime(2025, 1, 1, 9, 0)
+    detail = _case_item(1)
+    detail["client"].update({
+        "id": 1001, "matriculas": [{"matricula": f"{i:06d}", "orgao": "SEDUC"} for i in range(3)],
+        "orgao": "SEDUC", "banco": "001", "agencia": "1234", "conta": "12345-6",
+        "financiamentos": [
+            {
+                "id": i, "matricula": "000123", "financiamento_code": f"{i:04d}",
+                "total_parcelas": 96, "parcelas_pagas": random.randint(0, 96),
+                "valor_parcela_ref": "350.50", "orgao_pagamento": "001",
+                "orgao_pagamento_nome": "SECRETARIA DE EDUCACAO", "entity_name": "BANCO SANTANDER",
+                "status_code": "1", "status_description": "Ativo",
+                "referencia": f"{i % 12 + 1:02d}/2024", "entity_code": "033",
+                "cargo": "PROFESSOR", "orgao": "SEDUC", "lanc": "1",
+            }
+            for i in range(financiamentos)
+        ],
+    })
+    detail["simulation"] = _queue_item(1)["simulation"]
+    detail["attachments"] = _queue_item(1)["attachments"]
+    detail["contract"] = _queue_item(1)["contract"] | {"created_at": now - timedelta(days=2)}
+    return detail
+
+
+def _encoded_size(middleware: CompressionMiddleware, encoding: str, body: bytes) -> int:
+    encoder = middleware.encoder(encoding)
+    return len(encoder.process(body) + encoder.finish())
+
+
+def _timed(fn, repeat: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queue", type=int, default=2000, help="itens na fila financeira")
+    parser.add_argument("--financiamentos", type=int, default=120, help="linhas de folha do CPF")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    random.seed(7)
+    middleware = CompressionMiddleware(app=None)
+    encodings = ["gzip"] + (["br"] if brotli else [])
+
+    screens = (
+        ("GET /cases/{id}", _case_detail(args.financiamentos), CASE_HEADER_FIELDS, False),
+        ("GET /cases (200 itens)", [_case_item(i) for i in range(200)], CASE_CARD_FIELDS, True),
+        (f"GET /finance/queue ({args.queue} itens)",
+         [_queue_item(i) for i in range(args.queue)], QUEUE_CARD_FIELDS, True),
+    )
+
+    header = f"{'':<34}{'bytes':>10}" + "".join(f"{enc:>10}" for enc in encodings)
+    header += f"{'json ms':>10}" + "".join(f"{enc + ' ms':>10}" for enc in encodings)
+    for label, content, fields, is_list in screens:
+        print(f"\n{label}\n{header}")
+        for variant, fieldset in (("completo", FieldSet()), (f"fields={fields[:20]}...", FieldSet.parse(fields))):
+            payload = {"items": fieldset.apply(content)} if is_list else fieldset.apply(content)
+            body = dumps(payload)
+            sizes = [_encoded_size(middleware, enc, body) for enc in encodings]
+            json_ms = _timed(lambda: dumps(fieldset.apply(content)), args.repeat)
+            enc_ms = [
+                _timed(lambda enc=enc: _encoded_size(middleware, enc, body), args.repeat)
+                for enc in encodings
+            ]
+            print(
+                f"  {variant:<32}{len(body):>10}"
+                + "".join(f"{s:>10}" for s in sizes)
+                + f"{json_ms:>10.2f}"
+                + "".join(f"{ms:>10.2f}" for ms in enc_ms)
+            )
+
+
+if __name__ == "__main__":
+    main()
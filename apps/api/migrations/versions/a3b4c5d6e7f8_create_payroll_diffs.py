@@ -0,0 +1,69 @@
+"""create_payroll_diffs
+
+Revision ID: a3b4c5d6e7f8
+Revises: f2a3b4c5d6e7
+Create Date: 2025-12-10 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3b4c5d6e7f8'
+down_revision: Union[str, None] = 'f2a3b4c5d6e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Cria payroll_diffs (resumo da comparação de um lote com o anterior da
+    mesma entidade) e payroll_diff_items (financiamentos que mudaram).
+    """
+    op.create_table(
+        'payroll_diffs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('batch_id', sa.Integer(), nullable=False),
+        sa.Column('previous_batch_id', sa.Integer(), nullable=True),
+        sa.Column('entity_code', sa.String(length=16), nullable=False),
+        sa.Column('ref_month', sa.Integer(), nullable=False),
+        sa.Column('ref_year', sa.Integer(), nullable=False),
+        sa.Column('previous_ref_month', sa.Integer(), nullable=True),
+        sa.Column('previous_ref_year', sa.Integer(), nullable=True),
+        sa.Column('counts', sa.JSON(), nullable=False),
+        sa.Column('status_transitions', sa.JSON(), nullable=False),
+        sa.Column('prioritized_cases', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['batch_id'], ['import_batches.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['previous_batch_id'], ['import_batches.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('batch_id')
+    )
+    op.create_table(
+        'payroll_diff_items',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('diff_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=16), nullable=False),
+        sa.Column('cpf', sa.String(length=14), nullable=False),
+        sa.Column('matricula', sa.String(length=32), nullable=False),
+        sa.Column('financiamento_code', sa.String(length=16), nullable=False),
+        sa.Column('old_status', sa.String(length=1), nullable=True),
+        sa.Column('new_status', sa.String(length=1), nullable=True),
+        sa.Column('old_value', sa.Numeric(precision=12, scale=2), nullable=True),
+        sa.Column('new_value', sa.Numeric(precision=12, scale=2), nullable=True),
+        sa.Column('priority', sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(['diff_id'], ['payroll_diffs.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ix_payroll_diff_items_diff_kind', 'payroll_diff_items', ['diff_id', 'kind', 'id'], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_payroll_diff_items_diff_kind', table_name='payroll_diff_items')
+    op.drop_table('payroll_diff_items')
+    op.drop_table('payroll_diffs')
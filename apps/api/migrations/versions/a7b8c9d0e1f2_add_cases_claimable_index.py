@@ -0,0 +1,35 @@
+"""add_cases_claimable_index
+
+Revision ID: a7b8c9d0e1f2
+Revises: f5a6b7c8d9e0
+Create Date: 2025-12-03 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7b8c9d0e1f2'
+down_revision: Union[str, None] = 'f5a6b7c8d9e0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Índice parcial para POST /cases/claim-next: casos disponíveis
+    ordenados por prioridade da folha e idade (services/case_dispatch).
+    """
+    op.execute(
+        """
+        CREATE INDEX IF NOT EXISTS ix_cases_claimable
+        ON cases (((payroll_status_summary ->> 'priority_score')::int) DESC NULLS LAST, created_at, id)
+        WHERE status IN ('novo', 'em_atendimento')
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_cases_claimable")
@@ -0,0 +1,54 @@
+"""create_campaign_leaderboard_table
+
+Revision ID: c2d3e4f5a6b7
+Revises: f1a2b3c4d5e6
+Create Date: 2025-11-28 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2d3e4f5a6b7'
+down_revision: Union[str, None] = 'f1a2b3c4d5e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Cria tabela campaign_leaderboard (ranking materializado por campanha ativa).
+    """
+    op.create_table(
+        'campaign_leaderboard',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('campaign_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('volume_contratos', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('valor_total_contratos', sa.Numeric(precision=14, scale=2), server_default='0', nullable=False),
+        sa.Column('valor_consultoria', sa.Numeric(precision=14, scale=2), server_default='0', nullable=False),
+        sa.Column('ticket_medio', sa.Numeric(precision=14, scale=2), server_default='0', nullable=False),
+        sa.Column('pontuacao', sa.Numeric(precision=16, scale=2), server_default='0', nullable=False),
+        sa.Column('posicao', sa.Integer(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['campaign_id'], ['campaigns.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('campaign_id', 'user_id', name='uq_campaign_leaderboard_user')
+    )
+
+    # Leitura do top-N por campanha
+    op.create_index(
+        'ix_campaign_leaderboard_position',
+        'campaign_leaderboard',
+        ['campaign_id', 'posicao'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_campaign_leaderboard_position', table_name='campaign_leaderboard')
+    op.drop_table('campaign_leaderboard')
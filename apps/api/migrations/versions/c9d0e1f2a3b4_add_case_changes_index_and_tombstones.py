@@ -0,0 +1,43 @@
+"""add_case_changes_index_and_tombstones
+
+Revision ID: c9d0e1f2a3b4
+Revises: b8c9d0e1f2a3
+Create Date: 2025-12-05 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9d0e1f2a3b4'
+down_revision: Union[str, None] = 'b8c9d0e1f2a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Suporte ao delta de GET /cases/changes: índice do cursor
+    (last_update_at, id) e tabela case_tombstones (casos excluídos).
+    """
+    op.create_index(
+        'ix_cases_last_update_at_id', 'cases', ['last_update_at', 'id']
+    )
+    op.create_table(
+        'case_tombstones',
+        sa.Column('case_id', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('case_id')
+    )
+    op.create_index(
+        'ix_case_tombstones_deleted_at', 'case_tombstones', ['deleted_at']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_case_tombstones_deleted_at', table_name='case_tombstones')
+    op.drop_table('case_tombstones')
+    op.drop_index('ix_cases_last_update_at_id', table_name='cases')
@@ -0,0 +1,63 @@
+"""add_hot_path_indexes
+
+Revision ID: d0e1f2a3b4c5
+Revises: c9d0e1f2a3b4
+Create Date: 2025-12-06 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd0e1f2a3b4c5'
+down_revision: Union[str, None] = 'c9d0e1f2a3b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (nome, tabela, colunas, where) - derivados das consultas quentes;
+# tests/test_indexes.py confere com EXPLAIN que continuam sendo usados
+INDEXES = [
+    # list_cases com filtro de status (ordem por id) e status-counts
+    ('ix_cases_status_id', 'cases', ['status', 'id'], None),
+    # Caso aberto do cliente na importação; join cases -> clients
+    ('ix_cases_client_id', 'cases', ['client_id', 'id'], None),
+    # Visão do atendente (atribuição expirada) e casos atribuídos ativos
+    ('ix_cases_assignment_expires_at', 'cases', ['assignment_expires_at'], None),
+    # Varredura de SLA: só atribuições em status abertos
+    ('ix_cases_sla_open', 'cases', ['assignment_expires_at'],
+     "assigned_user_id IS NOT NULL AND status IN ('em_atendimento', 'calculista_pendente')"),
+    # Histórico do caso (e exclusão em cascata)
+    ('ix_case_events_case_id_created_at', 'case_events', ['case_id', 'created_at'], None),
+    # Analytics/SLA: eventos de um tipo num período
+    ('ix_case_events_type_created_at', 'case_events', ['type', 'created_at'], None),
+    ('ix_attachments_case_id', 'attachments', ['case_id'], None),
+    ('ix_simulations_case_id', 'simulations', ['case_id'], None),
+    # Fila do calculista e analytics por período
+    ('ix_simulations_status_updated_at', 'simulations', ['status', 'updated_at'], None),
+    # Rankings/campanhas por atendente e período; dashboards por período
+    ('ix_finance_incomes_agent_date_type', 'finance_incomes', ['agent_user_id', 'date', 'income_type'], None),
+    ('ix_finance_incomes_date', 'finance_incomes', ['date'], None),
+    ('ix_finance_expenses_agent_date_type', 'finance_expenses', ['agent_user_id', 'date', 'expense_type'], None),
+    ('ix_finance_expenses_date', 'finance_expenses', ['date'], None),
+]
+
+
+def upgrade() -> None:
+    """
+    Índices das consultas mais frequentes: listagem e contadores de casos,
+    varredura de SLA, histórico, rankings e analytics.
+    """
+    for name, table, columns, where in INDEXES:
+        op.create_index(
+            name, table, columns, unique=False, if_not_exists=True,
+            postgresql_where=sa.text(where) if where else None
+        )
+
+
+def downgrade() -> None:
+    for name, table, _columns, _where in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,116 @@
+"""create_entities_dimension
+
+Revision ID: d3e4f5a6b7c8
+Revises: c2d3e4f5a6b7
+Create Date: 2025-11-29 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3e4f5a6b7c8'
+down_revision: Union[str, None] = 'c2d3e4f5a6b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _normalize_bank_name(name: str) -> str:
+    """
+    Cópia de app.services.entity_service.normalize_bank_name na data da
+    migração: a migração não pode mudar se a função do app mudar depois.
+    """
+    if not name:
+        return name
+    normalized = name.upper().strip()
+
+    # BANCO DO BRASIL: tratar PRIMEIRO antes de remover BRASIL
+    if 'BANCO DO BRASIL' in normalized:
+        return 'BANCO DO BRASIL'
+
+    # Remover sufixos societários
+    normalized = normalized.replace(' S.A.', '').replace(' S/A', '').replace(' S.A', '')
+
+    # Padronizar bancos específicos
+    if 'SANTANDER' in normalized and not normalized.startswith('BANCO'):
+        normalized = 'BANCO SANTANDER'
+    elif 'SANATANDER' in normalized:
+        normalized = 'BANCO SANTANDER'
+    elif 'DAYCOVAL' in normalized and not normalized.startswith('BANCO'):
+        normalized = 'BANCO DAYCOVAL'
+    elif 'DIGIO' in normalized and 'PREVIDENCIA' not in normalized:
+        normalized = 'BANCO DIGIO'
+    elif 'FUTURO PREVID' in normalized:
+        return 'FUTURO PREVIDÊNCIA'
+    elif 'EQUATORIAL PREVID' in normalized:
+        return 'EQUATORIAL PREVIDÊNCIA'
+
+    # Remover CARTÃO e BRASIL do final (após tratar casos especiais)
+    normalized = normalized.replace(' CARTAO', '').replace(' CARTÃO', '')
+    if normalized.endswith(' BRASIL'):
+        normalized = normalized[:-7]
+
+    # Remover espaços duplos
+    return ' '.join(normalized.split())
+
+
+def upgrade() -> None:
+    """
+    Cria a dimensão entities (código, nome bruto, nome normalizado) e
+    vincula payroll_lines.entity_id, preenchendo a partir das linhas existentes.
+    """
+    op.create_table(
+        'entities',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('code', sa.String(length=16), nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('normalized_name', sa.String(length=255), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('code', 'name', name='uq_entities_code_name')
+    )
+    op.create_index('ix_entities_code', 'entities', ['code'], unique=False)
+    op.create_index('ix_entities_normalized_name', 'entities', ['normalized_name'], unique=False)
+
+    op.add_column('payroll_lines', sa.Column('entity_id', sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        'fk_payroll_lines_entity_id', 'payroll_lines', 'entities', ['entity_id'], ['id']
+    )
+    op.create_index('ix_payroll_lines_entity_id', 'payroll_lines', ['entity_id'], unique=False)
+
+    # Backfill: um DISTINCT único, normalização em Python só uma vez por par
+    conn = op.get_bind()
+    pairs = conn.execute(sa.text(
+        "SELECT DISTINCT entity_code, entity_name FROM payroll_lines"
+    )).fetchall()
+    if pairs:
+        conn.execute(
+            sa.text(
+                "INSERT INTO entities (code, name, normalized_name) "
+                "VALUES (:code, :name, :normalized_name)"
+            ),
+            [
+                {"code": code, "name": name, "normalized_name": _normalize_bank_name(name)}
+                for code, name in pairs
+            ]
+        )
+        conn.execute(sa.text(
+            """
+            UPDATE payroll_lines pl
+            SET entity_id = e.id
+            FROM entities e
+            WHERE e.code = pl.entity_code AND e.name = pl.entity_name
+            """
+        ))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_payroll_lines_entity_id', table_name='payroll_lines')
+    op.drop_constraint('fk_payroll_lines_entity_id', 'payroll_lines', type_='foreignkey')
+    op.drop_column('payroll_lines', 'entity_id')
+    op.drop_index('ix_entities_normalized_name', table_name='entities')
+    op.drop_index('ix_entities_code', table_name='entities')
+    op.drop_table('entities')
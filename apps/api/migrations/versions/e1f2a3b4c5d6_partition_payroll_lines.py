@@ -0,0 +1,96 @@
+"""partition_payroll_lines
+
+Revision ID: e1f2a3b4c5d6
+Revises: d0e1f2a3b4c5
+Create Date: 2025-12-08 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1f2a3b4c5d6'
+down_revision: Union[str, None] = 'd0e1f2a3b4c5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _next_month(year: int, month: int):
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def _create_constraints(pk: str) -> None:
+    """PK, unique, FKs e índices (no pai particionado, propagam para as partições)."""
+    op.execute(f"ALTER TABLE payroll_lines ADD CONSTRAINT payroll_lines_pkey PRIMARY KEY ({pk})")
+    op.create_unique_constraint(
+        'uix_payroll_unique_ref', 'payroll_lines',
+        ['cpf', 'matricula', 'financiamento_code', 'ref_month', 'ref_year']
+    )
+    op.create_foreign_key(
+        'payroll_lines_batch_id_fkey', 'payroll_lines', 'import_batches',
+        ['batch_id'], ['id'], ondelete='CASCADE'
+    )
+    op.create_foreign_key(
+        'fk_payroll_lines_entity_id', 'payroll_lines', 'entities', ['entity_id'], ['id']
+    )
+    op.create_index('ix_payroll_lines_cpf', 'payroll_lines', ['cpf'], unique=False)
+    op.create_index('ix_payroll_lines_matricula', 'payroll_lines', ['matricula'], unique=False)
+    op.create_index('ix_payroll_lines_entity_id', 'payroll_lines', ['entity_id'], unique=False)
+
+
+def _swap_tables(old: str, new: str) -> None:
+    """Troca a tabela antiga pela nova mantendo a sequence de payroll_lines.id."""
+    conn = op.get_bind()
+    seq = conn.execute(sa.text("SELECT pg_get_serial_sequence('payroll_lines', 'id')")).scalar()
+    op.execute(f"INSERT INTO {new} SELECT * FROM {old}")
+    if seq:
+        # Sem isso o DROP da tabela antiga levaria a sequence junto
+        op.execute(f"ALTER SEQUENCE {seq} OWNED BY NONE")
+    op.execute(f"DROP TABLE {old}")
+    op.execute(f"ALTER TABLE {new} RENAME TO payroll_lines")
+    if seq:
+        op.execute(f"ALTER SEQUENCE {seq} OWNED BY payroll_lines.id")
+
+
+def upgrade() -> None:
+    """
+    Particiona payroll_lines por referência (RANGE em ref_year, ref_month).
+
+    Uma partição por mês existente (payroll_lines_yYYYYmMM) e uma DEFAULT
+    para referências ainda sem partição. As próximas são criadas pela
+    importação (services/payroll_partitions.ensure_partition). Os dados são
+    copiados na mesma transação; a tabela fica bloqueada durante a cópia.
+    """
+    conn = op.get_bind()
+    refs = conn.execute(sa.text(
+        "SELECT DISTINCT ref_year, ref_month FROM payroll_lines ORDER BY 1, 2"
+    )).fetchall()
+
+    # LIKE copia colunas, NOT NULL e defaults (inclusive o nextval do id)
+    op.execute(
+        "CREATE TABLE payroll_lines_part (LIKE payroll_lines INCLUDING DEFAULTS) "
+        "PARTITION BY RANGE (ref_year, ref_month)"
+    )
+    for year, month in refs:
+        ny, nm = _next_month(year, month)
+        op.execute(
+            f"CREATE TABLE payroll_lines_y{year:04d}m{month:02d} PARTITION OF payroll_lines_part "
+            f"FOR VALUES FROM ({year}, {month}) TO ({ny}, {nm})"
+        )
+    op.execute("CREATE TABLE payroll_lines_default PARTITION OF payroll_lines_part DEFAULT")
+
+    _swap_tables('payroll_lines', 'payroll_lines_part')
+    # A PK de tabela particionada precisa conter a chave de partição;
+    # uix_payroll_unique_ref já contém ref_month/ref_year
+    _create_constraints('id, ref_year, ref_month')
+    op.execute("ANALYZE payroll_lines")
+
+
+def downgrade() -> None:
+    # Partições destacadas (payroll_lines_yYYYYmMM avulsas) não voltam
+    op.execute("CREATE TABLE payroll_lines_flat (LIKE payroll_lines INCLUDING DEFAULTS)")
+    _swap_tables('payroll_lines', 'payroll_lines_flat')
+    _create_constraints('id')
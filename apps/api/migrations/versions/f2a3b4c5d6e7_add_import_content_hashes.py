@@ -0,0 +1,35 @@
+"""add_import_content_hashes
+
+Revision ID: f2a3b4c5d6e7
+Revises: e1f2a3b4c5d6
+Create Date: 2025-12-09 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a3b4c5d6e7'
+down_revision: Union[str, None] = 'e1f2a3b4c5d6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Hashes de conteúdo da importação em modo delta (services/payroll_hashes)
+    e contadores do delta por lote. Linhas e casos já existentes ficam com
+    hash NULL e são regravados uma vez na próxima importação.
+    """
+    op.add_column('payroll_lines', sa.Column('content_hash', sa.String(length=32), nullable=True))
+    op.add_column('cases', sa.Column('payroll_summary_hash', sa.String(length=32), nullable=True))
+    op.add_column('import_batches', sa.Column('delta_stats', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('import_batches', 'delta_stats')
+    op.drop_column('cases', 'payroll_summary_hash')
+    op.drop_column('payroll_lines', 'content_hash')
@@ -0,0 +1,23 @@
+"""Cabeçalhos de download de anexos (Content-Disposition)."""
+import pytest
+from starlette.responses import Response
+
+from app.services.attachment_download import content_disposition
+
+
+@pytest.mark.parametrize("filename, expected", [
+    ("comprovante.pdf", 'attachment; filename="comprovante.pdf"'),
+    ("extrato março.pdf", "attachment; filename=\"extrato marco.pdf\"; filename*=utf-8''extrato%20mar%C3%A7o.pdf"),
+    ('contrato "final".pdf', "attachment; filename=\"contrato _final_.pdf\"; filename*=utf-8''contrato%20%22final%22.pdf"),
+    ("文件.pdf", "attachment; filename=\".pdf\"; filename*=utf-8''%E6%96%87%E4%BB%B6.pdf"),
+    ("文件", "attachment; filename=\"download\"; filename*=utf-8''%E6%96%87%E4%BB%B6"),
+])
+def test_content_disposition(filename, expected):
+    assert content_disposition(filename) == expected
+
+
+def test_content_disposition_is_latin1_encodable():
+    # Starlette codifica os cabeçalhos em latin-1: nomes fora dele davam 500
+    header = content_disposition("recibo 💸 ação.pdf")
+    Response(headers={"Content-Disposition": header})
+    assert header.startswith('attachment; filename="recibo  acao.pdf"')
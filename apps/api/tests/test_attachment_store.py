@@ -0,0 +1,113 @@
+"""
+Publicação dos blobs do attachment_store em relação ao commit.
+
+A contagem de referências (INSERT ... ON CONFLICT) é específica do
+PostgreSQL e fica de fora; o que se verifica aqui é que o blob só aparece
+depois do commit e que uma transação encerrada sem commit (rollback ou
+sessão fechada) não deixa arquivo para trás.
+"""
+import hashlib
+import io
+import os
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.services.attachment_store import (
+    AttachmentStore,
+    LocalDiskBackend,
+    StorageBackend,
+    register_backend,
+)
+
+CONTENT = b"comprovante de pagamento"
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+
+
+@pytest.fixture()
+def store(tmp_path, monkeypatch):
+    store = AttachmentStore(LocalDiskBackend(str(tmp_path)), max_size=1024)
+    monkeypatch.setattr(store, "_acquire", lambda db, sha256, size: None)
+    return store
+
+
+@pytest.fixture()
+def engine():
+    return create_engine("sqlite://")
+
+
+@pytest.fixture()
+def db(engine):
+    with Session(engine) as session:
+        # Abre a transação, como faria o INSERT da referência
+        session.connection()
+        yield session
+
+
+def _temp_files(store):
+    return os.listdir(store.backend.temp_dir())
+
+
+def test_blob_is_published_after_commit(store, db):
+    stored = store.save(db, io.BytesIO(CONTENT))
+
+    assert stored.sha256 == SHA256
+    assert stored.path == store.backend.path(SHA256)
+    assert not os.path.exists(stored.path)
+
+    db.commit()
+
+    assert os.path.exists(stored.path)
+    with open(stored.path, "rb") as f:
+        assert f.read() == CONTENT
+    assert _temp_files(store) == []
+
+
+def test_rollback_leaves_no_blob(store, db):
+    stored = store.save(db, io.BytesIO(CONTENT))
+    db.rollback()
+
+    assert not os.path.exists(stored.path)
+    assert _temp_files(store) == []
+
+    # O mesmo conteúdo salvo de novo é publicado normalmente
+    db.connection()
+    store.save(db, io.BytesIO(CONTENT))
+    db.commit()
+    assert os.path.exists(stored.path)
+
+
+def test_session_closed_without_commit_leaves_no_temp_file(store, engine):
+    session = Session(engine)
+    session.connection()
+    stored = store.save(session, io.BytesIO(CONTENT))
+    assert len(_temp_files(store)) == 1
+
+    session.close()
+
+    assert _temp_files(store) == []
+    assert not os.path.exists(stored.path)
+
+
+def test_exception_in_session_block_leaves_no_temp_file(store, engine):
+    # Como um handler que levanta HTTPException entre save() e commit()
+    with pytest.raises(RuntimeError):
+        with Session(engine) as session:
+            session.connection()
+            store.save(session, io.BytesIO(CONTENT))
+            raise RuntimeError("413 no segundo arquivo")
+
+    assert _temp_files(store) == []
+
+
+def test_incomplete_backend_is_rejected_on_register():
+    class NoDelete(StorageBackend):
+        def temp_dir(self): return "/tmp"
+        def exists(self, sha256): return False
+        def path(self, sha256): return sha256
+        def put(self, tmp_path, sha256): return sha256
+        def sha256_from_path(self, path): return None
+
+    with pytest.raises(TypeError, match="delete"):
+        register_backend("incompleto", NoDelete)
@@ -0,0 +1,41 @@
+"""
+Delta da esteira (GET /cases/changes) para o atendente.
+
+Atribuições que expiram não escrevem no banco; o delta as devolve por
+assignment_expires_at. Todas as expiradas desde o token precisam vir na
+resposta, mesmo acima de limit: o próximo token não cobre expirações.
+"""
+from datetime import timedelta
+from types import SimpleNamespace
+
+from app.models import Case, Client, User
+from app.routers import cases
+from app.services import case_changes
+
+EXPIRED = 5
+
+
+def test_all_expired_assignments_are_returned(sqlite_sessions, make_client):
+    now = case_changes.cursor_now()
+    since = now - timedelta(hours=2)
+    with sqlite_sessions() as db:
+        db.add(User(id=1, name="Outro", email="outro@example.com", password_hash="x", role="atendente"))
+        for i in range(1, EXPIRED + 1):
+            db.add(Client(id=i, name=f"Cliente {i}", cpf=f"{i:011d}", matricula=f"M{i}"))
+            # Sem escrita desde antes do token: só a expiração os traz
+            db.add(Case(
+                id=i, client_id=i, status="em_atendimento", assigned_user_id=1,
+                last_update_at=since - timedelta(hours=1),
+                assignment_expires_at=now - timedelta(minutes=i),
+            ))
+        db.commit()
+
+    user = SimpleNamespace(id=2, role="atendente", name="Atendente", email="a@example.com")
+    client = make_client(cases.r, user=user)
+    token = case_changes.encode_token(since)
+    response = client.get(f"/cases/changes?since={token}&limit=2")
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert sorted(item["id"] for item in body["items"]) == list(range(1, EXPIRED + 1))
+    assert body["has_more"] is False
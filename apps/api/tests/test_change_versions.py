@@ -0,0 +1,40 @@
+"""Contadores de versão por tabela usados nos ETags."""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.routers import analytics, cases, closing, finance, rankings
+from app.services import change_versions
+from app.services.change_versions import ETAG_TABLES, get_versions, mark_changed
+
+
+@pytest.fixture()
+def db():
+    with Session(create_engine("sqlite://")) as session:
+        yield session
+
+
+@pytest.mark.parametrize("tables", [
+    rankings.AGENTS_TABLES,
+    finance.QUEUE_TABLES,
+    closing.QUEUE_TABLES,
+    analytics.KPIS_TABLES,
+    cases.LIST_CASES_TABLES,
+])
+def test_etag_consumers_are_tracked(tables):
+    assert set(tables) <= ETAG_TABLES
+
+
+def test_only_etag_tables_are_bumped(db):
+    mark_changed(db, "cases", "outbox_events", "import_batches", "campaign_leaderboard")
+    assert db.info[change_versions._CHANGED_KEY] == {"cases"}
+
+
+def test_untracked_writes_do_not_open_a_bump(db):
+    mark_changed(db, "import_batches")
+    assert change_versions._CHANGED_KEY not in db.info
+
+
+def test_get_versions_rejects_untracked_table(db):
+    with pytest.raises(ValueError, match="import_batches"):
+        get_versions(db, ["cases", "import_batches"])
@@ -0,0 +1,244 @@
+"""
+Regressão de índices: confere com EXPLAIN que as consultas quentes usam
+os índices da migração d0e1f2a3b4c5 (e os anteriores de cases).
+
+Numa única transação, semeia um volume grande de dados sintéticos (casos,
+eventos, simulações, anexos, receitas e despesas), roda ANALYZE e pede o
+plano de cada consulta. No final tudo é desfeito com ROLLBACK (inclusive
+as estatísticas do ANALYZE), então pode rodar em um banco de
+desenvolvimento já migrado.
+
+Precisa de PostgreSQL com as migrações aplicadas em TEST_DATABASE_URL;
+sem ela os testes são pulados. INDEX_CHECK_CASES muda o volume semeado.
+"""
+
+
+import json
+import os
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, text
+
+DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+SEED_CASES = int(os.getenv("INDEX_CHECK_CASES", "200000"))
+
+pytestmark = pytest.mark.skipif(not DATABASE_URL, reason="TEST_DATABASE_URL não definido")
+
+SLA_STATUSES = ("em_atendimento", "calculista_pendente")
+IMPORT_OPEN_STATUSES = (
+    "novo", "disponivel", "em_atendimento", "calculista",
+    "calculista_pendente", "financeiro", "fechamento_pendente",
+)
+
+SEED_SQL = [
+    # Atendentes
+    """
+    INSERT INTO users (name, email, password_hash, role, active, created_at)
+    SELECT 'Idx ' || g, 'idx-' || :tag || '-' || g || '@example.invalid', 'x',
+           'atendente', true, :now
+    FROM generate_series(1, 50) g
+    """,
+    """
+    INSERT INTO clients (name, cpf, matricula)
+    SELECT 'Idx ' || g, lpad(g::text, 11, '0'), :tag || '-' || g
+    FROM generate_series(1, :clients) g
+    """,
+    # Distribuição de status parecida com a produção: maioria encerrada
+    """
+    INSERT INTO cases (client_id, assigned_user_id, status, source, created_at,
+                       last_update_at, assigned_at, assignment_expires_at)
+    SELECT c.id,
+           CASE WHEN g % 100 BETWEEN 90 AND 97 THEN u.id END,
+           CASE
+               WHEN g % 100 < 50 THEN 'encerrado'
+               WHEN g % 100 < 80 THEN 'contrato_efetivado'
+               WHEN g % 100 < 90 THEN 'novo'
+               WHEN g % 100 < 95 THEN 'em_atendimento'
+               WHEN g % 100 < 98 THEN 'calculista_pendente'
+               WHEN g % 100 = 98 THEN 'fechamento_pendente'
+               ELSE 'financeiro_pendente'
+           END,
+           'idx_check',
+           :now - g * interval '1 minute',
+           :now - g * interval '1 minute',
+           CASE WHEN g % 100 BETWEEN 90 AND 97 THEN :now - interval '1 day' END,
+           CASE WHEN g % 100 BETWEEN 90 AND 97
+                THEN :now + ((g % 200) - 150) * interval '1 hour' END
+    FROM generate_series(1, :cases) g
+    JOIN clients c ON c.matricula = :tag || '-' || (1 + g % :clients)
+    JOIN users u ON u.email = 'idx-' || :tag || '-' || (1 + g % 50) || '@example.invalid'
+    """,
+    """
+    CREATE TEMP TABLE idx_cases ON COMMIT DROP AS
+    SELECT id, row_number() OVER (ORDER BY id) AS n FROM cases WHERE source = 'idx_check'
+    """,
+    """
+    INSERT INTO case_events (case_id, type, payload, created_at)
+    SELECT ic.id,
+           CASE
+               WHEN (ic.n + k) % 100 = 0 THEN 'finance.disbursed'
+               WHEN (ic.n + k) % 100 = 1 THEN 'case.auto_expired'
+               ELSE (ARRAY['case.created', 'case.updated', 'comment.added'])[1 + k]
+           END,
+           '{}', :now - ic.n * interval '1 minute' + k * interval '10 second'
+    FROM idx_cases ic, generate_series(0, 2) k
+    """,
+    """
+    INSERT INTO simulations (case_id, status, created_at, updated_at)
+    SELECT ic.id,
+           CASE WHEN ic.n % 10 < 7 THEN 'approved' WHEN ic.n % 10 < 9 THEN 'rejected' ELSE 'draft' END,
+           :now - ic.n * interval '3 minute', :now - ic.n * interval '3 minute'
+    FROM idx_cases ic WHERE ic.n % 2 = 0
+    """,
+    """
+    INSERT INTO attachments (case_id, path, filename, created_at)
+    SELECT ic.id, 'idx/' || ic.n, 'doc.pdf', :now
+    FROM idx_cases ic WHERE ic.n % 4 = 0
+    """,
+    """
+    INSERT INTO finance_incomes (date, income_type, income_name, amount, created_by, agent_user_id, created_at)
+    SELECT :now - (g % 730) * interval '1 day',
+           (ARRAY['Receita Contrato', 'Receita Manual', 'Bônus'])[1 + g % 3],
+           'Idx', 100, u.id, u.id, :now
+    FROM generate_series(1, :cases / 2) g
+    JOIN users u ON u.email = 'idx-' || :tag || '-' || (1 + g % 50) || '@example.invalid'
+    """,
+    """
+    INSERT INTO finance_expenses (month, year, date, expense_type, expense_name, amount, created_by, agent_user_id, created_at)
+    SELECT 1, 2025, :now - (g % 730) * interval '1 day',
+           (ARRAY['Comissão', 'Impostos', 'Aluguel'])[1 + g % 3],
+           'Idx', 50, u.id, u.id, :now
+    FROM generate_series(1, :cases / 4) g
+    JOIN users u ON u.email = 'idx-' || :tag || '-' || (1 + g % 50) || '@example.invalid'
+    """,
+]
+
+ANALYZED_TABLES = (
+    "users", "clients", "cases", "case_events", "simulations",
+    "attachments", "finance_incomes", "finance_expenses",
+)
+
+# (nome, SQL, índice esperado no plano)
+CHECKS = [
+    ("list_cases por status",
+     "SELECT id FROM cases WHERE status = 'fechamento_pendente' ORDER BY id DESC LIMIT 20",
+     "ix_cases_status_id"),
+    ("status-counts (mine)",
+     "SELECT status, count(id) FROM cases WHERE assigned_user_id = :uid GROUP BY status",
+     "idx_cases_assigned_user_id"),
+    ("caso aberto do cliente (importação)",
+     "SELECT id FROM cases WHERE client_id = :client_id AND status = ANY(:open_statuses) "
+     "ORDER BY id DESC LIMIT 1",
+     "ix_cases_client_id"),
+    ("varredura de SLA",
+     "SELECT id FROM cases WHERE assigned_user_id IS NOT NULL "
+     "AND assignment_expires_at IS NOT NULL AND assignment_expires_at <= :now "
+     "AND status IN ('em_atendimento', 'calculista_pendente')",
+     "ix_cases_sla_open"),
+    ("casos perto de expirar",
+     "SELECT id FROM cases WHERE assigned_user_id IS NOT NULL "
+     "AND assignment_expires_at <= :now + interval '2 hours' AND assignment_expires_at > :now "
+     "AND status IN ('em_atendimento', 'calculista_pendente')",
+     "ix_cases_sla_open"),
+    ("atribuições ativas",
+     "SELECT count(id) FROM cases WHERE assigned_user_id IS NOT NULL "
+     "AND assignment_expires_at > :now + interval '40 hours'",
+     "ix_cases_assignment_expires_at"),
+    ("delta /cases/changes",
+     "SELECT id, last_update_at FROM cases WHERE (last_update_at, id) > (:now - interval '1 hour', 0) "
+     "ORDER BY last_update_at, id LIMIT 201",
+     "ix_cases_last_update_at_id"),
+    ("próximo caso disponível (claim-next)",
+     "SELECT id FROM cases WHERE status IN ('novo', 'em_atendimento') "
+     "AND (assigned_user_id IS NULL OR assignment_expires_at < :now) "
+     "ORDER BY ((payroll_status_summary ->> 'priority_score')::int) DESC NULLS LAST, created_at, id "
+     "LIMIT 1 FOR UPDATE OF cases SKIP LOCKED",
+     "ix_cases_claimable"),
+    ("histórico do caso",
+     "SELECT id FROM case_events WHERE case_id = :case_id ORDER BY created_at",
+     "ix_case_events_case_id_created_at"),
+    ("analytics: eventos por tipo e período",
+     "SELECT count(id) FROM case_events WHERE type = 'finance.disbursed' "
+     "AND created_at >= :now - interval '30 days' AND created_at < :now",
+     "ix_case_events_type_created_at"),
+    ("anexos do caso",
+     "SELECT id FROM attachments WHERE case_id = :case_id",
+     "ix_attachments_case_id"),
+    ("simulações do caso",
+     "SELECT id FROM simulations WHERE case_id = :case_id",
+     "ix_simulations_case_id"),
+    ("fila do calculista",
+     "SELECT id FROM simulations WHERE status = 'draft' ORDER BY updated_at DESC LIMIT 50",
+     "ix_simulations_status_updated_at"),
+    ("analytics: simulações rejeitadas no período",
+     "SELECT count(id) FROM simulations WHERE status = 'rejected' "
+     "AND updated_at >= :now - interval '7 days' AND updated_at < :now",
+     "ix_simulations_status_updated_at"),
+    ("ranking: receitas do atendente no período",
+     "SELECT sum(amount) FROM finance_incomes WHERE agent_user_id = :uid "
+     "AND date >= :now - interval '30 days' AND date <= :now",
+     "ix_finance_incomes_agent_date_type"),
+    ("dashboard: receitas do período",
+     "SELECT sum(amount) FROM finance_incomes WHERE date >= :now - interval '7 days' AND date <= :now",
+     "ix_finance_incomes_date"),
+    ("ranking: deduções do atendente no período",
+     "SELECT sum(amount) FROM finance_expenses WHERE agent_user_id = :uid "
+     "AND date >= :now - interval '30 days' AND date <= :now AND expense_type = ANY(:expense_types)",
+     "ix_finance_expenses_agent_date_type"),
+    ("dashboard: despesas do período",
+     "SELECT sum(amount) FROM finance_expenses WHERE date >= :now - interval '7 days' AND date <= :now",
+     "ix_finance_expenses_date"),
+]
+
+
+def _plan_nodes(node: dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+@pytest.fixture(scope="module")
+def seeded():
+    """Conexão com os dados semeados e os parâmetros das consultas."""
+    engine = create_engine(DATABASE_URL)
+    now = datetime.now().replace(microsecond=0)
+    tag = f"idx{uuid.uuid4().hex[:8]}"
+    seed_params = {"now": now, "tag": tag, "cases": SEED_CASES, "clients": max(SEED_CASES // 2, 1)}
+
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            for sql in SEED_SQL:
+                conn.execute(text(sql), seed_params)
+            for table in ANALYZED_TABLES:
+                conn.execute(text(f"ANALYZE {table}"))
+
+            sample = conn.execute(text(
+                "SELECT c.id, c.client_id, c.assigned_user_id FROM cases c "
+                "WHERE c.source = 'idx_check' AND c.assigned_user_id IS NOT NULL LIMIT 1"
+            )).one()
+            yield conn, {
+                "now": now,
+                "case_id": sample.id,
+                "client_id": sample.client_id,
+                "uid": sample.assigned_user_id,
+                "open_statuses": list(IMPORT_OPEN_STATUSES),
+                "expense_types": ["Comissão", "Impostos"],
+            }
+        finally:
+            trans.rollback()
+    engine.dispose()
+
+
+@pytest.mark.parametrize("name,sql,expected", CHECKS, ids=[c[0] for c in CHECKS])
+def test_query_uses_index(seeded, name, sql, expected):
+    conn, params = seeded
+    plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    nodes = list(_plan_nodes(plan[0]["Plan"]))
+    used = {n["Index Name"] for n in nodes if "Index Name" in n}
+    scans = sorted({n["Node Type"] for n in nodes if "Scan" in n["Node Type"]})
+    assert expected in used, f"{name}: índices usados {sorted(used) or 'nenhum'} [{', '.join(scans)}]"
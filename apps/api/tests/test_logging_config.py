@@ -0,0 +1,46 @@
+"""
+Mascaramento de CPF nos logs (PiiMaskingFilter).
+
+O filtro roda antes da fila; o que sai dele é o que o listener escreve,
+então mensagem, traceback e extras precisam chegar já mascarados.
+"""
+import json
+import logging
+import sys
+
+from app.logging_config import JsonFormatter, PiiMaskingFilter
+
+CPF = "123.456.789-09"
+MASKED = "***.456.789-**"
+
+
+def _record(msg, *args, exc_info=None, **extra) -> logging.LogRecord:
+    record = logging.LogRecord("app.test", logging.ERROR, __file__, 1, msg, args, exc_info)
+    record.__dict__.update(extra)
+    assert PiiMaskingFilter().filter(record)
+    return record
+
+
+def test_masks_interpolated_message():
+    record = _record("Cliente %s sem margem", "12345678909")
+    assert record.getMessage() == "Cliente ***.456.789-** sem margem"
+
+
+def test_masks_traceback():
+    try:
+        raise ValueError(f"CPF inválido: {CPF}")
+    except ValueError:
+        record = _record("Falha na importação", exc_info=sys.exc_info())
+
+    assert record.exc_info is None
+    assert CPF not in record.exc_text
+    assert MASKED in record.exc_text
+    assert CPF not in JsonFormatter().format(record)
+
+
+def test_masks_string_extras():
+    record = _record("Importação", cpf=CPF, linha=12)
+
+    data = json.loads(JsonFormatter().format(record))
+    assert data["cpf"] == MASKED
+    assert data["linha"] == 12
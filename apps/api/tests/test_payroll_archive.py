@@ -0,0 +1,97 @@
+"""
+Arquivo frio de payroll_lines (Parquet), sem banco.
+
+A exportação e o DROP da partição precisam do PostgreSQL; aqui ficam as
+partes puras: colunas exportadas, horizonte, checksums relidos do Parquet
+e o filtro de read_archive sobre arquivos num diretório temporário.
+"""
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("pyarrow")
+import pyarrow as pa  # noqa: E402
+import pyarrow.parquet as pq  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.models import PayrollLine  # noqa: E402
+from app.services import payroll_archive  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path))
+    return tmp_path
+
+
+def _line(line_id, cpf, year, month, valor, entity_code="1042"):
+    row = {name: None for name, _ in payroll_archive.COLUMNS}
+    row.update(
+        id=line_id, batch_id=1, cpf=cpf, matricula="M1", status_code="1",
+        status_description="Lançado e efetivado", financiamento_code=f"{line_id:04d}",
+        valor_parcela_ref=valor, entity_code=entity_code, entity_name="BANCO TESTE",
+        ref_year=year, ref_month=month, created_at=datetime(year, month, 1),
+        content_hash=f"{line_id:032x}",
+    )
+    return row
+
+
+def _write(year, month, lines):
+    table = pa.Table.from_pylist(lines, schema=payroll_archive._schema())
+    pq.write_table(table, payroll_archive.archive_path(year, month), row_group_size=2)
+
+
+def test_columns_match_payroll_line():
+    assert [name for name, _ in payroll_archive.COLUMNS] == [c.name for c in PayrollLine.__table__.columns]
+
+
+@pytest.mark.parametrize("now,months,expected", [
+    (datetime(2025, 6, 15), 12, (2024, 6)),
+    (datetime(2025, 1, 1), 1, (2024, 12)),
+    (datetime(2025, 1, 31), 13, (2023, 12)),
+    (datetime(2025, 3, 10), 0, (2025, 3)),
+])
+def test_horizon_reference(now, months, expected):
+    assert payroll_archive.horizon_reference(months, now=now) == expected
+
+
+def test_parquet_checksums_per_cpf():
+    _write(2024, 1, [
+        _line(1, "11111111111", 2024, 1, Decimal("100.10")),
+        _line(2, "11111111111", 2024, 1, None),
+        _line(3, "11111111111", 2024, 1, Decimal("0.05")),
+        _line(7, "22222222222", 2024, 1, Decimal("59.90")),
+    ])
+
+    checksums = payroll_archive._parquet_checksums(payroll_archive.archive_path(2024, 1))
+
+    assert checksums == {
+        "11111111111": (3, 6, Decimal("100.15")),
+        "22222222222": (1, 7, Decimal("59.90")),
+    }
+
+
+def test_read_archive_filters_and_orders():
+    _write(2024, 1, [
+        _line(1, "11111111111", 2024, 1, Decimal("10.00")),
+        _line(2, "22222222222", 2024, 1, Decimal("20.00"), entity_code="2000"),
+    ])
+    _write(2024, 2, [_line(3, "11111111111", 2024, 2, Decimal("30.00"))])
+    _write(2024, 3, [_line(4, "11111111111", 2024, 3, Decimal("40.00"))])
+    # Temporário de uma exportação em andamento não é lido
+    open(f"{payroll_archive.archive_dir()}/.payroll_lines_y2024m04.abc.tmp", "wb").close()
+
+    assert payroll_archive.archived_references() == [(2024, 1), (2024, 2), (2024, 3)]
+
+    by_cpf = payroll_archive.read_archive(cpf="11111111111")
+    assert [r["id"] for r in by_cpf] == [4, 3, 1]
+    assert by_cpf[0]["content_hash"] == f"{4:032x}"
+
+    in_period = payroll_archive.read_archive(cpf="11111111111", start=(2024, 1), end=(2024, 2))
+    assert [r["id"] for r in in_period] == [3, 1]
+
+    by_entity = payroll_archive.read_archive(entity_code="2000")
+    assert [r["cpf"] for r in by_entity] == ["22222222222"]
+
+    assert [r["id"] for r in payroll_archive.read_archive(cpf="11111111111", limit=2)] == [4, 3]
@@ -0,0 +1,102 @@
+"""
+Diff mês a mês da folha: o merge ordenado (diff_rows) e a escolha do lote
+anterior (previous_batch).
+"""
+from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from app.models import ImportBatch
+from app.services.payroll_diff import diff_rows, previous_batch
+
+Line = namedtuple("Line", "cpf matricula financiamento_code status_code valor_parcela_ref")
+
+
+def _line(cpf, fin, status="1", valor="100.00", matricula="M1"):
+    return Line(cpf, matricula, fin, status, Decimal(valor))
+
+
+def test_diff_rows_kinds():
+    previous = [
+        _line("111", "0001"),                        # unchanged
+        _line("111", "0002"),                        # 1 -> 2: prioritário
+        _line("111", "0003", valor="50.00"),         # value_changed
+        _line("222", "0001", status="2"),            # 2 -> 1: não prioritário
+        _line("333", "0001"),                        # disappeared
+    ]
+    current = [
+        _line("111", "0001"),
+        _line("111", "0002", status="2"),
+        _line("111", "0003", valor="55.00"),
+        _line("111", "0004"),                        # new
+        _line("222", "0001", status="1"),
+    ]
+
+    result = list(diff_rows(previous, current))
+    kinds = [kind for kind, _ in result]
+    items = {(i["cpf"], i["financiamento_code"]): i for _, i in result if i is not None}
+
+    assert kinds == ["unchanged", "status_changed", "value_changed", "new", "status_changed", "disappeared"]
+    assert result[0][1] is None
+
+    regression = items[("111", "0002")]
+    assert (regression["old_status"], regression["new_status"]) == ("1", "2")
+    assert regression["priority"] is True
+    assert items[("222", "0001")]["priority"] is False
+
+    value = items[("111", "0003")]
+    assert (value["old_value"], value["new_value"]) == (Decimal("50.00"), Decimal("55.00"))
+    assert value["priority"] is False
+
+    new = items[("111", "0004")]
+    assert (new["old_status"], new["old_value"], new["new_status"]) == (None, None, "1")
+
+    gone = items[("333", "0001")]
+    assert (gone["old_status"], gone["new_status"], gone["new_value"]) == ("1", None, None)
+    assert gone["priority"] is False
+
+
+def test_diff_rows_without_previous_reference():
+    current = [_line("111", "0001"), _line("222", "0001")]
+    assert [kind for kind, _ in diff_rows([], current)] == ["new", "new"]
+
+
+@pytest.mark.parametrize("side", ["previous", "current"])
+def test_diff_rows_rejects_out_of_order(side):
+    unordered = [_line("222", "0001"), _line("111", "0001")]
+    ordered = [_line("111", "0001"), _line("222", "0001")]
+    previous, current = (unordered, ordered) if side == "previous" else (ordered, unordered)
+
+    with pytest.raises(ValueError, match="fora de ordem"):
+        list(diff_rows(previous, current))
+
+
+def test_diff_rows_rejects_duplicate_key():
+    with pytest.raises(ValueError):
+        list(diff_rows([], [_line("111", "0001"), _line("111", "0001")]))
+
+
+def test_previous_batch(sqlite_sessions):
+    def batch(batch_id, entity_code, year, month):
+        return ImportBatch(
+            id=batch_id, entity_code=entity_code, entity_name="BANCO", ref_year=year,
+            ref_month=month, generated_at=datetime(year, month, 1),
+        )
+
+    with sqlite_sessions() as db:
+        db.add_all([
+            batch(1, "1042", 2024, 11),
+            batch(2, "1042", 2024, 12),
+            batch(3, "1042", 2024, 12),   # reimportação da mesma referência
+            batch(4, "2000", 2025, 1),    # outra entidade
+            batch(5, "1042", 2025, 1),
+            batch(6, "1042", 2025, 2),    # referência posterior
+        ])
+        db.commit()
+
+        assert previous_batch(db, db.get(ImportBatch, 5)).id == 3
+        assert previous_batch(db, db.get(ImportBatch, 2)).id == 1
+        assert previous_batch(db, db.get(ImportBatch, 1)) is None
+        assert previous_batch(db, db.get(ImportBatch, 4)) is None
@@ -0,0 +1,136 @@
+"""
+Importação delta da folha: hashes de conteúdo (services/payroll_hashes) e
+os ramos lines_unchanged / cases_unchanged de POST /imports.
+
+O hash ignora formatação (espaços nas pontas, casas do Decimal) e muda com
+qualquer campo atualizável ou com a entidade. A importação roda no SQLite
+de sqlite_sessions; a partição e o diff (PostgreSQL) ficam de fora.
+"""
+from decimal import Decimal
+
+import pytest
+
+from app.models import Case, PayrollLine
+from app.routers import imports
+from app.services.payroll_hashes import LINE_FIELDS, line_hash, summary_hash
+
+LINE = {
+    "cpf": "47082976372",
+    "matricula": "000550-9",
+    "financiamento_code": "6490",
+    "status_code": "1",
+    "status_description": "Lançado e Efetivado",
+    "orgao": "001",
+    "lanc": "088",
+    "total_parcelas": 24,
+    "parcelas_pagas": 12,
+    "valor_parcela_ref": Decimal("458.04"),
+    "orgao_pagamento": "001",
+    "orgao_pagamento_nome": "SEC DA ASSIST.SOC.E CIDADANIA",
+}
+
+
+def test_line_hash_ignores_formatting():
+    reformatted = dict(
+        LINE,
+        status_description="  Lançado e Efetivado ",
+        orgao_pagamento_nome="SEC DA ASSIST.SOC.E CIDADANIA   ",
+        valor_parcela_ref=Decimal("458.040"),
+    )
+    assert line_hash(reformatted, 7) == line_hash(LINE, 7)
+    assert line_hash(dict(LINE, valor_parcela_ref=458.04), 7) == line_hash(LINE, 7)
+    # Chave e campos que a importação não regrava não entram no hash
+    assert line_hash(dict(LINE, nome="OUTRO NOME", line_number=99), 7) == line_hash(LINE, 7)
+
+
+@pytest.mark.parametrize("field", LINE_FIELDS)
+def test_line_hash_changes_with_each_field(field):
+    changed = dict(LINE, **{field: Decimal("458.05") if field == "valor_parcela_ref" else "9"})
+    assert line_hash(changed, 7) != line_hash(LINE, 7)
+
+
+def test_line_hash_changes_with_entity():
+    assert line_hash(LINE, 8) != line_hash(LINE, 7)
+    assert line_hash(LINE, None) != line_hash(LINE, 7)
+
+
+def test_summary_hash_ignores_key_order():
+    summary = {"total_lines": 1, "priority_score": 5, "status_counts": {"1": {"count": 1}}}
+    reordered = {"status_counts": {"1": {"count": 1}}, "priority_score": 5, "total_lines": 1}
+    assert summary_hash(reordered) == summary_hash(summary)
+    assert summary_hash(dict(summary, priority_score=10)) != summary_hash(summary)
+
+
+HEADER = (
+    "Entidade: 1042-BANCO TESTE S.A                                            "
+    "Referência: 07/2025   Data da Geração: 31/07/2025"
+)
+ROWS = [
+    "  1    000550-9  JOANA MARIA DOS SANTOS IBIAPIN 3-AGENTE SUPERIOR DE SERVICO   "
+    "6490      001     088   024         458,04      001    47082976372",
+    "  2    000551-7  JOSE DA SILVA                  AUXILIAR                       "
+    "6491      001     088   024       1.200,50      001    12345678909",
+]
+
+
+def _file(*rows):
+    return ("\n".join([HEADER, *rows]) + "\n").encode("latin-1")
+
+
+@pytest.fixture()
+def post_import(sqlite_sessions, make_client, tmp_path, monkeypatch):
+    monkeypatch.setattr(imports, "IMPORTS_DIR", tmp_path)
+    monkeypatch.setattr(imports, "ensure_partition", lambda year, month: False)
+    client = make_client(imports.r)
+
+    def _post(content, mode="delta"):
+        response = client.post(
+            f"/imports?mode={mode}", files={"file": ("retorno.txt", content, "text/plain")}
+        )
+        assert response.status_code == 200, response.text
+        return response.json()
+    return _post
+
+
+def _last_updates(sqlite_sessions):
+    with sqlite_sessions() as db:
+        return dict(db.query(Case.id, Case.last_update_at).all())
+
+
+def test_reimport_of_identical_file_writes_nothing(post_import, sqlite_sessions):
+    first = post_import(_file(*ROWS))
+    assert first["counters"]["lines_created"] == 2
+    assert first["counters"]["cases_created"] == 2
+    before = _last_updates(sqlite_sessions)
+
+    second = post_import(_file(*ROWS))
+
+    assert second["delta_stats"] == {"mode": "delta", "unchanged": 2, "changed": 0, "new": 0, "disappeared": 0}
+    assert second["counters"]["cases_unchanged"] == 2
+    assert second["counters"]["cases_updated"] == 0
+    assert _last_updates(sqlite_sessions) == before
+
+
+def test_reimport_updates_only_changed_line(post_import, sqlite_sessions):
+    post_import(_file(*ROWS))
+    changed = ROWS[1].replace("1.200,50", "1.250,00")
+
+    result = post_import(_file(ROWS[0], changed))
+
+    assert result["delta_stats"]["unchanged"] == 1
+    assert result["delta_stats"]["changed"] == 1
+    assert result["counters"]["cases_unchanged"] == 1
+    assert result["counters"]["cases_updated"] == 1
+    with sqlite_sessions() as db:
+        line = db.query(PayrollLine).filter(PayrollLine.cpf == "12345678909").one()
+        assert line.valor_parcela_ref == Decimal("1250.00")
+
+
+def test_full_mode_rewrites_everything(post_import):
+    post_import(_file(*ROWS))
+
+    result = post_import(_file(*ROWS), mode="full")
+
+    assert result["delta_stats"]["unchanged"] == 0
+    assert result["delta_stats"]["changed"] == 2
+    assert result["counters"]["cases_updated"] == 2
@@ -0,0 +1,101 @@
+"""
+Orçamento de queries das listagens quentes.
+
+As rotas rodam contra o SQLite de sqlite_sessions com QUERY_BUDGET_ENFORCE
+ligado: uma query além do orçamento derruba a requisição. Os orçamentos
+são fixos (não crescem com page_size), então qualquer N+1 na página
+estoura; o teste também confere que o número de queries não muda entre
+uma página pequena e uma grande.
+"""
+from datetime import timedelta
+
+import pytest
+
+from app.config import settings
+from app.models import Case, Client, PayrollLine, User
+from app.routers import cases, clients
+from app.services import case_changes
+from app.services.payroll_counts import count_financiamentos_by_cpf
+from app.services.query_monitor import QueryBudgetExceeded, record_requests
+
+CLIENTS = 30
+LINES_PER_CLIENT = 3
+CASE_FIELDS = "id,status,client.name,client.cpf,client.num_financiamentos"
+
+
+@pytest.fixture()
+def seeded(sqlite_sessions, monkeypatch):
+    monkeypatch.setattr(settings, "query_budget_enforce", True)
+    with sqlite_sessions() as db:
+        db.add(User(id=1, name="Teste", email="teste@example.com", password_hash="x", role="admin"))
+        line_id = 0
+        for i in range(1, CLIENTS + 1):
+            cpf = f"{i:011d}"
+            db.add(Client(id=i, name=f"Cliente {i}", cpf=cpf, matricula=f"M{i}"))
+            db.add(Case(id=i, client_id=i, assigned_user_id=1 if i % 2 else None, status="novo"))
+            for n in range(LINES_PER_CLIENT):
+                line_id += 1
+                db.add(PayrollLine(
+                    id=line_id, batch_id=1, cpf=cpf, matricula=f"M{i}",
+                    status_code="1", status_description="Lançado e efetivado",
+                    financiamento_code=f"{n:04d}", entity_code="1042", entity_name="BANCO TESTE",
+                    ref_month=1, ref_year=2025,
+                ))
+        db.commit()
+    return sqlite_sessions
+
+
+def _queries(client, url: str):
+    with record_requests() as recorded:
+        response = client.get(url)
+    assert response.status_code == 200, response.text
+    # list_cases devolve 200 com "error" quando a query falha
+    assert "error" not in response.json()
+    return response, recorded[-1].queries
+
+
+def test_list_cases_within_budget(seeded, make_client):
+    client = make_client(cases.r, middleware=True)
+
+    small, small_queries = _queries(client, f"/cases?page_size=5&fields={CASE_FIELDS}")
+    large, large_queries = _queries(client, f"/cases?page_size=50&fields={CASE_FIELDS}")
+
+    assert len(large.json()["items"]) == CLIENTS
+    assert {i["client"]["num_financiamentos"] for i in large.json()["items"]} == {LINES_PER_CLIENT}
+    assert large_queries == small_queries
+
+
+def test_case_changes_within_budget(seeded, make_client):
+    client = make_client(cases.r, middleware=True)
+
+    since = case_changes.encode_token(case_changes.cursor_now() - timedelta(hours=1))
+    response, queries = _queries(client, f"/cases/changes?since={since}&limit=500&fields={CASE_FIELDS}")
+
+    items = response.json()["items"]
+    assert len(items) == CLIENTS
+    assert all(i["client"]["num_financiamentos"] == LINES_PER_CLIENT for i in items)
+    assert queries <= 10
+
+
+def test_list_clients_within_budget(seeded, make_client):
+    client = make_client(clients.r, middleware=True)
+
+    small, small_queries = _queries(client, "/clients?page_size=5")
+    large, large_queries = _queries(client, "/clients?page_size=50")
+
+    assert len(large.json()["items"]) == CLIENTS
+    assert large_queries == small_queries
+
+
+def test_budget_fails_on_n_plus_one(seeded, make_client, monkeypatch):
+    def count_per_client(db, cpfs):
+        counts = {}
+        for cpf in cpfs:
+            counts.update(count_financiamentos_by_cpf(db, [cpf]))
+        return counts
+
+    monkeypatch.setattr(clients, "count_financiamentos_by_cpf", count_per_client)
+    client = make_client(clients.r, middleware=True)
+
+    with pytest.raises(QueryBudgetExceeded):
+        client.get("/clients?page_size=50")
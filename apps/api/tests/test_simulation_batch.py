@@ -0,0 +1,125 @@
+"""
+Simulação em lote (NumPy) contra a simulação escalar.
+
+compute_simulation_batch promete os mesmos totais de compute_simulation_totals
+para cada cenário da grade; o teste gera grades aleatórias (semente fixa) e
+compara campo a campo, incluindo valores em cima de empates .xx5.
+"""
+import random
+
+import pytest
+
+from app.routers import simulations
+from app.services.simulation_batch import (
+    SimulationBatchInput,
+    compute_simulation_batch,
+    round_half_up_array,
+)
+from app.services.simulation_service import (
+    SimulationBankInput,
+    SimulationInput,
+    compute_simulation_totals,
+    round_half_up,
+)
+
+BANKS = ["Banco do Brasil", "Caixa", "Bradesco", "Margem Positiva", "Margem*"]
+
+
+def _money(rng: random.Random, low: float, high: float) -> float:
+    # Centavos e meios centavos: força empates .xx5 no arredondamento
+    return round(rng.uniform(low, high) * 200) / 200
+
+
+def _bank(rng: random.Random) -> SimulationBankInput:
+    name = rng.choice(BANKS)
+    parcela = _money(rng, 10, 2500)
+    if name == "Margem*" and rng.random() < 0.5:
+        parcela = -parcela
+    return SimulationBankInput(
+        bank=name,
+        parcela=parcela,
+        saldoDevedor=0.0 if name.startswith("Margem") else _money(rng, 100, 90000),
+        valorLiberado=_money(rng, 1, 5000),
+    )
+
+
+def _grid(rng: random.Random) -> SimulationBatchInput:
+    return SimulationBatchInput(
+        banks=[_bank(rng) for _ in range(rng.randint(1, 6))],
+        prazo=96,
+        coeficientes=[
+            f"{rng.uniform(0.015, 0.045):.7f}".replace(".", rng.choice([".", ","]))
+            for _ in range(rng.randint(1, 5))
+        ],
+        percentuaisConsultoria=[rng.choice([0, 5, 10, 12.5, rng.uniform(0, 100)]) for _ in range(rng.randint(1, 4))],
+        seguros=[_money(rng, 0, 2000) for _ in range(rng.randint(1, 3))],
+        top=None,
+    )
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_batch_matches_scalar(seed):
+    data = _grid(random.Random(seed))
+    result = compute_simulation_batch(data)
+
+    assert result.totalCenarios == len(data.coeficientes) * len(data.percentuaisConsultoria) * len(data.seguros)
+    assert len(result.cenarios) == result.totalCenarios
+
+    for cenario in result.cenarios:
+        expected = compute_simulation_totals(SimulationInput(
+            banks=data.banks,
+            prazo=data.prazo,
+            coeficiente=cenario.coeficiente,
+            seguro=cenario.seguro,
+            percentualConsultoria=cenario.percentualConsultoria,
+        ))
+        assert cenario.totals == expected
+
+    liberados = [c.totals.liberadoCliente for c in result.cenarios]
+    assert liberados == sorted(liberados, reverse=True)
+
+
+@pytest.mark.parametrize("value", [0.005, 1.005, 2.675, -2.675, 1234.565, 0.0, -0.0, 1e-9, 99999.995])
+def test_round_half_up_array_matches_scalar(value):
+    assert float(round_half_up_array([value])[0]) == round_half_up(value)
+
+
+def test_top_limits_scenarios():
+    data = _grid(random.Random(7))
+    data.top = 1
+    result = compute_simulation_batch(data)
+    assert len(result.cenarios) == 1
+
+
+@pytest.fixture()
+def client(make_client):
+    return make_client(simulations.r)
+
+
+def test_batch_endpoint_validates_input(client):
+    payload = {
+        "banks": [{"bank": "Caixa", "parcela": 0, "saldoDevedor": 1000, "valorLiberado": 100}],
+        "coeficientes": ["0,0215"],
+        "percentuaisConsultoria": [10, 140],
+        "seguros": [0, -5],
+    }
+    response = client.post("/simulations/batch", json=payload)
+    assert response.status_code == 400
+    errors = response.json()["detail"]["errors"]
+    assert "Parcela do banco 1 deve ser maior que zero" in errors
+    assert "Percentual de consultoria deve estar entre 0 e 100" in errors
+    assert "Seguro não pode ser negativo" in errors
+
+
+def test_batch_endpoint_returns_scenarios(client):
+    payload = {
+        "banks": [{"bank": "Caixa", "parcela": 350.5, "saldoDevedor": 9000, "valorLiberado": 100}],
+        "coeficientes": ["0,0215", "0.0230"],
+        "percentuaisConsultoria": [10],
+        "top": 1,
+    }
+    response = client.post("/simulations/batch", json=payload)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["totalCenarios"] == 2
+    assert [c["coeficiente"] for c in body["cenarios"]] == ["0,0215"]
@@ -15,9 +15,14 @@ export const makeWsUrl = () => {
   return url.toString();
 };
 
+// Último seq recebido; sobrevive a reconexões e trocas de página
+let lastSeq: number | null = null;
+
 /**
  * WebSocket com backoff exponencial e máximo de tentativas.
  * Invalida queries do React Query sem reload de página.
+ * Ao reconectar, pede ao servidor só os eventos perdidos (resume);
+ * se a janela retida não cobre o intervalo, recarrega tudo (resync).
  */
 export function useLiveCaseEvents() {
   const qc = useQueryClient();
@@ -45,8 +50,37 @@ export function useLiveCaseEvents() {
         ws.onmessage = (m) => {
           try {
             const ev = JSON.parse(m.data);
+
+            if (ev?.type === "hello") {
+              // O servidor segura os eventos ao vivo até o resume: mesmo na
+              // primeira conexão, retoma a partir do seq do hello
+              if (lastSeq === null && typeof ev.data?.seq === "number") {
+                lastSeq = ev.data.seq;
+              }
+              if (lastSeq !== null) {
+                ws?.send(JSON.stringify({ type: "resume", after: lastSeq }));
+              }
+              return;
+            }
+            if (ev?.type === "resync") {
+              // Perdemos eventos demais: recarrega todas as queries ativas
+              console.debug("[WS] resync:", ev.data?.reason);
+              qc.invalidateQueries({ refetchType: "active" });
+              lastSeq = typeof ev.data?.seq === "number" ? ev.data.seq : null;
+              return;
+            }
+            if (ev?.type === "resumed") {
+              console.debug(`[WS] resumed: ${ev.data?.count} eventos reenviados`);
+              return;
+            }
             if (!ev?.event) return;
 
+            if (typeof ev.seq === "number") {
+              // Repetido (replay + ao vivo em workers diferentes): já tratado
+              if (lastSeq !== null && ev.seq <= lastSeq) return;
+              lastSeq = ev.seq;
+            }
+
             console.debug("[WS] Received event:", ev.event, ev.payload);
 
             if (ev.event === "case.updated") {